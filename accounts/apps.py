@@ -8,8 +8,12 @@ class AccountsConfig(AppConfig):
     def ready(self):
         # Import ici pour éviter les problèmes de chargement circulaire
         from .models import Role
+        from .principal import connect_signals
         from django.db import transaction
         
+        # Invalidation du cache des rôles/organisation des utilisateurs
+        connect_signals()
+        
         # Créer les rôles par défaut si nécessaire
         try:
             with transaction.atomic():
@@ -1,4 +1,5 @@
 from .models import Role
+from .principal import get_principal
 from .permissions import (
     check_admin_permission, check_administrative_role_permission,
     check_section_role_permission, check_department_role_permission,
@@ -9,18 +10,11 @@ from .permissions import (
 def user_roles(request):
     """Ajoute les rôles de l'utilisateur au contexte de tous les templates."""
     if request.user.is_authenticated:
-        # Récupérer la désignation complète de la section
-        user_section_designation = None
-        if request.user.profile.section:
-            try:
-                from reglage.models import Section
-                section_obj = Section.objects.get(CodeSection=request.user.profile.section)
-                user_section_designation = section_obj.DesignationSection
-            except:
-                user_section_designation = request.user.profile.section
+        # Rôles, organisation et section résolus une fois par requête
+        principal = getattr(request, 'principal', None) or get_principal(request.user)
         
         # Vérifier si l'utilisateur appartient à une organisation
-        user_organisation = request.user.profile.organisation
+        user_organisation = principal.organisation
         is_org_user = user_organisation is not None and not request.user.is_superuser
         
         return {
@@ -31,12 +25,12 @@ def user_roles(request):
             # Rôles généraux
             'is_admin': check_admin_permission(request.user) and not is_org_user,
             'is_administrative_role': check_administrative_role_permission(request.user),
-            'is_gestionnaire': request.user.profile.roles.filter(name='gestionnaire').exists(),
+            'is_gestionnaire': principal.is_gestionnaire,
             'is_section_role': check_section_role_permission(request.user),
             'is_department_role': check_department_role_permission(request.user),
-            'is_enseignant': request.user.profile.is_enseignant,
-            'is_etudiant': request.user.profile.is_etudiant,
-            'is_personnel_admin': request.user.profile.is_personnel_admin,
+            'is_enseignant': principal.is_enseignant,
+            'is_etudiant': principal.is_etudiant,
+            'is_personnel_admin': principal.is_personnel_admin,
             
             # Permissions fonctionnelles
             'can_access_reglage': has_reglage_access(request.user),
@@ -50,12 +44,12 @@ def user_roles(request):
             'can_view_section_data': lambda section: can_view_section_data(request.user, section),
             
             # Tous les rôles de l'utilisateur
-            'user_roles': request.user.profile.roles.all(),
+            'user_roles': [Role(name=name) for name in sorted(principal.roles)],
             
             # Informations supplémentaires sur l'utilisateur
-            'user_department': request.user.profile.departement,
-            'user_section': request.user.profile.section,
-            'user_section_designation': user_section_designation,
+            'user_department': principal.departement,
+            'user_section': principal.section,
+            'user_section_designation': principal.section_designation,
         }
     return {
         # Organisation de l'utilisateur
@@ -2,6 +2,9 @@ from django.shortcuts import redirect
 from django.urls import resolve, reverse
 from django.contrib import messages
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .principal import get_principal
 
 class LoginRequiredMiddleware:
     """
@@ -45,3 +48,19 @@ class LoginRequiredMiddleware:
         
         response = self.get_response(request)
         return response
+
+
+class PrincipalMiddleware:
+    """
+    Attache à la requête le principal de l'utilisateur (rôles, organisation,
+    section), résolu au premier usage puis partagé par les contrôles de
+    permission, les middlewares suivants et les context processors.
+    À placer après AuthenticationMiddleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        request.principal = SimpleLazyObject(lambda: get_principal(request.user))
+        return self.get_response(request)
+
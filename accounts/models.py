@@ -77,24 +77,43 @@ class UserProfile(models.Model):
     def full_name(self):
         return f"{self.user.first_name} {self.user.last_name}"
     
+    @property
+    def role_names(self):
+        """
+        Noms des rôles du profil, lus une seule fois
+        
+        Réutilise le principal de la requête (accounts.principal) lorsque
+        l'utilisateur en porte un, sinon les rôles préchargés ou une requête.
+        """
+        names = self.__dict__.get('_role_names')
+        if names is None:
+            user = self._state.fields_cache.get('user')
+            principal = getattr(user, '_principal', None) if user is not None else None
+            if principal is not None and principal.user_id == self.user_id:
+                names = principal.roles
+            else:
+                names = frozenset(role.name for role in self.roles.all())
+            self.__dict__['_role_names'] = names
+        return names
+    
     @property
     def is_admin(self):
-        return self.roles.filter(name=Role.ADMIN).exists()
+        return Role.ADMIN in self.role_names
     
     @property
     def is_administrative_role(self):
         """Vérifie si l'utilisateur a un rôle administratif (DG, SGAC, SGR, SGAD, AB)"""
-        return self.roles.filter(name__in=Role.ADMIN_ROLES).exists()
+        return not self.role_names.isdisjoint(Role.ADMIN_ROLES)
         
     @property
     def is_section_role(self):
         """Vérifie si l'utilisateur est chef de section (CS, CSAE, CSR, SAAS)"""
-        return self.roles.filter(name__in=Role.SECTION_ROLES).exists()
+        return not self.role_names.isdisjoint(Role.SECTION_ROLES)
     
     @property
     def is_department_role(self):
         """Vérifie si l'utilisateur est chef de département ou secrétaire (CD, SD)"""
-        return self.roles.filter(name__in=Role.DEPT_ROLES).exists()
+        return not self.role_names.isdisjoint(Role.DEPT_ROLES)
     
     @property
     def is_enseignant(self):
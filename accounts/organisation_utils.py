@@ -2,23 +2,15 @@
 Utilitaires pour gérer l'isolation des données par organisation
 """
 from .models import Organisation
+from .principal import get_principal
 
 def get_user_organisation(user):
     """
     Récupère l'organisation de l'utilisateur connecté
     Retourne None si l'utilisateur n'a pas d'organisation ou si c'est un superuser
     """
-    if not user.is_authenticated:
-        return None
-    
-    # Les superusers voient toutes les données
-    if user.is_superuser:
-        return None
-    
-    if hasattr(user, 'profile') and user.profile.organisation:
-        return user.profile.organisation
-    
-    return None
+    # Les superusers voient toutes les données (lu dans le principal de la requête)
+    return get_principal(user).user_organisation
 
 def is_org_user(user):
     """
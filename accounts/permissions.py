@@ -5,13 +5,14 @@ from django.contrib import messages
 from django.http import HttpResponseForbidden
 from django.core.exceptions import PermissionDenied
 from .models import Role
+from .principal import get_principal
 
 # Décorateurs pour les vues basées sur des fonctions
 def admin_required(view_func):
     """Décorateur pour restreindre l'accès aux administrateurs uniquement."""
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if request.user.is_authenticated and (request.user.is_staff or request.user.profile.is_admin):
+        if request.user.is_authenticated and (request.user.is_staff or get_principal(request.user).is_admin):
             return view_func(request, *args, **kwargs)
         messages.error(request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
         return redirect('accounts:login')
@@ -21,7 +22,7 @@ def administrative_role_required(view_func):
     """Décorateur pour restreindre l'accès aux rôles administratifs (Administrateur, Gestionnaire)."""
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.profile.is_administrative_role:
+        if request.user.is_authenticated and get_principal(request.user).is_administrative_role:
             return view_func(request, *args, **kwargs)
         messages.error(request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
         return redirect('accounts:login')
@@ -31,7 +32,7 @@ def section_role_required(view_func):
     """Décorateur historique (désactivé si aucun rôle de section)."""
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.profile.is_section_role:
+        if request.user.is_authenticated and get_principal(request.user).is_section_role:
             return view_func(request, *args, **kwargs)
         messages.error(request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
         return redirect('accounts:login')
@@ -41,7 +42,7 @@ def department_role_required(view_func):
     """Décorateur historique (désactivé si aucun rôle de département)."""
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.profile.is_department_role:
+        if request.user.is_authenticated and get_principal(request.user).is_department_role:
             return view_func(request, *args, **kwargs)
         messages.error(request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
         return redirect('accounts:login')
@@ -51,7 +52,7 @@ def enseignant_required(view_func):
     """Décorateur historique (rôle enseignant supprimé)."""
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.profile.is_enseignant:
+        if request.user.is_authenticated and get_principal(request.user).is_enseignant:
             return view_func(request, *args, **kwargs)
         messages.error(request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
         return redirect('accounts:login')
@@ -61,7 +62,7 @@ def etudiant_required(view_func):
     """Décorateur historique (rôle étudiant supprimé)."""
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.profile.is_etudiant:
+        if request.user.is_authenticated and get_principal(request.user).is_etudiant:
             return view_func(request, *args, **kwargs)
         messages.error(request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
         return redirect('accounts:login')
@@ -71,7 +72,7 @@ def personnel_admin_required(view_func):
     """Décorateur historique (rôle personnel administratif supprimé)."""
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.profile.is_personnel_admin:
+        if request.user.is_authenticated and get_principal(request.user).is_personnel_admin:
             return view_func(request, *args, **kwargs)
         messages.error(request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
         return redirect('accounts:login')
@@ -81,7 +82,7 @@ def personnel_admin_required(view_func):
 class AdminRequiredMixin(UserPassesTestMixin):
     """Mixin pour restreindre l'accès aux administrateurs uniquement."""
     def test_func(self):
-        return self.request.user.is_authenticated and (self.request.user.is_staff or self.request.user.profile.is_admin)
+        return self.request.user.is_authenticated and (self.request.user.is_staff or get_principal(self.request.user).is_admin)
     
     def handle_no_permission(self):
         messages.error(self.request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
@@ -90,7 +91,7 @@ class AdminRequiredMixin(UserPassesTestMixin):
 class AdministrativeRoleMixin(UserPassesTestMixin):
     """Mixin pour restreindre l'accès aux rôles administratifs (Administrateur, Gestionnaire)."""
     def test_func(self):
-        return self.request.user.is_authenticated and self.request.user.profile.is_administrative_role
+        return self.request.user.is_authenticated and get_principal(self.request.user).is_administrative_role
     
     def handle_no_permission(self):
         messages.error(self.request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
@@ -99,7 +100,7 @@ class AdministrativeRoleMixin(UserPassesTestMixin):
 class SectionRoleMixin(UserPassesTestMixin):
     """Mixin historique (aucun rôle de section actif)."""
     def test_func(self):
-        return self.request.user.is_authenticated and self.request.user.profile.is_section_role
+        return self.request.user.is_authenticated and get_principal(self.request.user).is_section_role
     
     def handle_no_permission(self):
         messages.error(self.request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
@@ -108,7 +109,7 @@ class SectionRoleMixin(UserPassesTestMixin):
 class DepartmentRoleMixin(UserPassesTestMixin):
     """Mixin historique (aucun rôle de département actif)."""
     def test_func(self):
-        return self.request.user.is_authenticated and self.request.user.profile.is_department_role
+        return self.request.user.is_authenticated and get_principal(self.request.user).is_department_role
     
     def handle_no_permission(self):
         messages.error(self.request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
@@ -117,7 +118,7 @@ class DepartmentRoleMixin(UserPassesTestMixin):
 class EnseignantRequiredMixin(UserPassesTestMixin):
     """Mixin pour restreindre l'accès aux enseignants uniquement."""
     def test_func(self):
-        return self.request.user.is_authenticated and self.request.user.profile.is_enseignant
+        return self.request.user.is_authenticated and get_principal(self.request.user).is_enseignant
     
     def handle_no_permission(self):
         messages.error(self.request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
@@ -126,7 +127,7 @@ class EnseignantRequiredMixin(UserPassesTestMixin):
 class EtudiantRequiredMixin(UserPassesTestMixin):
     """Mixin pour restreindre l'accès aux étudiants uniquement."""
     def test_func(self):
-        return self.request.user.is_authenticated and self.request.user.profile.is_etudiant
+        return self.request.user.is_authenticated and get_principal(self.request.user).is_etudiant
     
     def handle_no_permission(self):
         messages.error(self.request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
@@ -135,7 +136,7 @@ class EtudiantRequiredMixin(UserPassesTestMixin):
 class PersonnelAdminRequiredMixin(UserPassesTestMixin):
     """Mixin pour restreindre l'accès au personnel administratif uniquement."""
     def test_func(self):
-        return self.request.user.is_authenticated and self.request.user.profile.is_personnel_admin
+        return self.request.user.is_authenticated and get_principal(self.request.user).is_personnel_admin
     
     def handle_no_permission(self):
         messages.error(self.request, "Vous n'avez pas les permissions nécessaires pour accéder à cette page.")
@@ -148,11 +149,11 @@ def check_admin_permission(user):
         return False
         
     # Staff ou rôle admin traditionnel
-    if user.is_staff or user.profile.is_admin:
+    if user.is_staff or get_principal(user).is_admin:
         return True
         
     # Seul le rôle ADMIN a tous les privilèges (pas le gestionnaire)
-    if user.profile.roles.filter(name=Role.ADMIN).exists():
+    if get_principal(user).has_role(Role.ADMIN):
         return True
         
     return False
@@ -163,27 +164,27 @@ def check_administrative_role_permission(user):
         return False
     
     # Vérifier si l'utilisateur a le rôle admin ou gestionnaire
-    return user.profile.is_administrative_role or user.profile.roles.filter(name=Role.GESTIONNAIRE).exists()
+    return get_principal(user).is_administrative_role or get_principal(user).has_role(Role.GESTIONNAIRE)
 
 def check_section_role_permission(user):
     """Historique: pas de rôle de section actif."""
-    return user.is_authenticated and user.profile.is_section_role
+    return user.is_authenticated and get_principal(user).is_section_role
 
 def check_department_role_permission(user):
     """Historique: pas de rôle de département actif."""
-    return user.is_authenticated and user.profile.is_department_role
+    return user.is_authenticated and get_principal(user).is_department_role
 
 def check_enseignant_permission(user):
     """Historique: rôle enseignant supprimé."""
-    return user.is_authenticated and user.profile.is_enseignant
+    return user.is_authenticated and get_principal(user).is_enseignant
 
 def check_etudiant_permission(user):
     """Historique: rôle étudiant supprimé."""
-    return user.is_authenticated and user.profile.is_etudiant
+    return user.is_authenticated and get_principal(user).is_etudiant
 
 def check_personnel_admin_permission(user):
     """Historique: rôle personnel administratif supprimé."""
-    return user.is_authenticated and user.profile.is_personnel_admin
+    return user.is_authenticated and get_principal(user).is_personnel_admin
 
 # Fonctions spécifiques pour les contrôles d'accès basés sur les fonctions
 def has_finance_access(user):
@@ -196,7 +197,7 @@ def has_finance_access(user):
         return True
     
     # Administrateur et Gestionnaire ont accès
-    if user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists():
+    if get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE):
         return True
         
     return False
@@ -211,7 +212,7 @@ def has_user_creation_access(user):
         return True
     
     # Les rôles administratifs spécifiques ont aussi accès
-    if user.profile.roles.filter(name__in=Role.ADMIN_ROLES).exists():
+    if get_principal(user).has_any_role(Role.ADMIN_ROLES):
         return True
         
     return False
@@ -222,18 +223,18 @@ def has_reglage_access(user):
         return False
     
     # Staff ou rôle admin traditionnel
-    if user.is_staff or user.profile.is_admin:
+    if user.is_staff or get_principal(user).is_admin:
         return True
     
     # Gestionnaire a aussi accès aux réglages
-    if user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists():
+    if get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE):
         return True
         
     return False
 
 def has_view_all_access(user):
     """Vérifie si l'utilisateur peut tout voir (sauf restrictions spécifiques)."""
-    return user.is_authenticated and (user.is_staff or user.profile.is_admin or user.profile.is_administrative_role)
+    return user.is_authenticated and (user.is_staff or get_principal(user).is_admin or get_principal(user).is_administrative_role)
 
 def can_view_department_data(user, department):
     """Vérifie si l'utilisateur peut voir les données d'un département spécifique."""
@@ -241,7 +242,7 @@ def can_view_department_data(user, department):
         return False
         
     # Administrateurs et rôles administratifs peuvent tout voir
-    if user.is_staff or user.profile.is_admin or user.profile.is_administrative_role:
+    if user.is_staff or get_principal(user).is_admin or get_principal(user).is_administrative_role:
         return True
         
     # Rôles historiques supprimés: on retire ces branches
@@ -254,7 +255,7 @@ def can_view_section_data(user, section):
         return False
         
     # Administrateurs et rôles administratifs peuvent voir toutes les sections
-    if user.is_staff or user.profile.is_admin or user.profile.is_administrative_role:
+    if user.is_staff or get_principal(user).is_admin or get_principal(user).is_administrative_role:
         return True
         
     # Rôles historiques supprimés: pas d'accès basé sur section
@@ -277,12 +278,12 @@ def can_edit_courses_teachers(user):
         return False
     
     # Utilisateur d'organisation peut éditer
-    if user.profile.organisation is not None:
+    if get_principal(user).organisation is not None:
         return True
     
     return (user.is_staff or 
-            user.profile.is_admin or 
-            user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())
+            get_principal(user).is_admin or 
+            get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))
 
 def can_delete_all(user):
     """Vérifie si l'utilisateur peut utiliser le bouton 'Supprimer tout' (Administrateur uniquement, pas org user)."""
@@ -290,8 +291,8 @@ def can_delete_all(user):
         return False
     
     # Les utilisateurs d'organisation ne peuvent jamais supprimer tout
-    if user.profile.organisation is not None and not user.is_superuser:
+    if get_principal(user).organisation is not None and not user.is_superuser:
         return False
     
     # Seul l'administrateur peut supprimer tout
-    return user.is_staff or user.profile.roles.filter(name=Role.ADMIN).exists()
+    return user.is_staff or get_principal(user).has_role(Role.ADMIN)
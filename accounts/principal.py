@@ -0,0 +1,266 @@
+"""
+Identité résolue de l'utilisateur connecté (rôles, organisation, section)
+
+Le principal est construit une seule fois par requête (PrincipalMiddleware)
+puis lu par tous les contrôles de permission. Il est aussi conservé dans le
+cache quelques secondes, sous une clé qui change dès que le profil, les rôles
+ou l'organisation de l'utilisateur sont modifiés.
+
+Ce cache entre requêtes n'est utilisé qu'avec un cache partagé (Redis,
+Memcached, base de données...) : avec le cache locmem par défaut, chaque
+processus garderait son propre principal et un retrait de droits ne serait
+vu par les autres workers qu'à expiration de l'entrée. Sans cache partagé,
+le principal est donc reconstruit à chaque requête.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Role
+
+
+CACHE_TIMEOUT = getattr(settings, 'PRINCIPAL_CACHE_TIMEOUT', 60)
+
+# Caches propres à chaque processus : invalidation invisible des autres workers
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    """Vrai si le cache par défaut est partagé entre processus (et CACHE_TIMEOUT positif)"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return CACHE_TIMEOUT > 0 and backend not in LOCAL_CACHE_BACKENDS
+
+
+class Principal:
+    """
+    Rôles, organisation et section d'un utilisateur
+
+    Attributs:
+        user_id: int ou None (utilisateur anonyme)
+        roles: frozenset des noms de rôles (Role.ADMIN, Role.GESTIONNAIRE...)
+        organisation: Organisation ou None
+        section: code de section du profil
+        section_designation: désignation complète de la section
+        departement: code de département du profil
+    """
+
+    def __init__(self, user_id=None, is_authenticated=False, is_superuser=False, is_staff=False,
+                 roles=(), organisation=None, section=None, section_designation=None, departement=None):
+        self.user_id = user_id
+        self.is_authenticated = is_authenticated
+        self.is_superuser = is_superuser
+        self.is_staff = is_staff
+        self.roles = frozenset(roles)
+        self.organisation = organisation
+        self.section = section
+        self.section_designation = section_designation
+        self.departement = departement
+
+    # Rôles historiques supprimés
+    is_enseignant = False
+    is_etudiant = False
+    is_personnel_admin = False
+
+    def __repr__(self):
+        return f"<Principal user={self.user_id} roles={sorted(self.roles)}>"
+
+    def has_role(self, name):
+        return name in self.roles
+
+    def has_any_role(self, *names):
+        """Vrai si l'utilisateur possède au moins un des rôles (noms ou listes de noms)"""
+        wanted = set()
+        for name in names:
+            if isinstance(name, (list, tuple, set, frozenset)):
+                wanted.update(name)
+            else:
+                wanted.add(name)
+        return not self.roles.isdisjoint(wanted)
+
+    @property
+    def is_admin(self):
+        return self.has_role(Role.ADMIN)
+
+    @property
+    def is_gestionnaire(self):
+        return self.has_role(Role.GESTIONNAIRE)
+
+    @property
+    def is_administrative_role(self):
+        return self.has_any_role(Role.ADMIN_ROLES)
+
+    @property
+    def is_section_role(self):
+        return self.has_any_role(Role.SECTION_ROLES)
+
+    @property
+    def is_department_role(self):
+        return self.has_any_role(Role.DEPT_ROLES)
+
+    @property
+    def user_organisation(self):
+        """Organisation servant à isoler les données (None pour les superusers)"""
+        if not self.is_authenticated or self.is_superuser:
+            return None
+        return self.organisation
+
+    @property
+    def is_org_user(self):
+        return self.user_organisation is not None
+
+
+ANONYMOUS = Principal()
+
+
+def _version_key(user_id):
+    return f'accounts:principal_version:{user_id}'
+
+
+def _cache_key(user_id):
+    version = cache.get(_version_key(user_id), 0)
+    return f'accounts:principal:{user_id}:{version}'
+
+
+def invalidate_principal(user_id):
+    """Change la version du principal d'un utilisateur (ancienne entrée ignorée)"""
+    if not user_id or not cache_is_shared():
+        return
+    key = _version_key(user_id)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def build_principal(user):
+    """
+    Construit le principal depuis la base : une requête pour le profil et son
+    organisation, une pour les rôles, une pour la section si renseignée
+    """
+    from reglage.models import Section
+    from .models import UserProfile
+
+    profile = (
+        UserProfile.objects.select_related('organisation')
+        .prefetch_related('roles')
+        .filter(user_id=user.pk)
+        .first()
+    )
+    if profile is None:
+        return Principal(user.pk, True, user.is_superuser, user.is_staff)
+
+    section_designation = None
+    if profile.section:
+        section_designation = Section.objects.filter(
+            CodeSection=profile.section
+        ).values_list('DesignationSection', flat=True).first() or profile.section
+
+    return Principal(
+        user_id=user.pk,
+        is_authenticated=True,
+        is_superuser=user.is_superuser,
+        is_staff=user.is_staff,
+        roles=[role.name for role in profile.roles.all()],
+        organisation=profile.organisation,
+        section=profile.section,
+        section_designation=section_designation,
+        departement=profile.departement,
+    )
+
+
+def get_principal(user):
+    """
+    Retourne le principal de l'utilisateur, mémorisé sur l'objet user
+    (et dans le cache s'il est partagé entre processus)
+
+    Args:
+        user: User (ou AnonymousUser / None)
+
+    Returns:
+        Principal
+    """
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+
+    principal = getattr(user, '_principal', None)
+    if principal is not None:
+        return principal
+
+    if not cache_is_shared():
+        principal = build_principal(user)
+    else:
+        key = _cache_key(user.pk)
+        principal = cache.get(key)
+        if principal is None:
+            principal = build_principal(user)
+            cache.set(key, principal, CACHE_TIMEOUT)
+    user._principal = principal
+    return principal
+
+
+def forget_principal(user):
+    """Oublie le principal mémorisé sur user (après modification de ses rôles)"""
+    if user is not None and hasattr(user, '_principal'):
+        del user._principal
+    if user is not None and getattr(user, 'pk', None):
+        invalidate_principal(user.pk)
+
+
+# --- Invalidation -----------------------------------------------------------
+
+def _on_user_save(sender, instance, **kwargs):
+    invalidate_principal(instance.pk)
+
+
+def _on_profile_save(sender, instance, **kwargs):
+    instance.__dict__.pop('_role_names', None)
+    user = instance._state.fields_cache.get('user')
+    if user is not None:
+        user.__dict__.pop('_principal', None)
+    invalidate_principal(instance.user_id)
+
+
+def _on_roles_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    from .models import UserProfile
+
+    if not reverse:
+        _on_profile_save(sender, instance)
+        return
+    # role.users.add(...) : pk_set contient des profils
+    profiles = UserProfile.objects.all() if pk_set is None else UserProfile.objects.filter(pk__in=pk_set)
+    for user_id in profiles.values_list('user_id', flat=True):
+        invalidate_principal(user_id)
+
+
+def _on_organisation_save(sender, instance, **kwargs):
+    from .models import UserProfile
+
+    for user_id in UserProfile.objects.filter(organisation=instance).values_list('user_id', flat=True):
+        invalidate_principal(user_id)
+
+
+def _on_section_save(sender, instance, **kwargs):
+    from .models import UserProfile
+
+    for user_id in UserProfile.objects.filter(section=instance.CodeSection).values_list('user_id', flat=True):
+        invalidate_principal(user_id)
+
+
+def connect_signals():
+    """Branche l'invalidation du cache des principaux (appelé dans AccountsConfig.ready)"""
+    from django.contrib.auth.models import User
+    from django.db.models.signals import post_save, post_delete, m2m_changed
+    from reglage.models import Section
+    from .models import Organisation, UserProfile
+
+    post_save.connect(_on_user_save, sender=User, dispatch_uid='principal_user_save')
+    post_save.connect(_on_profile_save, sender=UserProfile, dispatch_uid='principal_profile_save')
+    post_delete.connect(_on_profile_save, sender=UserProfile, dispatch_uid='principal_profile_delete')
+    m2m_changed.connect(_on_roles_changed, sender=UserProfile.roles.through, dispatch_uid='principal_roles_changed')
+    post_save.connect(_on_organisation_save, sender=Organisation, dispatch_uid='principal_organisation_save')
+    post_save.connect(_on_section_save, sender=Section, dispatch_uid='principal_section_save')
@@ -2,6 +2,7 @@ from django.shortcuts import redirect
 from django.urls import resolve, reverse
 from django.contrib import messages
 from django.conf import settings
+from .principal import get_principal
 from .permissions import (
     check_admin_permission, check_administrative_role_permission,
     check_section_role_permission, check_department_role_permission,
@@ -126,7 +127,7 @@ class RoleBasedAccessMiddleware:
         # Si l'utilisateur a un rôle de section, vérifier qu'il accède uniquement aux données de sa section
         if check_section_role_permission(request.user) and not check_admin_permission(request.user):
             # Récupérer la section de l'utilisateur
-            user_section = request.user.profile.section
+            user_section = get_principal(request.user).section
             
             # Si l'utilisateur essaie d'accéder à des données de section
             if 'section' in request.GET:
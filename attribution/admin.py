@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import PdfJob
+
+
+@admin.register(PdfJob)
+class PdfJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'report', 'status', 'user', 'created_at', 'finished_at')
+    list_filter = ('status', 'report')
+    search_fields = ('report', 'user__username', 'filename')
+    readonly_fields = ('key', 'active_key', 'scope', 'created_at', 'started_at', 'finished_at')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AttributionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'attribution'
+    
+    def ready(self):
+        """Importer les signaux lors du démarrage de l'application"""
+        import attribution.signals
@@ -0,0 +1,153 @@
+"""
+Import Excel des attributions en lot
+
+Les références (enseignants, cours) sont résolues en deux requêtes in_bulk,
+les attributions existantes sont exclues par jointure en mémoire, puis les
+nouvelles lignes sont écrites avec bulk_create par lots. Les lignes rejetées
+forment un rapport téléchargeable.
+"""
+import os
+import tempfile
+import uuid
+
+import pandas as pd
+from django.db import transaction
+
+from courses.models import Course
+from teachers.models import Teacher
+
+from .models import Attribution
+
+
+REQUIRED_COLUMNS = ['matricule', 'code_ue', 'annee_academique', 'type_charge']
+
+TYPES_CHARGE = {key for key, _ in Attribution.TYPE_CHARGE_CHOICES}
+
+REPORT_DIR = os.path.join(tempfile.gettempdir(), 'attribution_imports')
+
+REPORT_COLUMNS = ['ligne', 'matricule', 'code_ue', 'annee_academique', 'type_charge', 'motif']
+
+
+def _clean(value):
+    """Texte d'une cellule ('' si vide ; 1234.0 lu par pandas devient '1234')"""
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def prepare_frame(df):
+    """
+    Normalise le classeur : noms de colonnes, cellules texte, numéro de ligne Excel
+
+    Raises:
+        ValueError: si des colonnes obligatoires manquent
+    """
+    from reglage.import_jobs import normalize_columns
+
+    df = normalize_columns(df)
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f'Colonnes manquantes dans le fichier Excel : {", ".join(missing)}')
+
+    frame = pd.DataFrame({col: df[col].astype(object).map(_clean) for col in REQUIRED_COLUMNS})
+    frame['ligne'] = range(2, len(frame) + 2)
+    # Type de charge inconnu : valeur par défaut
+    frame.loc[~frame['type_charge'].isin(TYPES_CHARGE), 'type_charge'] = 'Reguliere'
+    frame['motif'] = ''
+    return frame
+
+
+def _reject(frame, mask, motif):
+    mask = mask & (frame['motif'] == '')
+    frame.loc[mask, 'motif'] = motif
+
+
+def import_attributions(df, dry_run=False, batch_size=500):
+    """
+    Valide puis crée les attributions d'un classeur
+
+    Args:
+        df: DataFrame lu depuis le fichier Excel
+        dry_run: bool - valider sans rien écrire
+        batch_size: int - lignes par requête INSERT
+
+    Returns:
+        dict: {'total', 'imported', 'rejected': DataFrame des lignes rejetées (REPORT_COLUMNS)}
+    """
+    frame = prepare_frame(df)
+
+    _reject(frame, (frame[['matricule', 'code_ue', 'annee_academique']] == '').any(axis=1), 'données manquantes')
+
+    teachers = Teacher.objects.in_bulk(
+        list(set(frame['matricule']) - {''}), field_name='matricule'
+    )
+    courses = Course.objects.in_bulk(
+        list(set(frame['code_ue']) - {''}), field_name='code_ue'
+    )
+    _reject(frame, ~frame['matricule'].isin(teachers), 'enseignant non trouvé')
+    _reject(frame, ~frame['code_ue'].isin(courses), 'cours non trouvé')
+
+    _reject(
+        frame,
+        frame.duplicated(['matricule', 'code_ue', 'annee_academique'], keep='first'),
+        'doublon dans le fichier',
+    )
+
+    # Anti-jointure en mémoire avec les attributions déjà enregistrées
+    candidates = frame[frame['motif'] == '']
+    course_ids = {code: course.pk for code, course in courses.items()}
+    existing = set(
+        Attribution.objects.filter(
+            matricule_id__in=set(candidates['matricule']),
+            code_ue_id__in={course_ids[code] for code in candidates['code_ue']},
+            annee_academique__in=set(candidates['annee_academique']),
+        ).values_list('matricule_id', 'code_ue_id', 'annee_academique')
+    )
+    if existing:
+        already = pd.Series(
+            [
+                (matricule, course_ids.get(code), annee) in existing
+                for matricule, code, annee in zip(frame['matricule'], frame['code_ue'], frame['annee_academique'])
+            ],
+            index=frame.index,
+        )
+        _reject(frame, already, 'attribution déjà existante')
+
+    to_create = frame[frame['motif'] == '']
+    if not dry_run and not to_create.empty:
+        attributions = [
+            Attribution(
+                matricule=teachers[row.matricule],
+                code_ue=courses[row.code_ue],
+                annee_academique=row.annee_academique,
+                type_charge=row.type_charge,
+            )
+            for row in to_create.itertuples(index=False)
+        ]
+        with transaction.atomic():
+            Attribution.objects.bulk_create(attributions, batch_size=batch_size)
+
+    return {
+        'total': len(frame),
+        'imported': len(to_create),
+        'rejected': frame.loc[frame['motif'] != '', REPORT_COLUMNS],
+    }
+
+
+def save_rejection_report(rejected):
+    """
+    Enregistre le rapport des rejets au format Excel
+
+    Returns:
+        str: identifiant du rapport (nom de fichier sans extension)
+    """
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    token = uuid.uuid4().hex
+    rejected.to_excel(report_path(token), index=False, sheet_name='Rejets')
+    return token
+
+
+def report_path(token):
+    return os.path.join(REPORT_DIR, f'{token}.xlsx')
@@ -0,0 +1,324 @@
+"""
+Recherche de créneaux libres sur des matrices d'occupation
+
+Pour chaque semaine, l'occupation est une matrice numpy (ressource × case)
+par type de ressource — enseignants, classes, salles — où une case est un
+(jour, créneau) de la semaine. Les matrices sont construites en une requête
+pour toutes les semaines demandées et conservées dans le processus tant que
+le compteur ScheduleVersion de la semaine ne change pas.
+
+Trouver les (date, créneau, salle) libres pour une attribution revient alors
+à un ET vectorisé : ligne de l'enseignant, ligne de la classe et matrice des
+salles assez grandes, au lieu d'une validation par essai.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Count
+
+from .models import ScheduleEntry, ScheduleVersion
+from .occupancy import JOURS_SEMAINE, effective_date
+
+
+# Jours de cours (lundi à samedi)
+JOURS = JOURS_SEMAINE[:6]
+
+# Semaines d'occupation gardées en mémoire par processus
+WEEK_CACHE_SIZE = 64
+
+
+def class_sizes(annee):
+    """
+    Effectif inscrit de chaque classe pour une année
+
+    Returns:
+        dict: {clé de classe (timetable_grid.class_key): nombre d'inscrits}
+    """
+    from gestion_administrative.models import Inscription
+    from .timetable_grid import class_key
+
+    sizes = defaultdict(int)
+    rows = (
+        Inscription.objects.filter(annee_academique=annee, est_actif=True)
+        .values_list('code_classe__CodeClasse').annotate(n=Count('id'))
+    )
+    for code, count in rows:
+        sizes[class_key(code) or code] += count
+    return sizes
+
+
+def class_size(sizes, classe):
+    """Effectif d'une classe (libellé de Course.classe), 0 si inconnu"""
+    from .timetable_grid import class_key
+
+    return sizes.get(class_key(classe) or classe, 0)
+
+
+def teacher_absences(matricules, date_debut, date_fin):
+    """
+    Absences enregistrées des enseignants qui chevauchent une période
+
+    Returns:
+        list: (matricule, début, fin)
+    """
+    from gestion_administrative.models import AbsenceEnseignant, AutorisationAbsenceEnseignant
+
+    return list(
+        AutorisationAbsenceEnseignant.objects.filter(
+            teacher__matricule__in=matricules, periode_debut__lte=date_fin, periode_fin__gte=date_debut,
+        ).values_list('teacher__matricule', 'periode_debut', 'periode_fin')
+    ) + list(
+        AbsenceEnseignant.objects.filter(
+            MatriculeEnseignant__in=matricules, dateDebut__lte=date_fin, dateFin__gte=date_debut,
+        ).values_list('MatriculeEnseignant', 'dateDebut', 'dateFin')
+    )
+
+
+class WeekOccupancy:
+    """
+    Occupation d'une semaine : nombre d'horaires par ressource et par case
+
+    La case d'un (jour, créneau) est jour * len(creneau_ids) + position du
+    créneau ; les ressources inconnues de la semaine sont libres partout.
+    """
+
+    KINDS = ('teacher', 'class', 'room')
+
+    def __init__(self, monday, creneau_ids):
+        self.monday = monday
+        self.creneau_ids = tuple(creneau_ids)
+        self.creneau_pos = {creneau_id: i for i, creneau_id in enumerate(self.creneau_ids)}
+        self.n_slots = len(JOURS) * len(self.creneau_ids)
+        self._pending = {kind: [] for kind in self.KINDS}
+        self.keys = {}
+        self.matrices = {}
+
+    def slot(self, day, creneau_id):
+        """Case d'un (date, créneau), ou None hors de la semaine"""
+        offset = (day - self.monday).days
+        position = self.creneau_pos.get(creneau_id)
+        if position is None or not 0 <= offset < len(JOURS):
+            return None
+        return offset * len(self.creneau_ids) + position
+
+    def add(self, kind, key, slot):
+        if key and slot is not None:
+            self._pending[kind].append((key, slot))
+
+    def freeze(self):
+        """Construit les matrices (une seule fois, après les add)"""
+        for kind, pairs in self._pending.items():
+            index = {}
+            for key, _ in pairs:
+                index.setdefault(key, len(index))
+            matrix = np.zeros((len(index), self.n_slots), dtype=np.int16)
+            if pairs:
+                rows = np.fromiter((index[key] for key, _ in pairs), dtype=np.intp, count=len(pairs))
+                cols = np.fromiter((slot for _, slot in pairs), dtype=np.intp, count=len(pairs))
+                np.add.at(matrix, (rows, cols), 1)
+            self.keys[kind] = index
+            self.matrices[kind] = matrix
+        self._pending = None
+        return self
+
+    def row(self, kind, key):
+        """Occupation d'une ressource (copie modifiable)"""
+        position = self.keys[kind].get(key)
+        if position is None:
+            return np.zeros(self.n_slots, dtype=np.int16)
+        return self.matrices[kind][position].copy()
+
+    def rows(self, kind, keys):
+        """Occupation de plusieurs ressources (une ligne par clé, dans l'ordre)"""
+        matrix = np.zeros((len(keys), self.n_slots), dtype=np.int16)
+        index = self.keys[kind]
+        for i, key in enumerate(keys):
+            position = index.get(key)
+            if position is not None:
+                matrix[i] = self.matrices[kind][position]
+        return matrix
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_weeks(mondays, creneau_ids, reference_version=None):
+    """
+    Occupation des semaines demandées (chargées en une requête au besoin)
+
+    Args:
+        mondays: lundis des semaines
+        creneau_ids: créneaux (colonnes) des matrices
+        reference_version: version du registre reglage (les créneaux actifs en dépendent)
+
+    Returns:
+        dict: {lundi: WeekOccupancy}
+    """
+    mondays = sorted(set(mondays))
+    creneau_ids = tuple(creneau_ids)
+    versions = dict(
+        ScheduleVersion.objects.filter(
+            key__in=[ScheduleVersion.week_key(monday) for monday in mondays]
+        ).values_list('key', 'version')
+    )
+    cache_keys = {
+        monday: (monday, versions.get(ScheduleVersion.week_key(monday), 0), creneau_ids, reference_version)
+        for monday in mondays
+    }
+
+    weeks = {}
+    with _cache_lock:
+        for monday, key in cache_keys.items():
+            if key in _cache:
+                _cache.move_to_end(key)
+                weeks[monday] = _cache[key]
+    missing = [monday for monday in mondays if monday not in weeks]
+    if not missing:
+        return weeks
+
+    fresh = {monday: WeekOccupancy(monday, creneau_ids) for monday in missing}
+    period = (missing[0], missing[-1] + timedelta(days=6))
+    rows = ScheduleEntry.objects.filter(date_effective__range=period, creneau_id__in=creneau_ids).values_list(
+        'date_effective', 'creneau_id', 'salle', 'salle_link__code', 'enseignant_matricule', 'classe_code',
+    )
+    for day, creneau_id, salle, salle_link, matricule, classe in rows:
+        week = fresh.get(day - timedelta(days=day.weekday()))
+        if week is None:
+            continue
+        slot = week.slot(day, creneau_id)
+        week.add('teacher', matricule, slot)
+        week.add('class', classe, slot)
+        week.add('room', salle or salle_link, slot)
+
+    with _cache_lock:
+        for monday, week in fresh.items():
+            _cache[cache_keys[monday]] = weeks[monday] = week.freeze()
+        while len(_cache) > WEEK_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return weeks
+
+
+def find_free_slots(attribution, date_debut, date_fin, type_horaire='cours', exclude_id=None, limit=None):
+    """
+    Triplets (date, créneau, salle) où l'enseignant, la classe et une salle
+    assez grande sont libres
+
+    Les résultats sont classés par adéquation de la salle (le moins de
+    places perdues d'abord, capacité inconnue en dernier), puis par date et
+    ordre des créneaux. Sans salle disponible enregistrée, les créneaux où
+    l'enseignant et la classe sont libres sont retournés sans salle.
+
+    Args:
+        attribution: Attribution (matricule et code_ue chargés)
+        date_debut, date_fin: dates - période de recherche
+        type_horaire: 'cours' ou 'examen' (créneaux proposés)
+        exclude_id: horaire à déplacer (son occupation actuelle est ignorée)
+        limit: nombre maximal de résultats
+
+    Returns:
+        dict: {'effectif': int, 'results': liste de dicts date, jour, creneau,
+        salle, capacite, places_libres}
+    """
+    from reglage.models import Salle
+    from reglage.registry import reference_data
+
+    ref = reference_data()
+    course = attribution.code_ue
+    teacher = attribution.matricule_id
+    classe = course.classe
+    all_creneaux = [creneau for creneau in ref.creneaux if creneau.code != 'TJ']
+    # Créneaux d'examen de la section du cours, à défaut tous ceux du type
+    wanted = {creneau.pk for creneau in ref.creneaux_pour(type_horaire, course.section)}
+    if not wanted:
+        wanted = {creneau.pk for creneau in ref.creneaux_pour(type_horaire)}
+    creneau_ids = [creneau.pk for creneau in all_creneaux]
+    effectif = class_size(class_sizes(attribution.annee_academique), classe)
+
+    # Salles assez grandes, de la mieux ajustée à la moins bien ajustée
+    rooms = [
+        (code, capacite) for code, capacite in
+        Salle.objects.filter(est_disponible=True).values_list('code', 'capacite')
+        if not effectif or capacite is None or capacite >= effectif
+    ]
+    rooms.sort(key=lambda room: (room[1] is None, (room[1] or 0) - effectif, room[0]))
+    room_codes = [code for code, _ in rooms]
+
+    first_monday = date_debut - timedelta(days=date_debut.weekday())
+    mondays = [first_monday + timedelta(weeks=n) for n in range((date_fin - first_monday).days // 7 + 1)]
+    weeks = load_weeks(mondays, creneau_ids, ref.version)
+
+    excluded = None
+    if exclude_id:
+        excluded = ScheduleEntry.objects.filter(pk=exclude_id).values_list(
+            'semaine_debut', 'date_cours', 'jour', 'creneau_id', 'salle', 'salle_link__code',
+            'attribution__matricule_id', 'attribution__code_ue__classe',
+        ).first()
+
+    absent_days = set()
+    for _, debut, fin in teacher_absences([teacher], date_debut, date_fin):
+        day = max(debut, date_debut)
+        while day <= min(fin, date_fin):
+            absent_days.add(day)
+            day += timedelta(days=1)
+
+    n_creneaux = len(creneau_ids)
+    wanted_cols = np.array([creneau_id in wanted for creneau_id in creneau_ids] * len(JOURS), dtype=bool)
+    results = []
+    for monday in mondays:
+        week = weeks[monday]
+        teacher_busy = week.row('teacher', teacher)
+        class_busy = week.row('class', classe)
+        room_busy = week.rows('room', room_codes)
+        if excluded:
+            semaine_debut, date_cours, jour, creneau_id, salle, salle_link, ex_teacher, ex_classe = excluded
+            day = effective_date(semaine_debut, jour, date_cours)
+            slot = week.slot(day, creneau_id) if day else None
+            if slot is not None:
+                if ex_teacher == teacher:
+                    teacher_busy[slot] -= 1
+                if ex_classe == classe:
+                    class_busy[slot] -= 1
+                if (salle or salle_link) in room_codes:
+                    room_busy[room_codes.index(salle or salle_link), slot] -= 1
+
+        valid = wanted_cols.copy()
+        for offset in range(len(JOURS)):
+            day = monday + timedelta(days=offset)
+            if day < date_debut or day > date_fin or day in absent_days:
+                valid[offset * n_creneaux:(offset + 1) * n_creneaux] = False
+        free = valid & (teacher_busy <= 0) & (class_busy <= 0)
+        if not free.any():
+            continue
+
+        if not rooms:
+            for slot in np.flatnonzero(free):
+                results.append((0, monday, int(slot), None))
+            continue
+        room_idx, slot_idx = np.nonzero((room_busy <= 0) & free[np.newaxis, :])
+        results.extend(zip(room_idx.tolist(), [monday] * len(slot_idx), slot_idx.tolist(), room_idx.tolist()))
+
+    order = {creneau.pk: position for position, creneau in enumerate(all_creneaux)}
+    results.sort(key=lambda item: (item[0], item[1], item[2] // n_creneaux, order[creneau_ids[item[2] % n_creneaux]]))
+    if limit:
+        results = results[:limit]
+
+    creneaux = {creneau.pk: creneau for creneau in all_creneaux}
+    payload = []
+    for _, monday, slot, room in results:
+        day = monday + timedelta(days=slot // n_creneaux)
+        creneau = creneaux[creneau_ids[slot % n_creneaux]]
+        code, capacite = rooms[room] if room is not None else (None, None)
+        payload.append({
+            'date': day.isoformat(),
+            'jour': JOURS[day.weekday()],
+            'creneau_id': creneau.pk,
+            'creneau_code': creneau.code,
+            'creneau': creneau.get_format_court(),
+            'salle': code,
+            'capacite': capacite,
+            'places_libres': capacite - effectif if capacite is not None else None,
+        })
+    return {'effectif': effectif, 'results': payload}
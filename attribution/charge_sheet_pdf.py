@@ -0,0 +1,326 @@
+"""
+Rendu PDF des fiches de charge horaire
+
+Ce module ne dépend pas de Django : une fiche est décrite par un dict de
+valeurs simples (voir charge_sheets.build_sheets), ce qui permet de rendre
+les fiches d'une section dans un pool de processus.
+
+Structure d'une fiche :
+    enseignant: dict ou None - matricule, nom_complet, grade, departement,
+        section (désignations) et photo_path
+    annee_academique: str
+    regulieres, supplementaires: listes de dicts - code_ue, intitule_ue,
+        intitule_ec, heures, credit, classe, semestre
+    csae, sgac: dict ou None - nom_complet, grade
+    header_path: str - image d'en-tête
+    date: str - date affichée au bas de la fiche
+"""
+import logging
+import os
+import zipfile
+from io import BytesIO
+
+from PIL import Image as PILImage, ImageDraw
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import Flowable, Image, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from static.images.header import create_header_table
+
+
+logger = logging.getLogger(__name__)
+
+
+COL_WIDTHS = [50, 140, 140, 70, 50, 50, 50]
+
+
+class _NextSheet(Flowable):
+    """Repère de fin de fiche : la numérotation des pages repart à 1 sur la page suivante"""
+
+    def wrap(self, available_width, available_height):
+        return 0, 0
+
+    def draw(self):
+        self.canv._sheet_first_page = self.canv.getPageNumber() + 1
+
+
+def _footer(canvas, doc):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    page_num = canvas.getPageNumber() - getattr(canvas, '_sheet_first_page', 1) + 1
+    text = f"Page {page_num}"
+    canvas.drawRightString(A4[0]-20, 10, text)
+    canvas.restoreState()
+
+
+def _new_document(buffer):
+    return SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=15,
+        leftMargin=15,
+        topMargin=15,
+        bottomMargin=15
+    )
+
+
+def _rounded_image(image_path, size=(100, 100), radius=15):
+    """Crée une image avec des bords arrondis"""
+    try:
+        img = PILImage.open(image_path).convert("RGB")
+        img = img.resize(size, PILImage.Resampling.LANCZOS)
+
+        # Masque avec bords arrondis
+        mask = PILImage.new('L', size, 0)
+        draw = ImageDraw.Draw(mask)
+        draw.rounded_rectangle([(0, 0), size], radius=radius, fill=255)
+
+        output = PILImage.new('RGB', size, (255, 255, 255))
+        output.paste(img, (0, 0))
+        output.putalpha(mask)
+
+        img_buffer = BytesIO()
+        output.save(img_buffer, format='PNG')
+        img_buffer.seek(0)
+        return img_buffer
+    except Exception as e:
+        logger.warning("Erreur lors de la creation de l'image arrondie (%s) : %s", image_path, e)
+        return None
+
+
+def _teacher_block(enseignant, annee_academique, styles, title_style):
+    """Titre, tableau d'informations de l'enseignant et photo"""
+    photo_element = None
+    photo_path = enseignant.get('photo_path')
+    if photo_path and os.path.exists(photo_path):
+        rounded_img_buffer = _rounded_image(photo_path, size=(100, 100), radius=15)
+        if rounded_img_buffer:
+            photo_element = Image(rounded_img_buffer, width=100, height=100)
+
+    # Si pas de photo, un texte "Pas de photo" centré
+    if not photo_element:
+        photo_element = Paragraph("Pas de photo", ParagraphStyle(
+            'PhotoPlaceholder',
+            parent=styles['Normal'],
+            fontSize=8,
+            alignment=1,
+            textColor=colors.grey
+        ))
+
+    label_style = ParagraphStyle('LabelStyle', parent=styles['Normal'], alignment=2, fontName='Helvetica-Bold', fontSize=9)
+    annee_display = annee_academique if annee_academique else 'Toutes les années'
+    enseignant_data = [
+        [Paragraph('Matricule en interne :', label_style), enseignant['matricule']],
+        [Paragraph('Nom et post-noms :', label_style), enseignant['nom_complet']],
+        [Paragraph('Grade :', label_style), enseignant['grade']],
+        [Paragraph('Département :', label_style), enseignant['departement']],
+        [Paragraph('Section :', label_style), enseignant['section']],
+        [Paragraph('Année académique :', label_style), annee_display]
+    ]
+
+    info_table = Table(enseignant_data, colWidths=[120, 302])
+    info_table.setStyle(TableStyle([
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+
+    title_text = f"<u>DESCRIPTION DE LA CHARGE HORAIRE POUR L'ANNEE ACADEMIQUE  {annee_display}</u>"
+
+    # Infos à gauche, photo à droite
+    main_table = Table([[info_table, photo_element]], colWidths=[422, 120])
+    main_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+        ('VALIGN', (0, 0), (0, 0), 'TOP'),
+        ('ALIGN', (1, 0), (1, 0), 'CENTER'),
+        ('VALIGN', (1, 0), (1, 0), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 5),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+        ('TOPPADDING', (0, 0), (-1, -1), 5),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+    ]))
+    return [Paragraph(title_text, title_style), Spacer(1, 1), main_table, Spacer(1, 10)]
+
+
+def _charges_table(rows, titre, numero, cell_style):
+    """
+    Tableau d'un type de charge avec sa ligne de sous-total
+
+    Returns:
+        tuple: (titre_table, table, total_heures, total_credits)
+    """
+    titre_table = Table([[Paragraph(titre, cell_style)]], colWidths=[529])
+    titre_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+
+    data = [['Code', 'Intitulé U.E.', 'Intitulé EC', 'Heures', 'Crédits', 'Classe', 'Semestre']]
+    total_heures = 0
+    total_credits = 0
+    for row in rows:
+        total_heures += row['heures']
+        total_credits += row['credit'] if row['credit'] else 0
+        data.append([
+            row['code_ue'],
+            Paragraph(row['intitule_ue'], cell_style),
+            Paragraph(row['intitule_ec'] or '', cell_style),
+            str(int(row['heures'])),
+            str(row['credit']) if row['credit'] else '0',
+            Paragraph(row['classe'] or '', cell_style),
+            row['semestre']
+        ])
+    data.append(['', '', f'Sous-total {numero}', str(int(total_heures)), str(int(total_credits)), '', ''])
+
+    table = Table(data, colWidths=COL_WIDTHS, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+        # Ligne de sous-total
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, -1), (-1, -1), 8),
+        ('SPAN', (0, -1), (2, -1)),
+    ]))
+    return titre_table, table, total_heures, total_credits
+
+
+def _signatures(sheet, styles):
+    signature_style_italic = ParagraphStyle(
+        'SignatureStyleItalic',
+        parent=styles['Normal'],
+        fontSize=9,
+        alignment=2,
+        leading=11,
+        fontName='Helvetica-Oblique'
+    )
+    date_style = ParagraphStyle('DateStyle', parent=styles['Normal'], fontSize=10, alignment=2)
+    pour_accord_style = ParagraphStyle('PourAccord', parent=styles['Normal'], fontSize=11, alignment=1, fontName='Helvetica-BoldOblique')
+    signature_left_style = ParagraphStyle('SignatureLeft', parent=styles['Normal'], fontSize=9, alignment=0, leading=11)
+    signature_right_style = ParagraphStyle('SignatureRight', parent=styles['Normal'], fontSize=9, alignment=2, leading=11)
+
+    csae_text = "<i>Date et signature du Chef de Section/Adjoint<br/>Chargé de l'Enseignement</i><br/><br/><br/><br/>"
+    if sheet.get('csae'):
+        csae_text += f"<b><u>{sheet['csae']['nom_complet']}</u></b><br/><i>{sheet['csae']['grade']}</i>"
+    sgac_text = "<i>Date et signature du Secrétaire Général Académique</i><br/><br/><br/><br/>"
+    if sheet.get('sgac'):
+        sgac_text += f"<b><u>{sheet['sgac']['nom_complet']}</u></b><br/><i>{sheet['sgac']['grade']}</i>"
+
+    signature_table = Table([[
+        Paragraph(csae_text, signature_left_style),
+        Paragraph(sgac_text, signature_right_style),
+    ]], colWidths=[280, 280])
+    signature_table.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]))
+    return [
+        Spacer(1, 14),
+        Paragraph(f"Fait à Mbanza-Ngungu, le  {sheet['date']}", date_style),
+        Paragraph("<i>Signature de l'intéressé</i>", signature_style_italic),
+        Spacer(1, 20),
+        Paragraph("<i><b>Pour accord :</b></i>", pour_accord_style),
+        Spacer(1, 15),
+        signature_table,
+    ]
+
+
+def sheet_elements(sheet):
+    """Éléments ReportLab d'une fiche de charge horaire"""
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=11, spaceAfter=10, alignment=1)
+    cell_style = ParagraphStyle('CellStyle', parent=styles['Normal'], fontSize=8, leading=12, alignment=1)
+
+    elements = [create_header_table(sheet.get('header_path')), Spacer(1, 2)]
+    if sheet.get('enseignant'):
+        elements += _teacher_block(sheet['enseignant'], sheet['annee_academique'], styles, title_style)
+
+    total_heures = 0
+    total_credits = 0
+    for key, titre, numero in (('regulieres', 'Charge régulière', '1'), ('supplementaires', 'Charge supplémentaire', '2')):
+        if not sheet[key]:
+            continue
+        titre_table, table, heures, credits = _charges_table(sheet[key], titre, numero, cell_style)
+        elements += [titre_table, table, Spacer(1, 10)]
+        total_heures += heures
+        total_credits += credits
+
+    total_table = Table(
+        [['Total', '', '', str(int(total_heures)), str(int(total_credits)), '', '']],
+        colWidths=COL_WIDTHS
+    )
+    total_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('GRID', (0, 0), (-1, 0), 0.5, colors.black),
+        ('SPAN', (0, 0), (2, 0)),
+    ]))
+    elements.append(total_table)
+    elements += _signatures(sheet, styles)
+    return elements
+
+
+def render_sheet(sheet):
+    """
+    Rend une fiche de charge horaire
+
+    Args:
+        sheet: dict - description de la fiche (voir l'en-tête du module)
+
+    Returns:
+        bytes: contenu du PDF
+    """
+    buffer = BytesIO()
+    _new_document(buffer).build(sheet_elements(sheet), onFirstPage=_footer, onLaterPages=_footer)
+    return buffer.getvalue()
+
+
+def render_combined(sheets):
+    """
+    Rend plusieurs fiches dans un seul document, chacune commençant sur une
+    nouvelle page avec sa propre numérotation
+
+    Returns:
+        bytes: contenu du PDF
+    """
+    elements = []
+    for index, sheet in enumerate(sheets):
+        if index:
+            elements += [_NextSheet(), PageBreak()]
+        elements += sheet_elements(sheet)
+    buffer = BytesIO()
+    _new_document(buffer).build(elements, onFirstPage=_footer, onLaterPages=_footer)
+    return buffer.getvalue()
+
+
+def zip_sheets(files):
+    """
+    Archive ZIP de PDF
+
+    Args:
+        files: liste de (nom de fichier, bytes)
+
+    Returns:
+        bytes: contenu de l'archive
+    """
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in files:
+            archive.writestr(filename, content)
+    return buffer.getvalue()
@@ -0,0 +1,209 @@
+"""
+Fiches de charge horaire par enseignant
+
+Les attributions d'une section et d'une année sont chargées en une requête
+puis regroupées par enseignant en mémoire ; les désignations (grade,
+département, section), le CSAE de chaque section et le SGAC sont résolus une
+seule fois pour tout le lot. Les fiches sont ensuite rendues par
+charge_sheet_pdf dans un pool de processus.
+"""
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import Q
+
+from reglage.registry import reference_data
+from static.images.header import header_image_path
+from teachers.models import Teacher
+
+from .charge_sheet_pdf import render_combined, render_sheet, zip_sheets
+from .models import Attribution
+
+
+logger = logging.getLogger(__name__)
+
+
+def sheet_row(course):
+    """Ligne d'une fiche pour une UE attribuée"""
+    return {
+        'code_ue': course.code_ue,
+        'intitule_ue': course.intitule_ue,
+        'intitule_ec': course.intitule_ec,
+        'heures': course.cmi + course.td_tp,
+        'credit': course.credit,
+        'classe': course.classe,
+        'semestre': course.semestre,
+    }
+
+
+class References:
+    """Désignations et signataires résolus une fois pour un lot d'enseignants"""
+
+    def __init__(self, teachers):
+        ref = reference_data()
+        self.grades = ref.grades
+        self.departements = ref.departements
+        self.sections = ref.sections
+
+        # CSAE de chaque section (le premier créé, comme Teacher.objects...first())
+        self.csae = {}
+        section_codes = {teacher.section for teacher in teachers if teacher.section}
+        for csae in Teacher.objects.filter(fonction='CSAE', section__in=section_codes).order_by('pk'):
+            self.csae.setdefault(csae.section, csae)
+        self.sgac = Teacher.objects.filter(fonction='SGAC').order_by('pk').first()
+
+    def grade(self, code):
+        if not code:
+            return ''
+        return self.grades.get(code, code)
+
+    def signatory(self, teacher):
+        if teacher is None:
+            return None
+        return {'nom_complet': teacher.nom_complet, 'grade': self.grade(teacher.grade)}
+
+    def teacher(self, teacher):
+        """Bloc d'informations de la fiche"""
+        photo_path = os.path.join(settings.MEDIA_ROOT, str(teacher.photo)) if teacher.photo else None
+        return {
+            'matricule': teacher.matricule,
+            'nom_complet': teacher.nom_complet,
+            'grade': self.grade(teacher.grade),
+            'departement': self.departements.get(teacher.departement, teacher.departement) if teacher.departement else '',
+            'section': self.sections.get(teacher.section, teacher.section) if teacher.section else '',
+            'photo_path': photo_path,
+        }
+
+
+def build_sheet(enseignant, attributions, annee_academique, references=None):
+    """
+    Description d'une fiche de charge horaire
+
+    Args:
+        enseignant: Teacher affiché en tête de fiche (ou None)
+        attributions: liste d'Attribution avec code_ue chargé
+        annee_academique: str - année affichée ('' pour toutes les années)
+        references: References partagées par un lot de fiches
+
+    Returns:
+        dict: fiche pour charge_sheet_pdf.render_sheet
+    """
+    if references is None:
+        references = References([enseignant] if enseignant else [])
+    return {
+        'enseignant': references.teacher(enseignant) if enseignant else None,
+        'annee_academique': annee_academique,
+        'regulieres': [sheet_row(a.code_ue) for a in attributions if a.type_charge == 'Reguliere'],
+        'supplementaires': [sheet_row(a.code_ue) for a in attributions if a.type_charge == 'Supplementaire'],
+        'csae': references.signatory(references.csae.get(enseignant.section)) if enseignant else None,
+        'sgac': references.signatory(references.sgac) if enseignant else None,
+        'header_path': header_image_path(),
+        'date': datetime.now().strftime("%d/%m/%Y"),
+    }
+
+
+def section_filter(section):
+    """Filtre des attributions par section d'appartenance (code ou désignation)"""
+    designation = reference_data().section_designation(section)
+    return (
+        Q(matricule__section=section)
+        | Q(matricule__section=designation)
+        | Q(matricule__section__icontains=designation)
+    )
+
+
+def section_sheets(annee_academique, section=None, type_charge=None):
+    """
+    Fiches de tous les enseignants d'une section pour une année
+
+    Args:
+        annee_academique: str
+        section: code de section, ou None / 'ALL' pour toutes les sections
+        type_charge: limite les attributions à un type de charge
+
+    Returns:
+        list: (Teacher, fiche) triés par nom
+    """
+    attributions = Attribution.objects.select_related('matricule', 'code_ue').filter(
+        annee_academique=annee_academique, matricule__isnull=False, code_ue__isnull=False,
+    )
+    if type_charge:
+        attributions = attributions.filter(type_charge=type_charge)
+    if section and section != 'ALL':
+        attributions = attributions.filter(section_filter(section))
+
+    by_teacher = {}
+    for attribution in attributions.order_by('code_ue__classe', 'code_ue__code_ue'):
+        teacher = attribution.matricule
+        by_teacher.setdefault(teacher.matricule, (teacher, []))[1].append(attribution)
+
+    teachers = sorted((teacher for teacher, _ in by_teacher.values()), key=lambda t: t.nom_complet)
+    references = References(teachers)
+    return [
+        (teacher, build_sheet(teacher, by_teacher[teacher.matricule][1], annee_academique, references))
+        for teacher in teachers
+    ]
+
+
+def sheet_filename(teacher):
+    safe = re.sub(r'[^\w.-]+', '_', teacher.matricule)
+    return f"charge_horaire_{safe}.pdf"
+
+
+def render_sheets(sheets, workers=None):
+    """
+    Rend les fiches dans un pool de processus
+
+    Repli séquentiel si le pool ne peut pas démarrer (hébergement sans fork,
+    limite de processus...).
+
+    Returns:
+        list: contenus PDF dans l'ordre des fiches
+    """
+    workers = workers or getattr(settings, 'CHARGE_SHEET_WORKERS', min(4, os.cpu_count() or 1))
+    workers = min(workers, len(sheets))
+    if workers > 1:
+        try:
+            # spawn : les processus ne copient pas les threads ni les connexions du serveur
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                return list(pool.map(render_sheet, sheets, chunksize=max(1, len(sheets) // (workers * 4))))
+        except (OSError, BrokenProcessPool):
+            logger.warning("Pool de rendu des fiches indisponible, rendu séquentiel", exc_info=True)
+    return [render_sheet(sheet) for sheet in sheets]
+
+
+def merged_pdf(sheets):
+    """
+    Toutes les fiches dans un seul PDF
+
+    Avec pypdf installé, les fiches sont rendues en parallèle puis
+    concaténées ; sinon elles sont rendues dans un seul document.
+    """
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        return render_combined(sheets)
+
+    writer = PdfWriter()
+    for content in render_sheets(sheets):
+        writer.append(PdfReader(BytesIO(content)))
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def zipped_sheets(teacher_sheets):
+    """Archive ZIP d'une fiche PDF par enseignant"""
+    contents = render_sheets([sheet for _, sheet in teacher_sheets])
+    return zip_sheets([
+        (sheet_filename(teacher), content)
+        for (teacher, _), content in zip(teacher_sheets, contents)
+    ])
@@ -0,0 +1,352 @@
+"""
+Planification des examens (type_horaire='examen')
+
+Chaque UE d'une section reçoit une épreuve sur un créneau d'examen de la
+section, dans une fenêtre de dates. Deux UE sont en conflit — elles ne
+peuvent pas partager un créneau — si elles ont la même classe, le même
+enseignant (surveillant), ou des classes qui partagent des étudiants
+(gestion_administrative.Inscription).
+
+Le graphe de conflits est coloré par DSatur : l'UE dont les voisines
+occupent le plus de créneaux différents est placée d'abord. Parmi les
+créneaux possibles (libres pour la classe, l'enseignant et une salle assez
+grande, horaires existants compris) on retient celui qui espace le plus les
+épreuves de la classe et de ses classes liées, puis celui dont les salles
+sont le moins chargées. La salle retenue est la plus petite qui suffit.
+
+Le cœur (ExamProblem, ExamScheduler) n'utilise pas Django ; build_exam_problem()
+charge les données et timetable_solver.schedule_entries() produit les
+ScheduleEntry.
+"""
+import time
+from collections import defaultdict
+from itertools import combinations
+
+from .timetable_solver import Session, TimetableProblem, _bits
+
+
+class ExamProblem(TimetableProblem):
+    """
+    Épreuves, graphe de conflits et occupation existante (bitsets par case)
+
+    Les cases, salles et occupations sont celles de TimetableProblem ; chaque
+    épreuve est une Session. Les liens entre classes (étudiants partagés)
+    s'ajoutent avec link_classes.
+    """
+
+    def __init__(self, slots, rooms):
+        super().__init__(slots, rooms, max_par_semaine=None)
+        self.exams = []
+        self.linked_classes = defaultdict(set)
+
+    def link_classes(self, first, second):
+        """Déclare deux classes liées par des étudiants inscrits dans les deux"""
+        if first and second and first != second:
+            self.linked_classes[first].add(second)
+            self.linked_classes[second].add(first)
+
+    def add_exam(self, attribution_id, teacher, classe, effectif=0, label=''):
+        exam = Session(
+            len(self.exams), attribution_id, teacher, classe, effectif,
+            self.rooms_for(effectif) if self.rooms else (), label,
+        )
+        self.exams.append(exam)
+        return exam
+
+    def conflict_graph(self):
+        """
+        Voisins de chaque épreuve (même classe, classes liées ou même enseignant)
+
+        Returns:
+            list: ensemble des indices voisins, par épreuve
+        """
+        by_class = defaultdict(list)
+        by_teacher = defaultdict(list)
+        for exam in self.exams:
+            by_class[exam.classe].append(exam.index)
+            if exam.teacher:
+                by_teacher[exam.teacher].append(exam.index)
+
+        neighbours = [set() for _ in self.exams]
+        groups = list(by_teacher.values()) + list(by_class.values())
+        for classe, linked in self.linked_classes.items():
+            for other in linked:
+                if classe < other and classe in by_class and other in by_class:
+                    groups.append(by_class[classe] + by_class[other])
+        for group in groups:
+            for first, second in combinations(group, 2):
+                neighbours[first].add(second)
+                neighbours[second].add(first)
+        return neighbours
+
+
+class ExamSchedule:
+    """
+    Résultat de la planification
+
+    Attributs:
+        placements: {indice d'épreuve: (indice de case, indice de salle ou None)}
+        unplaced: {indice d'épreuve: motif}
+    """
+
+    def __init__(self, problem, placements, unplaced, elapsed, complete):
+        self.problem = problem
+        self.placements = placements
+        self.unplaced = unplaced
+        self.elapsed = elapsed
+        self.complete = complete
+
+    def items(self):
+        """(Session, Slot, Room ou None) des épreuves placées, triés par case"""
+        problem = self.problem
+        rows = [
+            (problem.exams[e], problem.slots[slot], problem.rooms[room] if room is not None else None)
+            for e, (slot, room) in self.placements.items()
+        ]
+        rows.sort(key=lambda row: (row[1].index, row[0].classe or '', row[0].index))
+        return rows
+
+    def assignments(self):
+        """Épreuves placées : (attribution_id, date, creneau_id, code de salle ou None)"""
+        return [
+            (exam.attribution_id, slot.date, slot.creneau_id, room.code if room else None)
+            for exam, slot, room in self.items()
+        ]
+
+    def stats(self):
+        return {
+            'seances': len(self.problem.exams),
+            'placees': len(self.placements),
+            'non_placees': len(self.unplaced),
+            'reportees': 0,
+            'duree_s': round(self.elapsed, 2),
+            'complet': self.complete,
+        }
+
+
+class ExamScheduler:
+    """
+    Coloration DSatur du graphe de conflits sur les créneaux d'examen
+
+    Args:
+        problem: ExamProblem
+        time_budget: float - secondes allouées à la recherche
+    """
+
+    NO_SLOT = "aucun créneau sans conflit pour la classe et l'enseignant"
+    NO_ROOM = 'aucune salle libre assez grande'
+    TIMEOUT = 'budget de temps épuisé'
+
+    def __init__(self, problem, time_budget=5.0):
+        self.problem = problem
+        self.time_budget = time_budget
+        self.neighbours = problem.conflict_graph()
+        self.teacher_busy = defaultdict(int, problem.teacher_busy)
+        self.class_busy = defaultdict(int, problem.class_busy)
+        self.room_busy = list(problem.room_busy)
+        # Dates des épreuves déjà placées par classe (étalement)
+        self.class_days = defaultdict(list)
+        self.placements = {}
+
+    def _room_free(self, exam):
+        if not self.problem.rooms:
+            return self.problem.full
+        free = 0
+        for room in exam.rooms:
+            free |= ~self.room_busy[room]
+        return free & self.problem.full
+
+    def _used_by_neighbours(self, exam):
+        mask = 0
+        for other in self.neighbours[exam.index]:
+            if other in self.placements:
+                mask |= 1 << self.placements[other][0]
+        return mask
+
+    def domain(self, exam, rooms=True):
+        mask = self.problem.full & ~self.teacher_busy[exam.teacher] & ~self._used_by_neighbours(exam)
+        if exam.classe:
+            mask &= ~self.class_busy[exam.classe]
+        if rooms and mask:
+            mask &= self._room_free(exam)
+        return mask
+
+    def _spread_penalty(self, exam, day):
+        """Épreuves de la classe (et des classes liées) le même jour ou la veille/le lendemain"""
+        penalty = 0
+        classes = {exam.classe} | self.problem.linked_classes.get(exam.classe, set())
+        for classe in classes:
+            for other_day in self.class_days.get(classe, ()):
+                gap = abs((day - other_day).days)
+                if gap == 0:
+                    penalty += 4
+                elif gap == 1:
+                    penalty += 1
+        return penalty
+
+    def _rooms_used(self, index):
+        bit = 1 << index
+        return sum(1 for busy in self.room_busy if busy & bit)
+
+    def _choose(self, exam, mask):
+        slots = self.problem.slots
+        return min(
+            _bits(mask),
+            key=lambda index: (self._spread_penalty(exam, slots[index].date), self._rooms_used(index), index),
+        )
+
+    def _best_room(self, exam, index):
+        bit = 1 << index
+        for room in exam.rooms:
+            if not self.room_busy[room] & bit:
+                return room
+        return None
+
+    def _place(self, exam, index):
+        room = self._best_room(exam, index)
+        bit = 1 << index
+        self.teacher_busy[exam.teacher] |= bit
+        if exam.classe:
+            self.class_busy[exam.classe] |= bit
+            self.class_days[exam.classe].append(self.problem.slots[index].date)
+        if room is not None:
+            self.room_busy[room] |= bit
+        self.placements[exam.index] = (index, room)
+
+    def solve(self):
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        problem = self.problem
+        pending = set(range(len(problem.exams)))
+        unplaced = {}
+        complete = True
+        degree = [len(neighbours) for neighbours in self.neighbours]
+
+        while pending:
+            if time.perf_counter() > deadline:
+                complete = False
+                for index in pending:
+                    unplaced[index] = self.TIMEOUT
+                break
+
+            # DSatur : plus de créneaux distincts chez les voisines, puis plus de voisines
+            current = max(
+                pending,
+                key=lambda index: (
+                    bin(self._used_by_neighbours(problem.exams[index])).count('1'), degree[index], -index,
+                ),
+            )
+            pending.discard(current)
+            exam = problem.exams[current]
+            mask = self.domain(exam)
+            if not mask:
+                unplaced[current] = self.NO_ROOM if self.domain(exam, rooms=False) else self.NO_SLOT
+                continue
+            self._place(exam, self._choose(exam, mask))
+
+        return ExamSchedule(problem, dict(self.placements), unplaced, time.perf_counter() - start, complete)
+
+
+def build_exam_problem(section_code, date_debut, date_fin, annee, semestre=None):
+    """
+    Charge la planification des examens d'une section
+
+    Une épreuve par UE de la section ayant une attribution pour l'année et
+    pas encore d'épreuve dans la fenêtre ; elle est rattachée à la première
+    attribution de l'UE (son enseignant surveille).
+
+    Args:
+        section_code: code de section
+        date_debut, date_fin: dates - fenêtre des examens (dimanches exclus)
+        annee: code de l'année académique
+        semestre: limite aux UE d'un semestre (optionnel)
+
+    Returns:
+        tuple: (ExamProblem, {attribution_id: Attribution})
+    """
+    from datetime import timedelta
+    from django.db.models import Q
+    from gestion_administrative.models import Inscription
+    from reglage.models import Salle
+    from reglage.registry import reference_data
+    from .availability import class_size, class_sizes, teacher_absences
+    from .models import Attribution, ScheduleEntry
+    from .occupancy import OccupancyIndex
+    from .timetable_grid import class_key
+    from .timetable_solver import JOURS
+
+    ref = reference_data()
+    creneaux = [creneau for creneau in ref.creneaux_pour('examen', section_code) if creneau.code != 'TJ']
+    days = [
+        date_debut + timedelta(days=offset)
+        for offset in range((date_fin - date_debut).days + 1)
+        if (date_debut + timedelta(days=offset)).weekday() < len(JOURS)
+    ]
+    problem = ExamProblem(
+        [(day, creneau.pk, 0) for day in days for creneau in creneaux],
+        Salle.objects.filter(est_disponible=True).order_by('code').values_list('code', 'capacite'),
+    )
+
+    index = OccupancyIndex.load(date_debut, date_fin)
+    for (day, creneau_id), teachers, rooms, classes in index.occupied_slots():
+        for teacher in teachers:
+            problem.occupy(day, creneau_id, teacher=teacher)
+        for room in rooms:
+            problem.occupy(day, creneau_id, room=room)
+        for classe in classes:
+            problem.occupy(day, creneau_id, classe=classe)
+
+    attributions = Attribution.objects.filter(
+        annee_academique=annee, code_ue__isnull=False, matricule__isnull=False,
+    ).filter(
+        Q(code_ue__section=section_code)
+        | Q(matricule__section=section_code)
+        | Q(code_ue__classe__in=ref.classes_de_section(section_code))
+    )
+    if semestre:
+        attributions = attributions.filter(code_ue__semestre=semestre)
+    already = set(
+        ScheduleEntry.objects.filter(
+            type_horaire='examen', annee_academique=annee,
+            date_cours__range=(date_debut, date_fin), attribution__in=attributions,
+        ).values_list('attribution__code_ue_id', flat=True)
+    )
+    first_by_ue = {}
+    for attribution in attributions.select_related('code_ue', 'matricule').order_by('pk'):
+        if attribution.code_ue_id not in already:
+            first_by_ue.setdefault(attribution.code_ue_id, attribution)
+    if not first_by_ue:
+        return problem, {}
+
+    # Classes liées par des étudiants inscrits dans plusieurs classes
+    student_classes = defaultdict(set)
+    for etudiant_id, code in Inscription.objects.filter(annee_academique=annee, est_actif=True).values_list(
+        'etudiant_id', 'code_classe__CodeClasse',
+    ):
+        student_classes[etudiant_id].add(class_key(code) or code)
+    course_classes = {}
+    for attribution in first_by_ue.values():
+        course_classes.setdefault(class_key(attribution.code_ue.classe) or attribution.code_ue.classe, set()).add(
+            attribution.code_ue.classe
+        )
+    for classes in student_classes.values():
+        for first, second in combinations(sorted(classes), 2):
+            for label in course_classes.get(first, ()):
+                for other in course_classes.get(second, ()):
+                    problem.link_classes(label, other)
+
+    # Jours d'absence des surveillants
+    matricules = {attribution.matricule_id for attribution in first_by_ue.values()}
+    for matricule, debut, fin in teacher_absences(matricules, date_debut, date_fin):
+        for day in days:
+            if debut <= day <= fin:
+                problem.block_teacher(matricule, problem.day_masks[day])
+
+    sizes = class_sizes(annee)
+    for attribution in sorted(first_by_ue.values(), key=lambda a: (a.code_ue.classe, a.code_ue.code_ue)):
+        course = attribution.code_ue
+        problem.add_exam(
+            attribution.pk, attribution.matricule_id, course.classe, class_size(sizes, course.classe),
+            label=f"{course.code_ue} - {course.intitule_ue}",
+        )
+    return problem, {attribution.pk: attribution for attribution in first_by_ue.values()}
@@ -44,9 +44,38 @@ class ScheduleEntryForm(forms.ModelForm):
         help_text='Sélectionner la semaine'
     )
     
+    # Dernière semaine d'une récurrence (ex: de S1 à S14)
+    semaine_fin_select = forms.ModelChoiceField(
+        queryset=SemaineCours.objects.all().order_by('numero_semaine'),
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label="Jusqu'à la semaine",
+        help_text='Optionnel : programmer de la semaine sélectionnée jusqu\'à celle-ci'
+    )
+    
+    # Jours concernés par la récurrence
+    jours_recurrence = forms.MultipleChoiceField(
+        choices=ScheduleEntry.DAYS,
+        required=False,
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
+        label='Jours de la semaine',
+        help_text='Laisser vide pour programmer tous les jours de la plage'
+    )
+    
+    # Dates à exclure de la récurrence (jours fériés, congés...)
+    dates_exclues = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Ex: 01/11/2025, 25/12/2025',
+        }),
+        label='Dates exclues',
+        help_text='Dates séparées par des virgules (JJ/MM/AAAA)'
+    )
+    
     # Champ pour la date de début de la plage
     date_debut_plage = forms.DateField(
-        required=True,
+        required=False,
         widget=forms.DateInput(attrs={
             'class': 'form-control', 
             'type': 'date',
@@ -57,7 +86,7 @@ class ScheduleEntryForm(forms.ModelForm):
     
     # Champ pour la date de fin de la plage
     date_fin_plage = forms.DateField(
-        required=True,
+        required=False,
         widget=forms.DateInput(attrs={
             'class': 'form-control', 
             'type': 'date',
@@ -176,13 +205,14 @@ class ScheduleEntryForm(forms.ModelForm):
         
         # Pré-remplir avec l'année en cours si elle existe
         if not self.instance.pk:  # Nouveau formulaire
-            annee_courante = AnneeAcademique.objects.filter(est_en_cours=True).first()
+            from reglage.registry import reference_data
+            annee_courante = reference_data().annee_courante
             if annee_courante:
                 self.fields['annee_academique'].initial = annee_courante.code
                 self.fields['annee_academique_select'].initial = annee_courante
             
             # Pré-remplir avec la semaine en cours
-            semaine_courante = SemaineCours.objects.filter(est_en_cours=True).first()
+            semaine_courante = reference_data().semaine_courante
             if semaine_courante:
                 self.fields['semaine_select'].initial = semaine_courante
         
@@ -191,6 +221,7 @@ class ScheduleEntryForm(forms.ModelForm):
             f"S{obj.numero_semaine} : {obj.date_debut.strftime('%d/%m')} - {obj.date_fin.strftime('%d/%m')}"
             f"{' ★' if obj.est_en_cours else ''}"
         )
+        self.fields['semaine_fin_select'].label_from_instance = self.fields['semaine_select'].label_from_instance
         
         # Personnaliser l'affichage des créneaux avec placeholder
         self.fields['creneau_select'].label_from_instance = lambda obj: (
@@ -240,6 +271,25 @@ class ScheduleEntryForm(forms.ModelForm):
         if annee_select:
             cleaned_data['annee_academique'] = annee_select.code
         
+        # Récurrence par semaines : de la semaine sélectionnée à la semaine de fin
+        semaine_select = cleaned_data.get('semaine_select')
+        semaine_fin_select = cleaned_data.get('semaine_fin_select')
+        if semaine_fin_select:
+            if not semaine_select:
+                self.add_error('semaine_select', "Sélectionnez la semaine de début de la récurrence.")
+            elif semaine_fin_select.date_fin < semaine_select.date_debut:
+                self.add_error('semaine_fin_select', "La semaine de fin doit suivre la semaine de début.")
+            else:
+                cleaned_data['date_debut_plage'] = semaine_select.date_debut
+                cleaned_data['date_fin_plage'] = semaine_fin_select.date_fin
+        
+        # Dates à exclure
+        try:
+            from .recurrence import parse_dates_exclues
+            cleaned_data['dates_exclues'] = parse_dates_exclues(cleaned_data.get('dates_exclues'))
+        except ValueError as e:
+            self.add_error('dates_exclues', str(e))
+        
         # Gérer les dates de la plage
         date_debut_plage = cleaned_data.get('date_debut_plage')
         date_fin_plage = cleaned_data.get('date_fin_plage')
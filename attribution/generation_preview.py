@@ -0,0 +1,110 @@
+"""
+Aperçus de génération automatique (horaire des cours, examens)
+
+L'aperçu calculé par generer_horaire / generer_examens doit être relu par la
+requête de validation, qui peut être servie par un autre worker : il est
+donc écrit dans un fichier JSON partagé (comme les tâches d'import) plutôt
+que dans le cache du processus.
+"""
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import date
+
+
+PREVIEW_ROOT = os.path.join(tempfile.gettempdir(), 'schedule_previews')
+
+# Durée de validité d'un aperçu (secondes)
+PREVIEW_MAX_AGE = 30 * 60
+
+DATE_FIELDS = ('date_debut', 'date_fin')
+
+
+def _path(jeton):
+    return os.path.join(PREVIEW_ROOT, f'{jeton}.json')
+
+
+def _valid(jeton):
+    return bool(jeton) and all(c in '0123456789abcdef' for c in jeton)
+
+
+def prune(max_age=PREVIEW_MAX_AGE):
+    """Supprime les aperçus expirés"""
+    try:
+        names = os.listdir(PREVIEW_ROOT)
+    except OSError:
+        return
+    limit = time.time() - max_age
+    for name in names:
+        path = os.path.join(PREVIEW_ROOT, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def save(preview):
+    """
+    Enregistre un aperçu
+
+    Args:
+        preview: dict - user_id, type_horaire, annee, section_code,
+            date_debut, date_fin (dates) et assignments
+            [(attribution_id, date, creneau_id, salle)]
+
+    Returns:
+        str: jeton de l'aperçu
+    """
+    data = dict(preview)
+    for name in DATE_FIELDS:
+        data[name] = data[name].isoformat()
+    data['assignments'] = [
+        [attribution_id, day.isoformat(), creneau_id, salle]
+        for attribution_id, day, creneau_id, salle in preview['assignments']
+    ]
+
+    prune()
+    os.makedirs(PREVIEW_ROOT, exist_ok=True)
+    jeton = uuid.uuid4().hex
+    path = _path(jeton)
+    with open(path + '.tmp', 'w', encoding='utf-8') as preview_file:
+        json.dump(data, preview_file)
+    os.replace(path + '.tmp', path)
+    return jeton
+
+
+def load(jeton, user_id):
+    """Retourne l'aperçu s'il existe, n'a pas expiré et appartient à l'utilisateur, sinon None"""
+    if not _valid(jeton):
+        return None
+    path = _path(jeton)
+    try:
+        if time.time() - os.path.getmtime(path) > PREVIEW_MAX_AGE:
+            return None
+        with open(path, encoding='utf-8') as preview_file:
+            data = json.load(preview_file)
+    except (OSError, ValueError):
+        return None
+    if data.get('user_id') != user_id:
+        return None
+
+    for name in DATE_FIELDS:
+        data[name] = date.fromisoformat(data[name])
+    data['assignments'] = [
+        (attribution_id, date.fromisoformat(day), creneau_id, salle)
+        for attribution_id, day, creneau_id, salle in data['assignments']
+    ]
+    return data
+
+
+def discard(jeton):
+    """Supprime un aperçu enregistré"""
+    if not _valid(jeton):
+        return
+    try:
+        os.remove(_path(jeton))
+    except OSError:
+        pass
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from attribution import pdf_jobs
+
+
+class Command(BaseCommand):
+    help = 'Génère les rapports PDF en attente (tâches orphelines comprises) et supprime les anciens fichiers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--purge-days',
+            dest='purge_days',
+            type=int,
+            default=None,
+            help='Supprimer les tâches terminées depuis plus de N jours (PDF_JOB_RETENTION_DAYS par défaut).',
+        )
+        parser.add_argument(
+            '--no-purge',
+            action='store_true',
+            help='Ne pas supprimer les anciennes tâches.',
+        )
+
+    def handle(self, *args, **options):
+        processed = pdf_jobs.process_pending()
+        self.stdout.write(f'{processed} rapport(s) généré(s).')
+        if not options['no_purge']:
+            purged = pdf_jobs.purge(options['purge_days'])
+            self.stdout.write(f'{purged} ancienne(s) tâche(s) supprimée(s).')
+        self.stdout.write(self.style.SUCCESS('Terminé!'))
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('attribution', '0006_scheduleversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report', models.CharField(max_length=50, verbose_name='Rapport')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Paramètres')),
+                ('key', models.CharField(db_index=True, max_length=64, verbose_name='Empreinte de la demande')),
+                ('active_key', models.CharField(blank=True, max_length=64, null=True, unique=True)),
+                ('scope', models.CharField(max_length=64, verbose_name='Périmètre (organisation et rôles)')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Échec')], db_index=True, default='pending', max_length=10, verbose_name='Statut')),
+                ('file', models.FileField(blank=True, null=True, upload_to='pdf_jobs/%Y/%m/', verbose_name='Fichier')),
+                ('filename', models.CharField(blank=True, max_length=200, verbose_name='Nom du fichier')),
+                ('error', models.TextField(blank=True, verbose_name='Erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Créé le')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Démarré le')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Terminé le')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pdf_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Demandé par')),
+            ],
+            options={
+                'verbose_name': 'Génération PDF',
+                'verbose_name_plural': 'Générations PDF',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+JOURS = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
+FIELDS = ['enseignant_matricule', 'classe_code', 'section_code', 'date_effective', 'exclusif']
+
+
+def _effective_date(semaine_debut, jour, date_cours):
+    # Copie de occupancy.effective_date (les migrations ne dépendent pas du code courant)
+    if date_cours:
+        return date_cours
+    if not semaine_debut:
+        return None
+    if jour in JOURS:
+        return semaine_debut + timedelta(days=(JOURS.index(jour) - semaine_debut.weekday()) % 7)
+    return semaine_debut
+
+
+def backfill_slot_keys(apps, schema_editor):
+    """
+    Remplit les clés dénormalisées des horaires existants
+
+    Les conflits déjà en base (enseignant, classe ou salle réservés deux fois)
+    sont conservés : seul le premier horaire du créneau reste exclusif, les
+    suivants sont marqués comme conflits forcés (exclusif = NULL) pour que
+    les contraintes d'unicité de la migration suivante puissent être créées.
+    """
+    ScheduleEntry = apps.get_model('attribution', 'ScheduleEntry')
+
+    taken = set()
+    batch = []
+    entries = ScheduleEntry.objects.select_related(
+        'attribution__code_ue', 'attribution__matricule',
+    ).order_by('pk')
+    for entry in entries.iterator(chunk_size=2000):
+        attribution = entry.attribution
+        course = attribution.code_ue
+        entry.enseignant_matricule = attribution.matricule_id
+        entry.classe_code = course.classe if course else None
+        entry.section_code = (course.section if course else None) or (
+            attribution.matricule.section if attribution.matricule else None
+        )
+        entry.date_effective = _effective_date(entry.semaine_debut, entry.jour, entry.date_cours)
+
+        keys = [
+            ('enseignant', entry.enseignant_matricule),
+            ('classe', entry.classe_code),
+            ('salle', entry.salle_link_id),
+        ]
+        keys = [
+            (kind, value, entry.date_effective, entry.creneau_id)
+            for kind, value in keys
+            if value is not None and entry.date_effective is not None and entry.creneau_id is not None
+        ]
+        if any(key in taken for key in keys):
+            entry.exclusif = None
+        else:
+            entry.exclusif = True
+            taken.update(keys)
+
+        batch.append(entry)
+        if len(batch) >= 500:
+            ScheduleEntry.objects.bulk_update(batch, FIELDS)
+            batch = []
+    if batch:
+        ScheduleEntry.objects.bulk_update(batch, FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attribution', '0007_pdfjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduleentry',
+            name='enseignant_matricule',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduleentry',
+            name='classe_code',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduleentry',
+            name='section_code',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduleentry',
+            name='date_effective',
+            field=models.DateField(blank=True, editable=False, help_text='Date réelle du cours (date_cours ou semaine_debut + jour)', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduleentry',
+            name='exclusif',
+            field=models.BooleanField(default=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_slot_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attribution', '0008_scheduleentry_slot_keys'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='scheduleentry',
+            constraint=models.UniqueConstraint(fields=('enseignant_matricule', 'date_effective', 'creneau', 'exclusif'), name='horaire_enseignant_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='scheduleentry',
+            constraint=models.UniqueConstraint(fields=('classe_code', 'date_effective', 'creneau', 'exclusif'), name='horaire_classe_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='scheduleentry',
+            constraint=models.UniqueConstraint(fields=('salle_link', 'date_effective', 'creneau', 'exclusif'), name='horaire_salle_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleentry',
+            index=models.Index(fields=['section_code', 'date_effective'], name='horaire_section_date_idx'),
+        ),
+    ]
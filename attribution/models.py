@@ -1,8 +1,15 @@
-from django.db import models
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from teachers.models import Teacher
 from courses.models import Course
 from django.utils import timezone
 
+
+logger = logging.getLogger(__name__)
+
 # Create your models here.
 
 class Attribution(models.Model):
@@ -105,12 +112,122 @@ class ScheduleEntry(models.Model):
                                  related_name='schedule_entries', verbose_name="Salle")
     remarques = models.CharField(max_length=255, null=True, blank=True)
 
+    # Clés dénormalisées (recalculées à chaque enregistrement, voir refresh_slot_keys)
+    enseignant_matricule = models.CharField(max_length=20, null=True, blank=True, editable=False)
+    classe_code = models.CharField(max_length=100, null=True, blank=True, editable=False)
+    section_code = models.CharField(max_length=100, null=True, blank=True, editable=False)
+    date_effective = models.DateField(null=True, blank=True, editable=False,
+                                      help_text="Date réelle du cours (date_cours ou semaine_debut + jour)")
+    # Vrai pour un horaire normal ; NULL pour un conflit forcé, que les
+    # contraintes d'unicité ignorent (NULL est distinct dans un index unique)
+    exclusif = models.BooleanField(null=True, default=True, editable=False)
+
+    # Champs recalculés par refresh_slot_keys
+    SLOT_KEY_FIELDS = ['enseignant_matricule', 'classe_code', 'section_code', 'date_effective']
+
     class Meta:
         unique_together = [('attribution', 'annee_academique', 'semaine_debut', 'jour', 'creneau')]
+        constraints = [
+            # Double réservation refusée par la base, même entre requêtes concurrentes
+            models.UniqueConstraint(
+                fields=['enseignant_matricule', 'date_effective', 'creneau', 'exclusif'],
+                name='horaire_enseignant_unique',
+            ),
+            models.UniqueConstraint(
+                fields=['classe_code', 'date_effective', 'creneau', 'exclusif'],
+                name='horaire_classe_unique',
+            ),
+            models.UniqueConstraint(
+                fields=['salle_link', 'date_effective', 'creneau', 'exclusif'],
+                name='horaire_salle_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['section_code', 'date_effective'], name='horaire_section_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.attribution} {self.jour}-{self.creneau}"
     
+    def refresh_slot_keys(self):
+        """
+        Recalcule les clés dénormalisées depuis l'attribution et les dates
+
+        Appelée par save() ; à appeler explicitement avant un bulk_create.
+        """
+        from .occupancy import effective_date
+
+        attribution = self.attribution
+        course = attribution.code_ue if attribution.code_ue_id else None
+        self.enseignant_matricule = attribution.matricule_id
+        self.classe_code = course.classe if course else None
+        self.section_code = (course.section if course else None) or (
+            attribution.matricule.section if attribution.matricule_id else None
+        )
+        self.date_effective = effective_date(self.semaine_debut, self.jour, self.date_cours)
+
+    @classmethod
+    def refresh_slot_keys_of(cls, queryset):
+        """
+        Recalcule les clés dénormalisées d'horaires existants
+
+        À appeler après une modification de leur attribution, de leur cours
+        ou de leur enseignant (signaux, imports en lot). Un horaire dont les
+        nouvelles clés heurtent un autre horaire (enseignant, classe ou salle
+        déjà pris) est conservé comme conflit forcé (exclusif = NULL), comme
+        un conflit accepté dans le formulaire de modification.
+
+        Returns:
+            list: horaires passés en conflit forcé
+        """
+        fields = cls.SLOT_KEY_FIELDS
+        changed = []
+        for entry in queryset.select_related('attribution__code_ue', 'attribution__matricule'):
+            before = [getattr(entry, name) for name in fields]
+            entry.refresh_slot_keys()
+            if [getattr(entry, name) for name in fields] != before:
+                changed.append(entry)
+        if not changed:
+            return []
+
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_update(changed, fields, batch_size=500)
+            return []
+        except IntegrityError:
+            pass
+
+        # Au moins une collision : horaire par horaire pour isoler les conflits
+        forced = []
+        for entry in changed:
+            values = {name: getattr(entry, name) for name in fields}
+            try:
+                with transaction.atomic():
+                    cls.objects.filter(pk=entry.pk).update(**values)
+            except IntegrityError:
+                entry.exclusif = None
+                cls.objects.filter(pk=entry.pk).update(exclusif=None, **values)
+                forced.append(entry)
+        logger.warning(
+            "Clés d'horaire recalculées : %d horaire(s) en conflit passé(s) en conflit forcé (%s)",
+            len(forced), ', '.join(str(entry.pk) for entry in forced),
+        )
+        return forced
+
+    def save(self, *args, **kwargs):
+        self.refresh_slot_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.SLOT_KEY_FIELDS)
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Dates chargées : un déplacement invalide aussi l'ancienne semaine
+        instance._loaded_dates = (instance.__dict__.get('date_cours'), instance.__dict__.get('semaine_debut'))
+        return instance
+    
     def get_creneau_display_complet(self):
         """Retourne l'affichage des heures du créneau"""
         if self.creneau:
@@ -157,3 +274,115 @@ class PaiementHeuresSupplementaires(models.Model):
             self.montant = self.taux_horaire * self.nombre_heures
             self.save()
         return self.montant
+
+
+class ScheduleVersion(models.Model):
+    """
+    Compteur de version des horaires, par semaine et global
+
+    Incrémenté à chaque modification d'un ScheduleEntry (voir signals.py) ;
+    sert de tampon de données pour le cache des PDF d'horaire. Le compteur
+    REFERENCE suit les données affichées dans tous les PDF (enseignants,
+    cours, sections, créneaux, grades...) et fait partie de chaque tampon.
+    """
+    GLOBAL = 'all'
+    REFERENCE = 'ref'
+    
+    key = models.CharField(max_length=20, unique=True, verbose_name="Clé")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Version")
+    
+    class Meta:
+        verbose_name = "Version des horaires"
+        verbose_name_plural = "Versions des horaires"
+    
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+    
+    @staticmethod
+    def week_key(day):
+        """Clé de la semaine (lundi) contenant day"""
+        monday = day - timedelta(days=day.weekday())
+        return f"w:{monday:%Y-%m-%d}"
+    
+    @classmethod
+    def keys_for_dates(cls, dates):
+        """Clés à incrémenter pour des dates de cours modifiées (globale incluse)"""
+        return {cls.GLOBAL} | {cls.week_key(day) for day in dates if day}
+    
+    @classmethod
+    def bump(cls, keys):
+        """Incrémente les compteurs (créés au besoin) avec F()"""
+        for key in keys:
+            if cls.objects.filter(key=key).update(version=F('version') + 1):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(key=key, version=1)
+            except IntegrityError:
+                # Compteur créé entre-temps par une autre requête
+                cls.objects.filter(key=key).update(version=F('version') + 1)
+    
+    @classmethod
+    def bump_on_commit(cls, dates):
+        """Incrémente après validation de la transaction en cours"""
+        keys = cls.keys_for_dates(dates)
+        transaction.on_commit(lambda: cls.bump(keys))
+    
+    @classmethod
+    def bump_reference_on_commit(cls):
+        """Périme tous les PDF après validation (données de référence modifiées)"""
+        transaction.on_commit(lambda: cls.bump([cls.REFERENCE]))
+    
+    @classmethod
+    def stamp(cls, days=None):
+        """
+        Tampon de version pour des semaines données (ou global si days est vide)
+        
+        Returns:
+            str: ex. 'ref=2,w:2025-01-06=4' ou 'all=12,ref=2'
+        """
+        keys = {cls.week_key(day) for day in days} if days else {cls.GLOBAL}
+        keys = sorted(keys | {cls.REFERENCE})
+        versions = dict(cls.objects.filter(key__in=keys).values_list('key', 'version'))
+        return ','.join(f"{key}={versions.get(key, 0)}" for key in keys)
+
+
+class PdfJob(models.Model):
+    """
+    Génération d'un rapport PDF en arrière-plan (voir pdf_jobs.py)
+    
+    active_key est renseigné tant que la tâche est en attente ou en cours :
+    sa contrainte d'unicité regroupe les demandes identiques simultanées.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Terminé'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+    
+    report = models.CharField(max_length=50, verbose_name="Rapport")
+    params = models.JSONField(default=dict, blank=True, verbose_name="Paramètres")
+    key = models.CharField(max_length=64, db_index=True, verbose_name="Empreinte de la demande")
+    active_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    scope = models.CharField(max_length=64, verbose_name="Périmètre (organisation et rôles)")
+    user = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, related_name='pdf_jobs', verbose_name="Demandé par")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True, verbose_name="Statut")
+    file = models.FileField(upload_to='pdf_jobs/%Y/%m/', null=True, blank=True, verbose_name="Fichier")
+    filename = models.CharField(max_length=200, blank=True, verbose_name="Nom du fichier")
+    error = models.TextField(blank=True, verbose_name="Erreur")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Démarré le")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Terminé le")
+    
+    class Meta:
+        verbose_name = "Génération PDF"
+        verbose_name_plural = "Générations PDF"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.report} #{self.pk} ({self.get_status_display()})"
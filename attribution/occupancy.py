@@ -0,0 +1,204 @@
+"""
+Index d'occupation en mémoire des horaires (enseignants, salles, classes)
+"""
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from .models import ScheduleEntry
+
+
+JOURS_SEMAINE = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
+
+# Représentation légère d'un horaire déjà placé (suffisante pour les messages d'erreur)
+OccupiedEntry = namedtuple('OccupiedEntry', [
+    'id', 'code_ue', 'intitule_ue', 'classe', 'enseignant', 'salle',
+])
+
+
+def jour_from_date(value):
+    """Retourne le nom du jour en français pour une date"""
+    return JOURS_SEMAINE[value.weekday()]
+
+
+def effective_date(semaine_debut, jour, date_cours=None):
+    """
+    Calcule la date réelle d'un horaire.
+
+    Les horaires créés par plage de dates ont semaine_debut = date du cours,
+    ceux du constructeur d'horaires ont semaine_debut = lundi de la semaine
+    et le jour séparé : dans les deux cas on retombe sur la date exacte.
+    """
+    if date_cours:
+        return date_cours
+    if not semaine_debut:
+        return None
+    if jour in JOURS_SEMAINE:
+        decalage = (JOURS_SEMAINE.index(jour) - semaine_debut.weekday()) % 7
+        return semaine_debut + timedelta(days=decalage)
+    return semaine_debut
+
+
+def creneau_key(creneau):
+    """Retourne la clé d'un créneau (instance Creneau ou identifiant)"""
+    return getattr(creneau, 'pk', creneau)
+
+
+def week_bounds(start, end=None):
+    """Retourne (lundi, dimanche) couvrant les semaines de start à end"""
+    end = end or start
+    lundi = start - timedelta(days=start.weekday())
+    dimanche = end + timedelta(days=6 - end.weekday())
+    return lundi, dimanche
+
+
+class OccupancyIndex:
+    """
+    Index d'occupation chargé en une seule requête.
+
+    Associe chaque (date, créneau) aux enseignants (matricule), salles (code)
+    et classes déjà programmés, pour valider un lot d'horaires sans
+    interroger la base pour chaque candidat.
+    """
+
+    VALUES_FIELDS = (
+        'id', 'semaine_debut', 'date_cours', 'jour', 'creneau_id', 'salle',
+        'salle_link__code', 'attribution__matricule_id',
+        'attribution__matricule__nom_complet', 'attribution__code_ue__code_ue',
+        'attribution__code_ue__intitule_ue', 'attribution__code_ue__classe',
+    )
+
+    def __init__(self, date_debut=None, date_fin=None):
+        self.date_debut = date_debut
+        self.date_fin = date_fin
+        self._slots = defaultdict(lambda: {
+            'teacher': defaultdict(list),
+            'room': defaultdict(list),
+            'class': defaultdict(list),
+        })
+
+    @classmethod
+    def load(cls, date_debut, date_fin=None, queryset=None):
+        """
+        Charge l'occupation des semaines couvrant la période demandée
+
+        Args:
+            date_debut: date - premier jour de la période
+            date_fin: date - dernier jour de la période (optionnel)
+            queryset: QuerySet de ScheduleEntry à utiliser (optionnel)
+
+        Returns:
+            OccupancyIndex
+        """
+        lundi, dimanche = week_bounds(date_debut, date_fin)
+        index = cls(lundi, dimanche)
+        if queryset is None:
+            queryset = ScheduleEntry.objects.all()
+        rows = queryset.filter(date_effective__range=(lundi, dimanche)).values(*cls.VALUES_FIELDS)
+        for row in rows:
+            index._add_row(row)
+        return index
+
+    def covers(self, value):
+        """Indique si la date est couverte par les semaines chargées"""
+        if value is None or self.date_debut is None:
+            return False
+        return self.date_debut <= value <= self.date_fin
+
+    def _add_row(self, row):
+        jour_date = effective_date(row['semaine_debut'], row['jour'], row['date_cours'])
+        occupied = OccupiedEntry(
+            id=row['id'],
+            code_ue=row['attribution__code_ue__code_ue'],
+            intitule_ue=row['attribution__code_ue__intitule_ue'],
+            classe=row['attribution__code_ue__classe'],
+            enseignant=row['attribution__matricule__nom_complet'],
+            salle=row['salle'] or row['salle_link__code'],
+        )
+        self._register(
+            (jour_date, row['creneau_id']),
+            row['attribution__matricule_id'],
+            occupied.salle,
+            occupied.classe,
+            occupied,
+        )
+
+    def _register(self, slot, teacher, salle, classe, occupied):
+        buckets = self._slots[slot]
+        if teacher:
+            buckets['teacher'][teacher].append(occupied)
+        if salle:
+            buckets['room'][salle].append(occupied)
+        if classe:
+            buckets['class'][classe].append(occupied)
+
+    def add(self, entry):
+        """
+        Ajoute un horaire (ScheduleEntry) à l'index, par exemple juste après
+        son enregistrement, afin que les validations suivantes de la même
+        requête en tiennent compte.
+        """
+        attribution = entry.attribution
+        course = attribution.code_ue
+        salle = entry.salle or (entry.salle_link.code if entry.salle_link_id else None)
+        occupied = OccupiedEntry(
+            id=entry.pk,
+            code_ue=course.code_ue,
+            intitule_ue=course.intitule_ue,
+            classe=course.classe,
+            enseignant=attribution.matricule.nom_complet if attribution.matricule_id else '',
+            salle=salle,
+        )
+        self._register(
+            self.slot_for(entry.semaine_debut, entry.jour, entry.creneau_id, entry.date_cours),
+            attribution.matricule_id,
+            salle,
+            course.classe,
+            occupied,
+        )
+
+    @staticmethod
+    def slot_for(semaine, jour, creneau, date_cours=None):
+        """Retourne la clé (date, créneau) d'un horaire"""
+        return effective_date(semaine, jour, date_cours), creneau_key(creneau)
+
+    def _find(self, slot, kind, key, exclude_id=None):
+        if not key or slot not in self._slots:
+            return []
+        return [
+            occupied for occupied in self._slots[slot][kind].get(key, [])
+            if exclude_id is None or occupied.id != exclude_id
+        ]
+
+    def teacher_conflicts(self, slot, matricule, exclude_id=None):
+        """Horaires de l'enseignant déjà placés sur ce créneau"""
+        return self._find(slot, 'teacher', matricule, exclude_id)
+
+    def room_conflicts(self, slot, salle, exclude_id=None):
+        """Horaires occupant déjà la salle sur ce créneau"""
+        return self._find(slot, 'room', salle, exclude_id)
+
+    def class_conflicts(self, slot, classe, exclude_id=None):
+        """Horaires de la classe déjà placés sur ce créneau"""
+        return self._find(slot, 'class', classe, exclude_id)
+
+    def teachers_at(self, slot):
+        """Ensemble des matricules occupés sur ce créneau"""
+        return set(self._slots[slot]['teacher']) if slot in self._slots else set()
+
+    def rooms_at(self, slot):
+        """Ensemble des salles occupées sur ce créneau"""
+        return set(self._slots[slot]['room']) if slot in self._slots else set()
+
+    def classes_at(self, slot):
+        """Ensemble des classes occupées sur ce créneau"""
+        return set(self._slots[slot]['class']) if slot in self._slots else set()
+
+    def occupied_slots(self):
+        """
+        Occupation chargée, case par case
+
+        Returns:
+            iterator: ((date, créneau), enseignants, salles, classes)
+        """
+        for slot, buckets in self._slots.items():
+            yield slot, set(buckets['teacher']), set(buckets['room']), set(buckets['class'])
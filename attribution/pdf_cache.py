@@ -0,0 +1,144 @@
+"""
+Cache disque des PDF d'horaire
+
+Un PDF est identifié par les paramètres de la demande (type, classe, année,
+semaine, section...) et par le tampon de version des semaines concernées
+(ScheduleVersion), complété par une période d'expiration
+(SCHEDULE_PDF_CACHE_MAX_AGE) pour ce qu'aucun compteur ne suit. Les
+fichiers sont servis directement depuis le disque ;
+le plus ancien accès est évincé en premier dès que la taille totale dépasse
+SCHEDULE_PDF_CACHE_MAX_BYTES.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.http import FileResponse
+
+
+logger = logging.getLogger(__name__)
+
+_evict_lock = threading.Lock()
+
+
+def cache_dir():
+    return getattr(settings, 'SCHEDULE_PDF_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'schedule_pdf'))
+
+
+def max_bytes():
+    return getattr(settings, 'SCHEDULE_PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+
+
+def is_enabled():
+    return getattr(settings, 'SCHEDULE_PDF_CACHE', True)
+
+
+def max_age():
+    return getattr(settings, 'SCHEDULE_PDF_CACHE_MAX_AGE', 24 * 3600)
+
+
+def with_expiry(stamp):
+    """Ajoute au tampon la période courante : un PDF ne sert pas au-delà de max_age()"""
+    return f"{stamp};t={int(time.time() // max(max_age(), 1))}"
+
+
+def _digest(value):
+    return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()
+
+
+def cache_path(params, stamp):
+    """
+    Chemin du PDF pour des paramètres et un tampon de version
+
+    Le nom commence par l'empreinte des paramètres : les versions périmées
+    d'un même PDF sont retrouvées et supprimées à l'écriture.
+    """
+    return os.path.join(cache_dir(), f"{_digest(params)[:20]}-{_digest(stamp)[:12]}.pdf")
+
+
+def get(params, stamp):
+    """Chemin du PDF en cache (accès enregistré pour le LRU) ou None"""
+    path = cache_path(params, stamp)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def put(params, stamp, content):
+    """
+    Enregistre un PDF rendu et applique la limite de taille
+
+    Args:
+        params: tuple des paramètres de la demande
+        stamp: str - tampon de version (ScheduleVersion.stamp)
+        content: bytes - contenu du PDF
+    """
+    path = cache_path(params, stamp)
+    prefix = os.path.basename(path).split('-')[0]
+    try:
+        os.makedirs(cache_dir(), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as pdf:
+            pdf.write(content)
+        os.replace(tmp_path, path)
+        # Supprimer les versions périmées de ce PDF
+        for name in os.listdir(cache_dir()):
+            if name.startswith(prefix + '-') and name.endswith('.pdf') and name != os.path.basename(path):
+                _remove(os.path.join(cache_dir(), name))
+        evict()
+    except OSError:
+        logger.warning("Cache PDF : écriture impossible dans %s", cache_dir(), exc_info=True)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict(limit=None):
+    """Supprime les PDF les moins récemment servis au-delà de la limite de taille"""
+    limit = max_bytes() if limit is None else limit
+    with _evict_lock:
+        files = []
+        total = 0
+        try:
+            names = os.listdir(cache_dir())
+        except OSError:
+            return
+        now = time.time()
+        for name in names:
+            path = os.path.join(cache_dir(), name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith('.tmp'):
+                # Écriture interrompue
+                if now - stat.st_mtime > 3600:
+                    _remove(path)
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        for _, size, path in sorted(files):
+            if total <= limit:
+                break
+            _remove(path)
+            total -= size
+
+
+def clear():
+    evict(limit=0)
+
+
+def file_response(path, filename):
+    """Réponse PDF lue en flux depuis le disque"""
+    response = FileResponse(open(path, 'rb'), content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
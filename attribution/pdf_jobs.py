@@ -0,0 +1,316 @@
+"""
+File locale de génération des rapports PDF
+
+Les demandes sont enregistrées dans PdfJob puis rendues par un petit pool de
+threads du processus, hors du cycle de la requête. Le PDF est écrit sous
+MEDIA_ROOT/pdf_jobs ; le navigateur interroge l'état de la tâche puis
+télécharge le fichier. Deux demandes identiques (même rapport, mêmes
+paramètres, même organisation et mêmes rôles) en attente ou en cours
+partagent la même tâche.
+
+Les vues PDF existantes sont réutilisées telles quelles : la tâche les
+appelle avec une requête GET reconstituée pour l'utilisateur demandeur.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, close_old_connections, transaction
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from .models import PdfJob
+
+
+logger = logging.getLogger(__name__)
+
+# Rapports disponibles : nom -> (vue, paramètres imposés, nom de fichier)
+REPORTS = {
+    'charges_enseignant': ('attribution.views.generate_pdf', {}, 'charges.pdf'),
+    'horaire': ('attribution.views.schedule_pdf', {}, 'horaire.pdf'),
+    'charges_section': ('attribution.views.imprimer_charges_section', {}, 'charges_section.pdf'),
+    'fiches_charges': ('attribution.views.imprimer_fiches_charges', {'format': 'pdf'}, 'fiches_charges.pdf'),
+    'heures_supplementaires': ('attribution.views.heures_supplementaires_par_grade', {'format': 'pdf'}, 'heures_supplementaires.pdf'),
+    'paiements': ('attribution.views.rapport_paiements', {}, 'rapport_paiements.pdf'),
+    'suivi_dashboard': ('tracking.views.dashboard_pdf_view', {}, 'suivi_enseignements.pdf'),
+}
+
+# Paramètre passé à la vue en argument nommé (ex: rapport_paiements(type_rapport=...))
+VIEW_KWARGS = {
+    'paiements': ['type_rapport'],
+}
+
+
+def _admin_or_direction(user):
+    from accounts.permissions import check_admin_permission, check_administrative_role_permission
+
+    return check_admin_permission(user) or check_administrative_role_permission(user)
+
+
+# Droits propres à un rapport : la tâche appelle la vue directement, sans les
+# contrôles d'URL de RoleBasedAccessMiddleware (ex: /tracking/dashboard/ est
+# réservé à l'administration par admin_and_direction_urls)
+PERMISSIONS = {
+    'suivi_dashboard': _admin_or_direction,
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def scope_of(user):
+    """Empreinte de ce que l'utilisateur peut voir (organisation, statut, rôles)"""
+    from accounts.principal import get_principal
+
+    principal = get_principal(user)
+    organisation = principal.user_organisation
+    return _digest([
+        organisation.pk if organisation else None,
+        principal.is_superuser,
+        principal.is_staff,
+        sorted(principal.roles),
+    ])
+
+
+def check_access(report, user, params):
+    """
+    Vérifie que l'utilisateur peut demander ce rapport avec ces paramètres
+
+    Reprend les règles que RoleBasedAccessMiddleware applique à l'URL de la
+    vue : droits propres au rapport (PERMISSIONS) et, pour un responsable de
+    section, limitation à sa section.
+
+    Raises:
+        PermissionDenied: si la demande n'est pas autorisée
+    """
+    from accounts.permissions import check_admin_permission, check_section_role_permission
+    from accounts.principal import get_principal
+
+    check = PERMISSIONS.get(report)
+    if check is not None and not check(user):
+        raise PermissionDenied("Ce rapport est réservé à l'administration.")
+
+    section = params.get('section')
+    if section and check_section_role_permission(user) and not check_admin_permission(user):
+        user_section = get_principal(user).section
+        if user_section and str(section).lower() != user_section.lower():
+            raise PermissionDenied(f"Vous ne pouvez demander que les rapports de votre section : {user_section}")
+
+
+def clean_params(report, querydict):
+    """Paramètres de la demande, sans les paramètres imposés par le rapport"""
+    forced = REPORTS[report][1]
+    return {
+        name: values if len(values) > 1 else values[0]
+        for name, values in sorted(querydict.lists())
+        if name not in forced and name != 'csrfmiddlewaretoken'
+    }
+
+
+def submit(report, params, user):
+    """
+    Enregistre une demande de rapport, ou retourne la tâche identique en cours
+
+    Args:
+        report: str - clé de REPORTS
+        params: dict - paramètres GET de la vue
+        user: User demandeur
+
+    Returns:
+        tuple: (PdfJob, created: bool)
+
+    Raises:
+        PermissionDenied: voir check_access
+    """
+    if report not in REPORTS:
+        raise ValueError(f"Rapport inconnu : {report}")
+    check_access(report, user, params)
+    scope = scope_of(user)
+    key = _digest([report, params, scope])
+
+    existing = PdfJob.objects.filter(active_key=key).first()
+    if existing:
+        return existing, False
+    try:
+        with transaction.atomic():
+            job = PdfJob.objects.create(
+                report=report, params=params, key=key, active_key=key, scope=scope, user=user,
+            )
+    except IntegrityError:
+        # Demande identique enregistrée entre-temps
+        existing = PdfJob.objects.filter(active_key=key).first()
+        if existing:
+            return existing, False
+        raise
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_background, job.pk))
+    return job, True
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    # Un pool par processus (les workers forkés n'héritent pas des threads)
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=_setting('PDF_JOB_WORKERS', 2), thread_name_prefix='pdf-job'
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _run_in_background(job_id):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def _build_request(job):
+    """Requête GET équivalente à la demande d'origine"""
+    from django.contrib.messages.storage.cookie import CookieStorage
+
+    forced = REPORTS[job.report][1]
+    params = dict(job.params)
+    params.update(forced)
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = f'/impressions/{job.report}/'
+    request.GET = QueryDict(urlencode(params, doseq=True))
+    request.META.update({'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'REQUEST_METHOD': 'GET'})
+    request.user = job.user
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    request._messages = CookieStorage(request)
+    return request
+
+
+def _render(job):
+    view_path, _, default_name = REPORTS[job.report]
+    module_path, name = view_path.rsplit('.', 1)
+    view = getattr(import_module(module_path), name)
+    kwargs = {name: job.params[name] for name in VIEW_KWARGS.get(job.report, []) if name in job.params}
+
+    response = view(_build_request(job), **kwargs)
+    if getattr(response, 'streaming', False):
+        content = b''.join(response.streaming_content)
+    else:
+        content = response.content
+    if response.status_code != 200 or not content.startswith(b'%PDF'):
+        # Redirection ou message d'erreur de la vue (paramètres invalides, aucune donnée...)
+        detail = '' if getattr(response, 'streaming', False) else content[:300].decode('utf-8', 'replace')
+        raise ValueError(f"Le rapport n'a pas produit de PDF (HTTP {response.status_code}) {detail}".strip())
+
+    filename = default_name
+    disposition = response.get('Content-Disposition', '')
+    if 'filename="' in disposition:
+        filename = disposition.split('filename="', 1)[1].split('"', 1)[0] or default_name
+    return content, filename
+
+
+def run_job(job_id):
+    """
+    Rend une tâche en attente (sans effet si un autre worker l'a prise)
+
+    Returns:
+        PdfJob ou None
+    """
+    claimed = PdfJob.objects.filter(pk=job_id, status=PdfJob.STATUS_PENDING).update(
+        status=PdfJob.STATUS_RUNNING, started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+    job = PdfJob.objects.select_related('user').get(pk=job_id)
+    try:
+        if job.user is None:
+            raise ValueError("Utilisateur demandeur supprimé")
+        content, filename = _render(job)
+        job.file.save(f"{job.report}_{job.pk}.pdf", ContentFile(content), save=False)
+        job.filename = filename
+        job.status = PdfJob.STATUS_DONE
+    except Exception as e:
+        logger.exception("Échec de la génération PDF %s #%s", job.report, job.pk)
+        job.status = PdfJob.STATUS_FAILED
+        job.error = str(e)[:2000]
+    job.active_key = None
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'filename', 'status', 'error', 'active_key', 'finished_at'])
+    return job
+
+
+def process_pending(stale_after=None):
+    """
+    Reprend les tâches orphelines (serveur redémarré) et rend les tâches en attente
+
+    Returns:
+        int: nombre de tâches traitées
+    """
+    stale_after = stale_after or _setting('PDF_JOB_TIMEOUT', 600)
+    PdfJob.objects.filter(
+        status=PdfJob.STATUS_RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=stale_after),
+    ).update(status=PdfJob.STATUS_PENDING, started_at=None)
+
+    processed = 0
+    for job_id in PdfJob.objects.filter(status=PdfJob.STATUS_PENDING).order_by('created_at').values_list('pk', flat=True):
+        if run_job(job_id):
+            processed += 1
+    return processed
+
+
+def purge(days=None):
+    """
+    Supprime les tâches terminées plus anciennes que days jours et leurs fichiers
+
+    Returns:
+        int: nombre de tâches supprimées
+    """
+    days = days if days is not None else _setting('PDF_JOB_RETENTION_DAYS', 7)
+    old = PdfJob.objects.filter(
+        status__in=[PdfJob.STATUS_DONE, PdfJob.STATUS_FAILED],
+        finished_at__lt=timezone.now() - timedelta(days=days),
+    )
+    count = 0
+    for job in old.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
+
+
+def as_dict(job):
+    """État de la tâche pour le navigateur"""
+    from django.urls import reverse
+
+    data = {
+        'job_id': job.pk,
+        'report': job.report,
+        'status': job.status,
+        'status_url': reverse('attribution:pdf_job_status', args=[job.pk]),
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == PdfJob.STATUS_DONE:
+        data['download_url'] = reverse('attribution:pdf_job_download', args=[job.pk])
+        data['filename'] = job.filename
+    elif job.status == PdfJob.STATUS_FAILED:
+        data['error'] = job.error
+    return data
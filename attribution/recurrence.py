@@ -0,0 +1,101 @@
+"""
+Expansion des récurrences d'horaires (plages de dates, semaines S1..Sn)
+"""
+from bisect import bisect_right
+from datetime import timedelta
+
+from .occupancy import JOURS_SEMAINE
+
+
+# Garde-fou : une année académique complète au maximum
+MAX_RECURRENCE_DAYS = 366
+
+
+class SemaineTable:
+    """
+    Table des semaines de cours (SemaineCours) chargée en une seule requête
+
+    Permet de retrouver le numéro de semaine d'une date par recherche
+    dichotomique sur les intervalles [date_debut, date_fin].
+    """
+
+    def __init__(self, semaines):
+        self.semaines = sorted(semaines, key=lambda s: s.date_debut)
+        self._debuts = [s.date_debut for s in self.semaines]
+
+    @classmethod
+    def load(cls, annee_academique=None):
+        """Charge les semaines (de l'année donnée si précisée)"""
+        from reglage.models import SemaineCours
+
+        queryset = SemaineCours.objects.all()
+        if annee_academique:
+            queryset = queryset.filter(annee_academique=annee_academique)
+        return cls(list(queryset))
+
+    def semaine_for(self, value):
+        """Retourne la SemaineCours contenant la date, ou None"""
+        position = bisect_right(self._debuts, value) - 1
+        if position < 0:
+            return None
+        semaine = self.semaines[position]
+        return semaine if value <= semaine.date_fin else None
+
+    def numero_for(self, value):
+        """Retourne le numéro de semaine de la date, ou None"""
+        semaine = self.semaine_for(value)
+        return semaine.numero_semaine if semaine else None
+
+
+def parse_dates_exclues(value):
+    """
+    Décode une liste de dates séparées par des virgules, points-virgules ou
+    retours à la ligne (formats JJ/MM/AAAA ou AAAA-MM-JJ)
+
+    Raises:
+        ValueError: si une date est illisible
+    """
+    from datetime import datetime
+
+    dates = set()
+    for token in (value or '').replace(';', ',').replace('\n', ',').split(','):
+        token = token.strip()
+        if not token:
+            continue
+        for fmt in ('%d/%m/%Y', '%Y-%m-%d'):
+            try:
+                dates.add(datetime.strptime(token, fmt).date())
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"Date invalide : {token}")
+    return dates
+
+
+def expand_dates(date_debut, date_fin=None, jours=None, exclues=None):
+    """
+    Retourne les dates d'une récurrence
+
+    Args:
+        date_debut: date - premier jour
+        date_fin: date - dernier jour inclus (date_debut si absent)
+        jours: liste de noms de jours ('lundi', 'mardi'...) ; tous si vide
+        exclues: ensemble de dates à ignorer (jours fériés, congés...)
+
+    Returns:
+        list: dates triées
+    """
+    date_fin = date_fin or date_debut
+    if date_fin < date_debut:
+        return []
+    jours = set(jours or [])
+    exclues = exclues or set()
+
+    dates = []
+    current = date_debut
+    while current <= date_fin:
+        if (not jours or JOURS_SEMAINE[current.weekday()] in jours) and current not in exclues:
+            dates.append(current)
+        current += timedelta(days=1)
+    return dates
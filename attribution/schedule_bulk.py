@@ -0,0 +1,344 @@
+"""
+Enregistrement groupé des horaires (validation en lot + bulk_create)
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+
+from .models import Attribution, ScheduleEntry, ScheduleVersion
+from .occupancy import OccupancyIndex, effective_date
+from .validators import ScheduleConflictValidator
+
+
+# Champs de la contrainte unique_together de ScheduleEntry
+UNIQUE_FIELDS = ['attribution', 'annee_academique', 'semaine_debut', 'jour', 'creneau']
+
+# Champs mis à jour lorsqu'un horaire existe déjà pour la même cellule
+UPDATE_FIELDS = [
+    'type_horaire', 'numero_semaine', 'date_cours', 'salle', 'salle_link', 'remarques', 'exclusif',
+] + ScheduleEntry.SLOT_KEY_FIELDS
+
+# Message affiché quand une contrainte d'unicité refuse un lot déjà validé
+SLOT_TAKEN_MESSAGE = "Créneau pris entre-temps par un autre horaire (enseignant, classe ou salle) : rien n'a été enregistré."
+
+
+def bulk_upsert_entries(entries, batch_size=500):
+    """
+    Insère ou met à jour des horaires en lot dans une seule transaction
+
+    Les clés dénormalisées sont calculées ici (bulk_create n'appelle pas
+    save()). Si un horaire concurrent a pris un créneau depuis la
+    validation, la base refuse tout le lot (IntegrityError).
+
+    Args:
+        entries: liste de ScheduleEntry non enregistrés
+        batch_size: int - nombre de lignes par requête INSERT
+
+    Returns:
+        int: nombre d'horaires écrits
+    """
+    entries = list(entries)
+    if not entries:
+        return 0
+    for entry in entries:
+        entry.refresh_slot_keys()
+
+    with transaction.atomic():
+        if connection.features.supports_update_conflicts_with_target:
+            ScheduleEntry.objects.bulk_create(
+                entries,
+                update_conflicts=True,
+                update_fields=UPDATE_FIELDS,
+                unique_fields=UNIQUE_FIELDS,
+                batch_size=batch_size,
+            )
+        else:
+            # MySQL : ON DUPLICATE KEY UPDATE porterait aussi sur les contraintes
+            # de créneau et écraserait l'horaire d'un autre enseignant
+            _update_then_insert(entries, batch_size)
+        # bulk_create n'émet pas post_save : invalider le cache des PDF ici
+        ScheduleVersion.bump_on_commit(
+            {entry.date_cours for entry in entries} | {entry.semaine_debut for entry in entries}
+        )
+    return len(entries)
+
+
+def _update_then_insert(entries, batch_size):
+    """Met à jour les cellules déjà enregistrées, insère les autres (sans upsert)"""
+    existing = {
+        row[1:]: row[0]
+        for row in ScheduleEntry.objects.filter(
+            attribution_id__in={entry.attribution_id for entry in entries},
+            semaine_debut__in={entry.semaine_debut for entry in entries},
+        ).values_list('id', 'attribution_id', 'annee_academique', 'semaine_debut', 'jour', 'creneau_id')
+    }
+    updates, inserts = [], []
+    for entry in entries:
+        entry.pk = existing.get(
+            (entry.attribution_id, entry.annee_academique, entry.semaine_debut, entry.jour, entry.creneau_id)
+        )
+        (updates if entry.pk else inserts).append(entry)
+    if updates:
+        ScheduleEntry.objects.bulk_update(updates, UPDATE_FIELDS, batch_size=batch_size)
+    if inserts:
+        ScheduleEntry.objects.bulk_create(inserts, batch_size=batch_size)
+
+
+def resolve_creneaux(values):
+    """
+    Résout en une requête des créneaux donnés par ID ou par code
+
+    Returns:
+        dict: {valeur reçue (str): Creneau}
+    """
+    from reglage.models import Creneau
+
+    values = {str(v).strip() for v in values if v not in (None, '')}
+    if not values:
+        return {}
+    ids = [int(v) for v in values if v.isdigit()]
+    codes = [v.upper() for v in values if not v.isdigit()]
+
+    resolved = {}
+    for creneau in Creneau.objects.filter(Q(pk__in=ids) | Q(code__in=codes)):
+        resolved[str(creneau.pk)] = creneau
+        resolved[creneau.code.upper()] = creneau
+    return {v: resolved.get(v.upper()) for v in values}
+
+
+def resolve_salles(codes):
+    """Résout en une requête les salles données par code"""
+    from reglage.models import Salle
+
+    codes = {c.strip() for c in codes if c}
+    if not codes:
+        return {}
+    return {salle.code: salle for salle in Salle.objects.filter(code__in=codes)}
+
+
+def save_entries_bulk(annee, semaine_date, items):
+    """
+    Valide et enregistre un lot de cellules d'horaire pour une semaine
+
+    Toutes les attributions sont chargées avec in_bulk, le lot est validé
+    contre un seul index d'occupation puis écrit avec bulk_create.
+
+    Args:
+        annee: str - code de l'année académique
+        semaine_date: date - date de référence de la semaine
+        items: liste de dict {attribution_id, jour, creneau, salle, remarques}
+
+    Returns:
+        dict: {'saved': int, 'results': liste de résultats par cellule}
+    """
+    from reglage.models import SemaineCours
+
+    results = [
+        {
+            'index': position,
+            'attribution_id': item.get('attribution_id'),
+            'jour': item.get('jour'),
+            'creneau': item.get('creneau'),
+            'status': 'invalid',
+            'errors': [],
+        }
+        for position, item in enumerate(items)
+    ]
+
+    attribution_ids = set()
+    for item in items:
+        try:
+            attribution_ids.add(int(item.get('attribution_id')))
+        except (TypeError, ValueError):
+            pass
+    attributions = Attribution.objects.select_related('matricule', 'code_ue').in_bulk(attribution_ids)
+    creneaux = resolve_creneaux(item.get('creneau') for item in items)
+    salles = resolve_salles(item.get('salle') for item in items)
+
+    lundi = semaine_date - timedelta(days=semaine_date.weekday())
+    semaine_obj = SemaineCours.objects.filter(
+        date_debut__lte=semaine_date, date_fin__gte=semaine_date
+    ).first()
+    numero_semaine = semaine_obj.numero_semaine if semaine_obj else None
+
+    # Construire les candidats
+    candidates = []
+    positions = []
+    for position, item in enumerate(items):
+        result = results[position]
+        jour = item.get('jour')
+        creneau_value = item.get('creneau')
+        if not all([item.get('attribution_id'), jour, creneau_value]):
+            result['errors'].append("attribution_id, jour et creneau sont requis")
+            continue
+        try:
+            attribution = attributions.get(int(item.get('attribution_id')))
+        except (TypeError, ValueError):
+            attribution = None
+        if attribution is None:
+            result['status'] = 'not_found'
+            result['errors'].append(f"Attribution {item.get('attribution_id')} introuvable")
+            continue
+        creneau = creneaux.get(str(creneau_value).strip())
+        if creneau is None:
+            result['errors'].append(f"Créneau {creneau_value} introuvable")
+            continue
+
+        salle_code = (item.get('salle') or '').strip() or None
+        candidates.append(ScheduleEntry(
+            organisation=attribution.organisation,
+            attribution=attribution,
+            type_horaire='examen' if creneau.type_creneau == 'examen' else 'cours',
+            annee_academique=annee,
+            semaine_debut=semaine_date,
+            date_cours=effective_date(semaine_date, jour),
+            numero_semaine=numero_semaine,
+            jour=jour,
+            creneau=creneau,
+            salle=salle_code,
+            salle_link=salles.get(salle_code),
+            remarques=item.get('remarques'),
+        ))
+        positions.append(position)
+
+    if not candidates:
+        return {'saved': 0, 'results': results}
+
+    # Horaires déjà présents pour les mêmes cellules (mise à jour, pas conflit)
+    existing = {
+        (row['attribution_id'], row['jour'], row['creneau_id']): row['id']
+        for row in ScheduleEntry.objects.filter(
+            attribution_id__in=[c.attribution_id for c in candidates],
+            annee_academique=annee,
+            semaine_debut=semaine_date,
+        ).values('id', 'attribution_id', 'jour', 'creneau_id')
+    }
+    exclude_ids = {
+        i: existing.get((c.attribution_id, c.jour, c.creneau_id))
+        for i, c in enumerate(candidates)
+    }
+
+    index = OccupancyIndex.load(lundi, lundi + timedelta(days=6))
+    validations = ScheduleConflictValidator.validate_batch(candidates, index, exclude_ids=exclude_ids)
+
+    to_write = []
+    for i, (candidate, validation) in enumerate(zip(candidates, validations)):
+        result = results[positions[i]]
+        if validation['valid']:
+            result['status'] = 'updated' if exclude_ids.get(i) else 'saved'
+            to_write.append(candidate)
+        else:
+            result['status'] = 'conflict'
+            result['errors'].extend(validation['errors'])
+
+    try:
+        saved = bulk_upsert_entries(to_write)
+    except IntegrityError:
+        saved = 0
+        for position in positions:
+            result = results[position]
+            if result['status'] in ('saved', 'updated'):
+                result['status'] = 'conflict'
+                result['errors'].append(SLOT_TAKEN_MESSAGE)
+    return {'saved': saved, 'results': results}
+
+
+def copy_week(source_monday, targets, section_code=None, classe=None, type_horaire='cours'):
+    """
+    Recopie les horaires d'une semaine sur d'autres semaines de cours
+
+    Les horaires de la semaine source (filtrés par section ou classe) sont
+    décalés sur chaque semaine cible : semaine_debut, date_cours et date_fin
+    glissent du même nombre de jours, numero_semaine est celui de la
+    semaine cible. Les cellules déjà présentes et les conflits (enseignant,
+    classe, salle, y compris entre copies) sont écartés en une passe sur un
+    seul index d'occupation ; le reste est écrit avec bulk_create.
+
+    Args:
+        source_monday: date - lundi de la semaine à recopier
+        targets: SemaineCours cibles
+        section_code: limite aux horaires de la section (optionnel)
+        classe: limite aux horaires de la classe (optionnel)
+        type_horaire: 'cours' ou 'examen'
+
+    Returns:
+        dict: {'copied': int, 'sources': int, 'skipped': liste de cellules écartées}
+    """
+    def monday(day):
+        return day - timedelta(days=day.weekday())
+
+    source_monday = monday(source_monday)
+    targets = sorted(
+        (semaine for semaine in targets if monday(semaine.date_debut) != source_monday),
+        key=lambda semaine: semaine.date_debut,
+    )
+
+    sources = ScheduleEntry.objects.filter(
+        date_effective__range=(source_monday, source_monday + timedelta(days=6)), type_horaire=type_horaire,
+    ).select_related('attribution__code_ue', 'attribution__matricule', 'creneau', 'salle_link').order_by('date_effective', 'pk')
+    if section_code:
+        sources = sources.filter(section_code=section_code)
+    if classe:
+        sources = sources.filter(classe_code=classe)
+    sources = list(sources)
+    if not sources or not targets:
+        return {'copied': 0, 'sources': len(sources), 'skipped': []}
+
+    def shift(value, delta):
+        return value + delta if value else value
+
+    candidates = []
+    for semaine in targets:
+        delta = monday(semaine.date_debut) - source_monday
+        for entry in sources:
+            candidates.append(ScheduleEntry(
+                organisation_id=entry.organisation_id,
+                attribution=entry.attribution,
+                type_horaire=entry.type_horaire,
+                annee_academique=entry.annee_academique,
+                semaine_debut=shift(entry.semaine_debut, delta),
+                date_fin=shift(entry.date_fin, delta),
+                date_cours=shift(entry.date_cours, delta),
+                numero_semaine=semaine.numero_semaine,
+                jour=entry.jour,
+                creneau=entry.creneau,
+                salle=entry.salle,
+                salle_link=entry.salle_link,
+                remarques=entry.remarques,
+            ))
+
+    # Une lecture pour les cellules déjà remplies, une pour l'occupation des semaines cibles
+    first, last = monday(targets[0].date_debut), monday(targets[-1].date_debut) + timedelta(days=6)
+    existing = set(
+        ScheduleEntry.objects.filter(
+            date_effective__range=(first, last), attribution_id__in={entry.attribution_id for entry in sources},
+        ).values_list('attribution_id', 'date_effective', 'creneau_id')
+    )
+    index = OccupancyIndex.load(first, last)
+
+    fresh = []
+    for candidate in candidates:
+        day = effective_date(candidate.semaine_debut, candidate.jour, candidate.date_cours)
+        if (candidate.attribution_id, day, candidate.creneau_id) not in existing:
+            fresh.append(candidate)
+    validations = dict(zip(map(id, fresh), ScheduleConflictValidator.validate_batch(fresh, index)))
+
+    to_write, skipped = [], []
+    for candidate in candidates:
+        validation = validations.get(id(candidate))
+        if validation and validation['valid']:
+            to_write.append(candidate)
+            continue
+        course = candidate.attribution.code_ue
+        skipped.append({
+            'date': effective_date(candidate.semaine_debut, candidate.jour, candidate.date_cours),
+            'creneau': candidate.creneau.code if candidate.creneau else '',
+            'classe': course.classe,
+            'code_ue': course.code_ue,
+            'enseignant': candidate.attribution.matricule.nom_complet if candidate.attribution.matricule else '',
+            'raisons': validation['errors'] if validation else ['Déjà programmé'],
+        })
+
+    copied = bulk_upsert_entries(to_write)
+    return {'copied': copied, 'sources': len(sources), 'skipped': skipped}
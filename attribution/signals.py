@@ -0,0 +1,82 @@
+"""
+Invalidation du cache des PDF d'horaire
+
+Chaque enregistrement ou suppression d'un ScheduleEntry incrémente le
+compteur de sa semaine (ancienne et nouvelle date) et le compteur global.
+Une attribution modifiée (enseignant, type) invalide les semaines où elle
+est programmée, et ses horaires reprennent les nouvelles clés dénormalisées
+(enseignant, classe, section), comme ceux d'un cours ou d'un enseignant
+modifié (voir ScheduleEntry.refresh_slot_keys_of).
+
+Les PDF affichent aussi des données de référence (intitulés des cours,
+noms et grades des enseignants et signataires, sections, créneaux) : leur
+modification incrémente le compteur ScheduleVersion.REFERENCE, commun à
+tous les tampons.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.models import Organisation
+from courses.models import Course
+from reglage.models import Creneau, Departement, Grade, Section, SemaineCours
+from teachers.models import Teacher
+
+from .models import Attribution, ScheduleEntry, ScheduleVersion
+
+
+def _entry_dates(instance):
+    dates = {instance.date_cours, instance.semaine_debut}
+    dates.update(getattr(instance, '_loaded_dates', ()))
+    return dates
+
+
+@receiver(post_save, sender=ScheduleEntry, dispatch_uid='schedule_version_save')
+def bump_schedule_version_on_save(sender, instance, **kwargs):
+    ScheduleVersion.bump_on_commit(_entry_dates(instance))
+    instance._loaded_dates = (instance.date_cours, instance.semaine_debut)
+
+
+@receiver(post_delete, sender=ScheduleEntry, dispatch_uid='schedule_version_delete')
+def bump_schedule_version_on_delete(sender, instance, **kwargs):
+    ScheduleVersion.bump_on_commit(_entry_dates(instance))
+
+
+@receiver(post_save, sender=Attribution, dispatch_uid='schedule_version_attribution_save')
+def bump_schedule_version_on_attribution_save(sender, instance, created, **kwargs):
+    if created:
+        return
+    # Même dates que _entry_dates : date_cours est vide pour les horaires du constructeur
+    dates = set()
+    for date_cours, semaine_debut in ScheduleEntry.objects.filter(attribution=instance).values_list(
+        'date_cours', 'semaine_debut'
+    ).distinct():
+        dates.update((date_cours, semaine_debut))
+    ScheduleVersion.bump_on_commit(dates)
+    ScheduleEntry.refresh_slot_keys_of(ScheduleEntry.objects.filter(attribution=instance))
+
+
+@receiver(post_save, sender=Course, dispatch_uid='schedule_slot_keys_course_save')
+def refresh_slot_keys_on_course_save(sender, instance, created, **kwargs):
+    if created:
+        return
+    ScheduleEntry.refresh_slot_keys_of(ScheduleEntry.objects.filter(attribution__code_ue=instance))
+
+
+@receiver(post_save, sender=Teacher, dispatch_uid='schedule_slot_keys_teacher_save')
+def refresh_slot_keys_on_teacher_save(sender, instance, created, **kwargs):
+    if created:
+        return
+    ScheduleEntry.refresh_slot_keys_of(ScheduleEntry.objects.filter(attribution__matricule=instance))
+
+
+# Données de référence affichées dans les PDF d'horaire
+PDF_REFERENCE_MODELS = (Teacher, Course, Organisation, Section, Departement, Grade, Creneau, SemaineCours)
+
+
+def bump_pdf_reference(sender, **kwargs):
+    ScheduleVersion.bump_reference_on_commit()
+
+
+for model in PDF_REFERENCE_MODELS:
+    post_save.connect(bump_pdf_reference, sender=model, dispatch_uid=f'schedule_pdf_reference_save_{model.__name__}')
+    post_delete.connect(bump_pdf_reference, sender=model, dispatch_uid=f'schedule_pdf_reference_delete_{model.__name__}')
@@ -1,3 +1,466 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import date, timedelta
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import generation_preview, pdf_cache, pdf_jobs
+from .availability import WeekOccupancy
+from .exam_scheduler import ExamProblem, ExamScheduler
+from .models import Attribution, ScheduleEntry, ScheduleVersion
+from .occupancy import OccupancyIndex
+from .recurrence import MAX_RECURRENCE_DAYS, SemaineTable, expand_dates, parse_dates_exclues
+from .timetable_grid import ENTRY_FIELDS, TimetableGrid
+from .timetable_solver import TimetableProblem, TimetableSolver
+from .validators import ScheduleConflictValidator
+
+
+class ScheduleVersionTests(TestCase):
+    def test_bump_changes_week_stamp_only_for_that_week(self):
+        monday = date(2025, 1, 6)
+        other = date(2025, 1, 13)
+        before = ScheduleVersion.stamp([monday])
+        before_other = ScheduleVersion.stamp([other])
+
+        # Un mercredi appartient à la semaine du lundi 6
+        ScheduleVersion.bump(ScheduleVersion.keys_for_dates([date(2025, 1, 8)]))
+
+        self.assertNotEqual(ScheduleVersion.stamp([monday]), before)
+        self.assertEqual(ScheduleVersion.stamp([other]), before_other)
+        self.assertEqual(ScheduleVersion.objects.get(key=ScheduleVersion.GLOBAL).version, 1)
+
+    def test_reference_edit_changes_every_stamp(self):
+        from reglage.models import Section
+
+        monday = date(2025, 1, 6)
+        before = ScheduleVersion.stamp([monday])
+        before_global = ScheduleVersion.stamp()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Section.objects.create(CodeSection='ST', DesignationSection='Sciences et Technologies')
+
+        self.assertNotEqual(ScheduleVersion.stamp([monday]), before)
+        self.assertNotEqual(ScheduleVersion.stamp(), before_global)
+
+
+class ScheduleSlotConstraintTests(TestCase):
+    def setUp(self):
+        from courses.models import Course
+        from reglage.models import Creneau
+        from teachers.models import Teacher
+
+        teacher = Teacher.objects.create(
+            matricule='T001', nom_complet='Enseignant', fonction='Enseignant', categorie='P', departement='INFO',
+        )
+        # Créneau par défaut créé par la migration reglage 0011
+        self.creneau = Creneau.objects.get(code='AM')
+        self.attributions = [
+            Attribution.objects.create(
+                matricule=teacher, annee_academique='2024-2025',
+                code_ue=Course.objects.create(
+                    code_ue=f'UE{n}', intitule_ue=f'UE {n}', credit=3, cmi=30, td_tp=15,
+                    classe=f'L{n}INFO', semestre='S1', departement='INFO', section='ST',
+                ),
+            )
+            for n in (1, 2)
+        ]
+
+    def entry(self, attribution, **kwargs):
+        # Lundi 6 janvier, saisi par semaine : la date réelle est calculée depuis le jour
+        return ScheduleEntry(
+            attribution=attribution, annee_academique='2024-2025', semaine_debut=date(2025, 1, 6),
+            jour='mercredi', creneau=self.creneau, **kwargs,
+        )
+
+    def test_keys_are_denormalized_on_save(self):
+        entry = self.entry(self.attributions[0])
+        entry.save()
+
+        self.assertEqual(
+            (entry.enseignant_matricule, entry.classe_code, entry.section_code, entry.date_effective),
+            ('T001', 'L1INFO', 'ST', date(2025, 1, 8)),
+        )
+
+    def test_database_rejects_teacher_double_booking_unless_forced(self):
+        self.entry(self.attributions[0]).save()
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.entry(self.attributions[1]).save()
+
+        self.entry(self.attributions[1], exclusif=None).save()
+        self.assertEqual(ScheduleEntry.objects.filter(enseignant_matricule='T001').count(), 2)
+
+    def test_course_move_onto_a_booked_class_keeps_the_entry_as_forced(self):
+        from teachers.models import Teacher
+
+        other = Teacher.objects.create(
+            matricule='T002', nom_complet='Autre', fonction='Enseignant', categorie='P', departement='INFO',
+        )
+        attribution = self.attributions[1]
+        attribution.matricule = other
+        attribution.save()
+        self.entry(self.attributions[0]).save()
+        moved = self.entry(attribution)
+        moved.save()
+
+        course = attribution.code_ue
+        course.classe = 'L1INFO'
+        course.save()
+
+        moved.refresh_from_db()
+        self.assertEqual((moved.classe_code, moved.exclusif), ('L1INFO', None))
+
+    def test_copy_week_shifts_dates_and_skips_filled_cells(self):
+        from reglage.models import SemaineCours
+        from .schedule_bulk import copy_week
+
+        self.entry(self.attributions[0]).save()
+        cible = SemaineCours.objects.create(
+            numero_semaine=3, date_debut=date(2025, 1, 20), date_fin=date(2025, 1, 25), designation='S3',
+        )
+
+        first = copy_week(date(2025, 1, 6), [cible])
+        again = copy_week(date(2025, 1, 6), [cible])
+
+        copy = ScheduleEntry.objects.get(date_effective=date(2025, 1, 22))
+        self.assertEqual((copy.semaine_debut, copy.numero_semaine), (date(2025, 1, 20), 3))
+        self.assertEqual((first['copied'], first['skipped']), (1, []))
+        self.assertEqual((again['copied'], again['skipped'][0]['raisons']), (0, ['Déjà programmé']))
+
+
+class ScheduleConflictTests(TestCase):
+    """Index d'occupation et validateurs : conflits enseignant, classe et salle"""
+
+    MONDAY = date(2025, 1, 6)
+
+    def setUp(self):
+        from courses.models import Course
+        from reglage.models import Creneau
+        from teachers.models import Teacher
+
+        # Créneau par défaut créé par la migration reglage 0011
+        self.creneau = Creneau.objects.get(code='AM')
+        teachers = {
+            matricule: Teacher.objects.create(
+                matricule=matricule, nom_complet=f'Enseignant {matricule}', fonction='Enseignant',
+                categorie='P', departement='INFO',
+            )
+            for matricule in ('T001', 'T002')
+        }
+        # UE1 est programmée ; UE2 partage l'enseignant, UE3 la classe, UE4 rien
+        self.attributions = {
+            code: Attribution.objects.create(
+                matricule=teachers[matricule], annee_academique='2024-2025',
+                code_ue=Course.objects.create(
+                    code_ue=code, intitule_ue=code, credit=3, cmi=30, td_tp=15,
+                    classe=classe, semestre='S1', departement='INFO', section='ST',
+                ),
+            )
+            for code, matricule, classe in (
+                ('UE1', 'T001', 'L1INFO'),
+                ('UE2', 'T001', 'L2INFO'),
+                ('UE3', 'T002', 'L1INFO'),
+                ('UE4', 'T002', 'L3INFO'),
+            )
+        }
+        self.booked = self.entry('UE1', salle='B1')
+        self.booked.save()
+
+    def entry(self, code, jour='mercredi', **kwargs):
+        return ScheduleEntry(
+            attribution=self.attributions[code], annee_academique='2024-2025',
+            semaine_debut=self.MONDAY, jour=jour, creneau=self.creneau, **kwargs,
+        )
+
+    def validate(self, code, salle=None, exclude_id=None, index=None):
+        return ScheduleConflictValidator.validate_schedule_entry(
+            self.attributions[code], 'mercredi', self.creneau.pk, self.MONDAY,
+            salle=salle, exclude_id=exclude_id, index=index,
+        )
+
+    def test_index_finds_the_booked_slot(self):
+        index = OccupancyIndex.load(date(2025, 1, 8))
+        slot = index.slot_for(self.MONDAY, 'mercredi', self.creneau)
+
+        self.assertEqual(slot, (date(2025, 1, 8), self.creneau.pk))
+        self.assertTrue(index.covers(date(2025, 1, 12)))
+        self.assertFalse(index.covers(date(2025, 1, 13)))
+        self.assertEqual([e.code_ue for e in index.teacher_conflicts(slot, 'T001')], ['UE1'])
+        self.assertEqual([e.enseignant for e in index.class_conflicts(slot, 'L1INFO')], ['Enseignant T001'])
+        self.assertEqual(len(index.room_conflicts(slot, 'B1')), 1)
+        self.assertEqual(index.teacher_conflicts(slot, 'T001', exclude_id=self.booked.pk), [])
+        self.assertEqual(index.teacher_conflicts(index.slot_for(self.MONDAY, 'jeudi', self.creneau), 'T001'), [])
+        self.assertEqual((index.teachers_at(slot), index.rooms_at(slot)), ({'T001'}, {'B1'}))
+
+    def test_index_and_database_checks_agree(self):
+        index = OccupancyIndex.load(self.MONDAY)
+        cases = {
+            ('UE2', None): {'teacher'},
+            ('UE3', None): {'class'},
+            ('UE4', 'B1'): {'room'},
+            ('UE4', None): set(),
+        }
+        for (code, salle), expected in cases.items():
+            for source in (index, None):
+                with self.subTest(code=code, salle=salle, index=source is not None):
+                    result = self.validate(code, salle=salle, index=source)
+                    self.assertEqual(set(result['conflicts']), expected)
+                    self.assertEqual(result['valid'], not expected)
+                    self.assertEqual(len(result['errors']), len(expected))
+
+    def test_an_entry_does_not_conflict_with_itself(self):
+        for source in (OccupancyIndex.load(self.MONDAY), None):
+            with self.subTest(index=source is not None):
+                result = self.validate('UE1', salle='B1', exclude_id=self.booked.pk, index=source)
+                self.assertTrue(result['valid'])
+
+    def test_batch_detects_conflicts_between_its_own_entries(self):
+        batch = [self.entry('UE3', jour='jeudi'), self.entry('UE4', jour='jeudi', salle='B1')]
+        results = ScheduleConflictValidator.validate_batch(batch)
+
+        self.assertTrue(results[0]['valid'])
+        self.assertEqual(set(results[1]['conflicts']), {'teacher'})
+
+        # Déplacement de l'horaire existant : exclu de sa propre vérification
+        results = ScheduleConflictValidator.validate_batch(
+            [self.entry('UE1', salle='B1')], exclude_ids={0: self.booked.pk}
+        )
+        self.assertTrue(results[0]['valid'])
+
+    def test_period_report_lists_forced_conflicts(self):
+        self.entry('UE2', salle='B1', exclusif=None).save()
+        self.entry('UE3', jour='jeudi').save()
+
+        report = ScheduleConflictValidator.get_conflicts(date_debut=self.MONDAY, date_fin=date(2025, 1, 12))
+        self.assertEqual(report['entries_checked'], 3)
+        self.assertEqual(
+            (len(report['teacher_conflicts']), len(report['room_conflicts']), len(report['class_conflicts'])),
+            (1, 1, 0),
+        )
+        self.assertEqual(report['teacher_conflicts'][0]['date'], date(2025, 1, 8))
+        self.assertEqual(report['total_conflicts'], 2)
+
+        later = ScheduleConflictValidator.get_conflicts(date_debut=date(2025, 1, 9))
+        self.assertEqual((later['entries_checked'], later['total_conflicts']), (1, 0))
+
+
+class PdfCacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_new_version_replaces_stale_file(self):
+        with override_settings(SCHEDULE_PDF_CACHE_DIR=self.tmp.name):
+            params = ('schedule_pdf', 'cours', 'L1BC', '2024-2025', '2025-01-06')
+            pdf_cache.put(params, 'w:2025-01-06=1', b'%PDF-1')
+            self.assertIsNotNone(pdf_cache.get(params, 'w:2025-01-06=1'))
+
+            pdf_cache.put(params, 'w:2025-01-06=2', b'%PDF-2')
+            self.assertIsNone(pdf_cache.get(params, 'w:2025-01-06=1'))
+            self.assertEqual(len(os.listdir(self.tmp.name)), 1)
+
+    def test_least_recently_served_file_is_evicted(self):
+        with override_settings(SCHEDULE_PDF_CACHE_DIR=self.tmp.name, SCHEDULE_PDF_CACHE_MAX_BYTES=250):
+            pdf_cache.put(('a',), 's', b'x' * 100)
+            pdf_cache.put(('b',), 's', b'x' * 100)
+            # 'a' est servi après 'b' : 'b' devient le plus ancien accès
+            os.utime(pdf_cache.cache_path(('b',), 's'), (1, 1))
+            pdf_cache.get(('a',), 's')
+            pdf_cache.put(('c',), 's', b'x' * 100)
+
+            self.assertIsNotNone(pdf_cache.get(('a',), 's'))
+            self.assertIsNone(pdf_cache.get(('b',), 's'))
+            self.assertIsNotNone(pdf_cache.get(('c',), 's'))
+
+
+class TimetableGridTests(SimpleTestCase):
+    def entry(self, entry_id, classe, jour, creneau):
+        values = dict.fromkeys(ENTRY_FIELDS, '')
+        values.update({
+            'id': entry_id,
+            'jour': jour,
+            'creneau__code': creneau,
+            'attribution__code_ue__classe': classe,
+            'attribution__code_ue__code_ue': f'UE{entry_id}',
+        })
+        return values
+
+    def test_entries_are_placed_by_class_day_and_slot(self):
+        grid = TimetableGrid(['L1BC', 'L1MI', 'L2BC'], [('08h00-12h00', 'AM'), ('13h00-17h00', 'PM')])
+        grid.add(self.entry(1, 'l1 bc', 'mardi', 'pm'))
+        # Sans créneau : premier créneau de la journée
+        grid.add(self.entry(2, 'L1MI', 'lundi', None))
+
+        self.assertEqual([item['id'] for item in grid.cell('L1BC', 'Mardi', 'PM')], [1])
+        self.assertEqual([item['id'] for item in grid.cell('L1MI', 'Lundi', 'AM')], [2])
+        self.assertEqual(grid.cell('L1BC', 'Mardi', 'AM'), [])
+        self.assertEqual(grid.levels(), ['L1'])
+        self.assertEqual(grid.columns('L1'), ['L1BC', 'L1MI'])
+
+        rows = grid.rows('L1')
+        self.assertEqual(len(rows), 6 * 2)
+        self.assertEqual([item['id'] for item in rows[3]['cells'][0]], [1])  # Mardi PM, L1BC
+        self.assertEqual(grid.as_dict()['levels']['L1']['cells'][1][1], [[0], []])
+
+
+class TimetableSolverTests(SimpleTestCase):
+    def problem(self):
+        # Lundi 6 et mardi 7 janvier, créneaux 1 (AM) et 2 (PM)
+        days = [date(2025, 1, 6), date(2025, 1, 7)]
+        return TimetableProblem(
+            [(day, creneau, 4) for day in days for creneau in (1, 2)],
+            [('B1', 30), ('AMPHI', 200)],
+        ), days
+
+    def test_sessions_do_not_overlap_and_get_a_fitting_room(self):
+        problem, days = self.problem()
+        problem.occupy(days[0], 1, teacher='T1')
+        for attribution, teacher in ((1, 'T1'), (1, 'T1'), (2, 'T2'), (3, 'T2')):
+            problem.add_session(attribution, teacher, 'L1INFO', effectif=80)
+
+        solution = TimetableSolver(problem).solve()
+
+        self.assertEqual(solution.unplaced, {})
+        items = solution.items()
+        self.assertEqual(len({slot.index for _, slot, _ in items}), 4)
+        self.assertTrue(all(room.code == 'AMPHI' for _, _, room in items))
+        first = [slot for session, slot, _ in items if session.attribution_id == 1]
+        self.assertNotEqual(first[0].date, first[1].date)
+        self.assertNotIn((days[0], 1), [(slot.date, slot.creneau_id) for session, slot, _ in items if session.teacher == 'T1'])
+
+    def test_overflow_is_reported_not_forced(self):
+        problem, days = self.problem()
+        problem.block_teacher('T1', problem.mask_for(days[1]))
+        for attribution in (1, 2, 3):
+            problem.add_session(attribution, 'T1', 'L2INFO')
+
+        solution = TimetableSolver(problem).solve()
+
+        self.assertEqual(len(solution.placements), 2)
+        self.assertEqual(list(solution.unplaced.values()), [TimetableSolver.NO_SLOT])
+
+
+class ExamSchedulerTests(SimpleTestCase):
+    def problem(self):
+        # Trois jours d'examens, un créneau (1) par jour
+        days = [date(2025, 6, 2), date(2025, 6, 3), date(2025, 6, 4)]
+        return ExamProblem([(day, 1, 0) for day in days], [('B1', 30), ('AMPHI', 200)]), days
+
+    def test_linked_classes_never_share_a_slot_and_exams_are_spread(self):
+        problem, days = self.problem()
+        problem.link_classes('L1INFO', 'L1MATH')
+        problem.add_exam(1, 'T1', 'L1INFO', effectif=80)
+        problem.add_exam(2, 'T2', 'L1MATH', effectif=20)
+        problem.add_exam(3, 'T3', 'L2INFO', effectif=20)
+
+        schedule = ExamScheduler(problem).solve()
+
+        self.assertEqual(schedule.unplaced, {})
+        placed = {exam.attribution_id: (slot.date, room.code) for exam, slot, room in schedule.items()}
+        self.assertNotEqual(placed[1][0], placed[2][0])
+        self.assertEqual(abs((placed[1][0] - placed[2][0]).days), 2)
+        self.assertEqual(placed[1][1], 'AMPHI')
+
+    def test_busy_class_and_missing_slots_are_reported(self):
+        problem, days = self.problem()
+        problem.occupy(days[0], 1, classe='L1INFO')
+        for attribution in (1, 2, 3):
+            problem.add_exam(attribution, f'T{attribution}', 'L1INFO')
+
+        schedule = ExamScheduler(problem).solve()
+
+        self.assertEqual(len(schedule.placements), 2)
+        self.assertEqual(list(schedule.unplaced.values()), [ExamScheduler.NO_SLOT])
+
+
+class WeekOccupancyTests(SimpleTestCase):
+    def test_matrices_count_entries_per_resource_and_slot(self):
+        monday = date(2025, 1, 6)
+        week = WeekOccupancy(monday, [10, 20])
+        week.add('teacher', 'T1', week.slot(date(2025, 1, 7), 20))
+        week.add('teacher', 'T1', week.slot(date(2025, 1, 7), 20))
+        week.add('room', 'B1', week.slot(monday, 10))
+        week.add('room', 'B1', week.slot(date(2025, 1, 12), 10))  # dimanche : hors grille
+        week.freeze()
+
+        self.assertEqual(week.slot(date(2025, 1, 7), 20), 3)
+        self.assertEqual(week.row('teacher', 'T1').tolist(), [0, 0, 0, 2] + [0] * 8)
+        self.assertFalse(week.row('teacher', 'inconnu').any())
+        self.assertEqual(week.rows('room', ['A1', 'B1'])[:, 0].tolist(), [0, 1])
+
+
+class RecurrenceTests(SimpleTestCase):
+    def test_weekdays_and_excluded_dates_are_filtered(self):
+        monday = date(2025, 1, 6)
+        dates = expand_dates(
+            monday, monday + timedelta(days=13), jours=['lundi', 'jeudi'], exclues={date(2025, 1, 9)}
+        )
+        self.assertEqual(dates, [date(2025, 1, 6), date(2025, 1, 13), date(2025, 1, 16)])
+
+    def test_single_day_and_reversed_range(self):
+        monday = date(2025, 1, 6)
+        self.assertEqual(expand_dates(monday), [monday])
+        self.assertEqual(expand_dates(monday, monday - timedelta(days=1)), [])
+        self.assertEqual(expand_dates(monday, jours=['mardi']), [])
+
+    def test_longest_range_accepted_by_the_form(self):
+        start = date(2024, 9, 2)
+        dates = expand_dates(start, start + timedelta(days=MAX_RECURRENCE_DAYS - 1))
+        self.assertEqual(len(dates), MAX_RECURRENCE_DAYS)
+        self.assertEqual(dates[-1] - dates[0], timedelta(days=MAX_RECURRENCE_DAYS - 1))
+
+    def test_excluded_dates_accept_both_formats_and_separators(self):
+        self.assertEqual(
+            parse_dates_exclues('01/11/2024; 2024-12-25\n 25/12/2024,'),
+            {date(2024, 11, 1), date(2024, 12, 25)},
+        )
+        self.assertEqual(parse_dates_exclues(None), set())
+        with self.assertRaises(ValueError):
+            parse_dates_exclues('31/02/2024')
+
+    def test_week_numbers_are_found_by_date(self):
+        semaines = SemaineTable([
+            SimpleNamespace(numero_semaine=2, date_debut=date(2025, 1, 13), date_fin=date(2025, 1, 18)),
+            SimpleNamespace(numero_semaine=1, date_debut=date(2025, 1, 6), date_fin=date(2025, 1, 11)),
+        ])
+        self.assertEqual(semaines.numero_for(date(2025, 1, 6)), 1)
+        self.assertEqual(semaines.numero_for(date(2025, 1, 18)), 2)
+        self.assertIsNone(semaines.numero_for(date(2025, 1, 12)))  # dimanche entre deux semaines
+        self.assertIsNone(semaines.numero_for(date(2025, 1, 5)))
+        self.assertIsNone(semaines.semaine_for(date(2025, 1, 19)))
+
+
+class GenerationPreviewTests(SimpleTestCase):
+    def test_preview_round_trips_through_disk_for_its_owner_only(self):
+        jeton = generation_preview.save({
+            'user_id': 7, 'type_horaire': 'examen', 'annee': '2024-2025', 'section_code': 'ST',
+            'date_debut': date(2025, 1, 6), 'date_fin': date(2025, 1, 17),
+            'assignments': [(1, date(2025, 1, 8), 3, 'B1'), (2, date(2025, 1, 9), 3, None)],
+        })
+        self.addCleanup(generation_preview.discard, jeton)
+
+        self.assertIsNone(generation_preview.load(jeton, 8))
+        self.assertIsNone(generation_preview.load('../' + jeton, 7))
+        preview = generation_preview.load(jeton, 7)
+        self.assertEqual(preview['date_fin'], date(2025, 1, 17))
+        self.assertEqual(preview['assignments'][0], (1, date(2025, 1, 8), 3, 'B1'))
+
+        generation_preview.discard(jeton)
+        self.assertIsNone(generation_preview.load(jeton, 7))
+
+
+class PdfJobAccessTests(TestCase):
+    def test_admin_only_report_is_refused_to_other_users(self):
+        from django.contrib.auth.models import User
+        from django.core.exceptions import PermissionDenied
+        from .models import PdfJob
+
+        user = User.objects.create_user('agent', password='x')
+        with self.assertRaises(PermissionDenied):
+            pdf_jobs.submit('suivi_dashboard', {}, user)
+        self.assertFalse(PdfJob.objects.exists())
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'x')
+        pdf_jobs.check_access('suivi_dashboard', admin, {})
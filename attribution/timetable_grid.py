@@ -0,0 +1,277 @@
+"""
+Grille d'horaire précalculée
+
+TimetableGrid charge les entrées d'horaire en une requête et les range dans
+un tableau plat indexé par (classe, jour, créneau). Le PDF d'horaire, la
+grille HTML et l'API JSON lisent tous la même grille : la mise en page
+(colonnes par niveau, créneau par défaut des entrées sans créneau...) n'est
+calculée qu'à un seul endroit.
+"""
+import re
+from datetime import timedelta
+from functools import lru_cache
+
+from django.db.models import Q
+
+
+DAYS = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi']
+LEVELS = ['L1', 'L2', 'L3', 'M1', 'M2']
+DEFAULT_SLOTS = [('08h00-12h00', 'AM'), ('13h00-17h00', 'PM')]
+
+_CLASS_KEY = re.compile(r'^(L[1-3]|M[1-2])[A-Z]+$')
+
+# Colonnes lues par la requête unique de la grille
+ENTRY_FIELDS = (
+    'id',
+    'jour',
+    'creneau__code',
+    'salle',
+    'salle_link__code',
+    'attribution__code_ue__code_ue',
+    'attribution__code_ue__intitule_ue',
+    'attribution__code_ue__intitule_ec',
+    'attribution__code_ue__classe',
+    'attribution__matricule__nom_complet',
+    'attribution__matricule__grade',
+)
+
+
+@lru_cache(maxsize=2048)
+def class_key(classe):
+    """Clé de colonne d'une classe (ex: 'l1 bc' -> 'L1BC'), None si le format est inconnu"""
+    if not classe:
+        return None
+    value = classe.upper().strip().replace(' ', '')
+    return value if _CLASS_KEY.match(value) else None
+
+
+def level_of(classe):
+    """Niveau (L1..M2) par lequel commence une classe, ou None"""
+    value = (classe or '')[:2].upper()
+    return value if value in LEVELS else None
+
+
+def timetable_slots(type_horaire='cours', section_code=None):
+    """
+    Créneaux affichés dans la grille, dans l'ordre
+
+    Le créneau 'TJ' n'est jamais affiché : c'est un raccourci de saisie qui
+    crée une entrée AM et une entrée PM.
+
+    Returns:
+        list: (libellé, code)
+    """
+    from reglage.registry import reference_data
+
+    if type_horaire not in ('cours', 'examens', 'examen'):
+        type_horaire = None
+    creneaux = reference_data().creneaux_pour(type_horaire, section_code)
+    slots = [(c.get_format_court(), c.code) for c in creneaux if c.code != 'TJ']
+    return slots or list(DEFAULT_SLOTS)
+
+
+def section_classes(section_code=None):
+    """Codes des classes d'une section (toutes les classes si section_code est vide)"""
+    from reglage.registry import reference_data
+
+    return reference_data().classes_de_section(section_code)
+
+
+def week_days(week_start):
+    """Date de chaque jour (lundi à samedi) de la semaine contenant week_start"""
+    monday = week_start - timedelta(days=week_start.weekday())
+    return {day: monday + timedelta(days=offset) for offset, day in enumerate(DAYS)}
+
+
+class TimetableGrid:
+    """
+    Entrées d'horaire rangées par (classe, jour, créneau)
+
+    Les cellules sont stockées dans une liste plate de
+    len(classes) * len(days) * len(slots) éléments ; une cellule non vide
+    contient les indices de ses entrées dans items.
+    """
+
+    def __init__(self, classes, slots, day_dates=None, days=DAYS):
+        self.classes = sorted(set(classes))
+        self.slots = list(slots)
+        self.days = list(days)
+        self.day_dates = day_dates or {}
+        self.items = []
+        self.entry_count = 0  # entrées reçues, y compris celles hors grille
+        self.levels_with_entries = set()
+        self._class_index = {classe: i for i, classe in enumerate(self.classes)}
+        self._day_index = {day.lower(): i for i, day in enumerate(self.days)}
+        self._slot_indexes = {}
+        for i, (_, code) in enumerate(self.slots):
+            self._slot_indexes.setdefault((code or '').upper(), []).append(i)
+        # Entrée sans créneau : premier créneau et créneau AM
+        self._default_slots = sorted({0, *self._slot_indexes.get('AM', [])}) if self.slots else []
+        self._cells = [None] * (len(self.classes) * len(self.days) * len(self.slots))
+
+    @classmethod
+    def build(cls, entries, classes=(), slots=None, day_dates=None):
+        """
+        Construit la grille à partir d'un queryset de ScheduleEntry
+
+        Args:
+            entries: queryset de ScheduleEntry (filtré par l'appelant)
+            classes: codes de classe affichés même sans entrée
+            slots: liste de (libellé, code) ; timetable_slots() par défaut
+            day_dates: dict jour -> date pour les libellés
+
+        Returns:
+            TimetableGrid
+        """
+        rows = list(entries.values_list(*ENTRY_FIELDS))
+        classe_position = ENTRY_FIELDS.index('attribution__code_ue__classe')
+        columns = set(classes)
+        for row in rows:
+            key = class_key(row[classe_position])
+            if key:
+                columns.add(key)
+        grid = cls(columns, slots if slots is not None else timetable_slots(), day_dates)
+        for row in rows:
+            grid.add(dict(zip(ENTRY_FIELDS, row)))
+        return grid
+
+    @classmethod
+    def for_week(cls, week_start, section_code=None, type_horaire='cours', annee=None):
+        """
+        Grille d'une section pour la semaine contenant week_start
+
+        Args:
+            week_start: date - un jour de la semaine
+            section_code: section des classes, des cours ou des enseignants
+            type_horaire: 'cours' ou 'examens'
+            annee: année académique (optionnelle)
+        """
+        from .models import ScheduleEntry
+
+        day_dates = week_days(week_start)
+        entries = ScheduleEntry.objects.filter(
+            date_cours__gte=day_dates['Lundi'], date_cours__lte=day_dates['Samedi'],
+            type_horaire='examen' if type_horaire in ('examens', 'examen') else 'cours',
+        )
+        if section_code:
+            entries = entries.filter(
+                Q(attribution__matricule__section=section_code)
+                | Q(attribution__code_ue__section=section_code)
+            )
+        if annee:
+            entries = entries.filter(annee_academique=annee)
+        return cls.build(
+            entries.order_by('id'),
+            classes=section_classes(section_code),
+            slots=timetable_slots(type_horaire, section_code),
+            day_dates=day_dates,
+        )
+
+    def _index(self, class_idx, day_idx, slot_idx):
+        return (class_idx * len(self.days) + day_idx) * len(self.slots) + slot_idx
+
+    def add(self, values):
+        """Range une entrée (dict des ENTRY_FIELDS) dans ses cellules"""
+        self.entry_count += 1
+        classe = values['attribution__code_ue__classe']
+        level = level_of(classe)
+        if level:
+            self.levels_with_entries.add(level)
+        class_idx = self._class_index.get(class_key(classe))
+        day_idx = self._day_index.get(values['jour'])
+        if class_idx is None or day_idx is None:
+            return
+        creneau = (values['creneau__code'] or '').strip().upper()
+        slot_indexes = self._slot_indexes.get(creneau, []) if creneau else self._default_slots
+        if not slot_indexes:
+            return
+
+        item = len(self.items)
+        self.items.append({
+            'id': values['id'],
+            'code_ue': values['attribution__code_ue__code_ue'] or '',
+            'intitule_ue': values['attribution__code_ue__intitule_ue'] or '',
+            'intitule_ec': values['attribution__code_ue__intitule_ec'] or '',
+            'classe': classe,
+            'enseignant': values['attribution__matricule__nom_complet'] or '',
+            'grade': values['attribution__matricule__grade'] or '',
+            'creneau': values['creneau__code'],
+            'salle': values['salle_link__code'] or values['salle'] or '',
+        })
+        for slot_idx in slot_indexes:
+            index = self._index(class_idx, day_idx, slot_idx)
+            if self._cells[index] is None:
+                self._cells[index] = []
+            self._cells[index].append(item)
+
+    def has_level(self, level):
+        return level in self.levels_with_entries
+
+    def levels(self):
+        """Niveaux ayant au moins une entrée, dans l'ordre L1..M2"""
+        return [level for level in LEVELS if level in self.levels_with_entries]
+
+    def columns(self, level):
+        """Classes affichées pour un niveau"""
+        return [classe for classe in self.classes if classe.startswith(level)]
+
+    def cell(self, classe, day, slot_code):
+        """Entrées d'une cellule (jour en toutes lettres, code de créneau)"""
+        class_idx = self._class_index.get(classe)
+        day_idx = self._day_index.get(day.lower())
+        if class_idx is None or day_idx is None:
+            return []
+        items = []
+        for slot_idx in self._slot_indexes.get((slot_code or '').upper(), []):
+            items += [self.items[i] for i in self._cells[self._index(class_idx, day_idx, slot_idx)] or []]
+        return items
+
+    def rows(self, level):
+        """
+        Lignes jour x créneau d'un niveau
+
+        Returns:
+            list: dicts day, date, first (premier créneau du jour), slot_label,
+            slot_code et cells (liste d'entrées par colonne de columns(level))
+        """
+        class_indexes = [self._class_index[classe] for classe in self.columns(level)]
+        rows = []
+        for day_idx, day in enumerate(self.days):
+            for slot_idx, (slot_label, slot_code) in enumerate(self.slots):
+                rows.append({
+                    'day': day,
+                    'date': self.day_dates.get(day),
+                    'first': slot_idx == 0,
+                    'slot_label': slot_label,
+                    'slot_code': slot_code,
+                    'cells': [
+                        [self.items[i] for i in self._cells[self._index(class_idx, day_idx, slot_idx)] or []]
+                        for class_idx in class_indexes
+                    ],
+                })
+        return rows
+
+    def as_dict(self):
+        """Représentation JSON : une grille par niveau, cellules par indices d'entrées"""
+        levels = {}
+        for level in self.levels():
+            class_indexes = [self._class_index[classe] for classe in self.columns(level)]
+            levels[level] = {
+                'columns': self.columns(level),
+                'cells': [
+                    [
+                        [self._cells[self._index(class_idx, day_idx, slot_idx)] or [] for class_idx in class_indexes]
+                        for slot_idx in range(len(self.slots))
+                    ]
+                    for day_idx in range(len(self.days))
+                ],
+            }
+        return {
+            'days': [
+                {'jour': day, 'date': self.day_dates[day].isoformat() if day in self.day_dates else None}
+                for day in self.days
+            ],
+            'slots': [{'libelle': label, 'code': code} for label, code in self.slots],
+            'levels': levels,
+            'entries': self.items,
+        }
@@ -0,0 +1,578 @@
+"""
+Génération automatique d'horaires de cours (placement sous contraintes)
+
+Les séances à placer sont déduites du volume horaire de chaque UE
+(CMI + TD/TP), diminué des heures déjà programmées dans l'année. Chaque
+séance reçoit un (date, créneau) et une salle tels que :
+
+- l'enseignant, la classe et la salle sont libres (horaires existants,
+  séances déjà placées, absences autorisées de l'enseignant) ;
+- la salle est disponible et assez grande pour l'effectif de la classe ;
+- une attribution a au plus une séance par jour et au plus
+  `max_par_semaine` séances par semaine.
+
+L'occupation est tenue dans des bitsets (un entier Python par enseignant,
+classe et salle, un bit par (date, créneau)) : le domaine d'une séance est
+un ET de quelques masques. Le solveur place d'abord la séance au plus petit
+domaine, propage le placement aux séances du même enseignant ou de la même
+classe, et, quand un domaine devient vide, tente de déplacer une séance
+déjà placée qui bloque. Il s'arrête au budget de temps : les séances non
+placées sont rapportées, jamais forcées.
+
+Le cœur (TimetableProblem, TimetableSolver) n'utilise pas Django ;
+build_problem() charge les données et schedule_entries() produit les
+ScheduleEntry à enregistrer avec bulk_upsert_entries().
+"""
+import math
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+
+JOURS = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi']
+
+
+def _bits(mask):
+    """Indices des bits à 1 d'un masque, dans l'ordre croissant"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class Slot:
+    """Case de placement : une date et un créneau"""
+
+    __slots__ = ('index', 'date', 'creneau_id', 'hours')
+
+    def __init__(self, index, date, creneau_id, hours):
+        self.index = index
+        self.date = date
+        self.creneau_id = creneau_id
+        self.hours = hours
+
+    @property
+    def jour(self):
+        return JOURS[self.date.weekday()]
+
+
+class Room:
+    __slots__ = ('index', 'code', 'capacite')
+
+    def __init__(self, index, code, capacite=None):
+        self.index = index
+        self.code = code
+        self.capacite = capacite
+
+
+class Session:
+    """Séance à placer d'une attribution"""
+
+    __slots__ = ('index', 'attribution_id', 'teacher', 'classe', 'effectif', 'rooms', 'label')
+
+    def __init__(self, index, attribution_id, teacher, classe, effectif, rooms, label=''):
+        self.index = index
+        self.attribution_id = attribution_id
+        self.teacher = teacher
+        self.classe = classe
+        self.effectif = effectif
+        self.rooms = rooms
+        self.label = label
+
+
+class TimetableProblem:
+    """
+    Données d'un placement : cases, salles, séances et occupation existante
+
+    Args:
+        slots: liste de (date, creneau_id, heures) dans l'ordre de préférence
+        rooms: liste de (code, capacité ou None)
+        max_par_semaine: int - séances d'une même attribution par semaine
+    """
+
+    def __init__(self, slots, rooms, max_par_semaine=2):
+        self.max_par_semaine = max_par_semaine
+        # Séances qui ne tiennent pas dans la période : {attribution_id: nombre}
+        self.deferred = {}
+        self.slots = [Slot(i, day, creneau_id, hours) for i, (day, creneau_id, hours) in enumerate(slots)]
+        self.rooms = [Room(i, code, capacite) for i, (code, capacite) in enumerate(rooms)]
+        self.full = (1 << len(self.slots)) - 1
+        self.sessions = []
+
+        self.slot_index = {(slot.date, slot.creneau_id): slot.index for slot in self.slots}
+        self.room_index = {room.code: room.index for room in self.rooms}
+        self.day_masks = defaultdict(int)
+        self.week_masks = defaultdict(int)
+        for slot in self.slots:
+            self.day_masks[slot.date] |= 1 << slot.index
+            self.week_masks[self._week(slot.date)] |= 1 << slot.index
+
+        self.teacher_busy = defaultdict(int)
+        self.class_busy = defaultdict(int)
+        self.room_busy = [0] * len(self.rooms)
+        self._rooms_for = {}
+
+    @staticmethod
+    def _week(day):
+        return day - timedelta(days=day.weekday())
+
+    def mask_for(self, day=None, creneau_id=None):
+        """Masque des cases d'une date et/ou d'un créneau (None : toutes)"""
+        mask = 0
+        for slot in self.slots:
+            if (day is None or slot.date == day) and (creneau_id is None or slot.creneau_id == creneau_id):
+                mask |= 1 << slot.index
+        return mask
+
+    def occupy(self, day, creneau_id, teacher=None, classe=None, room=None):
+        """Enregistre une occupation existante (horaire déjà programmé)"""
+        index = self.slot_index.get((day, creneau_id))
+        if index is None:
+            return
+        bit = 1 << index
+        if teacher:
+            self.teacher_busy[teacher] |= bit
+        if classe:
+            self.class_busy[classe] |= bit
+        if room in self.room_index:
+            self.room_busy[self.room_index[room]] |= bit
+
+    def block_teacher(self, teacher, mask):
+        """Rend des cases indisponibles pour un enseignant (absence)"""
+        self.teacher_busy[teacher] |= mask
+
+    def rooms_for(self, effectif):
+        """Indices des salles assez grandes, de la plus petite à la plus grande"""
+        rooms = self._rooms_for.get(effectif)
+        if rooms is None:
+            fitting = [
+                room for room in self.rooms
+                if not effectif or room.capacite is None or room.capacite >= effectif
+            ]
+            # Capacité inconnue en dernier : on préfère une salle dont on sait qu'elle suffit
+            fitting.sort(key=lambda room: (room.capacite is None, room.capacite or 0, room.code))
+            rooms = self._rooms_for[effectif] = tuple(room.index for room in fitting)
+        return rooms
+
+    def add_session(self, attribution_id, teacher, classe, effectif=0, label=''):
+        session = Session(
+            len(self.sessions), attribution_id, teacher, classe, effectif,
+            self.rooms_for(effectif) if self.rooms else (), label,
+        )
+        self.sessions.append(session)
+        return session
+
+
+class TimetableSolution:
+    """
+    Résultat du solveur
+
+    Attributs:
+        placements: {indice de séance: (indice de case, indice de salle ou None)}
+        unplaced: {indice de séance: motif}
+        elapsed: durée de résolution (secondes)
+        complete: faux si le budget de temps a interrompu la recherche
+    """
+
+    def __init__(self, problem, placements, unplaced, elapsed, complete, moves):
+        self.problem = problem
+        self.placements = placements
+        self.unplaced = unplaced
+        self.elapsed = elapsed
+        self.complete = complete
+        self.moves = moves
+
+    def items(self):
+        """(Session, Slot, Room ou None) des séances placées, triés par case"""
+        problem = self.problem
+        rows = [
+            (problem.sessions[s], problem.slots[slot], problem.rooms[room] if room is not None else None)
+            for s, (slot, room) in self.placements.items()
+        ]
+        rows.sort(key=lambda row: (row[1].index, row[0].classe or '', row[0].index))
+        return rows
+
+    def assignments(self):
+        """Séances placées : (attribution_id, date, creneau_id, code de salle ou None)"""
+        return [
+            (session.attribution_id, slot.date, slot.creneau_id, room.code if room else None)
+            for session, slot, room in self.items()
+        ]
+
+    def stats(self):
+        return {
+            'seances': len(self.problem.sessions),
+            'placees': len(self.placements),
+            'non_placees': len(self.unplaced),
+            'reportees': sum(self.problem.deferred.values()),
+            'deplacements': self.moves,
+            'duree_s': round(self.elapsed, 2),
+            'complet': self.complete,
+        }
+
+
+class TimetableSolver:
+    """
+    Placement des séances d'un TimetableProblem (voir l'en-tête du module)
+
+    Args:
+        problem: TimetableProblem
+        time_budget: float - secondes allouées à la recherche
+    """
+
+    NO_ROOM = 'aucune salle libre assez grande'
+    NO_SLOT = "aucun créneau libre pour l'enseignant et la classe"
+    TIMEOUT = 'budget de temps épuisé'
+
+    def __init__(self, problem, time_budget=5.0):
+        self.problem = problem
+        self.time_budget = time_budget
+
+        self.teacher_busy = defaultdict(int, problem.teacher_busy)
+        self.class_busy = defaultdict(int, problem.class_busy)
+        self.room_busy = list(problem.room_busy)
+        # Cases déjà prises par chaque attribution et séances placées par case
+        self.attribution_slots = defaultdict(int)
+        self.placements = {}
+        self.moves = 0
+
+        self.by_teacher = defaultdict(list)
+        self.by_class = defaultdict(list)
+        for session in problem.sessions:
+            self.by_teacher[session.teacher].append(session.index)
+            if session.classe:
+                self.by_class[session.classe].append(session.index)
+
+    # --- Domaines ----------------------------------------------------------
+
+    def _room_free(self, session):
+        """Cases où au moins une salle convenable est libre"""
+        if not self.problem.rooms:
+            return self.problem.full
+        free = 0
+        for room in session.rooms:
+            free |= ~self.room_busy[room]
+            if free & self.problem.full == self.problem.full:
+                break
+        return free & self.problem.full
+
+    def _spread_mask(self, attribution_id):
+        """Cases interdites pour une attribution : jours déjà utilisés, semaines pleines"""
+        taken = self.attribution_slots[attribution_id]
+        if not taken:
+            return 0
+        problem = self.problem
+        blocked = 0
+        weeks = defaultdict(int)
+        for index in _bits(taken):
+            day = problem.slots[index].date
+            blocked |= problem.day_masks[day]
+            weeks[problem._week(day)] += 1
+        for week, count in weeks.items():
+            if count >= problem.max_par_semaine:
+                blocked |= problem.week_masks[week]
+        return blocked
+
+    def domain(self, session, rooms=True):
+        mask = self.problem.full & ~self.teacher_busy[session.teacher] & ~self._spread_mask(session.attribution_id)
+        if session.classe:
+            mask &= ~self.class_busy[session.classe]
+        if rooms and mask:
+            mask &= self._room_free(session)
+        return mask
+
+    # --- Placement ---------------------------------------------------------
+
+    def _best_room(self, session, index):
+        bit = 1 << index
+        for room in session.rooms:
+            if not self.room_busy[room] & bit:
+                return room
+        return None
+
+    def _place(self, session, index, room):
+        bit = 1 << index
+        self.teacher_busy[session.teacher] |= bit
+        if session.classe:
+            self.class_busy[session.classe] |= bit
+        if room is not None:
+            self.room_busy[room] |= bit
+        self.attribution_slots[session.attribution_id] |= bit
+        self.placements[session.index] = (index, room)
+
+    def _unplace(self, session):
+        index, room = self.placements.pop(session.index)
+        clear = ~(1 << index)
+        self.teacher_busy[session.teacher] &= clear
+        if session.classe:
+            self.class_busy[session.classe] &= clear
+        if room is not None:
+            self.room_busy[room] &= clear
+        self.attribution_slots[session.attribution_id] &= clear
+        return index, room
+
+    def _neighbours(self, session):
+        found = set(self.by_teacher[session.teacher])
+        if session.classe:
+            found.update(self.by_class[session.classe])
+        found.discard(session.index)
+        return found
+
+    def _score(self, session, index, open_domains, neighbours):
+        """Coût d'une case : séances voisines privées de cette case, charge du jour de la classe"""
+        bit = 1 << index
+        lost = sum(1 for other in neighbours if open_domains.get(other, 0) & bit)
+        day_load = 0
+        if session.classe:
+            day_mask = self.problem.day_masks[self.problem.slots[index].date]
+            day_load = bin(self.class_busy[session.classe] & day_mask).count('1')
+        return (lost + 2 * day_load, index)
+
+    def _choose(self, session, mask, open_domains):
+        neighbours = self._neighbours(session)
+        return min(_bits(mask), key=lambda index: self._score(session, index, open_domains, neighbours))
+
+    def _repair(self, session):
+        """
+        Place une séance sans case libre en déplaçant une seule séance bloquante
+
+        Returns:
+            Session: la séance déplacée, ou None si aucun placement n'a été trouvé
+        """
+        problem = self.problem
+        static = problem.full & ~problem.teacher_busy[session.teacher]
+        if session.classe:
+            static &= ~problem.class_busy[session.classe]
+        static &= ~self._spread_mask(session.attribution_id)
+
+        placed_at = defaultdict(list)
+        for other in self._neighbours(session):
+            if other in self.placements:
+                placed_at[self.placements[other][0]].append(other)
+
+        for index in _bits(static):
+            blockers = placed_at.get(index, [])
+            if len(blockers) != 1:
+                continue
+            blocker = problem.sessions[blockers[0]]
+            old_index, old_room = self._unplace(blocker)
+            room = self._best_room(session, index)
+            if room is None and problem.rooms:
+                self._place(blocker, old_index, old_room)
+                continue
+            self._place(session, index, room)
+            alternatives = self.domain(blocker) & ~(1 << old_index)
+            if alternatives:
+                new_index = min(_bits(alternatives))
+                self._place(blocker, new_index, self._best_room(blocker, new_index))
+                self.moves += 1
+                return blocker
+            self._unplace(session)
+            self._place(blocker, old_index, old_room)
+        return None
+
+    def solve(self):
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        problem = self.problem
+        unplaced = {}
+        open_domains = {session.index: self.domain(session, rooms=False) for session in problem.sessions}
+        complete = True
+
+        while open_domains:
+            if time.perf_counter() > deadline:
+                complete = False
+                for index in open_domains:
+                    unplaced[index] = self.TIMEOUT
+                break
+
+            # Séance la plus contrainte d'abord (plus petit domaine)
+            current = min(open_domains, key=lambda index: (bin(open_domains[index]).count('1'), index))
+            del open_domains[current]
+            session = problem.sessions[current]
+
+            mask = self.domain(session)
+            changed = [session]
+            if mask:
+                index = self._choose(session, mask, open_domains)
+                self._place(session, index, self._best_room(session, index))
+            else:
+                moved = self._repair(session)
+                if moved is None:
+                    unplaced[current] = self.NO_ROOM if self.domain(session, rooms=False) else self.NO_SLOT
+                    continue
+                changed.append(moved)
+
+            # Propagation aux séances du même enseignant ou de la même classe
+            for placed in changed:
+                for other in self._neighbours(placed):
+                    if other in open_domains:
+                        open_domains[other] = self.domain(problem.sessions[other], rooms=False)
+
+        return TimetableSolution(
+            problem, dict(self.placements), unplaced, time.perf_counter() - start, complete, self.moves,
+        )
+
+
+def _hours(creneau):
+    """Durée d'un créneau en heures"""
+    debut = creneau.heure_debut.hour * 60 + creneau.heure_debut.minute
+    fin = creneau.heure_fin.hour * 60 + creneau.heure_fin.minute
+    return max(fin - debut, 0) / 60
+
+
+def build_problem(section_code, date_debut, date_fin, annee, indisponibilites=(), max_par_semaine=2):
+    """
+    Charge un problème de placement pour les cours d'une section
+
+    Args:
+        section_code: code de section (classes, cours ou enseignants de la section)
+        date_debut, date_fin: dates - période à remplir (dimanches exclus)
+        annee: code de l'année académique
+        indisponibilites: (matricule, date ou None, code de créneau ou None)
+            supplémentaires, en plus des absences autorisées enregistrées
+        max_par_semaine: int - séances d'une même attribution par semaine ;
+            les séances au-delà sont reportées (problem.deferred)
+
+    Returns:
+        tuple: (TimetableProblem, {attribution_id: Attribution})
+    """
+    from django.db.models import Q
+    from reglage.models import Salle
+    from reglage.registry import reference_data
+    from .availability import class_size, class_sizes, teacher_absences
+    from .models import Attribution, ScheduleEntry
+    from .occupancy import OccupancyIndex
+
+    creneaux = [creneau for creneau in reference_data().creneaux_pour('cours') if creneau.code != 'TJ']
+    days = [
+        date_debut + timedelta(days=offset)
+        for offset in range((date_fin - date_debut).days + 1)
+        if (date_debut + timedelta(days=offset)).weekday() < len(JOURS)
+    ]
+    problem = TimetableProblem(
+        [(day, creneau.pk, _hours(creneau)) for day in days for creneau in creneaux],
+        Salle.objects.filter(est_disponible=True).order_by('code').values_list('code', 'capacite'),
+        max_par_semaine=max_par_semaine,
+    )
+
+    # Occupation existante de la période (toutes sections : enseignants et salles sont partagés)
+    index = OccupancyIndex.load(date_debut, date_fin)
+    for (day, creneau_id), teachers, rooms, classes in index.occupied_slots():
+        for teacher in teachers:
+            problem.occupy(day, creneau_id, teacher=teacher)
+        for room in rooms:
+            problem.occupy(day, creneau_id, room=room)
+        for classe in classes:
+            problem.occupy(day, creneau_id, classe=classe)
+
+    attributions = list(
+        Attribution.objects.filter(annee_academique=annee, code_ue__isnull=False, matricule__isnull=False)
+        .filter(
+            Q(code_ue__section=section_code)
+            | Q(matricule__section=section_code)
+            | Q(code_ue__classe__in=reference_data().classes_de_section(section_code))
+        )
+        .select_related('code_ue', 'matricule')
+        .order_by('code_ue__classe', 'code_ue__code_ue', 'pk')
+    )
+    if not attributions:
+        return problem, {}
+
+    # Volume d'une UE partagé entre ses enseignants ; heures déjà programmées dans l'année
+    teachers_per_ue = defaultdict(int)
+    for attribution in attributions:
+        teachers_per_ue[attribution.code_ue_id] += 1
+    scheduled = defaultdict(float)
+    for attribution_id, heure_debut, heure_fin in ScheduleEntry.objects.filter(
+        attribution__in=attributions, annee_academique=annee, type_horaire='cours', creneau__isnull=False,
+    ).values_list('attribution_id', 'creneau__heure_debut', 'creneau__heure_fin'):
+        scheduled[attribution_id] += max(
+            (heure_fin.hour * 60 + heure_fin.minute) - (heure_debut.hour * 60 + heure_debut.minute), 0
+        ) / 60
+
+    effectifs = class_sizes(annee)
+
+    # Absences des enseignants concernés
+    matricules = {attribution.matricule_id for attribution in attributions}
+    absences = teacher_absences(matricules, date_debut, date_fin)
+    for matricule, debut, fin in absences:
+        for day in days:
+            if debut <= day <= fin:
+                problem.block_teacher(matricule, problem.day_masks[day])
+    creneau_ids = {creneau.code: creneau.pk for creneau in creneaux}
+    for matricule, day, creneau_code in indisponibilites:
+        creneau_id = creneau_ids.get(creneau_code) if creneau_code else None
+        if creneau_code and creneau_id is None:
+            continue
+        problem.block_teacher(matricule, problem.mask_for(day, creneau_id))
+
+    weeks = len(problem.week_masks)
+    slot_hours = (sum(_hours(creneau) for creneau in creneaux) / len(creneaux)) if creneaux else 0
+    for attribution in attributions:
+        course = attribution.code_ue
+        budget = float((course.cmi or 0) + (course.td_tp or 0)) / teachers_per_ue[course.pk]
+        remaining = budget - scheduled[attribution.pk]
+        if remaining <= 0 or not slot_hours:
+            continue
+        effectif = class_size(effectifs, course.classe)
+        needed = math.ceil(remaining / slot_hours - 1e-9)
+        count = min(needed, max_par_semaine * weeks, len(days))
+        if needed > count:
+            problem.deferred[attribution.pk] = needed - count
+        for _ in range(count):
+            problem.add_session(
+                attribution.pk, attribution.matricule_id, course.classe, effectif,
+                label=f"{course.code_ue} - {attribution.matricule.nom_complet}",
+            )
+    return problem, {attribution.pk: attribution for attribution in attributions}
+
+
+def schedule_entries(assignments, annee, attributions=None, remarques='Généré automatiquement', type_horaire='cours'):
+    """
+    ScheduleEntry non enregistrés pour des séances placées
+
+    Comme pour la saisie par plage de dates, semaine_debut et date_cours
+    portent la date exacte de la séance.
+
+    Args:
+        assignments: liste de (attribution_id, date, creneau_id, code de salle ou None)
+            (TimetableSolution.assignments())
+        annee: code de l'année académique
+        attributions: {attribution_id: Attribution} (chargées en une requête sinon)
+        type_horaire: 'cours' ou 'examen'
+    """
+    from reglage.models import Creneau, Salle
+    from reglage.registry import reference_data
+    from .models import Attribution, ScheduleEntry
+
+    if attributions is None:
+        attributions = Attribution.objects.select_related('matricule', 'code_ue').in_bulk(
+            {attribution_id for attribution_id, _, _, _ in assignments}
+        )
+    creneaux = Creneau.objects.in_bulk({creneau_id for _, _, creneau_id, _ in assignments})
+    salles = Salle.objects.in_bulk({code for _, _, _, code in assignments if code}, field_name='code')
+    semaines = reference_data().semaines
+
+    entries = []
+    for attribution_id, day, creneau_id, salle_code in assignments:
+        attribution = attributions.get(attribution_id)
+        if attribution is None:
+            continue
+        semaine = next((s for s in semaines if s.date_debut <= day <= s.date_fin), None)
+        entries.append(ScheduleEntry(
+            organisation=attribution.organisation,
+            attribution=attribution,
+            type_horaire=type_horaire,
+            annee_academique=annee,
+            semaine_debut=day,
+            date_fin=day,
+            date_cours=day,
+            numero_semaine=semaine.numero_semaine if semaine else None,
+            jour=JOURS[day.weekday()],
+            creneau=creneaux.get(creneau_id),
+            salle=salle_code,
+            salle_link=salles.get(salle_code) if salle_code else None,
+            remarques=remarques,
+        ))
+    return entries
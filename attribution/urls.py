@@ -22,7 +22,14 @@ urlpatterns = [
     path('edit-attribution/<int:attribution_id>/', views.edit_attribution, name='edit_attribution'),
     path('schedule/', views.schedule_builder, name='schedule_builder'),
     path('schedule/pdf/', views.schedule_pdf, name='schedule_pdf'),
+    path('schedule/grille/', views.schedule_grid, name='schedule_grid'),
+    path('api/schedule/grille/', views.api_schedule_grid, name='api_schedule_grid'),
+    path('api/schedule/creneaux-libres/', views.api_creneaux_libres, name='api_creneaux_libres'),
     path('schedule/save/', views.save_schedule_entries, name='save_schedule_entries'),
+    path('schedule/bulk-save/', views.bulk_save_schedule_entries, name='bulk_save_schedule_entries'),
+    path('schedule/generer/', views.generer_horaire, name='generer_horaire'),
+    path('schedule/generer-examens/', views.generer_examens, name='generer_examens'),
+    path('schedule/copier-semaine/', views.copier_semaine, name='copier_semaine'),
     
     # CRUD pour ScheduleEntry
     path('schedule/entry/list/', views.ScheduleEntryListView.as_view(), name='schedule_entry_list'),
@@ -43,9 +50,11 @@ urlpatterns = [
     
     # Impression des charges par section
     path('imprimer-charges-section/', views.imprimer_charges_section, name='imprimer_charges_section'),
+    path('imprimer-fiches-charges/', views.imprimer_fiches_charges, name='imprimer_fiches_charges'),
     
     # Import Excel des attributions
     path('import-excel-attributions/', views.import_excel_attributions, name='import_excel_attributions'),
+    path('import-excel-attributions/rejets/', views.import_rejections, name='import_rejections'),
     
     # Supprimer toutes les attributions (superuser uniquement)
     path('delete-all-attributions/', views.delete_all_attributions, name='delete_all_attributions'),
@@ -58,4 +67,9 @@ urlpatterns = [
     # PDFs et rapports de paiement
     path('paiement-pdf/<int:paiement_id>/', views.paiement_pdf, name='paiement_pdf'),
     path('rapport-paiements/<str:type_rapport>/', views.rapport_paiements, name='rapport_paiements'),
+    
+    # Génération des rapports PDF en arrière-plan
+    path('impressions/<str:report>/demande/', views.demander_pdf, name='demander_pdf'),
+    path('impressions/tache/<int:job_id>/', views.pdf_job_status, name='pdf_job_status'),
+    path('impressions/tache/<int:job_id>/telecharger/', views.pdf_job_download, name='pdf_job_download'),
 ]
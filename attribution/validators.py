@@ -1,8 +1,17 @@
 """
 Validators pour détecter les conflits dans les horaires
 """
+from collections import defaultdict
+from datetime import date
+
 from .models import ScheduleEntry
+from .occupancy import OccupancyIndex, OccupiedEntry, effective_date, week_bounds
 from django.core.exceptions import ValidationError
+from django.db.models import Q
+from tracking.tracing import get_tracer
+
+
+trace = get_tracer(__name__)
 
 
 class ScheduleConflictValidator:
@@ -23,12 +32,12 @@ class ScheduleConflictValidator:
         Returns:
             tuple: (bool, list) - (has_conflict, conflicting_entries)
         """
+        # Sonde de l'index unique (enseignant_matricule, date_effective, creneau)
         conflicts = ScheduleEntry.objects.filter(
-            attribution__matricule=enseignant,
-            jour=jour,
+            enseignant_matricule=getattr(enseignant, 'matricule', enseignant),
+            date_effective=effective_date(semaine, jour),
             creneau=creneau,
-            semaine_debut=semaine
-        ).select_related('attribution__code_ue')
+        ).select_related('attribution__code_ue', 'attribution__matricule')
         
         if exclude_id:
             conflicts = conflicts.exclude(id=exclude_id)
@@ -56,10 +65,9 @@ class ScheduleConflictValidator:
             return False, []
         
         conflicts = ScheduleEntry.objects.filter(
-            salle=salle,
-            jour=jour,
+            Q(salle=salle) | Q(salle_link__code=salle),
+            date_effective=effective_date(semaine, jour),
             creneau=creneau,
-            semaine_debut=semaine
         ).select_related('attribution__code_ue', 'attribution__matricule')
         
         if exclude_id:
@@ -85,10 +93,9 @@ class ScheduleConflictValidator:
             tuple: (bool, list) - (has_conflict, conflicting_entries)
         """
         conflicts = ScheduleEntry.objects.filter(
-            attribution__code_ue__classe=classe,
-            jour=jour,
+            classe_code=classe,
+            date_effective=effective_date(semaine, jour),
             creneau=creneau,
-            semaine_debut=semaine
         ).select_related('attribution__code_ue', 'attribution__matricule')
         
         if exclude_id:
@@ -99,10 +106,13 @@ class ScheduleConflictValidator:
         return False, []
     
     @classmethod
-    def validate_schedule_entry(cls, attribution, jour, creneau, semaine, salle=None, exclude_id=None):
+    def validate_schedule_entry(cls, attribution, jour, creneau, semaine, salle=None, exclude_id=None, index=None):
         """
         Valide un horaire contre tous les types de conflits
         
+        Si un index d'occupation est fourni, la vérification se fait en mémoire
+        sans aucune requête supplémentaire.
+        
         Args:
             attribution: Objet Attribution
             jour: str - jour de la semaine
@@ -110,6 +120,7 @@ class ScheduleConflictValidator:
             semaine: date - date de début de semaine
             salle: str - code de la salle (optionnel)
             exclude_id: int - ID de l'horaire à exclure (pour modification)
+            index: OccupancyIndex - index d'occupation préchargé (optionnel)
             
         Returns:
             dict: {
@@ -119,16 +130,66 @@ class ScheduleConflictValidator:
                 'conflicts': dict
             }
         """
-        print(f"\n>>> ScheduleConflictValidator.validate_schedule_entry appelé")
-        print(f"    Attribution: {attribution}")
-        print(f"    Enseignant: {attribution.matricule}")
-        print(f"    Classe: {attribution.code_ue.classe}")
-        print(f"    Jour: {jour}")
-        print(f"    Créneau: {creneau}")
-        print(f"    Semaine: {semaine}")
-        print(f"    Salle: {salle}")
-        print(f"    Exclude ID: {exclude_id}")
+        # 1. Vérifier conflit enseignant (BLOQUANT)
+        if index is not None:
+            slot = index.slot_for(semaine, jour, creneau)
+            teacher_conflicts = index.teacher_conflicts(slot, attribution.matricule_id, exclude_id)
+        else:
+            _, teacher_conflicts = cls.check_teacher_conflict(
+                attribution.matricule, jour, creneau, semaine, exclude_id
+            )
+        trace.event(
+            'validation.enseignant',
+            attribution=attribution.pk,
+            enseignant=attribution.matricule_id,
+            classe=lambda: attribution.code_ue.classe,
+            jour=jour,
+            creneau=creneau,
+            semaine=semaine,
+            salle=salle,
+            exclude_id=exclude_id,
+            conflits=len(teacher_conflicts),
+        )
+        
+        # 2. Vérifier conflit salle (BLOQUANT)
+        room_conflicts = []
+        if salle:
+            if index is not None:
+                room_conflicts = index.room_conflicts(slot, salle, exclude_id)
+            else:
+                _, room_conflicts = cls.check_room_conflict(
+                    salle, jour, creneau, semaine, exclude_id
+                )
         
+        # 3. Vérifier conflit classe (BLOQUANT)
+        classe = attribution.code_ue.classe
+        if index is not None:
+            class_conflicts = index.class_conflicts(slot, classe, exclude_id)
+        else:
+            _, class_conflicts = cls.check_class_conflict(
+                classe, jour, creneau, semaine, exclude_id
+            )
+        
+        return cls._build_result(attribution, salle, teacher_conflicts, room_conflicts, class_conflicts)
+    
+    @staticmethod
+    def _describe(conflict):
+        """Retourne un OccupiedEntry pour un ScheduleEntry ou un OccupiedEntry"""
+        if isinstance(conflict, OccupiedEntry):
+            return conflict
+        course = conflict.attribution.code_ue
+        return OccupiedEntry(
+            id=conflict.id,
+            code_ue=course.code_ue,
+            intitule_ue=course.intitule_ue,
+            classe=course.classe,
+            enseignant=conflict.attribution.matricule.nom_complet,
+            salle=conflict.salle,
+        )
+    
+    @classmethod
+    def _build_result(cls, attribution, salle, teacher_conflicts, room_conflicts, class_conflicts):
+        """Construit le dictionnaire de résultat à partir des conflits trouvés"""
         result = {
             'valid': True,
             'errors': [],
@@ -136,59 +197,86 @@ class ScheduleConflictValidator:
             'conflicts': {}
         }
         
-        # 1. Vérifier conflit enseignant (BLOQUANT)
-        print(f"\n>>> Vérification conflit enseignant...")
-        has_teacher_conflict, teacher_conflicts = cls.check_teacher_conflict(
-            attribution.matricule, jour, creneau, semaine, exclude_id
-        )
-        print(f"    Conflit enseignant? {has_teacher_conflict}")
-        if has_teacher_conflict:
-            print(f"    Nombre de conflits: {len(teacher_conflicts)}")
-        if has_teacher_conflict:
+        if teacher_conflicts:
             result['valid'] = False
-            conflict = teacher_conflicts[0]
+            conflict = cls._describe(teacher_conflicts[0])
             result['errors'].append(
                 f"⚠️ CONFLIT ENSEIGNANT : {attribution.matricule.nom_complet} est déjà programmé(e) "
-                f"pour le cours {conflict.attribution.code_ue.code_ue} "
-                f"({conflict.attribution.code_ue.intitule_ue}) "
-                f"avec la classe {conflict.attribution.code_ue.classe}"
+                f"pour le cours {conflict.code_ue} "
+                f"({conflict.intitule_ue}) "
+                f"avec la classe {conflict.classe}"
             )
             result['conflicts']['teacher'] = teacher_conflicts
         
-        # 2. Vérifier conflit salle (BLOQUANT)
-        if salle:
-            has_room_conflict, room_conflicts = cls.check_room_conflict(
-                salle, jour, creneau, semaine, exclude_id
+        if room_conflicts:
+            result['valid'] = False
+            conflict = cls._describe(room_conflicts[0])
+            result['errors'].append(
+                f"⚠️ CONFLIT SALLE : La salle {salle} est déjà occupée par "
+                f"{conflict.enseignant} "
+                f"pour le cours {conflict.code_ue} "
+                f"({conflict.classe})"
             )
-            if has_room_conflict:
-                result['valid'] = False
-                conflict = room_conflicts[0]
-                result['errors'].append(
-                    f"⚠️ CONFLIT SALLE : La salle {salle} est déjà occupée par "
-                    f"{conflict.attribution.matricule.nom_complet} "
-                    f"pour le cours {conflict.attribution.code_ue.code_ue} "
-                    f"({conflict.attribution.code_ue.classe})"
-                )
-                result['conflicts']['room'] = room_conflicts
+            result['conflicts']['room'] = room_conflicts
         
-        # 3. Vérifier conflit classe (BLOQUANT)
-        classe = attribution.code_ue.classe
-        has_class_conflict, class_conflicts = cls.check_class_conflict(
-            classe, jour, creneau, semaine, exclude_id
-        )
-        if has_class_conflict:
+        if class_conflicts:
             result['valid'] = False
-            conflict = class_conflicts[0]
+            conflict = cls._describe(class_conflicts[0])
             result['errors'].append(
-                f"⚠️ CONFLIT CLASSE : La classe {classe} a déjà le cours "
-                f"{conflict.attribution.code_ue.code_ue} "
-                f"({conflict.attribution.code_ue.intitule_ue}) "
-                f"avec {conflict.attribution.matricule.nom_complet}"
+                f"⚠️ CONFLIT CLASSE : La classe {attribution.code_ue.classe} a déjà le cours "
+                f"{conflict.code_ue} "
+                f"({conflict.intitule_ue}) "
+                f"avec {conflict.enseignant}"
             )
             result['conflicts']['class'] = class_conflicts
         
         return result
     
+    @classmethod
+    def validate_batch(cls, entries, index=None, exclude_ids=None):
+        """
+        Valide un lot d'horaires en mémoire contre un index d'occupation
+        
+        Chaque candidat est vérifié contre l'index puis y est ajouté, de sorte
+        que deux candidats du même lot qui se chevauchent sont aussi détectés.
+        
+        Args:
+            entries: liste de ScheduleEntry non enregistrés (attribution chargée)
+            index: OccupancyIndex (optionnel, chargé en une requête sinon)
+            exclude_ids: dict - {position dans le lot: ID de l'horaire à exclure}
+            
+        Returns:
+            list: un résultat (même format que validate_schedule_entry) par entrée
+        """
+        entries = list(entries)
+        if not entries:
+            return []
+        exclude_ids = exclude_ids or {}
+        
+        if index is None:
+            dates = [
+                effective_date(e.semaine_debut, e.jour, e.date_cours) for e in entries
+            ]
+            dates = [d for d in dates if d]
+            index = OccupancyIndex.load(min(dates), max(dates)) if dates else OccupancyIndex()
+        
+        results = []
+        for position, entry in enumerate(entries):
+            exclude_id = exclude_ids.get(position, entry.pk)
+            attribution = entry.attribution
+            slot = index.slot_for(entry.semaine_debut, entry.jour, entry.creneau_id, entry.date_cours)
+            salle = entry.salle or (entry.salle_link.code if entry.salle_link_id else None)
+            results.append(cls._build_result(
+                attribution,
+                salle,
+                index.teacher_conflicts(slot, attribution.matricule_id, exclude_id),
+                index.room_conflicts(slot, salle, exclude_id) if salle else [],
+                index.class_conflicts(slot, attribution.code_ue.classe, exclude_id),
+            ))
+            index.add(entry)
+        
+        return results
+    
     @classmethod
     def get_conflicts_for_week(cls, semaine):
         """
@@ -200,69 +288,100 @@ class ScheduleConflictValidator:
         Returns:
             dict: Rapport complet des conflits de la semaine
         """
-        entries = ScheduleEntry.objects.filter(
-            semaine_debut=semaine
-        ).select_related('attribution__matricule', 'attribution__code_ue')
+        lundi, dimanche = week_bounds(semaine)
+        return cls.get_conflicts(date_debut=lundi, date_fin=dimanche)
+    
+    @classmethod
+    def get_conflicts(cls, date_debut=None, date_fin=None, annee_academique=None, queryset=None):
+        """
+        Récupère tous les conflits d'une période en une seule requête
+        
+        Les horaires sont regroupés par (date, créneau) puis, dans chaque
+        groupe, par enseignant, salle et classe : tout groupe de plus d'un
+        horaire est un conflit.
+        
+        Args:
+            date_debut: date - premier jour de la période (optionnel)
+            date_fin: date - dernier jour de la période (optionnel)
+            annee_academique: str - code de l'année académique (optionnel)
+            queryset: QuerySet de ScheduleEntry à auditer (optionnel)
+            
+        Returns:
+            dict: Rapport complet des conflits de la période
+        """
+        entries = queryset if queryset is not None else ScheduleEntry.objects.all()
+        entries = entries.select_related(
+            'attribution__matricule', 'attribution__code_ue', 'creneau', 'salle_link'
+        )
+        if annee_academique:
+            entries = entries.filter(annee_academique=annee_academique)
+        if date_debut or date_fin:
+            # semaine_debut peut être le lundi d'un horaire placé plus tard dans la semaine
+            lundi, dimanche = week_bounds(date_debut or date_fin, date_fin or date_debut)
+            date_filter = Q(date_cours__range=(lundi, dimanche)) | Q(semaine_debut__range=(lundi, dimanche))
+            entries = entries.filter(date_filter)
+        
+        # Regrouper les horaires par (date, créneau)
+        buckets = defaultdict(list)
+        for entry in entries:
+            jour_date = effective_date(entry.semaine_debut, entry.jour, entry.date_cours)
+            if date_debut and (jour_date is None or jour_date < date_debut):
+                continue
+            if date_fin and (jour_date is None or jour_date > date_fin):
+                continue
+            buckets[(jour_date, entry.creneau_id)].append(entry)
         
         conflicts_report = {
             'teacher_conflicts': [],
             'room_conflicts': [],
             'class_conflicts': [],
-            'total_conflicts': 0
+            'total_conflicts': 0,
+            'entries_checked': sum(len(slot_entries) for slot_entries in buckets.values()),
+            'date_debut': date_debut,
+            'date_fin': date_fin,
+            'annee_academique': annee_academique,
         }
         
-        # Vérifier chaque entrée
-        checked_combinations = set()
+        def slot_order(slot):
+            jour_date, creneau_id = slot
+            return (jour_date is None, jour_date or date.min, creneau_id is None, creneau_id or 0)
         
-        for entry in entries:
-            # Créer une clé unique pour éviter de vérifier 2 fois la même combinaison
-            key = f"{entry.jour}_{entry.creneau}"
+        for slot in sorted(buckets, key=slot_order):
+            slot_entries = buckets[slot]
+            if len(slot_entries) < 2:
+                continue
             
-            if key not in checked_combinations:
-                checked_combinations.add(key)
-                
-                # Vérifier les doublons enseignants
-                teacher_entries = entries.filter(
-                    attribution__matricule=entry.attribution.matricule,
-                    jour=entry.jour,
-                    creneau=entry.creneau
-                )
-                if teacher_entries.count() > 1:
-                    conflicts_report['teacher_conflicts'].append({
-                        'teacher': entry.attribution.matricule.nom_complet,
-                        'jour': entry.jour,
-                        'creneau': entry.creneau,
-                        'entries': list(teacher_entries)
-                    })
-                
-                # Vérifier les doublons salles
-                if entry.salle:
-                    room_entries = entries.filter(
-                        salle=entry.salle,
-                        jour=entry.jour,
-                        creneau=entry.creneau
-                    )
-                    if room_entries.count() > 1:
-                        conflicts_report['room_conflicts'].append({
-                            'salle': entry.salle,
-                            'jour': entry.jour,
-                            'creneau': entry.creneau,
-                            'entries': list(room_entries)
-                        })
-                
-                # Vérifier les doublons classes
-                class_entries = entries.filter(
-                    attribution__code_ue__classe=entry.attribution.code_ue.classe,
-                    jour=entry.jour,
-                    creneau=entry.creneau
-                )
-                if class_entries.count() > 1:
-                    conflicts_report['class_conflicts'].append({
-                        'classe': entry.attribution.code_ue.classe,
-                        'jour': entry.jour,
-                        'creneau': entry.creneau,
-                        'entries': list(class_entries)
-                    })
+            jour_date = slot[0]
+            first = slot_entries[0]
+            base = {
+                'date': jour_date,
+                'jour': first.jour,
+                'creneau': first.creneau,
+            }
+            
+            by_teacher = defaultdict(list)
+            by_room = defaultdict(list)
+            by_class = defaultdict(list)
+            for entry in slot_entries:
+                by_teacher[entry.attribution.matricule_id].append(entry)
+                salle = entry.salle or (entry.salle_link.code if entry.salle_link else None)
+                if salle:
+                    by_room[salle].append(entry)
+                by_class[entry.attribution.code_ue.classe].append(entry)
+            
+            for matricule, grouped in by_teacher.items():
+                if matricule and len(grouped) > 1:
+                    conflicts_report['teacher_conflicts'].append(dict(
+                        base,
+                        teacher=grouped[0].attribution.matricule.nom_complet,
+                        entries=grouped,
+                    ))
+            for salle, grouped in by_room.items():
+                if len(grouped) > 1:
+                    conflicts_report['room_conflicts'].append(dict(base, salle=salle, entries=grouped))
+            for classe, grouped in by_class.items():
+                if classe and len(grouped) > 1:
+                    conflicts_report['class_conflicts'].append(dict(base, classe=classe, entries=grouped))
         
         conflicts_report['total_conflicts'] = (
             len(conflicts_report['teacher_conflicts']) +
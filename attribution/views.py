@@ -17,23 +17,28 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.template.loader import render_to_string
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from io import BytesIO
 from django.conf import settings
-from PIL import Image as PILImage, ImageDraw
 import sys, os
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static/images'))
 from static.images.header import create_header_table
 from .models import Cours_Attribution, Course, Teacher, Attribution, ScheduleEntry
-from reglage.models import Grade, Departement, Section, AnneeAcademique
+from reglage.models import AnneeAcademique
+from reglage.registry import reference_data
 from django.db import transaction
 from datetime import datetime
 import json
 import re
 import traceback
+import logging
 import pandas as pd
+from tracking.tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+trace = get_tracer(__name__)
 
 # Fonction pour ne garder que le nom de famille
 def truncate_teacher_name(full_name):
@@ -142,7 +147,7 @@ def attribution_list(request):
     departements = filter_queryset_by_organisation(Cours_Attribution.objects, request.user, field_name='section').values_list('departement', flat=True).distinct().order_by('departement')
     
     # Récupérer l'année académique en cours depuis le modèle AnneeAcademique
-    annee_courante = AnneeAcademique.objects.filter(est_en_cours=True).first()
+    annee_courante = reference_data().annee_courante
     if annee_courante:
         academic_year = annee_courante.code
     else:
@@ -936,26 +941,23 @@ def liste_charges(request):
     type_charge = request.GET.get('type_charge')
     code_ue = request.GET.get('code_ue')
     
-    # DEBUG: Afficher tous les paramètres reçus
-    print(f"DEBUG liste_charges - Tous les paramètres GET: {request.GET}")
-    print(f"DEBUG liste_charges - teacher_matricule: '{teacher_matricule}'")
-    print(f"DEBUG liste_charges - annee_academique: '{annee_academique}'")
-    print(f"DEBUG liste_charges - type_charge: '{type_charge}'")
-    print(f"DEBUG liste_charges - Attributions avant filtrage: {attributions.count()}")
+    trace.event(
+        'liste_charges.parametres',
+        teacher_matricule=teacher_matricule, annee_academique=annee_academique, type_charge=type_charge,
+        code_ue=code_ue, avant_filtrage=lambda: attributions.count(),
+    )
     
     # Appliquer les filtres
     if teacher_matricule:
         attributions = attributions.filter(matricule__matricule=teacher_matricule)
-        print(f"DEBUG liste_charges - Après filtre enseignant: {attributions.count()}")
     if annee_academique:
         attributions = attributions.filter(annee_academique=annee_academique)
-        print(f"DEBUG liste_charges - Après filtre année: {attributions.count()}")
     if type_charge:
-        # Vérifier les valeurs de type_charge existantes dans la base
-        types_existants = Attribution.objects.values_list('type_charge', flat=True).distinct()
-        print(f"DEBUG liste_charges - Types de charge existants dans la base: {list(types_existants)}")
         attributions = attributions.filter(type_charge=type_charge)
-        print(f"DEBUG liste_charges - Après filtre type_charge: {attributions.count()}")
+        trace.event(
+            'liste_charges.types_existants',
+            types=lambda: list(Attribution.objects.values_list('type_charge', flat=True).distinct()),
+        )
     if code_ue:
         # Recherche par code exact ou intitulé partiel
         attributions = attributions.filter(
@@ -993,7 +995,7 @@ def liste_charges(request):
     
     # Récupérer les années académiques depuis le modèle AnneeAcademique
     annees_academiques = AnneeAcademique.objects.all().order_by('-date_debut')
-    annee_courante = AnneeAcademique.objects.filter(est_en_cours=True).first()
+    annee_courante = reference_data().annee_courante
     
     # Fallback vers les années des attributions existantes si aucune année n'est configurée
     if not annees_academiques.exists():
@@ -1259,15 +1261,33 @@ def schedule_pdf(request):
     user = request.user
     user_org = get_user_organisation(user)
     
-    # Récupérer la désignation complète de la section depuis la base de données
+    # Cache des PDF : mêmes paramètres et mêmes versions des semaines => même fichier
+    from . import pdf_cache
+    from .models import ScheduleVersion
+    cache_params = cache_stamp = None
+    if pdf_cache.is_enabled():
+        cache_params = (
+            'schedule_pdf', type_horaire, classe, annee, week_start, section_code,
+            chef_section_id, chef_adjoint_id, attribution_id, user_org.pk if user_org else None,
+        )
+        try:
+            semaine_debut = datetime.strptime(week_start, '%Y-%m-%d').date() if week_start else None
+        except ValueError:
+            semaine_debut = None
+        cache_stamp = pdf_cache.with_expiry(ScheduleVersion.stamp(
+            [semaine_debut, semaine_debut + timedelta(days=5)] if semaine_debut else None
+        ))
+        cached = pdf_cache.get(cache_params, cache_stamp)
+        if cached:
+            try:
+                return pdf_cache.file_response(cached, f"horaire_{classe or 'classe'}_{annee or 'annee'}.pdf")
+            except OSError:
+                pass  # Évincé entre-temps : générer à nouveau
+    
+    # Désignation complète de la section (le code si inconnue)
     section_designation = ""
     if section_code:
-        from reglage.models import Section
-        try:
-            section_obj = Section.objects.get(CodeSection=section_code)
-            section_designation = section_obj.DesignationSection
-        except Section.DoesNotExist:
-            section_designation = section_code  # Fallback sur le code si non trouvé
+        section_designation = reference_data().section_designation(section_code)
     elif user_org:
         # Si pas de section_code spécifié, utiliser celle de l'organisation
         section_code = user_org.code
@@ -1322,35 +1342,9 @@ def schedule_pdf(request):
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=10, leftMargin=10, topMargin=20, bottomMargin=15)
     
-    # Colonnes pour chaque niveau - basées sur les classes autorisées (dynamique depuis la BDD)
-    colonnes_par_niveau = {
-        'L1': sorted([c for c in classes_autorisees if c.startswith('L1')]),
-        'L2': sorted([c for c in classes_autorisees if c.startswith('L2')]),
-        'L3': sorted([c for c in classes_autorisees if c.startswith('L3')]),
-        'M1': sorted([c for c in classes_autorisees if c.startswith('M1')]),
-        'M2': sorted([c for c in classes_autorisees if c.startswith('M2')]),
-    }
-
-    def get_col_key_from_classe(classe_val):
-        """Extraire la clé de colonne depuis le champ classe (ex: L1BC, L2MI, L1PHYTO, etc.)"""
-        if not classe_val:
-            return None
-        
-        # Supprimer tous les espaces et convertir en majuscules
-        classe_upper = classe_val.upper().strip().replace(' ', '')
-        
-        # Retourner la classe telle quelle si elle correspond au format niveau + mention
-        # Format: L1, L2, L3, M1, M2 suivi de lettres (ex: L1PHYTO, L1BC, M1INFO)
-        if re.match(r'^(L[1-3]|M[1-2])[A-Z]+$', classe_upper):
-            return classe_upper
-        
-        return None
-    
-    days = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi']
-    
     # Récupérer toutes les entries
     # Si aucune semaine ni année n'est spécifiée, afficher TOUTES les entrées (comme la liste)
-    print(f"PDF: Paramètres reçus - week_start='{week_start}', annee='{annee}'")
+    trace.event('schedule_pdf.parametres', week_start=week_start, annee=annee, classe=classe, section=section_code)
     
     # Base queryset - filtré par organisation si applicable (via section du cours ou enseignant)
     base_queryset = ScheduleEntry.objects.select_related('attribution__code_ue', 'attribution__matricule')
@@ -1362,11 +1356,10 @@ def schedule_pdf(request):
         )
     
     if not week_start and not annee:
-        print("PDF: Branche 1 - Aucun filtre")
+        # Aucun filtre : toutes les entrées
         all_entries = base_queryset.all()
-        print(f"PDF: Aucun filtre - Affichage de TOUTES les {all_entries.count()} entrées")
     elif week_start and not annee:
-        print("PDF: Branche 2 - Filtre par semaine uniquement")
+        # Filtre par semaine uniquement
         try:
             y, m, d = [int(x) for x in week_start.split('-')]
             semaine_date = datetime(y, m, d).date()
@@ -1377,20 +1370,14 @@ def schedule_pdf(request):
                 date_cours__gte=semaine_date,
                 date_cours__lte=semaine_fin
             )
-            print(f"PDF: Filtre semaine du {semaine_date} au {semaine_fin}, trouvé {all_entries.count()} entrées")
-            if all_entries.exists():
-                print("Entrées trouvées:")
-                for e in all_entries[:10]:
-                    print(f"  - {e.attribution.code_ue.classe} | {e.attribution.code_ue.code_ue} | {e.jour} | date_cours={e.date_cours}")
         except Exception as ex:
-            print(f"PDF: ERREUR dans branche 2 - {ex}")
+            logger.warning("schedule_pdf : semaine invalide %r (%s)", week_start, ex)
             all_entries = ScheduleEntry.objects.none()
     else:
-        print("PDF: Branche 3 - Filtre par année")
+        # Filtre par année, puis par semaine si fournie
         all_entries = base_queryset.filter(
             annee_academique=annee if annee else all_attributions.first().annee_academique if all_attributions.exists() else '',
         )
-        print(f"PDF: Après filtre année: {all_entries.count()} entrées")
         if week_start:
             try:
                 y, m, d = [int(x) for x in week_start.split('-')]
@@ -1402,10 +1389,8 @@ def schedule_pdf(request):
                     date_cours__gte=semaine_date,
                     date_cours__lte=semaine_fin
                 )
-                print(f"PDF: Après filtre semaine: {all_entries.count()} entrées")
             except Exception as ex:
-                print(f"PDF: ERREUR filtre semaine - {ex}")
-                pass
+                logger.warning("schedule_pdf : semaine invalide %r (%s)", week_start, ex)
 
     def footer(canvas, doc):
         canvas.saveState()
@@ -1415,24 +1400,20 @@ def schedule_pdf(request):
         canvas.drawRightString(A4[0]-20, 10, text)
         canvas.restoreState()
 
-    # Debug: Afficher le nombre total d'entrées après filtrage
-    print(f"\n=== TOTAL ENTREES APRES FILTRAGE ===")
-    print(f"Nombre total d'entrées: {all_entries.count()}")
-    if all_entries.exists():
-        print("Exemples d'entrees:")
-        for e in all_entries[:5]:
-            creneau_info = f"{e.creneau.code}" if e.creneau else "None"
-            print(f"  - ID={e.id} | classe={e.attribution.code_ue.classe} | code={e.attribution.code_ue.code_ue} | jour={e.jour} | creneau={creneau_info} | date_cours={e.date_cours}")
-    else:
-        # Si aucune entrée trouvée, afficher TOUTES les entrées de la base
-        print("\n[ATTENTION] AUCUNE ENTREE TROUVEE AVEC LES FILTRES!")
-        all_in_db = ScheduleEntry.objects.all()
-        print(f"Total dans la base de donnees: {all_in_db.count()}")
-        if all_in_db.exists():
-            print("Toutes les entrees disponibles:")
-            for e in all_in_db[:10]:
-                creneau_info = f"{e.creneau.code}" if e.creneau else "None"
-                print(f"  - ID={e.id} | classe={e.attribution.code_ue.classe} | code={e.attribution.code_ue.code_ue} | jour={e.jour} | creneau={creneau_info} | date_cours={e.date_cours} | semaine_debut={e.semaine_debut}")
+    if trace.enabled:
+        # Diagnostic uniquement : ces requêtes ne sont exécutées que pour une requête tracée
+        sample_fields = ('id', 'attribution__code_ue__classe', 'attribution__code_ue__code_ue', 'jour', 'creneau__code', 'date_cours')
+        trace.event(
+            'schedule_pdf.entrees',
+            total=all_entries.count(),
+            exemples=list(all_entries.values_list(*sample_fields)[:5]),
+        )
+        if not all_entries.exists():
+            trace.event(
+                'schedule_pdf.aucune_entree',
+                total_base=ScheduleEntry.objects.count(),
+                exemples_base=list(ScheduleEntry.objects.values_list(*sample_fields, 'semaine_debut')[:10]),
+            )
 
     elements = []
     styles = getSampleStyleSheet()
@@ -1442,6 +1423,27 @@ def schedule_pdf(request):
     ue_title_style = ParagraphStyle('UETitle', parent=styles['Normal'], fontSize=8, alignment=1, wordWrap=None, fontName='Times-Italic')
     teacher_style = ParagraphStyle('Teacher', parent=styles['Normal'], fontSize=8, alignment=1, wordWrap=None, fontName='Times-Roman')
     code_style = ParagraphStyle('Code', parent=styles['Normal'], fontSize=8, alignment=1, wordWrap=None, fontName='Times-Bold')
+    # Contenu des cellules de cours
+    cell_content_style = ParagraphStyle(
+        'CellContent',
+        parent=styles['Normal'],
+        fontSize=7,  # Taille de police légèrement réduite
+        leading=8,   # Espacement entre les lignes réduit
+        alignment=1,
+        wordWrap='CJK',
+        fontName='Times-Roman',
+        splitLongWords=False,
+        spaceShrinkage=0.85,  # Réduit encore plus l'espacement
+        maxSpace=20,  # Largeur maximale avant troncature
+        ellipsis='...',
+        leftIndent=0,
+        rightIndent=0,
+        firstLineIndent=0,
+        spaceBefore=0,
+        spaceAfter=0,
+        paragraphSpaceBefore=0,
+        paragraphSpaceAfter=0
+    )
     
     # Calculer les dates de début et fin de semaine pour le titre
     semaine_info = ""
@@ -1467,10 +1469,10 @@ def schedule_pdf(request):
             if semaine_obj:
                 numero_semaine_str = f"S{semaine_obj.numero_semaine}"
             
-            print(f"PDF: Plage automatique detectee du {premiere_entree.date_cours} au {derniere_entree.date_cours}")
+            trace.event('schedule_pdf.plage_auto', debut=premiere_entree.date_cours, fin=derniere_entree.date_cours)
         else:
             # Fallback : utiliser la semaine en cours
-            semaine_en_cours = SemaineCours.objects.filter(est_en_cours=True).first()
+            semaine_en_cours = reference_data().semaine_courante
             if semaine_en_cours:
                 week_start = semaine_en_cours.date_debut.strftime('%Y-%m-%d')
                 numero_semaine_str = f"S{semaine_en_cours.numero_semaine}"
@@ -1486,7 +1488,7 @@ def schedule_pdf(request):
             date_debut = date_reference - timedelta(days=jours_depuis_lundi)  # Lundi
             date_fin = date_debut + timedelta(days=5)  # Samedi
             
-            print(f"PDF: Date reference {date_reference}, Lundi de la semaine: {date_debut}, Samedi: {date_fin}")
+            trace.event('schedule_pdf.semaine', reference=date_reference, lundi=date_debut, samedi=date_fin)
             
             # Récupérer le numéro de semaine depuis SemaineCours
             from reglage.models import SemaineCours
@@ -1511,49 +1513,20 @@ def schedule_pdf(request):
             }
             for day, offset in days_map.items():
                 day_dates[day] = date_debut + timedelta(days=offset)
-                print(f"PDF: {day} = {day_dates[day]}")
         except:
             semaine_info = week_start
     
-    # Récupérer les créneaux depuis la table Creneau si disponible
-    from reglage.models import Creneau
-    
-    # Filtrer les créneaux selon le type d'horaire et la section
-    # IMPORTANT: Exclure le créneau 'TJ' car il ne doit jamais apparaître dans le PDF
-    # TJ est juste un raccourci pour créer des entrées AM et PM
-    if type_horaire == 'cours':
-        # Pour les cours, filtrer par type_creneau
-        creneaux_actifs = Creneau.objects.filter(
-            est_actif=True, 
-            type_creneau__in=['cours', 'les_deux']
-        ).exclude(code='TJ').order_by('ordre', 'heure_debut')
-    elif type_horaire == 'examens':
-        # Pour les examens, filtrer par type_creneau et section
-        if section_code:
-            creneaux_actifs = Creneau.objects.filter(
-                est_actif=True, 
-                type_creneau__in=['examen', 'les_deux'],
-                section__CodeSection=section_code
-            ).exclude(code='TJ').order_by('ordre', 'heure_debut')
-        else:
-            # Si pas de section spécifiée, tous les créneaux d'examens
-            creneaux_actifs = Creneau.objects.filter(
-                est_actif=True, 
-                type_creneau__in=['examen', 'les_deux']
-            ).exclude(code='TJ').order_by('ordre', 'heure_debut')
-    else:
-        # Par défaut, tous les créneaux actifs (sauf TJ)
-        creneaux_actifs = Creneau.objects.filter(est_actif=True).exclude(code='TJ').order_by('ordre', 'heure_debut')
+    # Créneaux de la table Réglage (sans TJ), ou AM/PM par défaut
+    from .timetable_grid import TimetableGrid, timetable_slots
+    slots = timetable_slots(type_horaire, section_code)
     
-    if creneaux_actifs.exists():
-        # Utiliser les créneaux de la table Réglage
-        slots = [(c.get_format_court(), c.code) for c in creneaux_actifs]
-    else:
-        # Fallback sur les créneaux par défaut
-        slots = [('08h00-12h00', 'AM'), ('13h00-17h00', 'PM')]
+    # Grille classe x jour x créneau construite en une requête pour tous les niveaux
+    with trace.span('schedule_pdf.grille'):
+        grid = TimetableGrid.build(all_entries.order_by('id'), classes_autorisees, slots, day_dates)
+    trace.event('schedule_pdf.niveaux', niveaux=grid.levels, entrees=grid.entry_count, placees=lambda: len(grid.items))
     
     # Vérifier s'il y a des entrées avant de générer le PDF
-    if not all_entries.exists():
+    if not grid.entry_count:
         from django.contrib import messages
         messages.warning(request, "[ATTENTION] Aucun horaire trouvé avec les critères sélectionnés. Veuillez vérifier vos filtres.")
         from django.shortcuts import redirect
@@ -1562,18 +1535,8 @@ def schedule_pdf(request):
     # Boucle sur chaque niveau pour créer une page par niveau
     page_count = 0
     for niveau in niveaux_a_generer:
-        # Filtrer les horaires pour ce niveau - utiliser startswith pour être précis
-        entries_niveau = all_entries.filter(attribution__code_ue__classe__istartswith=niveau)
-        
-        # Debug: afficher le nombre d'horaires trouvés pour ce niveau
-        print(f"\n=== Niveau {niveau} ===")
-        print(f"Nombre d'horaires trouves: {entries_niveau.count()}")
-        for e in entries_niveau:
-            print(f"  - {e.attribution.code_ue.classe} | {e.attribution.code_ue.code_ue} | {e.attribution.matricule.nom_complet} | {e.jour} {e.creneau}")
-        
         # Ne générer la page que si des horaires existent pour ce niveau
-        if not entries_niveau.exists():
-            print(f"Niveau {niveau} ignore : aucun cours programme")
+        if not grid.has_level(niveau):
             continue
         
         # Ajouter un saut de page si ce n'est pas la première page
@@ -1621,141 +1584,63 @@ def schedule_pdf(request):
         elements.append(semestre_para)
         elements.append(Spacer(1, 4))
         
-        # Utiliser les colonnes fixes pour ce niveau comme base
-        col_keys_predefinies = colonnes_par_niveau.get(niveau, [])
-        
-        # D'abord, parcourir les entries pour détecter toutes les colonnes réelles
-        colonnes_detectees = set(col_keys_predefinies)  # Commencer avec les colonnes prédéfinies
-        by_col = {}
-        
-        # Parcourir tous les horaires et les organiser par colonne
-        for e in entries_niveau.select_related('attribution__matricule', 'attribution__code_ue'):
-            a = e.attribution
-            if not a:
-                continue
-            classe_val = a.code_ue.classe or ''
-            col_key = get_col_key_from_classe(classe_val)
-            
-            if col_key:
-                colonnes_detectees.add(col_key)
-                if col_key not in by_col:
-                    by_col[col_key] = []
-                by_col[col_key].append((e, a))
+        col_keys = grid.columns(niveau)
         
-        # Finaliser la liste des colonnes triées
-        col_keys = sorted(list(colonnes_detectees))
-        
-        # S'assurer que toutes les colonnes ont une liste (même vide)
-        for col in col_keys:
-            if col not in by_col:
-                by_col[col] = []
-        
-        # Debug: afficher le nombre d'entrées par colonne
-        print(f"PDF Niveau {niveau}: {len(col_keys)} colonnes detectees: {col_keys}")
-        for col in col_keys:
-            print(f"  Colonne {col}: {len(by_col[col])} entrées")
-        
-        # En-tête colonnes - s'assurer qu'il n'y a pas de None
-        table_header = ['Jour', 'Heures'] + [str(k) if k is not None else 'N/A' for k in col_keys]
+        # En-tête colonnes
+        table_header = ['Jour', 'Heures'] + col_keys
         
         # Construire les lignes du tableau
         data = [table_header]
-        for day in days:
-            # Afficher le jour avec la date en dessous
-            if day in day_dates:
-                day_label = f"<b>{day}</b><br/>{day_dates[day].strftime('%d/%m')}"
-            else:
-                day_label = f"<b>{day}</b>"
+        for grid_row in grid.rows(niveau):
+            row = []
             
-            for i, (slot_label, slot_code) in enumerate(slots):
-                row = []
-                
-                # Cellule Jour - seulement sur la première ligne du jour avec Paragraph pour formatage
-                if i == 0:
-                    row.append(Paragraph(day_label, cell_style))
+            # Cellule Jour - seulement sur la première ligne du jour, avec la date en dessous
+            if grid_row['first']:
+                if grid_row['date']:
+                    day_label = f"<b>{grid_row['day']}</b><br/>{grid_row['date'].strftime('%d/%m')}"
                 else:
-                    row.append('')  # Vide car sera fusionné
-                
-                # Cellule Heures - avec Times New Roman
-                row.append(Paragraph(slot_label, cell_style))
-                
-                # Ajouter une cellule pour chaque colonne de classe
-                for col in col_keys:
-                    items = []
-                    for e, a in by_col.get(col, []):
-                        jour_label = day.lower()
-                        
-                        # Vérifier que l'entry correspond au jour et créneau actuel
-                        # e.creneau est maintenant un objet Creneau (ForeignKey) ou None
-                        # Obtenir le code du créneau
-                        creneau_code = e.creneau.code if e.creneau else None
-                        
-                        # Si le créneau est vide, afficher dans le premier créneau (AM) par défaut
-                        if not creneau_code or creneau_code.strip() == '':
-                            creneau_match = (slot_code == 'AM' or i == 0)
-                        else:
-                            # Comparaison flexible du code du créneau
-                            creneau_match = (
-                                creneau_code == slot_code or 
-                                creneau_code.upper() == slot_code or
-                                creneau_code.upper() == slot_code.upper()
-                            )
-                        
-                        if e.jour == jour_label and creneau_match:
-                            code = a.code_ue.code_ue or ''
-                            title = truncate_ue_title(a.code_ue.intitule_ue or '')
-                            ec = a.code_ue.intitule_ec or ''
-                            teacher_name = truncate_teacher_name(a.matricule.nom_complet or '')
-                            grade = a.matricule.grade or ''
-                            
-                            # Construire le texte avec EC si présent
-                            if ec:
-                                # Si EC existe, l'afficher après le titre de l'UE
-                                ec_truncated = truncate_ue_title(ec)
-                                if grade:
-                                    txt = f"<b>{code}</b><br/><i>{title}</i><br/><i>{ec_truncated}</i><br/>{grade} {teacher_name}"
-                                else:
-                                    txt = f"<b>{code}</b><br/><i>{title}</i><br/><i>{ec_truncated}</i><br/>{teacher_name}"
-                            else:
-                                # Pas d'EC, affichage normal
-                                if grade:
-                                    txt = f"<b>{code}</b><br/><i>{title}</i><br/>{grade} {teacher_name}"
-                                else:
-                                    txt = f"<b>{code}</b><br/>{title}<br/>{teacher_name}"
-                            items.append(txt)
+                    day_label = f"<b>{grid_row['day']}</b>"
+                row.append(Paragraph(day_label, cell_style))
+            else:
+                row.append('')  # Vide car sera fusionné
+            
+            # Cellule Heures - avec Times New Roman
+            row.append(Paragraph(grid_row['slot_label'], cell_style))
+            
+            # Une cellule par colonne de classe
+            for entries_cellule in grid_row['cells']:
+                items = []
+                for item in entries_cellule:
+                    code = item['code_ue']
+                    title = truncate_ue_title(item['intitule_ue'])
+                    ec = item['intitule_ec']
+                    teacher_name = truncate_teacher_name(item['enseignant'])
+                    grade = item['grade']
                     
-                    # Créer le contenu de la cellule - utiliser espace si vide
-                    if items:
-                        # Créer un style personnalisé pour le contenu de la cellule
-                        style = ParagraphStyle(
-                            'CellContent',
-                            parent=styles['Normal'],
-                            fontSize=7,  # Taille de police légèrement réduite
-                            leading=8,   # Espacement entre les lignes réduit
-                            alignment=1,
-                            wordWrap='CJK',
-                            fontName='Times-Roman',
-                            splitLongWords=False,
-                            spaceShrinkage=0.85,  # Réduit encore plus l'espacement
-                            maxSpace=20,  # Largeur maximale avant troncature
-                            ellipsis='...',
-                            # Réduire les marges
-                            leftIndent=0,
-                            rightIndent=0,
-                            firstLineIndent=0,
-                            spaceBefore=0,
-                            spaceAfter=0,
-                            # Espacement entre les paragraphes
-                            paragraphSpaceBefore=0,
-                            paragraphSpaceAfter=0
-                        )
-                        # Joindre les éléments avec des sauts de ligne et créer un seul Paragraph
-                        cell_content = '<br/><br/>'.join(items)
-                        row.append(Paragraph(cell_content, style))
+                    # Construire le texte avec EC si présent
+                    if ec:
+                        # Si EC existe, l'afficher après le titre de l'UE
+                        ec_truncated = truncate_ue_title(ec)
+                        if grade:
+                            txt = f"<b>{code}</b><br/><i>{title}</i><br/><i>{ec_truncated}</i><br/>{grade} {teacher_name}"
+                        else:
+                            txt = f"<b>{code}</b><br/><i>{title}</i><br/><i>{ec_truncated}</i><br/>{teacher_name}"
                     else:
-                        row.append(Paragraph('&nbsp;', cell_style))  # Espace insécable HTML
+                        # Pas d'EC, affichage normal
+                        if grade:
+                            txt = f"<b>{code}</b><br/><i>{title}</i><br/>{grade} {teacher_name}"
+                        else:
+                            txt = f"<b>{code}</b><br/>{title}<br/>{teacher_name}"
+                    items.append(txt)
                 
-                data.append(row)
+                # Créer le contenu de la cellule - utiliser espace si vide
+                if items:
+                    # Joindre les éléments avec des sauts de ligne et créer un seul Paragraph
+                    row.append(Paragraph('<br/><br/>'.join(items), cell_content_style))
+                else:
+                    row.append(Paragraph('&nbsp;', cell_style))  # Espace insécable HTML
+            
+            data.append(row)
         
         # Créer et styler le tableau
         # Calculer le nombre de colonnes
@@ -1810,7 +1695,7 @@ def schedule_pdf(request):
         # Fusionner les cellules de la colonne Jour pour éviter la redondance
         nb_creneaux = len(slots)
         if nb_creneaux > 1:
-            for day_idx in range(len(days)):
+            for day_idx in range(len(grid.days)):
                 row_start = 1 + (day_idx * nb_creneaux)  # +1 pour l'en-tête
                 row_end = row_start + (nb_creneaux - 1)
                 # Vérifier que les indices sont valides
@@ -1825,16 +1710,8 @@ def schedule_pdf(request):
         chef_section = Teacher.objects.filter(id=chef_section_id).first() if chef_section_id else None
         chef_adjoint = Teacher.objects.filter(id=chef_adjoint_id).first() if chef_adjoint_id else None
 
-        # Fonction pour obtenir la désignation du grade
-        def get_grade_designation(code_grade):
-            if not code_grade:
-                return ''
-            try:
-                from reglage.models import Grade
-                grade_obj = Grade.objects.get(CodeGrade=code_grade)
-                return grade_obj.DesignationGrade
-            except:
-                return code_grade  # Fallback sur le code si la désignation n'existe pas
+        # Désignation du grade (le code si la désignation n'existe pas)
+        get_grade_designation = reference_data().grade_designation
 
         # Style pour les signatures avec Times New Roman
         sig_style = ParagraphStyle('SigStyle', parent=styles['Normal'], fontSize=8, alignment=0, fontName='Times-Roman')
@@ -1866,81 +1743,130 @@ def schedule_pdf(request):
         ]))
         elements.append(sig_table)
 
-    doc.build(elements, onFirstPage=footer, onLaterPages=footer)
+    with trace.span('schedule_pdf.rendu', pages=page_count):
+        doc.build(elements, onFirstPage=footer, onLaterPages=footer)
+    if cache_params is not None:
+        pdf_cache.put(cache_params, cache_stamp, buffer.getvalue())
     buffer.seek(0)
     response = HttpResponse(buffer, content_type='application/pdf')
     filename = f"horaire_{classe or 'classe'}_{annee or 'annee'}.pdf"
     response['Content-Disposition'] = f'inline; filename="{filename}"'
     return response
 
+def _timetable_grid_for_request(request):
+    """
+    Grille d'horaire demandée par les paramètres GET
+
+    Paramètres : semaine (YYYY-MM-DD, semaine en cours par défaut), section
+    (section de l'organisation par défaut), type ('cours' ou 'examens') et
+    annee (optionnelle).
+
+    Returns:
+        tuple: (TimetableGrid, section_code, type_horaire)
+    """
+    from datetime import date
+    from accounts.organisation_utils import get_user_organisation
+    from .timetable_grid import TimetableGrid
+
+    user_org = get_user_organisation(request.user)
+    type_horaire = request.GET.get('type', 'cours')
+    section_code = request.GET.get('section') or (user_org.code if user_org else '')
+    if user_org:
+        # Un utilisateur d'organisation ne voit que sa section
+        section_code = user_org.code
+
+    week_start = request.GET.get('semaine')
+    if week_start:
+        week_start = datetime.strptime(week_start, '%Y-%m-%d').date()
+    else:
+        semaine_en_cours = reference_data().semaine_courante
+        week_start = semaine_en_cours.date_debut if semaine_en_cours else date.today()
+
+    grid = TimetableGrid.for_week(
+        week_start, section_code=section_code, type_horaire=type_horaire, annee=request.GET.get('annee'),
+    )
+    return grid, section_code, type_horaire
+
+
+def schedule_grid(request):
+    """Grille HTML de l'horaire d'une semaine (une table par niveau)"""
+    try:
+        grid, section_code, type_horaire = _timetable_grid_for_request(request)
+    except ValueError:
+        messages.error(request, "Date de semaine invalide (format attendu : AAAA-MM-JJ)")
+        return redirect('attribution:schedule_entry_list')
+
+    niveaux = [
+        {'niveau': niveau, 'colonnes': grid.columns(niveau), 'lignes': grid.rows(niveau)}
+        for niveau in grid.levels()
+    ]
+    return render(request, 'attribution/schedule_grid.html', {
+        'grid': grid,
+        'niveaux': niveaux,
+        'nb_creneaux': len(grid.slots),
+        'section_code': section_code,
+        'type_horaire': type_horaire,
+        'semaine': grid.day_dates['Lundi'],
+    })
+
+
+@require_GET
+def api_schedule_grid(request):
+    """Grille de l'horaire d'une semaine en JSON (mêmes paramètres que schedule_grid)"""
+    try:
+        grid, section_code, type_horaire = _timetable_grid_for_request(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Date de semaine invalide (format attendu : AAAA-MM-JJ)'}, status=400)
+
+    data = grid.as_dict()
+    data.update({'success': True, 'section': section_code, 'type': type_horaire})
+    return JsonResponse(data)
+
+
+def _parse_schedule_payload(request):
+    """Décode le JSON envoyé par le constructeur d'horaires"""
+    payload = json.loads(request.body.decode('utf-8'))
+    annee = payload.get('annee_academique')
+    semaine = payload.get('semaine_debut')  # YYYY-MM-DD
+    entries = payload.get('entries', [])
+    if not annee or not semaine:
+        return None, None, None
+    y, m, d = [int(x) for x in semaine.split('-')]
+    return annee, datetime(y, m, d).date(), entries
+
+
+def _log_bulk_schedule(request, saved):
+    """Journalise en une ligne un enregistrement groupé (bulk_create n'émet pas post_save)"""
+    if not saved:
+        return
+    from tracking.models import ActionLog
+    ActionLog.log_action(
+        user=request.user,
+        action_type='schedule_create',
+        description=f"Création planning en lot: {saved} horaire(s)",
+        model_name='ScheduleEntry',
+        request=request
+    )
+
+
 @csrf_exempt
 @require_http_methods(['POST'])
 def save_schedule_entries(request):
-    from .validators import ScheduleConflictValidator
+    from .schedule_bulk import save_entries_bulk
     
     try:
-        payload = json.loads(request.body.decode('utf-8'))
-        annee = payload.get('annee_academique')
-        semaine = payload.get('semaine_debut')  # YYYY-MM-DD
-        entries = payload.get('entries', [])
-        if not annee or not semaine:
+        annee, semaine_date, entries = _parse_schedule_payload(request)
+        if not annee:
             return JsonResponse({'success': False, 'message': 'annee_academique et semaine_debut requis'}, status=400)
 
-        y, m, d = [int(x) for x in semaine.split('-')]
-        semaine_date = datetime(y, m, d).date()
-
-        saved = 0
-        errors = []
-        
-        for e in entries:
-            attribution_id = e.get('attribution_id')
-            jour = e.get('jour')  # 'lundi'...
-            creneau = e.get('creneau')  # 'am'/'pm'
-            salle = e.get('salle')
-            remarques = e.get('remarques')
-            if not all([attribution_id, jour, creneau]):
-                continue
-                
-            try:
-                a = Attribution.objects.get(id=attribution_id)
-                
-                # Vérifier s'il existe déjà (pour update)
-                existing = ScheduleEntry.objects.filter(
-                    attribution=a,
-                    annee_academique=annee,
-                    semaine_debut=semaine_date,
-                    jour=jour,
-                    creneau=creneau
-                ).first()
-                
-                # *** VALIDATION DES CONFLITS ***
-                validation_result = ScheduleConflictValidator.validate_schedule_entry(
-                    attribution=a,
-                    jour=jour,
-                    creneau=creneau,
-                    semaine=semaine_date,
-                    salle=salle,
-                    exclude_id=existing.id if existing else None
-                )
-                
-                # Si conflit détecté, l'ajouter aux erreurs et passer au suivant
-                if not validation_result['valid']:
-                    errors.extend(validation_result['errors'])
-                    continue
-                
-                # Pas de conflit, créer ou mettre à jour
-                obj, _ = ScheduleEntry.objects.update_or_create(
-                    attribution=a,
-                    annee_academique=annee,
-                    semaine_debut=semaine_date,
-                    jour=jour,
-                    creneau=creneau,
-                    defaults={'salle': salle, 'remarques': remarques}
-                )
-                saved += 1
-            except Attribution.DoesNotExist:
-                errors.append(f"Attribution {attribution_id} introuvable")
-                continue
+        outcome = save_entries_bulk(annee, semaine_date, entries)
+        _log_bulk_schedule(request, outcome['saved'])
+        saved = outcome['saved']
+        errors = [
+            error
+            for result in outcome['results'] if result['status'] in ('conflict', 'not_found')
+            for error in result['errors']
+        ]
         
         # Retourner le résultat
         if errors:
@@ -1955,6 +1881,404 @@ def save_schedule_entries(request):
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
+
+@require_http_methods(['POST'])
+def bulk_save_schedule_entries(request):
+    """
+    Enregistre une grille d'horaires complète en une seule transaction
+    
+    Même format d'entrée que save_schedule_entries ; la réponse détaille le
+    statut de chaque cellule (saved, updated, conflict, not_found, invalid).
+    """
+    from .schedule_bulk import save_entries_bulk
+    
+    try:
+        annee, semaine_date, entries = _parse_schedule_payload(request)
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'success': False, 'message': f'Données invalides: {e}'}, status=400)
+    if not annee:
+        return JsonResponse({'success': False, 'message': 'annee_academique et semaine_debut requis'}, status=400)
+    
+    try:
+        outcome = save_entries_bulk(annee, semaine_date, entries)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=500)
+    
+    _log_bulk_schedule(request, outcome['saved'])
+    rejected = sum(1 for result in outcome['results'] if result['status'] not in ('saved', 'updated'))
+    return JsonResponse({
+        'success': rejected == 0,
+        'saved': outcome['saved'],
+        'rejected': rejected,
+        'message': f"{outcome['saved']} horaire(s) enregistré(s), {rejected} rejeté(s).",
+        'results': outcome['results'],
+    })
+
+
+@require_GET
+def api_creneaux_libres(request):
+    """
+    Créneaux libres pour une attribution (enseignant, classe et salle libres)
+
+    Paramètres GET : attribution (ID), date_debut et date_fin (YYYY-MM-DD,
+    semaine en cours par défaut), type ('cours' ou 'examen'), exclude (ID de
+    l'horaire à déplacer) et limit (100 par défaut).
+    """
+    from datetime import date, timedelta
+    from .availability import find_free_slots
+
+    try:
+        attribution = Attribution.objects.select_related('matricule', 'code_ue').get(
+            pk=int(request.GET.get('attribution', ''))
+        )
+    except (ValueError, Attribution.DoesNotExist):
+        return JsonResponse({'success': False, 'message': 'Attribution introuvable'}, status=404)
+    if attribution.code_ue is None:
+        return JsonResponse({'success': False, 'message': "Attribution sans UE"}, status=400)
+
+    try:
+        semaine = reference_data().semaine_courante
+        default_start = semaine.date_debut if semaine else date.today() - timedelta(days=date.today().weekday())
+        date_debut = datetime.strptime(request.GET['date_debut'], '%Y-%m-%d').date() if request.GET.get('date_debut') else default_start
+        date_fin = datetime.strptime(request.GET['date_fin'], '%Y-%m-%d').date() if request.GET.get('date_fin') else date_debut + timedelta(days=5)
+        exclude_id = int(request.GET['exclude']) if request.GET.get('exclude') else None
+        limit = min(int(request.GET.get('limit') or 100), 1000)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Paramètres invalides'}, status=400)
+    if date_fin < date_debut or (date_fin - date_debut).days > 366:
+        return JsonResponse({'success': False, 'message': 'Période invalide (un an au plus)'}, status=400)
+
+    type_horaire = 'examen' if request.GET.get('type') in ('examen', 'examens') else 'cours'
+    with trace.span('creneaux_libres.recherche', attribution=attribution.pk):
+        found = find_free_slots(attribution, date_debut, date_fin, type_horaire, exclude_id=exclude_id, limit=limit)
+    return JsonResponse({
+        'success': True,
+        'attribution': attribution.pk,
+        'enseignant': attribution.matricule.nom_complet if attribution.matricule else None,
+        'classe': attribution.code_ue.classe,
+        'effectif': found['effectif'],
+        'count': len(found['results']),
+        'results': found['results'],
+    })
+
+
+def _enregistrer_generation(request, url_name):
+    """
+    Enregistre un aperçu de génération (horaire ou examens) conservé sur disque
+
+    L'horaire a pu changer depuis l'aperçu : chaque séance est revalidée et
+    seules celles encore sans conflit sont enregistrées, en un seul lot.
+
+    Args:
+        request: requête POST portant le jeton de l'aperçu
+        url_name: vue de génération vers laquelle revenir si l'aperçu a expiré
+
+    Returns:
+        HttpResponseRedirect: vers la grille de la première semaine générée
+    """
+    from urllib.parse import urlencode
+    from django.urls import reverse
+    from . import generation_preview
+    from .occupancy import OccupancyIndex
+    from django.db import IntegrityError
+    from .schedule_bulk import SLOT_TAKEN_MESSAGE, bulk_upsert_entries
+    from .timetable_solver import schedule_entries
+    from .validators import ScheduleConflictValidator
+
+    jeton = request.POST.get('jeton', '')
+    preview = generation_preview.load(jeton, request.user.pk)
+    if not preview:
+        messages.error(request, "Aperçu expiré : relancez la génération.")
+        return redirect(f'attribution:{url_name}')
+
+    type_horaire = preview.get('type_horaire', 'cours')
+    entries = schedule_entries(preview['assignments'], preview['annee'], type_horaire=type_horaire)
+    index = OccupancyIndex.load(preview['date_debut'], preview['date_fin'])
+    validations = ScheduleConflictValidator.validate_batch(entries, index)
+    valid = [entry for entry, validation in zip(entries, validations) if validation['valid']]
+    try:
+        with trace.span(f'{url_name}.enregistrement', seances=len(valid)):
+            saved = bulk_upsert_entries(valid)
+    except IntegrityError:
+        messages.error(request, SLOT_TAKEN_MESSAGE + " Relancez la génération.")
+        return redirect(f'attribution:{url_name}')
+    generation_preview.discard(jeton)
+    _log_bulk_schedule(request, saved)
+
+    rejected = len(entries) - len(valid)
+    if rejected:
+        messages.warning(request, f"{saved} séance(s) enregistrée(s), {rejected} écartée(s) : conflit apparu depuis l'aperçu.")
+    else:
+        messages.success(request, f"{saved} séance(s) enregistrée(s).")
+    return redirect(reverse('attribution:schedule_grid') + '?' + urlencode({
+        'semaine': preview['date_debut'].strftime('%Y-%m-%d'),
+        'section': preview['section_code'],
+        'type': type_horaire,
+    }))
+
+
+def generer_horaire(request):
+    """
+    Génération automatique de l'horaire des cours d'une section
+
+    GET : formulaire (section, année, période, séances par semaine).
+    POST action=apercu : calcule un horaire sans conflit (timetable_solver)
+    et l'affiche sans l'enregistrer ; le résultat est conservé 30 minutes.
+    POST action=valider : revalide l'aperçu contre les horaires actuels et
+    enregistre les séances sans conflit en un seul lot.
+    """
+    from datetime import date, timedelta
+    from accounts.organisation_utils import get_user_organisation
+    from . import generation_preview
+    from .timetable_solver import TimetableSolver, build_problem
+
+    ref = reference_data()
+    user_org = get_user_organisation(request.user)
+    data = request.POST if request.method == 'POST' else request.GET
+
+    # Un utilisateur d'organisation ne génère que l'horaire de sa section
+    section_code = user_org.code if user_org else (data.get('section') or '')
+    annee = data.get('annee') or (ref.annee_courante.code if ref.annee_courante else '')
+    semaine = ref.semaine_courante
+    try:
+        date_debut = datetime.strptime(data['date_debut'], '%Y-%m-%d').date() if data.get('date_debut') else (
+            semaine.date_debut if semaine else date.today() - timedelta(days=date.today().weekday())
+        )
+        date_fin = datetime.strptime(data['date_fin'], '%Y-%m-%d').date() if data.get('date_fin') else (
+            date_debut + timedelta(days=5)
+        )
+        max_par_semaine = max(1, int(data.get('max_par_semaine') or 2))
+    except ValueError:
+        messages.error(request, "Paramètres invalides (dates au format AAAA-MM-JJ).")
+        return redirect('attribution:generer_horaire')
+
+    context = {
+        'sections': ref.sections,
+        'annees': ref.annees,
+        'section_code': section_code,
+        'section_imposee': bool(user_org),
+        'annee': annee,
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'max_par_semaine': max_par_semaine,
+        'mode': 'cours',
+    }
+
+    if request.method != 'POST':
+        return render(request, 'attribution/generer_horaire.html', context)
+
+    if request.POST.get('action') == 'valider':
+        return _enregistrer_generation(request, 'generer_horaire')
+
+    if not section_code or not annee:
+        messages.error(request, "Choisissez une section et une année académique.")
+        return render(request, 'attribution/generer_horaire.html', context)
+    if date_fin < date_debut or (date_fin - date_debut).days > 366:
+        messages.error(request, "Période invalide (un an au plus).")
+        return render(request, 'attribution/generer_horaire.html', context)
+
+    with trace.span('generer_horaire.chargement', section=section_code):
+        problem, attributions = build_problem(
+            section_code, date_debut, date_fin, annee, max_par_semaine=max_par_semaine,
+        )
+    solution = TimetableSolver(
+        problem, time_budget=getattr(settings, 'TIMETABLE_SOLVER_TIME_BUDGET', 10),
+    ).solve()
+    trace.event('generer_horaire.solution', **solution.stats())
+
+    jeton = generation_preview.save({
+        'user_id': request.user.pk,
+        'type_horaire': 'cours',
+        'annee': annee,
+        'section_code': section_code,
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'assignments': solution.assignments(),
+    })
+
+    creneaux = {creneau.pk: creneau for creneau in ref.creneaux}
+    context.update({
+        'jeton': jeton,
+        'stats': solution.stats(),
+        'seances': [
+            {
+                'date': slot.date,
+                'creneau': creneaux.get(slot.creneau_id),
+                'classe': session.classe,
+                'ue': attributions[session.attribution_id].code_ue,
+                'enseignant': attributions[session.attribution_id].matricule,
+                'salle': room.code if room else '',
+                'effectif': session.effectif,
+            }
+            for session, slot, room in solution.items()
+        ],
+        'non_placees': [
+            {'libelle': problem.sessions[index].label, 'classe': problem.sessions[index].classe, 'motif': motif}
+            for index, motif in sorted(solution.unplaced.items())
+        ],
+    })
+    return render(request, 'attribution/generer_horaire.html', context)
+
+
+def generer_examens(request):
+    """
+    Planification automatique des examens d'une section
+
+    Une épreuve par UE, sur les créneaux d'examen de la section, sans
+    conflit de classe, d'enseignant ni d'étudiants inscrits dans plusieurs
+    classes (exam_scheduler). Même déroulement que generer_horaire :
+    POST action=apercu calcule et affiche, POST action=valider enregistre.
+    """
+    from datetime import date, timedelta
+    from accounts.organisation_utils import get_user_organisation
+    from . import generation_preview
+    from .exam_scheduler import ExamScheduler, build_exam_problem
+
+    ref = reference_data()
+    user_org = get_user_organisation(request.user)
+    data = request.POST if request.method == 'POST' else request.GET
+
+    section_code = user_org.code if user_org else (data.get('section') or '')
+    annee = data.get('annee') or (ref.annee_courante.code if ref.annee_courante else '')
+    semestre = data.get('semestre') or ''
+    semaine = ref.semaine_courante
+    try:
+        date_debut = datetime.strptime(data['date_debut'], '%Y-%m-%d').date() if data.get('date_debut') else (
+            semaine.date_debut if semaine else date.today() - timedelta(days=date.today().weekday())
+        )
+        date_fin = datetime.strptime(data['date_fin'], '%Y-%m-%d').date() if data.get('date_fin') else (
+            date_debut + timedelta(days=12)
+        )
+    except ValueError:
+        messages.error(request, "Paramètres invalides (dates au format AAAA-MM-JJ).")
+        return redirect('attribution:generer_examens')
+
+    context = {
+        'sections': ref.sections,
+        'annees': ref.annees,
+        'section_code': section_code,
+        'section_imposee': bool(user_org),
+        'annee': annee,
+        'semestre': semestre,
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'mode': 'examen',
+    }
+
+    if request.method != 'POST':
+        return render(request, 'attribution/generer_horaire.html', context)
+
+    if request.POST.get('action') == 'valider':
+        return _enregistrer_generation(request, 'generer_examens')
+
+    if not section_code or not annee:
+        messages.error(request, "Choisissez une section et une année académique.")
+        return render(request, 'attribution/generer_horaire.html', context)
+    if date_fin < date_debut or (date_fin - date_debut).days > 92:
+        messages.error(request, "Période invalide (trois mois au plus).")
+        return render(request, 'attribution/generer_horaire.html', context)
+
+    with trace.span('generer_examens.chargement', section=section_code):
+        problem, attributions = build_exam_problem(section_code, date_debut, date_fin, annee, semestre or None)
+    if not problem.slots:
+        messages.warning(request, "Aucun créneau d'examen actif pour cette section (voir Réglage > Créneaux).")
+    schedule = ExamScheduler(
+        problem, time_budget=getattr(settings, 'TIMETABLE_SOLVER_TIME_BUDGET', 10),
+    ).solve()
+    trace.event('generer_examens.solution', **schedule.stats())
+
+    jeton = generation_preview.save({
+        'user_id': request.user.pk,
+        'type_horaire': 'examen',
+        'annee': annee,
+        'section_code': section_code,
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'assignments': schedule.assignments(),
+    })
+
+    creneaux = {creneau.pk: creneau for creneau in ref.creneaux}
+    context.update({
+        'jeton': jeton,
+        'stats': schedule.stats(),
+        'seances': [
+            {
+                'date': slot.date,
+                'creneau': creneaux.get(slot.creneau_id),
+                'classe': exam.classe,
+                'ue': attributions[exam.attribution_id].code_ue,
+                'enseignant': attributions[exam.attribution_id].matricule,
+                'salle': room.code if room else '',
+                'effectif': exam.effectif,
+            }
+            for exam, slot, room in schedule.items()
+        ],
+        'non_placees': [
+            {'libelle': problem.exams[index].label, 'classe': problem.exams[index].classe, 'motif': motif}
+            for index, motif in sorted(schedule.unplaced.items())
+        ],
+    })
+    return render(request, 'attribution/generer_horaire.html', context)
+
+
+def copier_semaine(request):
+    """
+    Recopie l'horaire d'une semaine sur d'autres semaines de cours
+
+    GET : formulaire (semaine source, semaines cibles, section, classe).
+    POST : copie en lot (schedule_bulk.copy_week) et liste des cellules
+    écartées (déjà programmées ou en conflit).
+    """
+    from django.db import IntegrityError
+    from accounts.organisation_utils import get_user_organisation
+    from .schedule_bulk import SLOT_TAKEN_MESSAGE, copy_week
+
+    ref = reference_data()
+    user_org = get_user_organisation(request.user)
+    data = request.POST if request.method == 'POST' else request.GET
+
+    section_code = user_org.code if user_org else (data.get('section') or '')
+    semaines = {str(semaine.pk): semaine for semaine in ref.semaines}
+    source = semaines.get(data.get('source') or '') or ref.semaine_courante
+    cibles = [semaines[pk] for pk in data.getlist('cibles') if pk in semaines]
+    context = {
+        'sections': ref.sections,
+        'semaines': ref.semaines,
+        'section_code': section_code,
+        'section_imposee': bool(user_org),
+        'classes': ref.classes_de_section(section_code),
+        'classe': data.get('classe') or '',
+        'type_horaire': data.get('type_horaire') or 'cours',
+        'source': source,
+        'cibles': {semaine.pk for semaine in cibles},
+    }
+    if request.method != 'POST':
+        return render(request, 'attribution/copier_semaine.html', context)
+
+    if source is None or not cibles:
+        messages.error(request, "Choisissez une semaine source et au moins une semaine cible.")
+        return render(request, 'attribution/copier_semaine.html', context)
+
+    try:
+        with trace.span('copier_semaine', source=source.date_debut, cibles=len(cibles), section=section_code):
+            outcome = copy_week(
+                source.date_debut, cibles, section_code=section_code or None,
+                classe=context['classe'] or None, type_horaire=context['type_horaire'],
+            )
+    except IntegrityError:
+        messages.error(request, SLOT_TAKEN_MESSAGE)
+        return render(request, 'attribution/copier_semaine.html', context)
+    _log_bulk_schedule(request, outcome['copied'])
+
+    if not outcome['sources']:
+        messages.warning(request, "Aucun horaire dans la semaine source pour ces filtres.")
+    elif outcome['skipped']:
+        messages.warning(request, f"{outcome['copied']} horaire(s) copié(s), {len(outcome['skipped'])} cellule(s) écartée(s).")
+    else:
+        messages.success(request, f"{outcome['copied']} horaire(s) copié(s) sur {len(cibles)} semaine(s).")
+    context['resultat'] = outcome
+    return render(request, 'attribution/copier_semaine.html', context)
+
 def generate_pdf(request):
     # Récupérer les paramètres de filtrage pour les attributions
     matricule = request.GET.get('matricule', '')
@@ -1980,438 +2304,56 @@ def generate_pdf(request):
         if annee_academique:
             attributions = attributions.filter(annee_academique=annee_academique)
     
-    # Obtenir des informations sur l'enseignant (pour l'en-tête)
-    enseignant_info = None
-    csae_info = None
-    sgac_info = None
-    if attributions.exists():
-        enseignant_info = attributions.first().matricule
-        
-        # Récupérer le CSAE de la section de l'enseignant
-        try:
-            from teachers.models import Teacher
-            csae_info = Teacher.objects.filter(
-                fonction='CSAE',
-                section=enseignant_info.section
-            ).first()
-        except:
-            csae_info = None
-        
-        # Récupérer le SGAC (Secrétaire Général Académique)
-        try:
-            from teachers.models import Teacher
-            sgac_info = Teacher.objects.filter(fonction='SGAC').first()
-        except:
-            sgac_info = None
-    
-    # Séparer les attributions par type de charge
-    attributions_regulieres = attributions.filter(type_charge='Reguliere')
-    attributions_supplementaires = attributions.filter(type_charge='Supplementaire')
-    
-    # Créer un buffer pour le PDF
-    buffer = BytesIO()
-    
-    # Créer le document PDF avec l'orientation portrait
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=15,
-        leftMargin=15,
-        topMargin=15,
-        bottomMargin=15
-    )
-    
-    def footer(canvas, doc):
-        canvas.saveState()
-        canvas.setFont('Helvetica', 8)
-        page_num = canvas.getPageNumber()
-        text = f"Page {page_num}"
-        canvas.drawRightString(A4[0]-20, 10, text)
-        canvas.restoreState()
+    from .charge_sheet_pdf import render_sheet
+    from .charge_sheets import build_sheet
 
-    elements = []
-    
-    # Ajouter l'en-tête institutionnelle
-    header = create_header_table()
-    elements.append(header)
-    elements.append(Spacer(1, 2))
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=11,
-        spaceAfter=10,
-        alignment=1
-    )
-    
-    # Style pour le texte des cellules
-    cell_style = ParagraphStyle(
-        'CellStyle',
-        parent=styles['Normal'],
-        fontSize=8,
-        leading=12,
-        alignment=1  # Centre le texte
-    )
-    
-    header_style = ParagraphStyle(
-        'HeaderStyle',
-        parent=styles['Normal'],
-        fontSize=10,
-        leading=12,
-        alignment=0  # Aligné à gauche
-    )
-    
-    # Informations de l'enseignant
-    if enseignant_info:
-        # Récupérer la désignation complète du grade
-        grade_designation = ''
-        try:
-            if enseignant_info.grade:
-                grade_obj = Grade.objects.get(CodeGrade=enseignant_info.grade)
-                grade_designation = grade_obj.DesignationGrade
-        except Grade.DoesNotExist:
-            grade_designation = enseignant_info.grade
-        except:
-            grade_designation = 'Non spécifié'
-        
-        # Récupérer la désignation complète du département
-        departement_designation = ''
-        try:
-            if enseignant_info.departement:
-                dept_obj = Departement.objects.get(CodeDept=enseignant_info.departement)
-                departement_designation = dept_obj.DesignationDept
-        except Departement.DoesNotExist:
-            departement_designation = enseignant_info.departement
-        except:
-            departement_designation = 'Non spécifié'
-        
-        # Récupérer la désignation complète de la section
-        section_designation = ''
-        try:
-            if enseignant_info.section:
-                section_obj = Section.objects.get(CodeSection=enseignant_info.section)
-                section_designation = section_obj.DesignationSection
-        except Section.DoesNotExist:
-            section_designation = enseignant_info.section
-        except:
-            section_designation = 'Non spécifiée'
-            
-        # Fonction pour créer une image avec bords arrondis
-        def create_rounded_image(image_path, size=(100, 100), radius=15):
-            """Crée une image avec des bords arrondis"""
-            try:
-                # Ouvrir l'image
-                img = PILImage.open(image_path).convert("RGB")
-                
-                # Redimensionner l'image
-                img = img.resize(size, PILImage.Resampling.LANCZOS)
-                
-                # Créer un masque avec bords arrondis
-                mask = PILImage.new('L', size, 0)
-                draw = ImageDraw.Draw(mask)
-                draw.rounded_rectangle([(0, 0), size], radius=radius, fill=255)
-                
-                # Appliquer le masque
-                output = PILImage.new('RGB', size, (255, 255, 255))
-                output.paste(img, (0, 0))
-                output.putalpha(mask)
-                
-                # Sauvegarder dans un buffer
-                img_buffer = BytesIO()
-                output.save(img_buffer, format='PNG')
-                img_buffer.seek(0)
-                
-                return img_buffer
-            except Exception as e:
-                print(f"Erreur lors de la creation de l'image arrondie: {e}")
-                return None
-        
-        # Préparer la photo de l'enseignant
-        photo_element = None
-        if enseignant_info.photo:
-            try:
-                # Construire le chemin complet de la photo
-                photo_path = os.path.join(settings.MEDIA_ROOT, str(enseignant_info.photo))
-                if os.path.exists(photo_path):
-                    # Créer l'image avec bords arrondis
-                    rounded_img_buffer = create_rounded_image(photo_path, size=(100, 100), radius=15)
-                    if rounded_img_buffer:
-                        # Créer l'élément Image pour le PDF
-                        photo_element = Image(rounded_img_buffer, width=100, height=100)
-            except Exception as e:
-                print(f"Erreur lors du chargement de la photo: {e}")
-        
-        # Si pas de photo, créer un placeholder
-        if not photo_element:
-            # Créer un paragraphe "Pas de photo" centré
-            photo_placeholder = Paragraph("Pas de photo", ParagraphStyle(
-                'PhotoPlaceholder',
-                parent=styles['Normal'],
-                fontSize=8,
-                alignment=1,
-                textColor=colors.grey
-            ))
-            photo_element = photo_placeholder
-        
-        # Créer le tableau d'informations adapté au portrait (6 lignes x 2 colonnes)
-        enseignant_data = [
-            [Paragraph('Matricule en interne :', ParagraphStyle('LabelStyle', parent=styles['Normal'], alignment=2, fontName='Helvetica-Bold', fontSize=9)), enseignant_info.matricule],
-            [Paragraph('Nom et post-noms :', ParagraphStyle('LabelStyle', parent=styles['Normal'], alignment=2, fontName='Helvetica-Bold', fontSize=9)), enseignant_info.nom_complet],
-            [Paragraph('Grade :', ParagraphStyle('LabelStyle', parent=styles['Normal'], alignment=2, fontName='Helvetica-Bold', fontSize=9)), grade_designation],
-            [Paragraph('Département :', ParagraphStyle('LabelStyle', parent=styles['Normal'], alignment=2, fontName='Helvetica-Bold', fontSize=9)), departement_designation],
-            [Paragraph('Section :', ParagraphStyle('LabelStyle', parent=styles['Normal'], alignment=2, fontName='Helvetica-Bold', fontSize=9)), section_designation],
-            [Paragraph('Année académique :', ParagraphStyle('LabelStyle', parent=styles['Normal'], alignment=2, fontName='Helvetica-Bold', fontSize=9)), annee_academique if annee_academique else 'Toutes les années']
-        ]
-        
-        # Largeurs adaptées au portrait (première colonne 120px, deuxième colonne réduite de 2cm total: 358 - 56 ≈ 302px)
-        info_table = Table(enseignant_data, colWidths=[120, 302])
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),   # Deuxième colonne alignée à gauche
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        
-        # Ajouter le titre "DESCRIPTION DE LA CHARGE HORAIRE POUR L'ANNEE ACADEMIQUE" responsive
-        annee_display = annee_academique if annee_academique else 'Toutes les années'
-        title_text = f"<u>DESCRIPTION DE LA CHARGE HORAIRE POUR L'ANNEE ACADEMIQUE  {annee_display}</u>"
-        title_para = Paragraph(title_text, title_style)
-        
-        elements.append(title_para)
-        elements.append(Spacer(1, 1))
-        
-        # Créer un tableau global avec infos à gauche alignées et photo à droite
-        main_data = [[info_table, photo_element]]
-        main_table = Table(main_data, colWidths=[422, 120])  # Total 542px pour s'adapter au tableau d'informations réduit de 2cm
-        main_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),   # Tableau d'informations aligné à gauche
-            ('VALIGN', (0, 0), (0, 0), 'TOP'),
-            ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-            ('VALIGN', (1, 0), (1, 0), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (0, 0), 5),
-            ('RIGHTPADDING', (0, 0), (0, 0), 5),
-            ('TOPPADDING', (0, 0), (0, 0), 5),
-            ('BOTTOMPADDING', (0, 0), (0, 0), 5),
-            ('LEFTPADDING', (1, 0), (1, 0), 5),
-            ('RIGHTPADDING', (1, 0), (1, 0), 5),
-            ('TOPPADDING', (1, 0), (1, 0), 5),
-            ('BOTTOMPADDING', (1, 0), (1, 0), 5),
-        ]))
-        
-        elements.append(main_table)
-        elements.append(Spacer(1, 10))
-    
-    # Fonction pour créer un tableau de charges (régulières ou supplémentaires)
-    def creer_tableau_charges(attributions, titre):
-        # Créer une cellule pour le titre avec fond gris
-        titre_data = [[Paragraph(titre, cell_style)]]
-        titre_table = Table(titre_data, colWidths=[529])  # Même largeur que le tableau de données augmenté
-        titre_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        elements.append(titre_table)
-        
-        # Entêtes du tableau principal
-        header_data = [
-            ['Code', 'Intitulé U.E.', 'Intitulé EC', 'Heures', 'Crédits', 'Classe', 'Semestre']
-        ]
-        
-        # Préparer les données
-        data = []
-        
-        # Totaux pour calcul
-        total_presentiel = 0
-        total_tp_td = 0
-        total_heures = 0
-        total_credits = 0
-        
-        # Ajouter chaque attribution au tableau
-        for attr in attributions:
-            presentiel = attr.code_ue.cmi
-            tp_td = attr.code_ue.td_tp
-            total = presentiel + tp_td
-            
-            # Ajouter aux totaux
-            total_presentiel += presentiel
-            total_tp_td += tp_td
-            total_heures += total
-            total_credits += attr.code_ue.credit if attr.code_ue.credit else 0
-            
-            # Utiliser Paragraph pour permettre le retour à la ligne automatique dans les cellules
-            row = [
-                attr.code_ue.code_ue,
-                Paragraph(attr.code_ue.intitule_ue, cell_style),
-                Paragraph(attr.code_ue.intitule_ec or '', cell_style),
-                str(int(total)),
-                str(attr.code_ue.credit) if attr.code_ue.credit else '0',
-                Paragraph(attr.code_ue.classe or '', cell_style),
-                attr.code_ue.semestre
-            ]
-            data.append(row)
-        
-        # Ajouter ligne de sous-total
-        sous_total_row = ['', '', 'Sous-total ' + ('1' if titre == 'Charge régulière' else '2'), 
-                        str(int(total_heures)), str(int(total_credits)), '', '']
-        data.append(sous_total_row)
-        
-        # Combiner les en-têtes et les données
-        all_data = header_data + data
-        
-        # Définir les largeurs de colonnes adaptées au portrait
-        col_widths = [50, 140, 140, 70, 50, 50, 50]
-        
-        # Créer le tableau
-        table = Table(all_data, colWidths=col_widths, repeatRows=1)
-        
-        # Style du tableau
-        style = TableStyle([
-            # Style des entêtes
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            
-            # Style des cellules de données
-            ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            
-            # Style pour la colonne des codes (première colonne)
-            ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-            
-            # Style pour la ligne de sous-total
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, -1), (-1, -1), 8),
-            ('SPAN', (0, -1), (2, -1)),  # Fusion des 3 premières cellules pour le texte "Sous-total"
-        ])
-        
-        table.setStyle(style)
-        return table, total_presentiel, total_tp_td, total_heures, total_credits
-    
-    # Générer et ajouter le tableau des charges régulières
-    if attributions_regulieres.exists():
-        table_regulieres, total_presentiel_reg, total_tp_td_reg, total_heures_reg, total_credits_reg = creer_tableau_charges(attributions_regulieres, 'Charge régulière')
-        elements.append(table_regulieres)
-        elements.append(Spacer(1, 10))
-    else:
-        total_presentiel_reg, total_tp_td_reg, total_heures_reg, total_credits_reg = 0, 0, 0, 0
-    
-    # Générer et ajouter le tableau des charges supplémentaires
-    if attributions_supplementaires.exists():
-        table_supplementaires, total_presentiel_supp, total_tp_td_supp, total_heures_supp, total_credits_supp = creer_tableau_charges(attributions_supplementaires, 'Charge supplémentaire')
-        elements.append(table_supplementaires)
-        elements.append(Spacer(1, 10))
-    else:
-        total_presentiel_supp, total_tp_td_supp, total_heures_supp, total_credits_supp = 0, 0, 0, 0
-    
-    # Ajouter le total général
-    total_data = [
-        ['Total', '', '', 
-         str(int(total_heures_reg + total_heures_supp)), 
-         str(int(total_credits_reg + total_credits_supp)),
-         '', '']  # Colonnes vides pour classe et semestre
-    ]
-    
-    total_table = Table(total_data, colWidths=[50, 140, 140, 70, 50, 50, 50])
-    total_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('GRID', (0, 0), (-1, 0), 0.5, colors.black),
-        ('SPAN', (0, 0), (2, 0)),  # Fusion des 3 premières cellules pour le texte "Total"
-    ]))
-    
-    elements.append(total_table)
-    
-    # Ajouter la section des signatures
-    elements.append(Spacer(1, 14))
-    
-    # Styles pour les signatures
-    styles = getSampleStyleSheet()
-    signature_style = ParagraphStyle(
-        'SignatureStyle',
-        parent=styles['Normal'],
-        fontSize=9,
-        alignment=1,  # Centre
-        leading=11
-    )
-    
-    signature_style_italic = ParagraphStyle(
-        'SignatureStyleItalic',
-        parent=styles['Normal'],
-        fontSize=9,
-        alignment=2,  # Aligné à droite
-        leading=11,
-        fontName='Helvetica-Oblique'
-    )
-    
-    # Date et lieu à droite + "Signature de l'intéressé"
-    from datetime import datetime
-    date_du_jour = datetime.now().strftime("%d/%m/%Y")
-    date_style = ParagraphStyle('DateStyle', parent=styles['Normal'], fontSize=10, alignment=2)  # Aligné à droite
-    elements.append(Paragraph(f"Fait à Mbanza-Ngungu, le  {date_du_jour}", date_style))
-    elements.append(Paragraph("<i>Signature de l'intéressé</i>", signature_style_italic))
-    elements.append(Spacer(1, 20))
-    
-    # Titre "Pour accord :" centré
-    pour_accord_style = ParagraphStyle('PourAccord', parent=styles['Normal'], fontSize=11, alignment=1, fontName='Helvetica-BoldOblique')
-    elements.append(Paragraph("<i><b>Pour accord :</b></i>", pour_accord_style))
-    elements.append(Spacer(1, 15))
-    
-    # Récupérer les grades
-    enseignant_grade = enseignant_info.get_grade_designation() if enseignant_info and hasattr(enseignant_info, 'get_grade_designation') else ''
-    csae_grade = csae_info.get_grade_designation() if csae_info and hasattr(csae_info, 'get_grade_designation') else ''
-    sgac_grade = sgac_info.get_grade_designation() if sgac_info and hasattr(sgac_info, 'get_grade_designation') else ''
-    
-    # Ligne des signatures: CSAE (gauche) et SGAC (droite)
-    signature_left_style = ParagraphStyle('SignatureLeft', parent=styles['Normal'], fontSize=9, alignment=0, leading=11)
-    signature_right_style = ParagraphStyle('SignatureRight', parent=styles['Normal'], fontSize=9, alignment=2, leading=11)
-    
-    if csae_info:
-        csae_text = f"<i>Date et signature du Chef de Section/Adjoint<br/>Chargé de l'Enseignement</i><br/><br/><br/><br/><b><u>{csae_info.nom_complet}</u></b><br/><i>{csae_grade}</i>"
-    else:
-        csae_text = "<i>Date et signature du Chef de Section/Adjoint<br/>Chargé de l'Enseignement</i><br/><br/><br/><br/>"
-    
-    if sgac_info:
-        sgac_text = f"<i>Date et signature du Secrétaire Général Académique</i><br/><br/><br/><br/><b><u>{sgac_info.nom_complet}</u></b><br/><i>{sgac_grade}</i>"
-    else:
-        sgac_text = "<i>Date et signature du Secrétaire Général Académique</i><br/><br/><br/><br/>"
-    
-    signature_data = [[
-        Paragraph(csae_text, signature_left_style),
-        Paragraph(sgac_text, signature_right_style),
-    ]]
-    
-    signature_table = Table(signature_data, colWidths=[280, 280])
-    signature_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
-    elements.append(signature_table)
-    
-    # Générer le PDF avec le footer
-    doc.build(elements, onFirstPage=footer, onLaterPages=footer)
-    
-    # Préparer la réponse
-    pdf = buffer.getvalue()
-    buffer.close()
+    # Une seule requête : les charges régulières et supplémentaires sont séparées en mémoire
+    attributions = list(attributions.order_by('pk'))
+    enseignant_info = attributions[0].matricule if attributions else None
+    pdf = render_sheet(build_sheet(enseignant_info, attributions, annee_academique))
     
     response = HttpResponse(content_type='application/pdf')
     filename = f"charge_horaire_{matricule if matricule else 'tous'}.pdf"
     response['Content-Disposition'] = f'inline; filename="{filename}"'
     response.write(pdf)
-    
+
+    return response
+
+
+def imprimer_fiches_charges(request):
+    """
+    Fiches de charge horaire de tous les enseignants d'une section
+
+    Paramètres GET : annee_academique et section (code ou ALL) requis,
+    type_charge optionnel, format 'pdf' (un seul PDF) ou 'zip' (un PDF par
+    enseignant).
+    """
+    from .charge_sheets import merged_pdf, section_sheets, zipped_sheets
+
+    annee_academique = request.GET.get('annee_academique')
+    section = request.GET.get('section')
+    type_charge = request.GET.get('type_charge')
+    output = request.GET.get('format', 'pdf')
+
+    if not annee_academique or not section:
+        return HttpResponse("Paramètres manquants : année académique et section sont requis", status=400)
+    if output not in ('pdf', 'zip'):
+        return HttpResponse("Format inconnu : pdf ou zip", status=400)
+
+    teacher_sheets = section_sheets(annee_academique, section, type_charge)
+    if not teacher_sheets:
+        return HttpResponse(
+            f"Aucune attribution trouvée pour la section '{section}' et l'année académique {annee_academique}.",
+            status=404
+        )
+
+    filename = f"fiches_charges_{section}_{annee_academique}"
+    if output == 'zip':
+        response = HttpResponse(zipped_sheets(teacher_sheets), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+    else:
+        response = HttpResponse(merged_pdf([sheet for _, sheet in teacher_sheets]), content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="{filename}.pdf"'
     return response
 
 
@@ -2534,7 +2476,7 @@ class ScheduleEntryListView(ListView):
         return queryset
     
     def get_context_data(self, **kwargs):
-        from reglage.models import AnneeAcademique, Salle, Creneau, Classe, SemaineCours, Section
+        from reglage.models import AnneeAcademique, Salle, Classe, SemaineCours, Section
         from accounts.organisation_utils import get_user_organisation
         from django.db.models import Q
         
@@ -2543,32 +2485,17 @@ class ScheduleEntryListView(ListView):
         
         # Données depuis les modèles de réglage (PRIORITÉ)
         context['annees_reglage'] = AnneeAcademique.objects.all().order_by('-code')
-        context['annee_courante'] = AnneeAcademique.objects.filter(est_en_cours=True).first()
+        context['annee_courante'] = reference_data().annee_courante
         context['salles_disponibles'] = Salle.objects.filter(est_disponible=True).order_by('code')
         
         # Filtrer les créneaux selon le type d'horaire sélectionné
+        # (pour les examens : section de l'utilisateur, toutes les sections pour le superuser)
         type_horaire = self.request.GET.get('type_horaire', 'cours')
-        if type_horaire == 'cours':
-            context['creneaux_actifs'] = Creneau.objects.filter(
-                est_actif=True, 
-                type_creneau__in=['cours', 'les_deux']
-            ).order_by('ordre', 'heure_debut')
-        elif type_horaire == 'examen':
-            # Pour les examens, filtrer par section de l'utilisateur ou toutes les sections
-            if user_org:
-                context['creneaux_actifs'] = Creneau.objects.filter(
-                    est_actif=True, 
-                    type_creneau__in=['examen', 'les_deux'],
-                    section__CodeSection=user_org.code
-                ).order_by('ordre', 'heure_debut')
-            else:
-                # Superuser voit tous les créneaux d'examens
-                context['creneaux_actifs'] = Creneau.objects.filter(
-                    est_actif=True, 
-                    type_creneau__in=['examen', 'les_deux']
-                ).order_by('ordre', 'heure_debut')
+        if type_horaire in ('cours', 'examen'):
+            section_code = user_org.code if user_org and type_horaire == 'examen' else None
+            context['creneaux_actifs'] = reference_data().creneaux_pour(type_horaire, section_code)
         else:
-            context['creneaux_actifs'] = Creneau.objects.filter(est_actif=True).order_by('ordre', 'heure_debut')
+            context['creneaux_actifs'] = reference_data().creneaux
         
         # Filtrer les classes par section de l'organisation ou par chef de section sélectionné
         if user_org:
@@ -2583,37 +2510,27 @@ class ScheduleEntryListView(ListView):
             if chef_section_id:
                 try:
                     chef_section = Teacher.objects.get(id=chef_section_id)
-                    # Debug: afficher la section du chef
-                    print(f"DEBUG: Chef section = {chef_section.nom_complet}, Section = '{chef_section.section}'")
-                    
-                    # Vérifier si la section existe dans la table Section
-                    from reglage.models import Section
-                    try:
-                        section_obj = Section.objects.get(CodeSection=chef_section.section)
-                        print(f"DEBUG: Section trouvée = {section_obj.DesignationSection}")
-                    except Section.DoesNotExist:
-                        print(f"DEBUG: ERREUR - Section '{chef_section.section}' n'existe pas dans la table Section!")
                     
                     # Filtrer les classes par section
                     classes_filtrees = Classe.objects.filter(
                         mention__departement__section__CodeSection=chef_section.section
                     ).order_by('CodeClasse')
                     
-                    # Debug: afficher les classes trouvées
-                    print(f"DEBUG: Nombre de classes trouvées pour section '{chef_section.section}' = {classes_filtrees.count()}")
-                    if classes_filtrees.count() > 0:
-                        for c in classes_filtrees[:5]:  # Afficher les 5 premières
-                            print(f"  - {c.CodeClasse} (Section: {c.mention.departement.section.CodeSection})")
-                    else:
-                        print(f"DEBUG: AUCUNE classe trouvée pour la section '{chef_section.section}'")
-                        # Afficher toutes les sections disponibles
-                        sections_disponibles = Section.objects.all().values_list('CodeSection', flat=True)
-                        print(f"DEBUG: Sections disponibles dans la BD = {list(sections_disponibles)}")
+                    if trace.enabled:
+                        # Diagnostic d'une section de chef mal renseignée (requête tracée uniquement)
+                        trace.event(
+                            'schedule_list.chef_section',
+                            chef=chef_section.nom_complet,
+                            section=chef_section.section,
+                            section_connue=Section.objects.filter(CodeSection=chef_section.section).exists(),
+                            classes=list(classes_filtrees.values_list('CodeClasse', flat=True)[:5]),
+                            sections_disponibles=lambda: list(Section.objects.values_list('CodeSection', flat=True)),
+                        )
                     
                     context['classes_reglage'] = classes_filtrees
                     context['selected_section'] = chef_section.section
                 except Teacher.DoesNotExist:
-                    print(f"DEBUG: Chef de section avec ID {chef_section_id} non trouvé")
+                    trace.event('schedule_list.chef_section_inconnu', chef_section_id=chef_section_id)
                     context['classes_reglage'] = Classe.objects.all().order_by('CodeClasse')
             
             elif chef_adjoint_id:
@@ -2631,7 +2548,7 @@ class ScheduleEntryListView(ListView):
             context['classes_reglage'] = Classe.objects.all().order_by('CodeClasse')
         
         context['semaines_cours'] = SemaineCours.objects.all().order_by('numero_semaine')
-        context['semaine_courante'] = SemaineCours.objects.filter(est_en_cours=True).first()
+        context['semaine_courante'] = reference_data().semaine_courante
         
         # Sections disponibles pour les créneaux d'examens
         if user_org:
@@ -2694,11 +2611,11 @@ class ScheduleEntryCreateView(CreateView):
     success_url = reverse_lazy('attribution:schedule_entry_list')
     
     def get_context_data(self, **kwargs):
-        from reglage.models import AnneeAcademique, Classe
+        from reglage.models import Classe
         from accounts.organisation_utils import get_user_organisation
         
         context = super().get_context_data(**kwargs)
-        context['annee_courante'] = AnneeAcademique.objects.filter(est_en_cours=True).first()
+        context['annee_courante'] = reference_data().annee_courante
         
         # Filtrer les classes par section de l'organisation
         user_org = get_user_organisation(self.request.user)
@@ -2711,26 +2628,18 @@ class ScheduleEntryCreateView(CreateView):
         return context
     
     def form_valid(self, form):
-        print("\n" + "="*60)
-        print("FORM_VALID APPELE - Le formulaire est valide")
-        print("="*60)
-        
-        from datetime import timedelta
-        from reglage.models import AnneeAcademique, SemaineCours
         from .validators import ScheduleConflictValidator
+        from .occupancy import OccupancyIndex, jour_from_date
+        from django.db import IntegrityError
+        from .recurrence import MAX_RECURRENCE_DAYS, SemaineTable, expand_dates
+        from .schedule_bulk import SLOT_TAKEN_MESSAGE, bulk_upsert_entries
         
         force_conflicts = form.cleaned_data.get('force_conflicts')
 
         # Récupérer la date de fin de la plage (si spécifiée)
         date_fin = form.cleaned_data.get('date_fin')
         date_debut = form.cleaned_data.get('semaine_debut')
-        
-        # Debug: afficher les dates reçues
-        print(f"\n=== DEBUG CRÉATION HORAIRE ===")
-        print(f"Date début (semaine_debut): {date_debut}")
-        print(f"Date fin (date_fin): {date_fin}")
-        print(f"Type date_debut: {type(date_debut)}")
-        print(f"Type date_fin: {type(date_fin)}")
+        trace.event('schedule_create.plage', date_debut=date_debut, date_fin=date_fin)
         
         # Vérifier si une plage de dates est spécifiée et valide
         if date_fin and date_debut:
@@ -2742,12 +2651,12 @@ class ScheduleEntryCreateView(CreateView):
             delta = date_fin - date_debut
             jours_plage = delta.days + 1  # +1 pour inclure le jour de début
             
-            if jours_plage > 31:  # Limiter à 1 mois pour des raisons de performance
-                form.add_error('date_fin', "La plage de dates ne peut pas dépasser 31 jours.")
+            if jours_plage > MAX_RECURRENCE_DAYS:
+                form.add_error('date_fin', f"La plage de dates ne peut pas dépasser {MAX_RECURRENCE_DAYS} jours.")
                 return self.form_invalid(form)
         
         # Insérer automatiquement l'année académique en cours
-        annee_courante = AnneeAcademique.objects.filter(est_en_cours=True).first()
+        annee_courante = reference_data().annee_courante
         if annee_courante:
             form.instance.annee_academique = annee_courante.code
         
@@ -2785,30 +2694,17 @@ class ScheduleEntryCreateView(CreateView):
         creneau_toute_journee = False
         creneaux_a_creer = [form.instance.creneau]  # Par défaut, un seul créneau
         
-        print(f"\n{'='*60}")
-        print(f"DETECTION TOUTE LA JOURNEE")
-        print(f"{'='*60}")
-        print(f"Case 'Toute la journee' cochee: {toute_la_journee}")
-        print(f"Creneau selectionne: {form.instance.creneau}")
-        
         if toute_la_journee:
-            print(f"[OK] TOUTE LA JOURNEE DETECTEE !")
             creneau_toute_journee = True
             # Récupérer les créneaux matin et après-midi
             from reglage.models import Creneau
             creneau_matin = Creneau.objects.filter(code='AM').first()
             creneau_apres_midi = Creneau.objects.filter(code='PM').first()
             
-            print(f"Creneau AM trouve: {creneau_matin}")
-            print(f"Creneau PM trouve: {creneau_apres_midi}")
-            
             if creneau_matin and creneau_apres_midi:
                 creneaux_a_creer = [creneau_matin, creneau_apres_midi]
-                print(f"[OK] Les 2 creneaux AM et PM seront crees:")
-                print(f"  1. Creneau AM: {creneau_matin.code} - {creneau_matin.designation} ({creneau_matin.heure_debut}-{creneau_matin.heure_fin})")
-                print(f"  2. Creneau PM: {creneau_apres_midi.code} - {creneau_apres_midi.designation} ({creneau_apres_midi.heure_debut}-{creneau_apres_midi.heure_fin})")
             else:
-                print(f"[ERREUR] Les creneaux AM ou PM n'existent pas !")
+                logger.warning("Création d'horaire : créneaux AM ou PM absents pour 'Toute la journée'")
                 messages.warning(self.request, "Les creneaux AM et PM n'existent pas. Veuillez les creer d'abord.")
                 # Si AM/PM n'existent pas, utiliser le créneau sélectionné
                 if form.instance.creneau:
@@ -2817,189 +2713,102 @@ class ScheduleEntryCreateView(CreateView):
                     form.add_error(None, "Veuillez selectionner un creneau ou creer les creneaux AM et PM.")
                     return self.form_invalid(form)
         else:
-            print(f"[INFO] Creneau normal - Une seule entree sera creee")
             if not form.instance.creneau:
                 form.add_error('creneau', "Veuillez selectionner un creneau ou cocher 'Toute la journee'.")
                 return self.form_invalid(form)
         
-        print(f"Nombre de creneaux a creer: {len(creneaux_a_creer)}")
-        print(f"{'='*60}\n")
-        
-        # Liste pour stocker toutes les entrées créées (pour les messages de confirmation)
-        created_entries = []
-        
-        # Si une plage de dates est spécifiée, créer plusieurs entrées
-        # Note: On utilise >= au lieu de > pour permettre une plage d'un seul jour
-        if date_fin and date_debut and date_fin >= date_debut:
-            print(f"CRÉATION D'UNE PLAGE DE {date_debut} à {date_fin}")
-            current_date = date_debut
-            entry_count = 0
-            while current_date <= date_fin:
-                # Mapper les jours en français
-                jours_fr = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
-                
-                # Trouver la semaine correspondant à cette date
-                from reglage.models import SemaineCours
-                semaine_obj = SemaineCours.objects.filter(
-                    date_debut__lte=current_date,
-                    date_fin__gte=current_date
-                ).first()
-                numero_semaine = semaine_obj.numero_semaine if semaine_obj else None
-                
-                # Créer une entrée pour chaque créneau (1 ou 2 selon si c'est "Toute la journée")
-                for creneau in creneaux_a_creer:
-                    entry_count += 1
-                    print(f"  -> Création entrée #{entry_count} pour {current_date} ({current_date.strftime('%A')})")
-                    print(f"     Semaine trouvée: S{numero_semaine} pour {current_date}")
-                    
-                    # Créer une copie du formulaire pour chaque date et créneau
-                    entry = ScheduleEntry(
-                        attribution=form.instance.attribution,
-                        type_horaire=form.instance.type_horaire,  # Type: cours ou examen
-                        annee_academique=form.instance.annee_academique,
-                        semaine_debut=current_date,
-                        date_cours=current_date,  # Utiliser la date du jour comme date de cours
-                        numero_semaine=numero_semaine,  # Numéro de semaine correspondant à la date
-                        jour=jours_fr[current_date.weekday()],  # Jour en français
-                        creneau=creneau,  # Utiliser le créneau de la boucle (AM ou PM si TJ)
-                        salle=form.instance.salle,
-                        salle_link=form.instance.salle_link,
-                        remarques=form.instance.remarques
-                    )
-                    
-                    # Valider l'entrée pour cette date et ce créneau
-                    validation_result = self._validate_entry(entry)
-                    if not validation_result['valid']:
-                        if force_conflicts:
-                            for error in validation_result['errors']:
-                                messages.warning(self.request, f"Le {current_date.strftime('%d/%m/%Y')} - {error}")
-                        else:
-                            for error in validation_result['errors']:
-                                form.add_error(None, f"Le {current_date.strftime('%d/%m/%Y')} - {error}")
-                            return self.form_invalid(form)
-                    
-                    # Sauvegarder l'entrée
-                    entry.save()
-                    created_entries.append(entry)
-                
-                # Passer au jour suivant
-                current_date += timedelta(days=1)
-            
-            # Message de succès avec le nombre d'entrées créées
-            messages.success(
-                self.request, 
-                f"[OK] {len(created_entries)} entrees d'horaire creees avec succes dans la plage du "
-                f"{date_debut.strftime('%d/%m/%Y')} au {date_fin.strftime('%d/%m/%Y')}."
-            )
-            # Définir self.object pour get_success_url (utiliser la dernière entrée créée)
-            self.object = created_entries[-1] if created_entries else None
-            return redirect(self.success_url)
+        trace.event(
+            'schedule_create.creneaux',
+            toute_la_journee=toute_la_journee,
+            creneaux=[creneau.code for creneau in creneaux_a_creer if creneau],
+        )
         
-        # Si pas de plage de dates, créer une ou plusieurs entrées selon le créneau
-        else:
-            print(f"CRÉATION D'UNE SEULE ENTRÉE pour {date_debut}")
-            
-            # Sauvegarder le numéro de semaine depuis SemaineCours
-            numero_semaine = None
-            if form.instance.semaine_debut:
-                try:
-                    # Chercher la semaine qui contient cette date
-                    semaine_obj = SemaineCours.objects.filter(
-                        date_debut__lte=form.instance.semaine_debut,
-                        date_fin__gte=form.instance.semaine_debut
-                    ).first()
-                    if semaine_obj:
-                        numero_semaine = semaine_obj.numero_semaine
-                except SemaineCours.DoesNotExist:
-                    pass
-            
+        # Développer la récurrence : dates de la plage, filtrées par jours et exclusions
+        dates = expand_dates(
+            date_debut,
+            date_fin if date_fin and date_fin >= date_debut else None,
+            jours=form.cleaned_data.get('jours_recurrence'),
+            exclues=form.cleaned_data.get('dates_exclues'),
+        )
+        if not dates:
+            form.add_error(None, "Aucune date ne correspond aux jours et exclusions choisis.")
+            return self.form_invalid(form)
+        
+        # Numéros de semaine résolus depuis une seule lecture de SemaineCours
+        semaines = SemaineTable.load()
+        
+        entries = []
+        for current_date in dates:
+            numero_semaine = semaines.numero_for(current_date)
             # Créer une entrée pour chaque créneau (1 ou 2 selon si c'est "Toute la journée")
-            for idx, creneau in enumerate(creneaux_a_creer):
-                print(f"\n=== Création entrée {idx+1}/{len(creneaux_a_creer)} ===")
-                print(f"Créneau: {creneau.code} - {creneau.designation}")
-                
-                # Créer une nouvelle entrée pour ce créneau
-                entry = ScheduleEntry(
+            for creneau in creneaux_a_creer:
+                entries.append(ScheduleEntry(
+                    organisation=form.instance.attribution.organisation,
                     attribution=form.instance.attribution,
                     type_horaire=form.instance.type_horaire,  # Type: cours ou examen
                     annee_academique=form.instance.annee_academique,
-                    semaine_debut=form.instance.semaine_debut,
-                    date_cours=form.instance.semaine_debut,
-                    numero_semaine=numero_semaine,
-                    jour=form.instance.jour,
-                    creneau=creneau,  # Utiliser le créneau de la boucle (AM ou PM si TJ)
+                    semaine_debut=current_date,
+                    date_cours=current_date,  # Utiliser la date du jour comme date de cours
+                    numero_semaine=numero_semaine,  # Numéro de semaine correspondant à la date
+                    jour=jour_from_date(current_date),  # Jour en français
+                    creneau=creneau,  # AM ou PM si "Toute la journée"
                     salle=form.instance.salle,
                     salle_link=form.instance.salle_link,
                     remarques=form.instance.remarques
-                )
-                
-                # Valider l'entrée
-                validation_result = self._validate_entry(entry)
-                if not validation_result['valid']:
-                    print(f"[WARN] Validation echouee pour {creneau.code}: {validation_result['errors']}")
-                    if force_conflicts:
-                        for error in validation_result['errors']:
-                            messages.warning(self.request, f"[{creneau.code}] {error}")
-                        # Continuer même si validation échoue avec force_conflicts
-                        entry.save()
-                        created_entries.append(entry)
-                        print(f"[OK] Entree {creneau.code} sauvegardee malgre les conflits (force_conflicts=True)")
-                    else:
-                        for error in validation_result['errors']:
-                            form.add_error(None, f"[{creneau.code}] {error}")
-                        # Ne pas arrêter la boucle, continuer avec le prochain créneau
-                        print(f"[ERREUR] Entree {creneau.code} non creee (validation echouee)")
-                        continue
-                else:
-                    # Sauvegarder l'entrée
-                    entry.save()
-                    created_entries.append(entry)
-                    print(f"[OK] Entree {creneau.code} creee avec succes")
-            
-            # Message de succès
-            if creneau_toute_journee:
-                messages.success(self.request, f"{len(created_entries)} horaires crees avec succes (Matin + Apres-midi). Aucun conflit detecte.")
-            else:
-                messages.success(self.request, "Horaire cree avec succes. Aucun conflit detecte.")
-            
-            # Définir self.object pour get_success_url
-            self.object = created_entries[-1] if created_entries else None
-            return redirect(self.success_url)
-    
-    def _validate_entry(self, entry):
-        """Valide une entrée d'horaire et retourne le résultat de la validation."""
-        from .validators import ScheduleConflictValidator
-        
-        print(f"\n=== VALIDATION DES CONFLITS ===")
-        print(f"Attribution: {entry.attribution}")
-        print(f"Jour: {entry.jour}")
-        print(f"Créneau: {entry.creneau}")
-        print(f"Date: {entry.semaine_debut}")
-        print(f"Salle: {entry.salle}")
+                ))
+        
+        # Valider tout le lot contre l'occupation chargée une seule fois
+        with trace.span('schedule_create.validation', entrees=len(entries)):
+            index = OccupancyIndex.load(dates[0], dates[-1])
+            validations = ScheduleConflictValidator.validate_batch(entries, index)
+        conflits = [
+            (entry, error)
+            for entry, validation in zip(entries, validations) if not validation['valid']
+            for error in validation['errors']
+        ]
         
-        validation_result = ScheduleConflictValidator.validate_schedule_entry(
-            attribution=entry.attribution,
-            jour=entry.jour,
-            creneau=entry.creneau,
-            semaine=entry.semaine_debut,
-            salle=entry.salle,
-            exclude_id=entry.pk if entry.pk else None
-        )
+        if conflits:
+            add_message = (
+                (lambda msg: messages.warning(self.request, msg)) if force_conflicts
+                else (lambda msg: form.add_error(None, msg))
+            )
+            for entry, error in conflits[:20]:
+                add_message(f"Le {entry.date_cours.strftime('%d/%m/%Y')} [{entry.creneau.code}] - {error}")
+            if len(conflits) > 20:
+                add_message(f"... et {len(conflits) - 20} autre(s) conflit(s).")
+            if not force_conflicts:
+                return self.form_invalid(form)
+            # Conflits acceptés : ces horaires sortent des contraintes d'unicité
+            for entry, _ in conflits:
+                entry.exclusif = None
         
-        print(f"Résultat validation: {validation_result}")
-        print(f"Valid: {validation_result['valid']}")
-        print(f"Errors: {validation_result['errors']}")
+        # Enregistrer toutes les entrées en une seule transaction
+        try:
+            with trace.span('schedule_create.enregistrement', conflits_forces=len(conflits)):
+                created = bulk_upsert_entries(entries)
+        except IntegrityError:
+            form.add_error(None, SLOT_TAKEN_MESSAGE)
+            return self.form_invalid(form)
+        _log_bulk_schedule(self.request, created)
+        
+        # Message de succès avec le nombre d'entrées créées
+        if len(dates) > 1:
+            messages.success(
+                self.request,
+                f"[OK] {created} entrees d'horaire creees avec succes dans la plage du "
+                f"{dates[0].strftime('%d/%m/%Y')} au {dates[-1].strftime('%d/%m/%Y')}."
+            )
+        elif creneau_toute_journee:
+            messages.success(self.request, f"{created} horaires crees avec succes (Matin + Apres-midi).")
+        else:
+            messages.success(self.request, "Horaire cree avec succes.")
         
-        return validation_result
+        # bulk_create ne renvoie pas toujours les clés (MySQL) : pas d'objet unique à afficher
+        self.object = None
+        return redirect(self.success_url)
     
     def form_invalid(self, form):
-        print("\n" + "="*60)
-        print("FORM_INVALID APPELE - Le formulaire contient des erreurs")
-        print("="*60)
-        print("Erreurs du formulaire:")
-        for field, errors in form.errors.items():
-            print(f"  - {field}: {errors}")
-        print("="*60 + "\n")
+        trace.event('schedule_create.formulaire_invalide', errors=lambda: form.errors.get_json_data())
         
         messages.error(self.request, "Erreur lors de la création de l'horaire. Vérifiez les données.")
         return super().form_invalid(form)
@@ -3013,11 +2822,11 @@ class ScheduleEntryUpdateView(UpdateView):
     success_url = reverse_lazy('attribution:schedule_entry_list')
     
     def get_context_data(self, **kwargs):
-        from reglage.models import AnneeAcademique, Classe
+        from reglage.models import Classe
         from accounts.organisation_utils import get_user_organisation
         
         context = super().get_context_data(**kwargs)
-        context['annee_courante'] = AnneeAcademique.objects.filter(est_en_cours=True).first()
+        context['annee_courante'] = reference_data().annee_courante
         
         # Filtrer les classes par section de l'organisation
         user_org = get_user_organisation(self.request.user)
@@ -3030,7 +2839,9 @@ class ScheduleEntryUpdateView(UpdateView):
         return context
     
     def form_valid(self, form):
+        from django.db import IntegrityError
         from reglage.models import SemaineCours
+        from .schedule_bulk import SLOT_TAKEN_MESSAGE
         from .validators import ScheduleConflictValidator
         
         force_conflicts = form.cleaned_data.get('force_conflicts')
@@ -3074,13 +2885,21 @@ class ScheduleEntryUpdateView(UpdateView):
                 for error in validation_result['errors']:
                     messages.error(self.request, error)
                 return self.form_invalid(form)
+        # Un conflit accepté sort l'horaire des contraintes d'unicité
+        form.instance.exclusif = True if validation_result['valid'] else None
         
         # Afficher les avertissements s'il y en a
         for warning in validation_result['warnings']:
             messages.warning(self.request, warning)
         
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+        except IntegrityError:
+            messages.error(self.request, SLOT_TAKEN_MESSAGE)
+            return self.form_invalid(form)
         messages.success(self.request, "[OK] Horaire modifie avec succes. Aucun conflit detecte.")
-        return super().form_valid(form)
+        return response
     
     def form_invalid(self, form):
         messages.error(self.request, "Erreur lors de la modification de l'horaire.")
@@ -3118,27 +2937,45 @@ def autocomplete_ues(request):
 
 
 def schedule_conflicts_report(request):
-    """Affiche un rapport des conflits pour une semaine donnée"""
+    """Affiche un rapport des conflits pour une semaine, une période ou une année académique"""
     from .validators import ScheduleConflictValidator
-    from reglage.models import SemaineCours
+    from reglage.models import SemaineCours, AnneeAcademique
+    
+    def parse_date(value):
+        try:
+            y, m, d = [int(x) for x in value.split('-')]
+            return datetime(y, m, d).date()
+        except (AttributeError, ValueError):
+            return None
     
     # Récupérer la semaine sélectionnée ou la semaine en cours
     semaine_param = request.GET.get('semaine')
+    date_debut = parse_date(request.GET.get('date_debut'))
+    date_fin = parse_date(request.GET.get('date_fin'))
+    annee_param = request.GET.get('annee', '').strip()
     
-    if semaine_param:
-        try:
-            y, m, d = [int(x) for x in semaine_param.split('-')]
-            semaine_date = datetime(y, m, d).date()
-        except:
-            semaine_date = None
-    else:
-        # Utiliser la semaine en cours par défaut
-        semaine_en_cours = SemaineCours.objects.filter(est_en_cours=True).first()
-        semaine_date = semaine_en_cours.date_debut if semaine_en_cours else None
-    
+    semaine_date = None
     conflicts_report = None
-    if semaine_date:
-        conflicts_report = ScheduleConflictValidator.get_conflicts_for_week(semaine_date)
+    
+    if date_debut or date_fin or annee_param:
+        # Audit d'une période ou d'une année entière en une seule requête
+        if date_debut and date_fin and date_fin < date_debut:
+            date_debut, date_fin = date_fin, date_debut
+        conflicts_report = ScheduleConflictValidator.get_conflicts(
+            date_debut=date_debut,
+            date_fin=date_fin,
+            annee_academique=annee_param or None,
+        )
+    else:
+        if semaine_param:
+            semaine_date = parse_date(semaine_param)
+        else:
+            # Utiliser la semaine en cours par défaut
+            semaine_en_cours = reference_data().semaine_courante
+            semaine_date = semaine_en_cours.date_debut if semaine_en_cours else None
+        
+        if semaine_date:
+            conflicts_report = ScheduleConflictValidator.get_conflicts_for_week(semaine_date)
     
     # Récupérer toutes les semaines pour le sélecteur
     semaines_cours = SemaineCours.objects.all().order_by('numero_semaine')
@@ -3147,6 +2984,10 @@ def schedule_conflicts_report(request):
         'conflicts_report': conflicts_report,
         'semaine_selectionnee': semaine_date,
         'semaines_cours': semaines_cours,
+        'annees_academiques': AnneeAcademique.objects.all(),
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'annee_selectionnee': annee_param,
     }
     
     return render(request, 'attribution/conflicts_report.html', context)
@@ -3441,7 +3282,6 @@ def heures_supplementaires_par_grade(request):
     """Vue pour afficher les heures supplémentaires attribuées par grade"""
     from django.db.models import Sum, Count, F
     from django.db.models.functions import Coalesce
-    import traceback
     
     try:
         # Récupérer l'année académique sélectionnée (optionnel)
@@ -3453,34 +3293,35 @@ def heures_supplementaires_par_grade(request):
         if annee_academique and (not annee_academique.strip() or annee_academique.startswith(':')):
             annee_academique = None
         
-        # DEBUG: Vérifier les types de charge disponibles
-        types_charges = Attribution.objects.values_list('type_charge', flat=True).distinct()
-        print(f"Types de charge disponibles: {list(types_charges)}")
-        print(f"Année académique reçue: '{annee_academique}'")
-        print(f"Section reçue: '{section}'")
-        
-        # DEBUG: Vérifier toutes les attributions
-        total_attributions = Attribution.objects.count()
-        print(f"Total de toutes les attributions: {total_attributions}")
+        trace.event(
+            'heures_sup.parametres',
+            annee=annee_academique,
+            section=section,
+            types_charge=lambda: list(Attribution.objects.values_list('type_charge', flat=True).distinct()),
+            total=lambda: Attribution.objects.count(),
+        )
         
         # Filtrer les attributions de type "supplementaire" (insensible à la casse)
         attributions = Attribution.objects.filter(type_charge__iexact='supplementaire').select_related('matricule', 'code_ue')
-        print(f"Nombre d'attributions supplémentaires trouvées: {attributions.count()}")
         
         # Si aucune attribution supplémentaire, essayer avec 'Reguliere' pour test
-        if attributions.count() == 0:
-            print("Aucune attribution supplémentaire trouvée, test avec 'Reguliere' pour débogage")
+        repli_reguliere = not attributions.exists()
+        if repli_reguliere:
+            trace.event('heures_sup.repli_reguliere')
             attributions = Attribution.objects.filter(type_charge__iexact='reguliere').select_related('matricule', 'code_ue')
-            print(f"Nombre d'attributions 'Reguliere' trouvées: {attributions.count()}")
         
-        # DEBUG: Afficher les sections uniques des enseignants
-        sections_enseignants = set(attr.matricule.section for attr in attributions if attr.matricule and attr.matricule.section)
-        print(f"Sections des enseignants dans les attributions: {sections_enseignants}")
+        trace.event(
+            'heures_sup.attributions',
+            total=lambda: attributions.count(),
+            sections=lambda: sorted(set(
+                attributions.exclude(matricule__section__isnull=True)
+                .values_list('matricule__section', flat=True)
+            )),
+        )
         
         # Filtrer par année si spécifiée
         if annee_academique:
             attributions = attributions.filter(annee_academique=annee_academique)
-            print(f"Après filtrage par année: {attributions.count()}")
         
         # Filtrer par section si spécifiée
         if section and section != 'ALL':
@@ -3500,20 +3341,16 @@ def heures_supplementaires_par_grade(request):
                         Q(matricule__section__icontains=section_obj.DesignationSection) |
                         Q(matricule__section__icontains=section_obj.CodeSection)
                     )
-                    print(f"Filtrage par section: {section_obj.DesignationSection} ({section_obj.CodeSection})")
                 else:
                     # Si la section n'est pas trouvée, filtrer directement par la valeur fournie
                     attributions = attributions.filter(
                         Q(matricule__section=section) |
                         Q(matricule__section__icontains=section)
                     )
-                    print(f"Filtrage par section (direct): {section}")
                 
-                print(f"Après filtrage par section: {attributions.count()}")
-            except Exception as e:
-                print(f"Erreur filtrage section: {e}")
-                import traceback
-                print(traceback.format_exc())
+                trace.event('heures_sup.filtre_section', section=section, trouvee=bool(section_obj))
+            except Exception:
+                logger.exception("Heures supplémentaires : échec du filtrage par section %r", section)
                 attributions = attributions.filter(matricule__section__icontains=section)
         
         # Si format PDF demandé, générer le PDF
@@ -3523,21 +3360,16 @@ def heures_supplementaires_par_grade(request):
         # Grouper par grade et calculer les statistiques
         stats_par_grade = {}
         
-        # DEBUG: Forcer l'évaluation du queryset et compter
         attributions_list = list(attributions)
-        print(f"DEBUG: Nombre d'attributions à traiter: {len(attributions_list)}")
         
-        for i, attribution in enumerate(attributions_list):
+        for attribution in attributions_list:
             try:
-                print(f"DEBUG: Traitement attribution {i+1}/{len(attributions_list)} - ID: {attribution.id}")
-                
                 # Vérifier que l'attribution a un matricule et un code_ue
                 if not attribution.matricule or not attribution.code_ue:
-                    print(f"Attribution {attribution.id} sans matricule ou code_ue")
+                    trace.event('heures_sup.attribution_incomplete', id=attribution.id)
                     continue
                 
                 grade = attribution.matricule.grade if attribution.matricule.grade else "Non spécifié"
-                print(f"DEBUG: Attribution {attribution.id} - Grade: {grade}")
                 
                 if grade not in stats_par_grade:
                     stats_par_grade[grade] = {
@@ -3562,14 +3394,11 @@ def heures_supplementaires_par_grade(request):
                 stats_par_grade[grade]['total_cmi'] += cmi
                 stats_par_grade[grade]['total_td_tp'] += td_tp
                 stats_par_grade[grade]['total_heures'] += (cmi + td_tp)
-                print(f"DEBUG: Attribution {attribution.id} traitée avec succès")
-            except Exception as e:
-                print(f"Erreur traitement attribution {attribution.id}: {e}")
-                import traceback
-                print(traceback.format_exc())
+            except Exception:
+                logger.exception("Heures supplémentaires : attribution %s ignorée", attribution.id)
                 continue
         
-        print(f"DEBUG: stats_par_grade après boucle: {list(stats_par_grade.keys())}")
+        trace.event('heures_sup.grades', traitees=len(attributions_list), grades=list(stats_par_grade))
         
         # Convertir les sets en nombres
         for grade in stats_par_grade:
@@ -3596,14 +3425,12 @@ def heures_supplementaires_par_grade(request):
         # Récupérer les sections depuis reglage/Section
         sections_disponibles = list(SectionReglage.objects.all().order_by('CodeSection').values_list('DesignationSection', flat=True))
         
-        # DEBUG
-        print(f"=== HEURES SUPPLEMENTAIRES DEBUG ===")
-        print(f"ATTENTION: Affichage des données de test (type 'Reguliere' si pas de 'Supplementaire')")
-        print(f"Années disponibles: {annees_disponibles}")
-        print(f"Sections disponibles: {sections_disponibles}")
-        print(f"Nombre de stats: {len(stats_list)}")
-        print(f"Stats par grade: {[s['grade'] for s in stats_list]}")
-        print(f"Total enseignants: {totaux['nombre_enseignants']}, Total cours: {totaux['nombre_cours']}")
+        trace.event(
+            'heures_sup.totaux',
+            enseignants=totaux['nombre_enseignants'],
+            cours=totaux['nombre_cours'],
+            heures=totaux['total_heures'],
+        )
         
         context = {
             'stats_par_grade': stats_list,
@@ -3612,21 +3439,18 @@ def heures_supplementaires_par_grade(request):
             'annees_disponibles': annees_disponibles,
             'sections_disponibles': sections_disponibles,
             'section_selectionnee': section,
-            'message_test': "Affichage des données de test (type 'Reguliere' si pas de 'Supplementaire')" if Attribution.objects.filter(type_charge__iexact='supplementaire').count() == 0 else None,
+            'message_test': "Affichage des données de test (type 'Reguliere' si pas de 'Supplementaire')" if repli_reguliere else None,
         }
         
         # Si la requête est en AJAX, retourner en JSON
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            print(f"Retour AJAX avec {len(annees_disponibles)} années et {len(sections_disponibles)} sections")
             return JsonResponse(context)
         
         # Sinon, retourner le template HTML
         return render(request, 'attribution/heures_supplementaires_grade.html', context)
         
     except Exception as e:
-        print(f"=== ERREUR HEURES SUPPLEMENTAIRES ===")
-        print(f"Erreur: {e}")
-        print(traceback.format_exc())
+        logger.exception("Erreur heures supplémentaires par grade")
         
         # Retourner une réponse d'erreur appropriée
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -3923,12 +3747,19 @@ def imprimer_charges_section(request):
 
 @csrf_exempt
 def import_excel_attributions(request):
-    """Importe les attributions depuis un fichier Excel"""
+    """
+    Importe les attributions depuis un fichier Excel
+
+    Avec le champ dry_run, le fichier est seulement validé. Les lignes
+    rejetées sont disponibles dans un rapport Excel (import_rejections).
+    """
     from accounts.models import Role
+    from accounts.principal import get_principal
+    from .attribution_import import import_attributions, save_rejection_report
     
     # Vérifier les permissions
     user = request.user
-    if not (user.is_authenticated and (user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())):
+    if not (user.is_authenticated and (user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))):
         messages.error(request, 'Permission refusée. Vous n\'avez pas les droits pour importer des attributions.')
         return redirect('attribution:liste_charges')
     
@@ -3941,6 +3772,7 @@ def import_excel_attributions(request):
         return redirect('attribution:liste_charges')
     
     file = request.FILES['file']
+    dry_run = bool(request.POST.get('dry_run'))
     
     # Vérifier l'extension du fichier
     if not file.name.endswith(('.xls', '.xlsx')):
@@ -3948,119 +3780,70 @@ def import_excel_attributions(request):
         return redirect('attribution:liste_charges')
     
     try:
-        # Lire le fichier Excel
-        df = pd.read_excel(file)
-        
-        # Colonnes attendues dans le fichier Excel
-        required_columns = ['matricule', 'code_ue', 'annee_academique', 'type_charge']
-        
-        # Vérifier les colonnes requises
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            messages.error(request, f'Colonnes manquantes dans le fichier Excel : {", ".join(missing_columns)}')
-            return redirect('attribution:liste_charges')
-        
-        # Statistiques d'import
-        total_rows = len(df)
-        imported_count = 0
-        skipped_count = 0
-        error_count = 0
-        
-        # Collecter les détails des lignes ignorées
-        skipped_details = []
-        error_details = []
-        
-        # Utiliser une transaction pour garantir la cohérence
-        with transaction.atomic():
-            for index, row in df.iterrows():
-                try:
-                    # Nettoyer les données
-                    matricule = str(row['matricule']).strip()
-                    code_ue = str(row['code_ue']).strip()
-                    annee_academique = str(row['annee_academique']).strip()
-                    type_charge = str(row['type_charge']).strip()
-                    
-                    # Valider les données
-                    if not matricule or not code_ue or not annee_academique or not type_charge:
-                        skipped_count += 1
-                        skipped_details.append(f"Ligne {index+2}: {matricule} - {code_ue} (données manquantes)")
-                        continue
-                    
-                    # Vérifier que l'enseignant existe
-                    try:
-                        teacher = Teacher.objects.get(matricule=matricule)
-                    except Teacher.DoesNotExist:
-                        skipped_count += 1
-                        skipped_details.append(f"Ligne {index+2}: {matricule} - {code_ue} (enseignant non trouvé)")
-                        continue
-                    
-                    # Vérifier que le cours existe
-                    try:
-                        course = Course.objects.get(code_ue=code_ue)
-                    except Course.DoesNotExist:
-                        skipped_count += 1
-                        skipped_details.append(f"Ligne {index+2}: {matricule} - {code_ue} (cours non trouvé)")
-                        continue
-                    
-                    # Valider le type de charge
-                    if type_charge not in ['Reguliere', 'Supplementaire']:
-                        type_charge = 'Reguliere'  # Valeur par défaut
-                    
-                    # Vérifier si l'attribution existe déjà
-                    if Attribution.objects.filter(
-                        matricule=teacher,
-                        code_ue=course,
-                        annee_academique=annee_academique
-                    ).exists():
-                        skipped_count += 1
-                        skipped_details.append(f"Ligne {index+2}: {matricule} - {code_ue} (attribution déjà existante)")
-                        continue
-                    
-                    # Créer l'attribution
-                    Attribution.objects.create(
-                        matricule=teacher,
-                        code_ue=course,
-                        annee_academique=annee_academique,
-                        type_charge=type_charge
-                    )
-                    
-                    imported_count += 1
-                    
-                except Exception as e:
-                    error_count += 1
-                    error_details.append(f"Ligne {index+2}: {matricule} - {code_ue} (erreur: {str(e)})")
-                    continue
-        
-        # Messages de succès
-        if imported_count > 0:
-            messages.success(request, f'✅ {imported_count} attributions ont été importées avec succès.')
-        
-        if skipped_count > 0:
-            messages.info(request, f'ℹ️ {skipped_count} lignes ont été ignorées (données manquantes, doublons ou références invalides).')
-            # Afficher les détails des lignes ignorées (limité à 10 pour éviter trop de messages)
-            for detail in skipped_details[:10]:
-                messages.info(request, f'🔸 {detail}')
-            if len(skipped_details) > 10:
-                messages.info(request, f'🔸 ... et {len(skipped_details) - 10} autres lignes ignorées')
-        
-        if error_count > 0:
-            messages.warning(request, f'⚠️ {error_count} lignes ont généré des erreurs lors de l\'import.')
-            # Afficher les détails des erreurs (limité à 10 pour éviter trop de messages)
-            for detail in error_details[:10]:
-                messages.warning(request, f'❌ {detail}')
-            if len(error_details) > 10:
-                messages.warning(request, f'❌ ... et {len(error_details) - 10} autres erreurs')
-        
-        # Message récapitulatif
-        total_processed = imported_count + skipped_count + error_count
-        if total_processed < total_rows:
-            messages.info(request, f'📊 Traitement : {total_processed}/{total_rows} lignes traitées.')
-        
+        result = import_attributions(pd.read_excel(file), dry_run=dry_run)
+    except ValueError as e:
+        messages.error(request, f'❌ {e}')
+        return redirect('attribution:liste_charges')
     except Exception as e:
         messages.error(request, f'❌ Erreur lors de la lecture du fichier Excel : {str(e)}')
+        return redirect('attribution:liste_charges')
+    
+    rejected = result['rejected']
+    request.session.pop('attribution_import_report', None)
+    if not rejected.empty:
+        try:
+            request.session['attribution_import_report'] = save_rejection_report(rejected)
+        except Exception:
+            # Le rapport est facultatif : l'import reste valide
+            pass
+    
+    # Messages de succès
+    if dry_run:
+        messages.info(request, f'🔎 Vérification : {result["imported"]} attribution(s) seraient importées sur {result["total"]} ligne(s). Aucune donnée n\'a été enregistrée.')
+    elif result['imported'] > 0:
+        _log_bulk_attributions(request, result['imported'])
+        messages.success(request, f'✅ {result["imported"]} attributions ont été importées avec succès.')
+    
+    if not rejected.empty:
+        messages.info(request, f'ℹ️ {len(rejected)} lignes ont été ignorées (données manquantes, doublons ou références invalides).')
+        # Afficher les détails des lignes ignorées (limité à 10 pour éviter trop de messages)
+        for row in rejected.head(10).itertuples(index=False):
+            messages.info(request, f'🔸 Ligne {row.ligne}: {row.matricule} - {row.code_ue} ({row.motif})')
+        if len(rejected) > 10:
+            messages.info(request, f'🔸 ... et {len(rejected) - 10} autres lignes ignorées (voir le rapport des rejets)')
     
     return redirect('attribution:liste_charges')
 
+
+def _log_bulk_attributions(request, created):
+    """Journalise en une ligne un import groupé (bulk_create n'émet pas post_save)"""
+    from tracking.models import ActionLog
+    ActionLog.log_action(
+        user=request.user,
+        action_type='attribution_create',
+        description=f"Import Excel des attributions: {created} attribution(s)",
+        model_name='Attribution',
+        request=request
+    )
+
+
+def import_rejections(request):
+    """Télécharge le rapport Excel des lignes rejetées au dernier import"""
+    from .attribution_import import report_path
+    
+    token = request.session.get('attribution_import_report')
+    if not token or not os.path.exists(report_path(token)):
+        messages.error(request, 'Aucun rapport de rejets disponible.')
+        return redirect('attribution:liste_charges')
+    
+    with open(report_path(token), 'rb') as report:
+        response = HttpResponse(
+            report.read(),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    response['Content-Disposition'] = 'attachment; filename="rejets_import_attributions.xlsx"'
+    return response
+
 def delete_all_attributions(request):
     """Supprimer toutes les attributions de charges (réservé au superuser)"""
     if not request.user.is_superuser:
@@ -4264,11 +4047,12 @@ def creer_paiement_heures_sup(request):
 def paiement_pdf(request, paiement_id):
     """Générer un PDF pour un paiement spécifique"""
     from accounts.models import Role
+    from accounts.principal import get_principal
     from datetime import datetime
     
     # Vérifier les permissions
     user = request.user
-    if not (user.is_authenticated and (user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())):
+    if not (user.is_authenticated and (user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))):
         return HttpResponse('Permission refusée', status=403)
     
     try:
@@ -4384,10 +4168,11 @@ def paiement_pdf(request, paiement_id):
 def rapport_paiements(request, type_rapport='global'):
     """Générer un rapport de paiements"""
     from accounts.models import Role
+    from accounts.principal import get_principal
     
     # Vérifier les permissions
     user = request.user
-    if not (user.is_authenticated and (user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())):
+    if not (user.is_authenticated and (user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))):
         return HttpResponse('Permission refusée', status=403)
     
     try:
@@ -4477,4 +4262,67 @@ def rapport_paiements(request, type_rapport='global'):
         return response
         
     except Exception as e:
-        return HttpResponse(f'Erreur lors de la génération du rapport: {str(e)}', status=500)
\ No newline at end of file
+        return HttpResponse(f'Erreur lors de la génération du rapport: {str(e)}', status=500)
+
+def demander_pdf(request, report):
+    """
+    Demande la génération d'un rapport PDF en arrière-plan
+
+    Les paramètres GET sont ceux de la vue PDF correspondante. Retourne
+    l'état de la tâche (créée ou déjà en cours pour la même demande).
+    """
+    from django.core.exceptions import PermissionDenied
+    from . import pdf_jobs
+
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentification requise'}, status=403)
+    if report not in pdf_jobs.REPORTS:
+        return JsonResponse({'error': f'Rapport inconnu : {report}'}, status=404)
+
+    source = request.POST if request.method == 'POST' else request.GET
+    try:
+        job, created = pdf_jobs.submit(report, pdf_jobs.clean_params(report, source), request.user)
+    except PermissionDenied as e:
+        return JsonResponse({'error': str(e)}, status=403)
+    data = pdf_jobs.as_dict(job)
+    data['created'] = created
+    return JsonResponse(data, status=202 if job.status != job.STATUS_DONE else 200)
+
+
+def _get_pdf_job(request, job_id):
+    """Tâche visible par l'utilisateur (même périmètre que le demandeur), sinon None"""
+    from . import pdf_jobs
+    from .models import PdfJob
+
+    if not request.user.is_authenticated:
+        return None
+    job = PdfJob.objects.filter(pk=job_id).first()
+    if job is None or (job.user_id != request.user.pk and job.scope != pdf_jobs.scope_of(request.user)):
+        return None
+    return job
+
+
+def pdf_job_status(request, job_id):
+    """État d'une génération PDF (JSON)"""
+    from . import pdf_jobs
+
+    job = _get_pdf_job(request, job_id)
+    if job is None:
+        return JsonResponse({'error': 'Tâche introuvable'}, status=404)
+    return JsonResponse(pdf_jobs.as_dict(job))
+
+
+def pdf_job_download(request, job_id):
+    """Télécharge le PDF d'une génération terminée"""
+    from django.http import FileResponse, Http404
+
+    job = _get_pdf_job(request, job_id)
+    if job is None or job.status != job.STATUS_DONE or not job.file:
+        raise Http404("PDF non disponible")
+    try:
+        pdf = job.file.open('rb')
+    except OSError:
+        raise Http404("PDF non disponible")
+    response = FileResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{job.filename or "rapport.pdf"}"'
+    return response
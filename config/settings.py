@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 import dj_database_url
 from decouple import config, Csv
 import pymysql
@@ -66,6 +67,9 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.PrincipalMiddleware',  # Rôles et organisation résolus une fois par requête
+    'tracking.query_budget.QueryBudgetMiddleware',  # Mesure des requêtes SQL par vue (désactivée par défaut)
+    'tracking.tracing.TracingMiddleware',  # Traces de diagnostic à la demande (en-tête X-Trace)
     'tracking.middleware_user.CurrentUserMiddleware',  # Middleware pour stocker l'utilisateur courant
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -89,6 +93,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'accounts.context_processors.user_roles',
+                'reglage.context_processors.reference',
             ],
             'debug': DEBUG,  # Active le mode debug pour les templates
         },
@@ -227,6 +232,14 @@ LOGGING = {
             'formatter': 'verbose',
             'encoding': 'utf-8',
         },
+        'trace_file': {
+            'level': 'DEBUG',
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'logs', 'trace.log'),
+            'formatter': 'verbose',
+            'encoding': 'utf-8',
+            'delay': True,  # Fichier créé à la première trace
+        },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
@@ -244,9 +257,65 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        # Traces de diagnostic (tracking/tracing.py), émises seulement pour les requêtes tracées
+        'trace': {
+            'handlers': ['trace_file'],
+            'level': 'DEBUG',
+            'propagate': False,
+        },
     },
 }
 
+# Traces de diagnostic : toutes les requêtes, ou celles d'un superutilisateur avec l'en-tête
+TRACE_ALL_REQUESTS = config('TRACE_ALL_REQUESTS', default=False, cast=bool)
+TRACE_HEADER = config('TRACE_HEADER', default='X-Trace')
+
+# Durée (secondes) du cache des rôles/organisation des utilisateurs (accounts.principal),
+# utilisé seulement avec un cache partagé entre processus (pas avec locmem)
+PRINCIPAL_CACHE_TIMEOUT = config('PRINCIPAL_CACHE_TIMEOUT', default=60, cast=int)
+
+# Registre des tables de référence (reglage.registry) : âge maximal (secondes)
+# d'un instantané, pour les processus qui ne partagent pas le cache
+REFERENCE_DATA_MAX_AGE = config('REFERENCE_DATA_MAX_AGE', default=300, cast=int)
+
+# Journal des actions (ActionLog) : écriture par lots dans un thread d'arrière-plan
+# (synchrone sous les tests : le thread aurait sa propre connexion à la base de test)
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+ACTION_LOG_ASYNC = config('ACTION_LOG_ASYNC', default=not TESTING, cast=bool)
+ACTION_LOG_BATCH_SIZE = config('ACTION_LOG_BATCH_SIZE', default=100, cast=int)  # Lignes par bulk_create
+ACTION_LOG_FLUSH_INTERVAL = config('ACTION_LOG_FLUSH_INTERVAL', default=2.0, cast=float)  # Secondes
+ACTION_LOG_QUEUE_SIZE = config('ACTION_LOG_QUEUE_SIZE', default=10000, cast=int)  # Au-delà, les logs sont perdus (comptés)
+# Rétention : les actions plus anciennes sont archivées dans MEDIA_ROOT/action_logs
+# puis supprimées (commande archive_action_logs). L'archivage automatique quotidien
+# est à activer explicitement, et seulement si MEDIA_ROOT est un stockage persistant
+ACTION_LOG_RETENTION_DAYS = config('ACTION_LOG_RETENTION_DAYS', default=180, cast=int)
+ACTION_LOG_AUTO_ARCHIVE = config('ACTION_LOG_AUTO_ARCHIVE', default=False, cast=bool)
+ACTION_LOG_ARCHIVE_FORMAT = config('ACTION_LOG_ARCHIVE_FORMAT', default='jsonl')  # jsonl ou parquet
+
+# Cache disque des PDF d'horaire (invalidé par les compteurs ScheduleVersion)
+SCHEDULE_PDF_CACHE = config('SCHEDULE_PDF_CACHE', default=True, cast=bool)
+SCHEDULE_PDF_CACHE_DIR = config('SCHEDULE_PDF_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'schedule_pdf'))
+SCHEDULE_PDF_CACHE_MAX_BYTES = config('SCHEDULE_PDF_CACHE_MAX_BYTES', default=200 * 1024 * 1024, cast=int)
+# Durée maximale de service d'un PDF en cache (secondes)
+SCHEDULE_PDF_CACHE_MAX_AGE = config('SCHEDULE_PDF_CACHE_MAX_AGE', default=24 * 3600, cast=int)
+
+# Génération des rapports PDF en arrière-plan (attribution/pdf_jobs.py)
+PDF_JOB_WORKERS = config('PDF_JOB_WORKERS', default=2, cast=int)
+PDF_JOB_TIMEOUT = config('PDF_JOB_TIMEOUT', default=600, cast=int)  # secondes avant reprise d'une tâche orpheline
+PDF_JOB_RETENTION_DAYS = config('PDF_JOB_RETENTION_DAYS', default=7, cast=int)
+
+# Génération automatique des horaires (attribution/timetable_solver.py) : budget de recherche (secondes)
+TIMETABLE_SOLVER_TIME_BUDGET = config('TIMETABLE_SOLVER_TIME_BUDGET', default=10, cast=float)
+
+# Mesure des requêtes SQL par vue (tracking/query_budget.py) : toujours active si
+# QUERY_BUDGET_ENABLED, sinon à la demande d'un superutilisateur via l'en-tête
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', default=False, cast=bool)
+QUERY_BUDGET_HEADER = config('QUERY_BUDGET_HEADER', default='X-Query-Budget')
+QUERY_BUDGET_WINDOW = config('QUERY_BUDGET_WINDOW', default=200, cast=int)  # mesures conservées par vue
+
+# Processus de rendu des fiches de charge d'une section (attribution/charge_sheets.py)
+CHARGE_SHEET_WORKERS = config('CHARGE_SHEET_WORKERS', default=min(4, os.cpu_count() or 1), cast=int)
+
 # Authentication settings
 LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'home'
@@ -2,7 +2,7 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.db.models import Count, Sum
-from reglage.models import AnneeAcademique, SemaineCours
+from reglage.registry import reference_data
 from attribution.models import ScheduleEntry
 from django.contrib import messages
 
@@ -23,8 +23,8 @@ def home(request):
     
     context = {
         'current_year': timezone.now().year,
-        'active_year': AnneeAcademique.objects.filter(est_en_cours=True).first(),
-        'current_week': SemaineCours.objects.filter(est_en_cours=True).first(),
+        'active_year': reference_data().annee_courante,
+        'current_week': reference_data().semaine_courante,
         'is_admin': is_admin or is_administrative,
         'organisations': organisations,
         'total_organisations': organisations.count(),
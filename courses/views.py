@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import UserPassesTestMixin
 from accounts.models import Role
+from accounts.principal import get_principal
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.db import transaction, models
@@ -13,8 +14,6 @@ from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
 from reglage.models import Departement, Classe
 import logging
-import os
-import tempfile
 
 logger = logging.getLogger(__name__)
 
@@ -63,7 +62,7 @@ class CourseListView(ListView):
         user = self.request.user
         context['can_delete_all'] = user.is_authenticated and (
             user.is_staff or 
-            user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists()
+            get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE)
         )
         
         # Ajouter les options de filtre par classe depuis reglage
@@ -122,7 +121,7 @@ class CourseCreateView(UserPassesTestMixin, CreateView):
         return user.is_authenticated and (
             user.is_staff or
             is_org_user(user) or
-            user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists()
+            get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE)
         )
 
 class CourseUpdateView(UserPassesTestMixin, UpdateView):
@@ -153,7 +152,7 @@ class CourseUpdateView(UserPassesTestMixin, UpdateView):
         user = self.request.user
         if not user.is_authenticated:
             return False
-        if user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists():
+        if user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE):
             return True
         user_org = get_user_organisation(user)
         if user_org and is_org_user(user):
@@ -240,7 +239,7 @@ class CourseDeleteView(UserPassesTestMixin, DeleteView):
         user = self.request.user
         if not user.is_authenticated:
             return False
-        if user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists():
+        if user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE):
             return True
         user_org = get_user_organisation(user)
         if user_org and is_org_user(user):
@@ -255,145 +254,101 @@ class CourseDeleteView(UserPassesTestMixin, DeleteView):
                 return True
         return False
 
+def _parse_course_row(row):
+    from reglage.import_jobs import cell_decimal, cell_text
+
+    return {
+        'code_ue': cell_text(row, 'code_ue'),
+        'intitule_ue': cell_text(row, 'intitule_ue'),
+        'intitule_ec': cell_text(row, 'intitule_ec', required=False),
+        'credit': cell_decimal(row, 'credit'),
+        'cmi': cell_decimal(row, 'cmi'),
+        'td_tp': cell_decimal(row, 'td_tp'),
+        'classe': cell_text(row, 'classe'),
+        'semestre': cell_text(row, 'semestre'),
+        'departement': cell_text(row, 'departement'),
+    }
+
+
+def _course_import_spec():
+    from reglage.import_jobs import ImportSpec
+
+    return ImportSpec(
+        model=Course,
+        key='code_ue',
+        required_columns=['code_ue', 'intitule_ue', 'intitule_ec', 'credit', 'cmi', 'td_tp', 'classe', 'semestre', 'departement'],
+        parse_row=_parse_course_row,
+        update_fields=['intitule_ue', 'intitule_ec', 'credit', 'cmi', 'td_tp', 'classe', 'semestre', 'departement'],
+        label='cours',
+        after_chunk=_refresh_course_schedules,
+    )
+
+
+def _refresh_course_schedules(rows):
+    """Horaires des cours importés : clés (classe, section) et cache des PDF (pas de post_save)"""
+    from attribution.models import ScheduleEntry, ScheduleVersion
+
+    ScheduleEntry.refresh_slot_keys_of(
+        ScheduleEntry.objects.filter(attribution__code_ue__code_ue__in=[row['code_ue'] for row in rows])
+    )
+    # Intitulés, noms et grades affichés dans les PDF d'horaire
+    ScheduleVersion.bump_reference_on_commit()
+
+
 @csrf_exempt
 def import_excel(request):
-    # Restreindre l'import aux administrateurs/gestionnaires et utilisateurs d'organisation
+    """
+    Import Excel des cours en deux temps
+
+    POST : lit le classeur une seule fois, valide chaque ligne et crée une
+    tâche d'import (job_id). GET avec l'en-tête X-Progress et ?job_id= :
+    écrit le lot suivant et renvoie la progression et les erreurs par ligne.
+    """
     from accounts.organisation_utils import get_user_organisation, is_org_user
+    from reglage.import_jobs import ImportJob, normalize_columns
+    # Restreindre l'import aux administrateurs/gestionnaires et utilisateurs d'organisation
     user = request.user
     user_org = get_user_organisation(user)
-    if not (user.is_authenticated and (user.is_staff or is_org_user(user) or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())):
+    if not (user.is_authenticated and (user.is_staff or is_org_user(user) or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))):
         return JsonResponse({'error': "Permission refusée"}, status=403)
 
+    spec = _course_import_spec()
+
     if request.method == 'POST':
+        excel_file = request.FILES.get('excel_file')
+        if not excel_file:
+            return JsonResponse({'error': 'Aucun fichier sélectionné'}, status=400)
         try:
-            excel_file = request.FILES.get('excel_file')
-            if not excel_file:
-                return JsonResponse({'error': 'Aucun fichier sélectionné'}, status=400)
-
-            # Créer un dossier temporaire s'il n'existe pas
-            temp_dir = os.path.join(tempfile.gettempdir(), 'excel_imports')
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # Sauvegarder le fichier temporairement
-            temp_path = os.path.join(temp_dir, excel_file.name)
-            with open(temp_path, 'wb+') as destination:
-                for chunk in excel_file.chunks():
-                    destination.write(chunk)
-
-            # Lire le fichier Excel
-            df = pd.read_excel(temp_path)
-            
-            # Normaliser les noms de colonnes
-            df.columns = [col.strip().lower().replace(' ', '_') for col in df.columns]
-            
-            # Vérifier les colonnes requises
-            required_columns = ['code_ue', 'intitule_ue', 'intitule_ec', 'credit', 'cmi', 'td_tp', 'classe', 'semestre', 'departement']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                os.remove(temp_path)  # Nettoyer le fichier temporaire
-                return JsonResponse({
-                    'error': f'Colonnes manquantes : {", ".join(missing_columns)}'
-                }, status=400)
-
-            # Envoyer le nombre total de lignes et le chemin du fichier
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({
-                    'total': len(df),
-                    'status': 'starting',
-                    'temp_file': temp_path
-                })
-
+            df = normalize_columns(pd.read_excel(excel_file))
+            # Assigner automatiquement la section de l'organisation
+            defaults = {'section': user_org.code} if user_org else None
+            job = ImportJob.create(spec, df, user.pk, defaults=defaults)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
-            # Nettoyer en cas d'erreur
-            if 'temp_path' in locals():
-                os.remove(temp_path)
-            return JsonResponse({
-                'error': f"Erreur lors de l'import: {str(e)}"
-            }, status=500)
+            logger.exception("Import Excel des cours : lecture du fichier impossible")
+            return JsonResponse({'error': f"Erreur lors de l'import: {str(e)}"}, status=500)
+
+        return JsonResponse(job.as_dict(spec.label))
 
     elif request.method == 'GET' and request.headers.get('X-Progress'):
+        job = ImportJob.load(request.GET.get('job_id'), user.pk)
+        if job is None:
+            return JsonResponse({'error': "Tâche d'import introuvable"}, status=404)
         try:
-            current_progress = int(request.GET.get('current', 0))
-            total = int(request.GET.get('total', 0))
-            temp_path = request.GET.get('temp_file')
-            
-            if not temp_path or not os.path.exists(temp_path) or current_progress >= total:
-                return JsonResponse({'error': 'Fichier temporaire non trouvé ou paramètres invalides'}, status=400)
-
-            # Lire le fichier Excel
-            df = pd.read_excel(temp_path)
-            df.columns = [col.strip().lower().replace(' ', '_') for col in df.columns]
-            
-            # Traiter le prochain lot de lignes (5 lignes à la fois)
-            batch_size = 5
-            end_index = min(current_progress + batch_size, total)
-            
-            for index in range(current_progress, end_index):
-                row = df.iloc[index]
-                try:
-                    course_data = {
-                        'code_ue': str(row['code_ue']).strip(),
-                        'intitule_ue': str(row['intitule_ue']).strip(),
-                        'intitule_ec': str(row['intitule_ec']).strip(),
-                        'credit': int(row['credit']),
-                        'cmi': int(row['cmi']),
-                        'td_tp': int(row['td_tp']),
-                        'classe': str(row['classe']).strip(),
-                        'semestre': str(row['semestre']).strip(),
-                        'departement': str(row['departement']).strip()
-                    }
-                    
-                    # Assigner automatiquement la section de l'organisation
-                    if user_org:
-                        course_data['section'] = user_org.code
-
-                    Course.objects.update_or_create(
-                        code_ue=course_data['code_ue'],
-                        defaults=course_data
-                    )
-
-                except Exception as e:
-                    # Nettoyer en cas d'erreur
-                    os.remove(temp_path)
-                    return JsonResponse({
-                        'error': f"Erreur à la ligne {index + 1}: {str(e)}"
-                    }, status=500)
-
-            progress = (end_index / total) * 100
-            
-            # Si c'est la dernière itération, supprimer le fichier temporaire
-            if end_index >= total:
-                os.remove(temp_path)
-                return JsonResponse({
-                    'current': end_index,
-                    'total': total,
-                    'progress': 100,
-                    'status': 'completed',
-                    'message': f"{end_index} cours importés avec succès!"
-                })
-            
-            return JsonResponse({
-                'current': end_index,
-                'total': total,
-                'progress': progress,
-                'status': 'processing',
-                'temp_file': temp_path
-            })
-
+            job.process_next(spec)
         except Exception as e:
-            # Nettoyer en cas d'erreur
-            if 'temp_path' in locals():
-                os.remove(temp_path)
-            return JsonResponse({
-                'error': f"Erreur lors du traitement: {str(e)}"
-            }, status=500)
+            logger.exception("Import Excel des cours : échec du lot suivant")
+            return JsonResponse({'error': f"Erreur lors du traitement: {str(e)}"}, status=500)
+        return JsonResponse(job.as_dict(spec.label))
+
+    return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
 
 def import_courses(request):
     """Importe des cours à partir d'un fichier Excel."""
     # Restreindre l'import aux administrateurs/gestionnaires
     user = request.user
-    if not (user.is_authenticated and (user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())):
+    if not (user.is_authenticated and (user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))):
         messages.error(request, "Permission refusée")
         return redirect('courses:list')
 
@@ -573,7 +528,7 @@ def delete_selected_courses(request):
     
     # Vérifier les permissions
     user = request.user
-    if not (user.is_authenticated and (user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())):
+    if not (user.is_authenticated and (user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))):
         messages.error(request, 'Permission refusée. Vous n\'avez pas les droits pour supprimer des cours.')
         return redirect('courses:list')
     
@@ -626,7 +581,7 @@ def delete_all_courses(request):
     
     # Vérifier les permissions
     user = request.user
-    if not (user.is_authenticated and (user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())):
+    if not (user.is_authenticated and (user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))):
         messages.error(request, 'Permission refusée. Vous n\'avez pas les droits pour supprimer tous les cours.')
         return redirect('courses:list')
     
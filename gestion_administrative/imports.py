@@ -0,0 +1,173 @@
+"""
+Imports Excel des étudiants et des inscriptions par lots
+
+Chaque lot compare le classeur aux données existantes en une requête, crée
+les nouvelles lignes avec bulk_create et met à jour les lignes modifiées
+avec bulk_update. Les imports sont exécutés en arrière-plan par
+reglage.import_jobs.ImportJob (progression et reprise après échec).
+"""
+import pandas as pd
+from django.utils import timezone
+
+from reglage.import_jobs import ImportSpec, cell_text
+from reglage.models import Classe, Departement
+
+from .models import Etudiant, Inscription
+
+
+ETUDIANT_FIELDS = [
+    'nom_complet', 'date_naissance', 'sexe', 'telephone', 'departement_id', 'classe', 'annee_academique',
+]
+
+
+def _departement_lookup():
+    """Code du département par code ou désignation (insensible à la casse)"""
+    lookup = {}
+    for code, designation in Departement.objects.values_list('CodeDept', 'DesignationDept'):
+        lookup[designation.strip().lower()] = code
+        lookup[code.strip().lower()] = code
+    return lookup
+
+
+def etudiant_spec():
+    """Import des étudiants : clé matricule, colonnes optionnelles mises à jour si renseignées"""
+    departements = _departement_lookup()
+
+    def parse_row(row):
+        values = {
+            'matricule': cell_text(row, 'matricule'),
+            'nom_complet': cell_text(row, 'nom_complet'),
+            'sexe': cell_text(row, 'sexe', required=False),
+            'telephone': cell_text(row, 'telephone', required=False),
+            'classe': cell_text(row, 'classe', required=False),
+            'annee_academique': cell_text(row, 'annee_academique', required=False),
+            'date_naissance': None,
+            'departement_id': None,
+        }
+        if row.get('date_naissance') is not None:
+            values['date_naissance'] = pd.to_datetime(row['date_naissance']).date()
+        departement = cell_text(row, 'departement', required=False)
+        if departement:
+            values['departement_id'] = departements.get(departement.lower())
+            if values['departement_id'] is None:
+                raise ValueError(f"Département inconnu : {departement}")
+        return values
+
+    return ImportSpec(
+        model=Etudiant,
+        key='matricule',
+        required_columns=['matricule', 'nom_complet'],
+        parse_row=parse_row,
+        update_fields=ETUDIANT_FIELDS,
+        label='étudiants',
+        write_chunk=write_etudiants,
+    )
+
+
+def write_etudiants(rows):
+    """
+    Crée les nouveaux étudiants et met à jour ceux dont une valeur change
+
+    Une cellule vide ne remplace pas la valeur existante.
+
+    Returns:
+        tuple: (créés, modifiés)
+    """
+    existing = Etudiant.objects.in_bulk([row['matricule'] for row in rows], field_name='matricule')
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    for row in rows:
+        etudiant = existing.get(row['matricule'])
+        if etudiant is None:
+            to_create.append(Etudiant(matricule=row['matricule'], **{f: row[f] for f in ETUDIANT_FIELDS}))
+            continue
+        changed = False
+        for field in ETUDIANT_FIELDS:
+            value = row[field]
+            if value is not None and str(getattr(etudiant, field)) != str(value):
+                setattr(etudiant, field, value)
+                changed = True
+        if changed:
+            # bulk_update ne renseigne pas auto_now
+            etudiant.updated_at = now
+            to_update.append(etudiant)
+
+    Etudiant.objects.bulk_create(to_create)
+    Etudiant.objects.bulk_update(to_update, ETUDIANT_FIELDS + ['updated_at'])
+    return len(to_create), len(to_update)
+
+
+def inscription_spec():
+    """Import des inscriptions : une ligne par (matricule, code_classe, année)"""
+    def parse_row(row):
+        return {
+            'matricule': cell_text(row, 'matricule'),
+            'code_classe': cell_text(row, 'code_classe'),
+            'annee_academique': cell_text(row, 'annee_academique'),
+        }
+
+    return ImportSpec(
+        model=Inscription,
+        key=('matricule', 'code_classe', 'annee_academique'),
+        required_columns=['matricule', 'code_classe', 'annee_academique'],
+        parse_row=parse_row,
+        update_fields=[],
+        label='inscriptions',
+        write_chunk=write_inscriptions,
+    )
+
+
+def write_inscriptions(rows):
+    """
+    Crée les inscriptions manquantes et réactive les inscriptions inactives
+
+    Returns:
+        tuple: (créées, réactivées, erreurs par ligne)
+    """
+    etudiants = dict(
+        Etudiant.objects.filter(matricule__in={row['matricule'] for row in rows})
+        .values_list('matricule', 'id')
+    )
+    classes = dict(
+        Classe.objects.filter(CodeClasse__in={row['code_classe'] for row in rows})
+        .values_list('CodeClasse', 'id')
+    )
+
+    errors = []
+    wanted = {}
+    for row in rows:
+        etudiant_id = etudiants.get(row['matricule'])
+        classe_id = classes.get(row['code_classe'])
+        if etudiant_id is None:
+            errors.append({'ligne': row['_ligne'], 'erreur': f"Étudiant {row['matricule']} non trouvé"})
+        elif classe_id is None:
+            errors.append({'ligne': row['_ligne'], 'erreur': f"Classe {row['code_classe']} non trouvée"})
+        else:
+            wanted[(etudiant_id, classe_id, row['annee_academique'])] = row
+
+    existing = {
+        (etudiant_id, classe_id, annee): (pk, est_actif)
+        for pk, etudiant_id, classe_id, annee, est_actif in Inscription.objects.filter(
+            etudiant_id__in={key[0] for key in wanted},
+            code_classe_id__in={key[1] for key in wanted},
+            annee_academique__in={key[2] for key in wanted},
+        ).values_list('id', 'etudiant_id', 'code_classe_id', 'annee_academique', 'est_actif')
+    }
+
+    to_create = [
+        Inscription(etudiant_id=key[0], code_classe_id=key[1], annee_academique=key[2], est_actif=True)
+        for key in wanted if key not in existing
+    ]
+    inactive = [existing[key][0] for key in wanted if key in existing and not existing[key][1]]
+
+    Inscription.objects.bulk_create(to_create)
+    if inactive:
+        Inscription.objects.filter(pk__in=inactive).update(est_actif=True, updated_at=timezone.now())
+    return len(to_create), len(inactive), errors
+
+
+SPECS = {
+    'étudiants': etudiant_spec,
+    'inscriptions': inscription_spec,
+}
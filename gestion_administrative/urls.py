@@ -32,4 +32,8 @@ urlpatterns = [
     path('inscriptions/modifier/<int:inscription_id>/', views.modifier_inscription, name='modifier_inscription'),
     path('inscriptions/supprimer/<int:inscription_id>/', views.supprimer_inscription, name='supprimer_inscription'),
     path('inscriptions/import/', views.importer_inscriptions_excel, name='importer_inscriptions'),
+    
+    # Suivi des imports Excel en arrière-plan
+    path('imports/<str:job_id>/', views.import_job_status, name='import_job_status'),
+    path('imports/<str:job_id>/reprendre/', views.reprendre_import, name='reprendre_import'),
 ]
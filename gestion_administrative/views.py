@@ -190,80 +190,73 @@ def supprimer_etudiant(request, etudiant_id):
     return JsonResponse({'success': False, 'message': 'Méthode non autorisée'})
 
 
+def _start_import(request, spec, fichier):
+    """Lit le classeur, crée la tâche d'import et la lance en arrière-plan"""
+    from reglage.import_jobs import ImportJob, normalize_columns
+
+    df = normalize_columns(pd.read_excel(fichier))
+    job = ImportJob.create(spec, df, request.user.pk)
+    job.start(spec)
+    return job
+
+
+def _job_param(request):
+    """Identifiant de tâche passé dans ?job= (hexadécimal uniquement)"""
+    job_id = request.GET.get('job', '')
+    return job_id if job_id.isalnum() else None
+
+
 def importer_etudiants_excel(request):
-    """Importer des étudiants depuis un fichier Excel"""
+    """
+    Importer des étudiants depuis un fichier Excel
+
+    L'import est exécuté en arrière-plan ; la page suit sa progression
+    (import_job_status) et permet de le reprendre après un échec.
+    """
+    from .imports import etudiant_spec
+
     if request.method == 'POST':
         form = ImportExcelForm(request.POST, request.FILES)
         if form.is_valid():
             try:
-                fichier = request.FILES['fichier_excel']
-                df = pd.read_excel(fichier)
-                
-                # Colonnes attendues
-                colonnes_requises = ['matricule', 'nom_complet']
-                colonnes_optionnelles = [
-                    'date_naissance', 'sexe', 'telephone', 'departement', 'classe', 'annee_academique'
-                ]
-                
-                # Vérifier les colonnes requises
-                for col in colonnes_requises:
-                    if col not in df.columns:
-                        messages.error(request, f'Colonne requise manquante: {col}')
-                        return render(request, 'gestion_administrative/etudiants/import.html', {'form': form})
-                
-                etudiants_crees = 0
-                etudiants_modifies = 0
-                erreurs = []
-                
-                for index, row in df.iterrows():
-                    try:
-                        # Préparer les données
-                        data = {
-                            'matricule': str(row['matricule']).strip(),
-                            'nom_complet': str(row['nom_complet']).strip(),
-                        }
-                        
-                        # Ajouter les colonnes optionnelles si présentes
-                        for col in colonnes_optionnelles:
-                            if col in df.columns and pd.notna(row[col]):
-                                if col == 'date_naissance':
-                                    data[col] = pd.to_datetime(row[col]).date()
-                                else:
-                                    data[col] = str(row[col]).strip()
-                        
-                        # Créer ou mettre à jour l'étudiant
-                        etudiant, created = Etudiant.objects.update_or_create(
-                            matricule=data['matricule'],
-                            defaults=data
-                        )
-                        
-                        if created:
-                            etudiants_crees += 1
-                        else:
-                            etudiants_modifies += 1
-                            
-                    except Exception as e:
-                        erreurs.append(f'Ligne {index + 2}: {str(e)}')
-                
-                # Messages de résultat
-                if etudiants_crees > 0:
-                    messages.success(request, f'{etudiants_crees} étudiants créés')
-                if etudiants_modifies > 0:
-                    messages.info(request, f'{etudiants_modifies} étudiants modifiés')
-                if erreurs:
-                    for erreur in erreurs[:5]:  # Limiter à 5 erreurs
-                        messages.error(request, erreur)
-                    if len(erreurs) > 5:
-                        messages.error(request, f'... et {len(erreurs) - 5} autres erreurs')
-                
-                return redirect('gestion_administrative:liste_etudiants')
-                
+                job = _start_import(request, etudiant_spec(), request.FILES['fichier_excel'])
+                return redirect(f"{request.path}?job={job.job_id}")
+            except ValueError as e:
+                messages.error(request, str(e))
             except Exception as e:
                 messages.error(request, f'Erreur lors de l\'importation: {str(e)}')
     else:
         form = ImportExcelForm()
     
-    return render(request, 'gestion_administrative/etudiants/import.html', {'form': form})
+    return render(request, 'gestion_administrative/etudiants/import.html', {
+        'form': form,
+        'job_id': _job_param(request),
+        'liste_url': 'gestion_administrative:liste_etudiants',
+    })
+
+
+def import_job_status(request, job_id):
+    """Progression d'une tâche d'import (JSON)"""
+    from reglage.import_jobs import ImportJob
+
+    job = ImportJob.load(job_id, request.user.pk)
+    if job is None:
+        return JsonResponse({'error': "Tâche d'import introuvable"}, status=404)
+    return JsonResponse(job.as_dict(job.state['label']))
+
+
+def reprendre_import(request, job_id):
+    """Relance une tâche d'import interrompue à partir du dernier lot enregistré"""
+    from reglage.import_jobs import ImportJob
+    from .imports import SPECS
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
+    job = ImportJob.load(job_id, request.user.pk)
+    if job is None or job.state['label'] not in SPECS:
+        return JsonResponse({'error': "Tâche d'import introuvable"}, status=404)
+    job.start(SPECS[job.state['label']]())
+    return JsonResponse(job.as_dict(job.state['label']))
 
 
 def supprimer_absence_etudiant(request, absence_id):
@@ -949,81 +942,24 @@ def supprimer_inscription(request, inscription_id):
 
 
 def importer_inscriptions_excel(request):
-    """Importe des inscriptions depuis un fichier Excel"""
+    """Importe des inscriptions depuis un fichier Excel (en arrière-plan, voir importer_etudiants_excel)"""
+    from .imports import inscription_spec
+
     if request.method == 'POST':
         form = ImportInscriptionsForm(request.POST, request.FILES)
         if form.is_valid():
             try:
-                print('DEBUG importer_inscriptions_excel: using pandas + *_id assignment')
-                fichier = request.FILES['excel_file']
-                df = pd.read_excel(fichier)
-                
-                # Colonnes attendues
-                colonnes_requises = ['matricule', 'code_classe', 'annee_academique']
-                
-                # Vérifier les colonnes requises
-                for col in colonnes_requises:
-                    if col not in df.columns:
-                        messages.error(request, f'Colonne requise manquante: {col}')
-                        return render(request, 'gestion_administrative/import_inscriptions.html', {'form': form})
-                
-                inscriptions_crees = 0
-                inscriptions_modifiees = 0
-                erreurs = []
-                
-                for index, row in df.iterrows():
-                    try:
-                        # Récupérer les données
-                        matricule = str(row['matricule']).strip()
-                        code_classe = str(row['code_classe']).strip()
-                        annee_academique = str(row['annee_academique']).strip()
-                        
-                        # Vérifier l'étudiant
-                        try:
-                            etudiant = Etudiant.objects.get(matricule=matricule)
-                        except Etudiant.DoesNotExist:
-                            erreurs.append(f'Ligne {index + 2}: Étudiant {matricule} non trouvé')
-                            continue
-                        
-                        # Vérifier la classe
-                        try:
-                            classe_id = Classe.objects.only('id').get(CodeClasse=code_classe).id
-                        except Classe.DoesNotExist:
-                            erreurs.append(f'Ligne {index + 2}: Classe {code_classe} non trouvée')
-                            continue
-                        
-                        # Créer ou mettre à jour l'inscription
-                        inscription, created = Inscription.objects.update_or_create(
-                            etudiant_id=etudiant.id,
-                            code_classe_id=classe_id,
-                            annee_academique=annee_academique,
-                            defaults={'est_actif': True}
-                        )
-                        
-                        if created:
-                            inscriptions_crees += 1
-                        else:
-                            inscriptions_modifiees += 1
-                            
-                    except Exception as e:
-                        erreurs.append(f'Ligne {index + 2}: {str(e)}')
-                
-                # Messages de résultat
-                if inscriptions_crees > 0:
-                    messages.success(request, f'{inscriptions_crees} inscriptions créées')
-                if inscriptions_modifiees > 0:
-                    messages.info(request, f'{inscriptions_modifiees} inscriptions modifiées')
-                if erreurs:
-                    for erreur in erreurs[:5]:  # Limiter à 5 erreurs
-                        messages.error(request, erreur)
-                    if len(erreurs) > 5:
-                        messages.error(request, f'... et {len(erreurs) - 5} autres erreurs')
-                
-                return redirect('gestion_administrative:liste_inscriptions')
-                
+                job = _start_import(request, inscription_spec(), request.FILES['excel_file'])
+                return redirect(f"{request.path}?job={job.job_id}")
+            except ValueError as e:
+                messages.error(request, str(e))
             except Exception as e:
                 messages.error(request, f'Erreur lors de l\'importation: {str(e)}')
     else:
         form = ImportInscriptionsForm()
     
-    return render(request, 'gestion_administrative/import_inscriptions.html', {'form': form})
+    return render(request, 'gestion_administrative/import_inscriptions.html', {
+        'form': form,
+        'job_id': _job_param(request),
+        'liste_url': 'gestion_administrative:liste_inscriptions',
+    })
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ReglageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reglage'
+    
+    def ready(self):
+        """Brancher l'invalidation du registre des tables de référence"""
+        import reglage.signals
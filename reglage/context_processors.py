@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .registry import reference_data
+
+
+def reference(request):
+    """Tables de référence pour les templates ({{ reference.annee_courante }}), chargées au premier accès"""
+    return {'reference': SimpleLazyObject(reference_data)}
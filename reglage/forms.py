@@ -1,5 +1,5 @@
 from django import forms
-from .models import SemaineCours, AnneeAcademique, Creneau, Section
+from .models import SemaineCours, Creneau, Section
 
 
 class SemaineCoursForm(forms.ModelForm):
@@ -40,8 +40,9 @@ class SemaineCoursForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         
         # Récupérer toutes les années académiques
-        annees = AnneeAcademique.objects.all().order_by('-code')
-        annee_courante = AnneeAcademique.objects.filter(est_en_cours=True).first()
+        from .registry import reference_data
+        annees = reference_data().annees
+        annee_courante = reference_data().annee_courante
         
         # Créer les choix pour le combo année académique
         choix_annees = [('', '-- Sélectionner une année --')]
@@ -0,0 +1,461 @@
+"""
+Imports Excel par tâches : lecture unique du classeur puis écriture par lots
+
+Le classeur est lu une seule fois à la création de la tâche. Les lignes
+valides sont normalisées et stockées sous forme de colonnes (JSON) dans un
+dossier de travail propre à la tâche ; chaque appel de progression écrit
+ensuite un lot complet avec bulk_create(update_conflicts=True).
+
+Les imports volumineux peuvent aussi être traités par un thread
+(ImportJob.start) : l'état est enregistré après chaque lot, ce qui permet de
+reprendre la tâche après un échec.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import InterfaceError, OperationalError, close_old_connections, connection, transaction
+
+
+logger = logging.getLogger(__name__)
+
+IMPORT_ROOT = os.path.join(tempfile.gettempdir(), 'excel_imports')
+
+# Lignes écrites par appel de progression
+CHUNK_SIZE = 500
+
+# Nombre maximal d'erreurs renvoyées au navigateur
+MAX_ERRORS_REPORTED = 200
+
+# Les dossiers de tâches plus anciens sont supprimés
+JOB_MAX_AGE = 24 * 3600
+
+# Une tâche 'running' sans signe de vie depuis ce délai peut être reprise
+STALE_AFTER = 120
+
+# Tâches traitées par un thread de ce processus
+_running = set()
+_running_lock = threading.Lock()
+
+
+def normalize_columns(df):
+    """Noms de colonnes en minuscules, espaces remplacés par des soulignés"""
+    df.columns = [str(col).strip().lower().replace(' ', '_') for col in df.columns]
+    return df
+
+
+def cell_text(row, column, required=True):
+    """
+    Valeur texte d'une cellule
+
+    Les nombres entiers lus comme flottants (matricule 1234.0) sont
+    rendus sans décimale.
+
+    Raises:
+        ValueError: si la cellule est vide et obligatoire
+    """
+    value = row.get(column)
+    if value is None or str(value).strip() == '':
+        if required:
+            raise ValueError(f"Colonne '{column}' vide")
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def cell_decimal(row, column):
+    """Valeur numérique d'une cellule (accepte 3,5 comme 3.5)"""
+    text = cell_text(row, column).replace(',', '.')
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"Colonne '{column}' : valeur numérique invalide ({text})")
+
+
+class ImportSpec:
+    """
+    Description d'un import : modèle cible, clé d'unicité et conversion des lignes
+
+    Args:
+        model: modèle Django cible
+        key: champ unique servant à l'upsert (ex: 'code_ue'), ou tuple de
+            champs identifiant une ligne quand write_chunk est fourni
+        required_columns: colonnes obligatoires du classeur
+        parse_row: callable(row: dict) -> dict de champs ; lève ValueError
+        update_fields: champs mis à jour quand la clé existe déjà
+        label: libellé au pluriel pour les messages ('cours', 'enseignants')
+        write_chunk: callable(rows: list[dict]) -> (créés, modifiés) ou
+            (créés, modifiés, erreurs) remplaçant l'upsert par défaut (appelé
+            dans une transaction). Chaque ligne porte son numéro Excel dans
+            '_ligne'.
+        after_chunk: callable(rows: list[dict]) appelé dans la même
+            transaction après l'écriture d'un lot (mise à jour des données
+            dérivées que bulk_create ne déclenche pas : pas de post_save)
+    """
+
+    def __init__(self, model, key, required_columns, parse_row, update_fields, label, write_chunk=None,
+                 after_chunk=None):
+        self.model = model
+        self.key = key
+        self.required_columns = required_columns
+        self.parse_row = parse_row
+        self.update_fields = update_fields
+        self.label = label
+        self.write_chunk = write_chunk
+        self.after_chunk = after_chunk
+
+    @property
+    def key_fields(self):
+        return list(self.key) if isinstance(self.key, (list, tuple)) else [self.key]
+
+    def key_of(self, values):
+        if isinstance(self.key, (list, tuple)):
+            return tuple(values[name] for name in self.key)
+        return values[self.key]
+
+
+class ImportJob:
+    """
+    Tâche d'import identifiée par un job_id
+
+    L'état (total, lignes traitées, créations, mises à jour, erreurs) est
+    conservé dans state.json, les données normalisées dans rows.json.
+    """
+
+    def __init__(self, job_id, state):
+        self.job_id = job_id
+        self.state = state
+
+    # --- Création / chargement ---------------------------------------------
+
+    @staticmethod
+    def _folder(job_id):
+        return os.path.join(IMPORT_ROOT, job_id)
+
+    @classmethod
+    def create(cls, spec, df, owner_id, defaults=None):
+        """
+        Valide et met en forme toutes les lignes du DataFrame
+
+        Args:
+            spec: ImportSpec
+            df: DataFrame déjà lu (colonnes normalisées)
+            owner_id: ID de l'utilisateur propriétaire de la tâche
+            defaults: dict de champs imposés à toutes les lignes (ex: section)
+
+        Returns:
+            ImportJob
+
+        Raises:
+            ValueError: si des colonnes obligatoires manquent
+        """
+        missing = [col for col in spec.required_columns if col not in df.columns]
+        if missing:
+            raise ValueError(f'Colonnes manquantes : {", ".join(missing)}')
+
+        defaults = defaults or {}
+        records = df.astype(object).where(df.notna(), None).to_dict('records')
+
+        errors = []
+        by_key = {}
+        for index, row in enumerate(records):
+            ligne = index + 2  # ligne Excel (en-tête en ligne 1)
+            try:
+                values = spec.parse_row(row)
+            except (ValueError, TypeError, ArithmeticError) as e:
+                errors.append({'ligne': ligne, 'erreur': str(e)})
+                continue
+            values.update(defaults)
+            values['_ligne'] = ligne
+            # Une clé répétée dans le classeur : la dernière ligne l'emporte
+            by_key[spec.key_of(values)] = values
+
+        key_fields = spec.key_fields
+        fields = key_fields + [f for f in spec.update_fields if f not in key_fields]
+        for name in defaults:
+            if name not in fields:
+                fields.append(name)
+        # Stockage par colonnes ; Decimal et dates sont écrits sous forme de texte
+        columns = {name: [] for name in fields + ['_ligne']}
+        for values in by_key.values():
+            for name in columns:
+                value = values.get(name)
+                if value is not None and not isinstance(value, (str, int, float)):
+                    value = str(value)
+                columns[name].append(value)
+
+        cls.prune()
+        job_id = uuid.uuid4().hex
+        folder = cls._folder(job_id)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, 'rows.json'), 'w', encoding='utf-8') as staged:
+            json.dump(columns, staged, ensure_ascii=False)
+
+        job = cls(job_id, {
+            'owner_id': owner_id,
+            'label': spec.label,
+            'fields': fields,
+            'update_fields': [f for f in fields if f not in key_fields],
+            'rows_read': len(records),
+            'total': len(by_key),
+            'current': 0,
+            'created': 0,
+            'updated': 0,
+            'errors': errors,
+            'status': 'starting' if by_key else 'completed',
+        })
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, job_id, owner_id):
+        """Retourne la tâche si elle existe et appartient à l'utilisateur, sinon None"""
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(os.path.join(cls._folder(job_id), 'state.json'), encoding='utf-8') as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            return None
+        if state.get('owner_id') != owner_id:
+            return None
+        return cls(job_id, state)
+
+    def save(self):
+        path = os.path.join(self._folder(self.job_id), 'state.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as state_file:
+            json.dump(self.state, state_file, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def cleanup(self):
+        """Supprime les données de travail (l'état reste lisible jusqu'au nettoyage)"""
+        try:
+            os.remove(os.path.join(self._folder(self.job_id), 'rows.json'))
+        except OSError:
+            pass
+
+    def discard(self):
+        shutil.rmtree(self._folder(self.job_id), ignore_errors=True)
+
+    @classmethod
+    def prune(cls, max_age=JOB_MAX_AGE):
+        """Supprime les tâches abandonnées ou terminées depuis plus de max_age secondes"""
+        try:
+            names = os.listdir(IMPORT_ROOT)
+        except OSError:
+            return
+        limit = time.time() - max_age
+        for name in names:
+            folder = os.path.join(IMPORT_ROOT, name)
+            try:
+                if os.path.getmtime(folder) < limit:
+                    if os.path.isdir(folder):
+                        shutil.rmtree(folder, ignore_errors=True)
+                    else:
+                        os.remove(folder)
+            except OSError:
+                pass
+
+    # --- Traitement --------------------------------------------------------
+
+    def _rows(self, start, stop):
+        with open(os.path.join(self._folder(self.job_id), 'rows.json'), encoding='utf-8') as staged:
+            columns = json.load(staged)
+        names = list(columns)
+        return [
+            {name: columns[name][i] for name in names}
+            for i in range(start, min(stop, self.state['total']))
+        ]
+
+    def _upsert(self, spec, rows):
+        """Upsert par défaut : bulk_create(update_conflicts=True) sur la clé unique"""
+        keys = [row[spec.key] for row in rows]
+        existing = set(
+            spec.model.objects.filter(**{f'{spec.key}__in': keys}).values_list(spec.key, flat=True)
+        )
+
+        options = {
+            'update_conflicts': True,
+            'update_fields': self.state['update_fields'],
+        }
+        # MySQL (ON DUPLICATE KEY UPDATE) n'accepte pas de liste de champs uniques
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = [spec.key]
+
+        fields = self.state['fields']
+        spec.model.objects.bulk_create(
+            [spec.model(**{name: row[name] for name in fields}) for row in rows], **options
+        )
+        return len(rows) - len(existing), len(existing)
+
+    @staticmethod
+    def _write(spec, write, rows):
+        result = write(rows)
+        if spec.after_chunk:
+            spec.after_chunk(rows)
+        return result
+
+    def _write_rows(self, spec, write, rows):
+        """
+        Réécrit un lot refusé ligne par ligne, chacune dans son point de sauvegarde
+
+        Une ligne rejetée par la base (valeur trop longue, contrainte...) est
+        reportée avec son numéro Excel au lieu de faire échouer tout le lot.
+
+        Raises:
+            OperationalError, InterfaceError: la base est indisponible
+        """
+        created = updated = 0
+        errors = []
+        with transaction.atomic():
+            for row in rows:
+                try:
+                    with transaction.atomic():
+                        result = self._write(spec, write, [row])
+                except (OperationalError, InterfaceError):
+                    raise
+                except Exception as e:
+                    errors.append({'ligne': row.get('_ligne'), 'erreur': str(e)})
+                    continue
+                created += result[0]
+                updated += result[1]
+                if len(result) > 2:
+                    errors.extend(result[2])
+        return created, updated, errors
+
+    def process_next(self, spec, chunk_size=CHUNK_SIZE, raise_errors=False):
+        """
+        Écrit le lot suivant en une transaction
+
+        Si la base refuse le lot, il est réécrit ligne par ligne et seules
+        les lignes fautives sont reportées en erreur. Une erreur
+        opérationnelle (connexion perdue...) est reportée pour le lot entier
+        et le traitement continue avec le lot suivant ; avec raise_errors,
+        elle est propagée sans avancer : la tâche peut reprendre à ce lot.
+        """
+        if self.state['status'] == 'completed':
+            return self
+
+        start = self.state['current']
+        rows = self._rows(start, start + chunk_size)
+        write = spec.write_chunk or (lambda chunk: self._upsert(spec, chunk))
+
+        try:
+            try:
+                with transaction.atomic():
+                    result = self._write(spec, write, rows)
+            except (OperationalError, InterfaceError):
+                raise
+            except Exception as e:
+                logger.warning("Import %s : lot %d-%d refusé (%s), écriture ligne par ligne",
+                               self.job_id, start + 1, start + len(rows), e)
+                result = self._write_rows(spec, write, rows)
+            self.state['created'] += result[0]
+            self.state['updated'] += result[1]
+            if len(result) > 2:
+                self.state['errors'].extend(result[2])
+        except Exception as e:
+            if raise_errors:
+                raise
+            keys = [spec.key_of(row) for row in rows[:3]]
+            self.state['errors'].append({
+                'ligne': None,
+                'erreur': f"Lot {start + 1}-{start + len(rows)} ({', '.join(map(str, keys))}...) : {e}",
+            })
+
+        self.state['current'] = start + len(rows)
+        if self.state['current'] >= self.state['total']:
+            self.state['status'] = 'completed'
+            self.cleanup()
+        elif self.state['status'] != 'running':
+            self.state['status'] = 'processing'
+        self.state['heartbeat'] = time.time()
+        self.save()
+        return self
+
+    # --- Exécution en arrière-plan -----------------------------------------
+
+    def is_running(self):
+        """Vrai si un thread traite la tâche (signe de vie récent)"""
+        return (
+            self.state['status'] == 'running'
+            and time.time() - self.state.get('heartbeat', 0) < STALE_AFTER
+        )
+
+    def start(self, spec, chunk_size=CHUNK_SIZE):
+        """
+        Traite la tâche dans un thread, à partir du dernier lot enregistré
+
+        Chaque lot est validé dans sa propre transaction ; les lignes refusées
+        par la base sont reportées sans arrêter la tâche. Après une erreur
+        opérationnelle (ou l'arrêt du serveur), un nouvel appel reprend au
+        lot suivant le dernier lot écrit.
+
+        Returns:
+            bool: False si la tâche est terminée ou déjà en cours
+        """
+        with _running_lock:
+            if self.state['status'] == 'completed' or self.job_id in _running or self.is_running():
+                return False
+            _running.add(self.job_id)
+        self.state['status'] = 'running'
+        self.state['failure'] = None
+        self.state['heartbeat'] = time.time()
+        self.save()
+        threading.Thread(
+            target=self._run, args=(spec, chunk_size), name=f'import-{self.job_id[:8]}', daemon=True
+        ).start()
+        return True
+
+    def _run(self, spec, chunk_size):
+        close_old_connections()
+        try:
+            while self.state['status'] != 'completed':
+                self.process_next(spec, chunk_size, raise_errors=True)
+        except Exception as e:
+            logger.exception("Import %s interrompu au lot %d", self.job_id, self.state['current'])
+            self.state['status'] = 'failed'
+            self.state['failure'] = str(e)
+            self.save()
+        finally:
+            with _running_lock:
+                _running.discard(self.job_id)
+            close_old_connections()
+
+    # --- Rapport -----------------------------------------------------------
+
+    @property
+    def progress(self):
+        total = self.state['total']
+        return 100 if not total else round(self.state['current'] * 100 / total, 1)
+
+    def as_dict(self, label):
+        """Réponse JSON de progression"""
+        state = self.state
+        data = {
+            'job_id': self.job_id,
+            'current': state['current'],
+            'total': state['total'],
+            'progress': self.progress,
+            'status': state['status'],
+            'created': state['created'],
+            'updated': state['updated'],
+            'failure': state.get('failure'),
+            'resumable': state['status'] in ('failed', 'running') and not self.is_running(),
+            'error_count': len(state['errors']),
+            'errors': state['errors'][:MAX_ERRORS_REPORTED],
+        }
+        if state['status'] == 'completed':
+            message = f"{state['created'] + state['updated']} {label} importés avec succès! " \
+                      f"({state['created']} créés, {state['updated']} mis à jour)"
+            if state['errors']:
+                message += f" - {len(state['errors'])} ligne(s) en erreur"
+            data['message'] = message
+        return data
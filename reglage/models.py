@@ -223,6 +223,7 @@ class SemaineCours(models.Model):
         La semaine en cours est celle où date_debut <= aujourd'hui <= date_fin
         """
         from datetime import date
+        from .registry import invalidate
         aujourd_hui = date.today()
         
         # Désactiver toutes les semaines
@@ -238,9 +239,10 @@ class SemaineCours(models.Model):
             semaine_actuelle.est_en_cours = True
             # Utiliser update pour éviter de déclencher save() et la boucle infinie
             cls.objects.filter(pk=semaine_actuelle.pk).update(est_en_cours=True)
-            return semaine_actuelle
         
-        return None
+        # Les update() n'émettent pas de signal : périmer le registre explicitement
+        invalidate()
+        return semaine_actuelle
     
     def __str__(self):
         statut = " (En cours)" if self.est_en_cours else ""
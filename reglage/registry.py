@@ -0,0 +1,168 @@
+"""
+Registre en mémoire des tables de référence (reglage)
+
+Les petites tables qui changent rarement (année et semaine en cours,
+créneaux, sections, départements, grades, classes) sont chargées une fois
+par processus dans un instantané ReferenceData, puis lues sans requête.
+
+L'instantané est versionné par un jeton stocké dans le cache : toute
+écriture sur un modèle de référence (signals.py) remplace le jeton après
+validation de la transaction, et chaque processus recharge ses données au
+prochain accès. Avec un cache non partagé (locmem), les autres processus se
+resynchronisent au plus tard après REFERENCE_DATA_MAX_AGE secondes.
+
+Les instances retournées sont partagées entre requêtes : ne pas les modifier.
+
+Usage :
+    from reglage.registry import reference_data
+    ref = reference_data()
+    ref.annee_courante, ref.section_designation('ST'), ref.creneaux_pour('cours')
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+VERSION_KEY = 'reglage:reference_data:version'
+MAX_AGE = getattr(settings, 'REFERENCE_DATA_MAX_AGE', 300)
+
+
+class ReferenceData:
+    """Instantané des tables de référence (lecture seule)"""
+
+    def __init__(self, version, annees, semaines, creneaux, sections, departements, grades, classes):
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        self.annees = annees
+        self.annee_courante = next((annee for annee in annees if annee.est_en_cours), None)
+        self.semaines = semaines
+        self.semaine_courante = next((semaine for semaine in semaines if semaine.est_en_cours), None)
+
+        self.creneaux = creneaux
+        self.creneaux_par_code = {creneau.code: creneau for creneau in creneaux}
+        self._creneaux_pour = {}
+
+        self.sections = sections
+        self.departements = departements
+        self.grades = grades
+
+        self.classes = {code: designation for code, designation, _ in classes}
+        self.classes_par_section = {}
+        for code, _, section_code in classes:
+            self.classes_par_section.setdefault(section_code, []).append(code)
+
+    @classmethod
+    def load(cls, version):
+        from .models import AnneeAcademique, Classe, Creneau, Departement, Grade, Section, SemaineCours
+
+        return cls(
+            version,
+            annees=list(AnneeAcademique.objects.order_by('-code')),
+            semaines=list(SemaineCours.objects.order_by('date_debut')),
+            creneaux=list(
+                Creneau.objects.filter(est_actif=True).select_related('section').order_by('ordre', 'heure_debut')
+            ),
+            sections=dict(Section.objects.order_by('CodeSection').values_list('CodeSection', 'DesignationSection')),
+            departements=dict(Departement.objects.order_by('CodeDept').values_list('CodeDept', 'DesignationDept')),
+            grades=dict(Grade.objects.order_by('CodeGrade').values_list('CodeGrade', 'DesignationGrade')),
+            classes=list(
+                Classe.objects.order_by('CodeClasse').values_list(
+                    'CodeClasse', 'DesignationClasse', 'mention__departement__section__CodeSection'
+                )
+            ),
+        )
+
+    def creneau(self, code):
+        """Créneau actif par code (ex: 'AM'), ou None"""
+        return self.creneaux_par_code.get(code)
+
+    def creneaux_pour(self, type_horaire=None, section_code=None):
+        """
+        Créneaux actifs d'un type d'horaire, dans l'ordre d'affichage
+
+        Args:
+            type_horaire: 'cours', 'examen'/'examens' ou None (tous)
+            section_code: pour les examens, limite aux créneaux de la section
+
+        Returns:
+            tuple: instances Creneau
+        """
+        if type_horaire == 'examens':
+            type_horaire = 'examen'
+        key = (type_horaire, section_code if type_horaire == 'examen' else None)
+        found = self._creneaux_pour.get(key)
+        if found is None:
+            found = tuple(
+                creneau for creneau in self.creneaux
+                if (type_horaire is None or creneau.type_creneau in (type_horaire, 'les_deux'))
+                and (key[1] is None or creneau.section_id == key[1])
+            )
+            self._creneaux_pour[key] = found
+        return found
+
+    def section_designation(self, code):
+        """Désignation d'une section (le code si inconnu)"""
+        return self.sections.get(code, code)
+
+    def departement_designation(self, code):
+        """Désignation d'un département (le code si inconnu)"""
+        return self.departements.get(code, code)
+
+    def grade_designation(self, code):
+        """Désignation d'un grade (le code si inconnu)"""
+        if not code:
+            return ''
+        return self.grades.get(code, code)
+
+    def classe_designation(self, code):
+        """Désignation d'une classe (le code si inconnu)"""
+        return self.classes.get(code, code)
+
+    def classes_de_section(self, section_code=None):
+        """Codes des classes d'une section (toutes si section_code est vide)"""
+        if not section_code:
+            return list(self.classes)
+        return list(self.classes_par_section.get(section_code, ()))
+
+
+_lock = threading.Lock()
+_current = None
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Jeton perdu (redémarrage, éviction) : en créer un sans écraser un concurrent
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def reference_data():
+    """Instantané à jour des tables de référence (rechargé si la version a changé)"""
+    global _current
+    version = _version()
+    current = _current
+    if current is not None and current.version == version and time.monotonic() - current.loaded_at < MAX_AGE:
+        return current
+    with _lock:
+        current = _current
+        if current is None or current.version != version or time.monotonic() - current.loaded_at >= MAX_AGE:
+            current = _current = ReferenceData.load(version)
+    return current
+
+
+def _bump():
+    global _current
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    _current = None
+
+
+def invalidate():
+    """Périme l'instantané de tous les processus après validation de la transaction en cours"""
+    transaction.on_commit(_bump)
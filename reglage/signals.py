@@ -0,0 +1,23 @@
+"""
+Invalidation du registre des tables de référence (registry.py)
+
+Tout enregistrement ou suppression sur un modèle de référence périme
+l'instantané. Les mises à jour en masse (QuerySet.update) n'émettent pas
+de signal : appeler registry.invalidate() après celles-ci.
+"""
+from django.db.models.signals import post_save, post_delete
+
+from . import registry
+from .models import AnneeAcademique, Classe, Creneau, Departement, Grade, Mention, Niveau, Section, SemaineCours
+
+
+REFERENCE_MODELS = (AnneeAcademique, SemaineCours, Creneau, Section, Departement, Mention, Niveau, Classe, Grade)
+
+
+def invalidate_reference_data(sender, **kwargs):
+    registry.invalidate()
+
+
+for model in REFERENCE_MODELS:
+    post_save.connect(invalidate_reference_data, sender=model, dispatch_uid=f'reference_data_save_{model.__name__}')
+    post_delete.connect(invalidate_reference_data, sender=model, dispatch_uid=f'reference_data_delete_{model.__name__}')
@@ -1,3 +1,83 @@
+from datetime import time
+
+from django.db import DataError
 from django.test import TestCase
 
-# Create your tests here.
+from .import_jobs import ImportJob, ImportSpec, cell_text
+from .models import AnneeAcademique, Creneau, Grade, Section
+from .registry import invalidate, reference_data
+
+
+class ReferenceDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.section = Section.objects.create(CodeSection='ST', DesignationSection='Sciences et Technologies')
+        Grade.objects.create(CodeGrade='PO', DesignationGrade='Professeur Ordinaire')
+        AnneeAcademique.objects.create(code='2024-2025', designation='2024-2025', est_en_cours=True)
+        # AM et PM (les_deux) sont créés par la migration 0011
+        Creneau.objects.create(code='S1', designation='Examen ST', type_creneau='examen', section=cls.section,
+                               heure_debut=time(13), heure_fin=time(15), ordre=3)
+
+    def setUp(self):
+        # Instantané éventuellement chargé par un autre test
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate()
+
+    def test_lookups_run_without_queries_once_loaded(self):
+        reference_data()
+        with self.assertNumQueries(0):
+            ref = reference_data()
+            self.assertEqual(ref.annee_courante.code, '2024-2025')
+            self.assertEqual(ref.grade_designation('PO'), 'Professeur Ordinaire')
+            self.assertEqual(ref.grade_designation('XX'), 'XX')
+            self.assertEqual(ref.section_designation('ST'), 'Sciences et Technologies')
+            self.assertEqual([c.code for c in ref.creneaux_pour('cours')], ['AM', 'PM'])
+            self.assertEqual([c.code for c in ref.creneaux_pour('examens', 'ST')], ['S1'])
+
+    def test_saving_a_reference_model_reloads_the_snapshot(self):
+        before = reference_data()
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(CodeGrade='CT', DesignationGrade='Chef de Travaux')
+        after = reference_data()
+        self.assertIsNot(before, after)
+        self.assertEqual(after.grade_designation('CT'), 'Chef de Travaux')
+
+
+class ImportJobTests(TestCase):
+    def spec(self):
+        def write_chunk(rows):
+            for row in rows:
+                if len(row['DesignationGrade']) > 20:
+                    raise DataError('Data too long for column DesignationGrade')
+            Grade.objects.bulk_create([Grade(**{k: v for k, v in row.items() if k != '_ligne'}) for row in rows])
+            return len(rows), 0
+
+        return ImportSpec(
+            model=Grade,
+            key='CodeGrade',
+            required_columns=['code', 'designation'],
+            parse_row=lambda row: {
+                'CodeGrade': cell_text(row, 'code'),
+                'DesignationGrade': cell_text(row, 'designation'),
+            },
+            update_fields=['DesignationGrade'],
+            label='grades',
+            write_chunk=write_chunk,
+        )
+
+    def test_a_rejected_row_does_not_fail_its_chunk(self):
+        import pandas as pd
+
+        df = pd.DataFrame({
+            'code': ['PO', 'CT', 'ASS'],
+            'designation': ['Professeur', 'Chef de Travaux mais beaucoup trop long', 'Assistant'],
+        })
+        job = ImportJob.create(self.spec(), df, owner_id=1)
+        self.addCleanup(job.discard)
+
+        job.process_next(self.spec(), raise_errors=True)
+
+        self.assertEqual(job.state['status'], 'completed')
+        self.assertEqual(job.state['created'], 2)
+        self.assertEqual([error['ligne'] for error in job.state['errors']], [3])
+        self.assertEqual(set(Grade.objects.values_list('CodeGrade', flat=True)), {'PO', 'ASS'})
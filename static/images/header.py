@@ -6,14 +6,23 @@ from reportlab.lib.units import inch
 from reportlab.platypus import Image, Spacer
 from django.conf import settings
 
-def create_header_table():
+def header_image_path():
+    """Chemin absolu de l'image d'en-tête dans le dossier static"""
+    return os.path.join(settings.BASE_DIR, 'static', 'images', 'entete.PNG')
+
+
+def create_header_table(image_path=None):
     """
     Crée une image d'en-tête à partir du fichier local entete.PNG
+
+    Args:
+        image_path: chemin de l'image (par défaut header_image_path()) ; à
+            fournir hors d'un processus Django configuré
     """
     from PIL import Image as PILImage
     
     # Construire le chemin absolu vers l'image dans le dossier static
-    image_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'entete.PNG')
+    image_path = image_path or header_image_path()
     
     # Vérifier si le fichier image existe avant de l'utiliser
     if os.path.exists(image_path):
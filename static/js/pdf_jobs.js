@@ -0,0 +1,52 @@
+// Génération des rapports PDF en arrière-plan (attribution/pdf_jobs.py)
+//
+// La fenêtre est ouverte tout de suite (pour ne pas être bloquée par le
+// navigateur), la demande est envoyée à demander_pdf puis l'état de la tâche
+// est interrogé jusqu'à ce que le PDF soit prêt à être téléchargé.
+function genererPdfEnArrierePlan(url, params, csrftoken) {
+    var fenetre = window.open('', '_blank');
+    if (fenetre) {
+        fenetre.document.title = 'Génération du PDF...';
+        fenetre.document.body.innerHTML =
+            '<p style="font-family: sans-serif; margin: 2em;">Génération du PDF en cours, veuillez patienter...</p>';
+    }
+
+    function echec(message) {
+        if (fenetre) {
+            fenetre.close();
+        }
+        alert('Erreur lors de la génération du PDF : ' + message);
+    }
+
+    function suivre(data) {
+        if (data.status === 'done') {
+            if (fenetre) {
+                fenetre.location.href = data.download_url;
+            } else {
+                window.location.href = data.download_url;
+            }
+        } else if (data.status === 'failed') {
+            echec(data.error || 'erreur inconnue');
+        } else {
+            setTimeout(function() {
+                $.getJSON(data.status_url).done(suivre).fail(function() {
+                    echec('tâche introuvable');
+                });
+            }, 1500);
+        }
+    }
+
+    $.ajax({
+        url: url,
+        method: 'POST',
+        data: params,
+        headers: {
+            'X-Requested-With': 'XMLHttpRequest',
+            'X-CSRFToken': csrftoken
+        },
+        success: suivre,
+        error: function(xhr) {
+            echec((xhr.responseJSON && xhr.responseJSON.error) || 'erreur de communication avec le serveur');
+        }
+    });
+}
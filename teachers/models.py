@@ -23,9 +23,6 @@ class Teacher(models.Model):
         """Retourne la désignation complète du grade depuis la table Grade"""
         if not self.grade:
             return ''
-        try:
-            from reglage.models import Grade
-            grade_obj = Grade.objects.get(CodeGrade=self.grade)
-            return grade_obj.DesignationGrade
-        except:
-            return self.grade  # Fallback sur le code si la désignation n'existe pas
+        from reglage.registry import reference_data
+        # Fallback sur le code si la désignation n'existe pas
+        return reference_data().grade_designation(self.grade)
@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import UserPassesTestMixin
 from accounts.models import Role
+from accounts.principal import get_principal
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.db import transaction
@@ -13,8 +14,6 @@ from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
 from reglage.models import Departement
 import logging
-import os
-import tempfile
 
 logger = logging.getLogger(__name__)
 
@@ -75,7 +74,7 @@ class TeacherCreateView(UserPassesTestMixin, CreateView):
         return user.is_authenticated and (
             user.is_staff or
             is_org_user(user) or
-            user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists()
+            get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE)
         )
 
 class TeacherUpdateView(UserPassesTestMixin, UpdateView):
@@ -94,7 +93,7 @@ class TeacherUpdateView(UserPassesTestMixin, UpdateView):
         if not user.is_authenticated:
             return False
         # Admin global peut tout modifier
-        if user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists():
+        if user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE):
             return True
         # Utilisateur d'organisation ne peut modifier que ses enseignants
         user_org = get_user_organisation(user)
@@ -151,7 +150,7 @@ class TeacherDeleteView(UserPassesTestMixin, DeleteView):
         if not user.is_authenticated:
             return False
         # Admin global peut tout supprimer
-        if user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists():
+        if user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE):
             return True
         # Utilisateur d'organisation ne peut supprimer que ses enseignants
         user_org = get_user_organisation(user)
@@ -160,142 +159,98 @@ class TeacherDeleteView(UserPassesTestMixin, DeleteView):
             return teacher.section == user_org.code
         return False
 
+def _parse_teacher_row(row):
+    from reglage.import_jobs import cell_text
+
+    return {
+        'matricule': cell_text(row, 'matricule'),
+        'nom_complet': cell_text(row, 'nom_complet'),
+        'fonction': cell_text(row, 'fonction'),
+        'grade': cell_text(row, 'grade'),
+        'section': cell_text(row, 'section', required=False),
+        'categorie': cell_text(row, 'categorie'),
+        'departement': cell_text(row, 'departement'),
+    }
+
+
+def _teacher_import_spec():
+    from reglage.import_jobs import ImportSpec
+
+    return ImportSpec(
+        model=Teacher,
+        key='matricule',
+        required_columns=['matricule', 'nom_complet', 'fonction', 'grade', 'section', 'categorie', 'departement'],
+        parse_row=_parse_teacher_row,
+        update_fields=['nom_complet', 'fonction', 'grade', 'section', 'categorie', 'departement'],
+        label='enseignants',
+        after_chunk=_refresh_teacher_schedules,
+    )
+
+
+def _refresh_teacher_schedules(rows):
+    """Horaires des enseignants importés : clés (section) et cache des PDF (pas de post_save)"""
+    from attribution.models import ScheduleEntry, ScheduleVersion
+
+    ScheduleEntry.refresh_slot_keys_of(
+        ScheduleEntry.objects.filter(attribution__matricule_id__in=[row['matricule'] for row in rows])
+    )
+    # Intitulés, noms et grades affichés dans les PDF d'horaire
+    ScheduleVersion.bump_reference_on_commit()
+
+
 @csrf_exempt
 def import_excel(request):
-    # Restreindre l'import aux administrateurs/gestionnaires et utilisateurs d'organisation
+    """
+    Import Excel des enseignants en deux temps
+
+    POST : lit le classeur une seule fois, valide chaque ligne et crée une
+    tâche d'import (job_id). GET avec l'en-tête X-Progress et ?job_id= :
+    écrit le lot suivant et renvoie la progression et les erreurs par ligne.
+    """
     from accounts.organisation_utils import get_user_organisation, is_org_user
+    from reglage.import_jobs import ImportJob, normalize_columns
+    # Restreindre l'import aux administrateurs/gestionnaires et utilisateurs d'organisation
     user = request.user
     user_org = get_user_organisation(user)
-    if not (user.is_authenticated and (user.is_staff or is_org_user(user) or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())):
+    if not (user.is_authenticated and (user.is_staff or is_org_user(user) or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))):
         return JsonResponse({'error': 'Permission refusée'}, status=403)
 
+    spec = _teacher_import_spec()
+
     if request.method == 'POST':
+        excel_file = request.FILES.get('excel_file')
+        if not excel_file:
+            return JsonResponse({'error': 'Aucun fichier sélectionné'}, status=400)
         try:
-            excel_file = request.FILES.get('excel_file')
-            if not excel_file:
-                return JsonResponse({'error': 'Aucun fichier sélectionné'}, status=400)
-
-            # Créer un dossier temporaire s'il n'existe pas
-            temp_dir = os.path.join(tempfile.gettempdir(), 'excel_imports')
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # Sauvegarder le fichier temporairement
-            temp_path = os.path.join(temp_dir, excel_file.name)
-            with open(temp_path, 'wb+') as destination:
-                for chunk in excel_file.chunks():
-                    destination.write(chunk)
-
-            # Lire le fichier Excel
-            df = pd.read_excel(temp_path)
-            
-            # Normaliser les noms de colonnes
-            df.columns = [col.strip().lower().replace(' ', '_') for col in df.columns]
-            
-            # Vérifier les colonnes requises
-            required_columns = ['matricule', 'nom_complet', 'fonction', 'grade', 'section', 'categorie', 'departement']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                os.remove(temp_path)  # Nettoyer le fichier temporaire
-                return JsonResponse({
-                    'error': f'Colonnes manquantes : {", ".join(missing_columns)}'
-                }, status=400)
-
-            # Envoyer le nombre total de lignes et le chemin du fichier
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({
-                    'total': len(df),
-                    'status': 'starting',
-                    'temp_file': temp_path
-                })
-
+            df = normalize_columns(pd.read_excel(excel_file))
+            # Assigner automatiquement la section de l'organisation
+            defaults = {'section': user_org.code} if user_org else None
+            job = ImportJob.create(spec, df, user.pk, defaults=defaults)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
-            # Nettoyer en cas d'erreur
-            if 'temp_path' in locals():
-                os.remove(temp_path)
-            return JsonResponse({
-                'error': f"Erreur lors de l'import: {str(e)}"
-            }, status=500)
+            logger.exception("Import Excel des enseignants : lecture du fichier impossible")
+            return JsonResponse({'error': f"Erreur lors de l'import: {str(e)}"}, status=500)
+        return JsonResponse(job.as_dict(spec.label))
 
     elif request.method == 'GET' and request.headers.get('X-Progress'):
+        job = ImportJob.load(request.GET.get('job_id'), user.pk)
+        if job is None:
+            return JsonResponse({'error': "Tâche d'import introuvable"}, status=404)
         try:
-            current_progress = int(request.GET.get('current', 0))
-            total = int(request.GET.get('total', 0))
-            temp_path = request.GET.get('temp_file')
-            
-            if not temp_path or not os.path.exists(temp_path) or current_progress >= total:
-                return JsonResponse({'error': 'Fichier temporaire non trouvé ou paramètres invalides'}, status=400)
-
-            # Lire le fichier Excel
-            df = pd.read_excel(temp_path)
-            df.columns = [col.strip().lower().replace(' ', '_') for col in df.columns]
-            
-            # Traiter le prochain lot de lignes (5 lignes à la fois)
-            batch_size = 5
-            end_index = min(current_progress + batch_size, total)
-            
-            for index in range(current_progress, end_index):
-                row = df.iloc[index]
-                try:
-                    teacher_data = {
-                        'matricule': str(row['matricule']).strip(),
-                        'nom_complet': str(row['nom_complet']).strip(),
-                        'fonction': str(row['fonction']).strip(),
-                        'grade': str(row['grade']).strip(),
-                        'categorie': str(row['categorie']).strip(),
-                        'departement': str(row['departement']).strip()
-                    }
-                    
-                    # Assigner automatiquement la section de l'organisation
-                    if user_org:
-                        teacher_data['section'] = user_org.code
-
-                    Teacher.objects.update_or_create(
-                        matricule=teacher_data['matricule'],
-                        defaults=teacher_data
-                    )
-
-                except Exception as e:
-                    # Nettoyer en cas d'erreur
-                    os.remove(temp_path)
-                    return JsonResponse({
-                        'error': f"Erreur à la ligne {index + 1}: {str(e)}"
-                    }, status=500)
-
-            progress = (end_index / total) * 100
-            
-            # Si c'est la dernière itération, supprimer le fichier temporaire
-            if end_index >= total:
-                os.remove(temp_path)
-                return JsonResponse({
-                    'current': end_index,
-                    'total': total,
-                    'progress': 100,
-                    'status': 'completed',
-                    'message': f"{end_index} enseignants importés avec succès!"
-                })
-            
-            return JsonResponse({
-                'current': end_index,
-                'total': total,
-                'progress': progress,
-                'status': 'processing',
-                'temp_file': temp_path
-            })
-
+            job.process_next(spec)
         except Exception as e:
-            # Nettoyer en cas d'erreur
-            if 'temp_path' in locals():
-                os.remove(temp_path)
-            return JsonResponse({
-                'error': f"Erreur lors du traitement: {str(e)}"
-            }, status=500)
+            logger.exception("Import Excel des enseignants : échec du lot suivant")
+            return JsonResponse({'error': f"Erreur lors du traitement: {str(e)}"}, status=500)
+        return JsonResponse(job.as_dict(spec.label))
+
+    return JsonResponse({'error': 'Méthode non autorisée'}, status=405)
 
 def import_teachers(request):
     """Importe des enseignants à partir d'un fichier Excel."""
     # Restreindre l'import aux administrateurs/gestionnaires
     user = request.user
-    if not (user.is_authenticated and (user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())):
+    if not (user.is_authenticated and (user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))):
         messages.error(request, 'Permission refusée')
         return redirect('teachers:list')
 
@@ -357,7 +312,7 @@ def delete_all_teachers(request):
     
     # Vérifier les permissions
     user = request.user
-    if not (user.is_authenticated and (user.is_staff or user.profile.roles.filter(name__in=[Role.ADMIN, Role.GESTIONNAIRE]).exists())):
+    if not (user.is_authenticated and (user.is_staff or get_principal(user).has_any_role(Role.ADMIN, Role.GESTIONNAIRE))):
         messages.error(request, 'Permission refusée. Vous n\'avez pas les droits pour supprimer tous les enseignants.')
         return redirect('teachers:list')
     
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import AcademicWeek, TeachingProgress, ProgressStats
+from .models import AcademicWeek, TeachingProgress, ProgressStats, ActionLogSummary
 
 @admin.register(AcademicWeek)
 class AcademicWeekAdmin(admin.ModelAdmin):
@@ -17,7 +17,14 @@ class TeachingProgressAdmin(admin.ModelAdmin):
 
 @admin.register(ProgressStats)
 class ProgressStatsAdmin(admin.ModelAdmin):
-    list_display = ['course', 'teacher', 'academic_year', 'total_hours_done', 'last_update']
+    list_display = ['course', 'teacher', 'academic_year', 'week', 'total_hours_done', 'last_update']
     list_filter = ['academic_year', 'last_update']
     search_fields = ['course__code_ue', 'teacher__nom_complet']
     ordering = ['-last_update']
+
+@admin.register(ActionLogSummary)
+class ActionLogSummaryAdmin(admin.ModelAdmin):
+    list_display = ['month', 'action_type', 'organisation', 'username', 'count']
+    list_filter = ['month', 'action_type', 'organisation']
+    search_fields = ['username']
+    ordering = ['-month', 'action_type']
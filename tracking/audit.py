@@ -0,0 +1,263 @@
+"""
+Écriture différée du journal des actions (ActionLog)
+
+Les enregistrements sont placés dans une file bornée en mémoire ; un thread
+d'arrière-plan les insère par lots avec bulk_create toutes les N lignes ou
+toutes les T secondes. Les descriptions coûteuses (lectures en base) sont
+calculées au moment de l'écriture, hors du cycle de la requête.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+# Marqueur d'arrêt du thread d'écriture
+_STOP = object()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class ActionLogWriter:
+    """
+    File d'attente bornée des actions à journaliser
+
+    Chaque enregistrement est un dict de champs ActionLog. Les clés
+    particulières suivantes sont résolues au moment de l'écriture :
+        'describe': callable retournant la description définitive
+        'resolve_organisation': bool - rechercher l'organisation de user_id
+    """
+
+    def __init__(self, max_size=None, batch_size=None, flush_interval=None):
+        self.max_size = max_size or _setting('ACTION_LOG_QUEUE_SIZE', 10000)
+        self.batch_size = batch_size or _setting('ACTION_LOG_BATCH_SIZE', 100)
+        self.flush_interval = flush_interval or _setting('ACTION_LOG_FLUSH_INTERVAL', 2.0)
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._next_retention = None
+        self._retention_thread = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    # --- Côté requête ------------------------------------------------------
+
+    def enqueue(self, record):
+        """
+        Ajoute un enregistrement sans bloquer
+
+        Returns:
+            bool: False si la file est pleine (l'enregistrement est perdu)
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # Avertir sans inonder les logs
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning("Journal des actions saturé : %d enregistrement(s) perdu(s)", dropped)
+            return False
+
+    def stats(self):
+        """Compteurs de fonctionnement (en attente, écrits, perdus, en échec)"""
+        return {
+            'pending': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    # --- Thread d'écriture -------------------------------------------------
+
+    def _ensure_started(self):
+        # Un thread par processus (les workers forkés n'héritent pas du thread)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='action-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                self._write_in_background(batch)
+                return
+            if record is not None:
+                batch.append(record)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write_in_background(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                self._maybe_run_retention()
+
+    def _maybe_run_retention(self):
+        # Archivage périodique des logs anciens (ACTION_LOG_AUTO_ARCHIVE), dans
+        # son propre thread : un long archivage ne retarde pas l'écriture des logs
+        if not _setting('ACTION_LOG_AUTO_ARCHIVE', False):
+            return
+        now = time.monotonic()
+        if self._next_retention is None:
+            # Premier passage une fois le processus en régime, pas au démarrage
+            self._next_retention = now + _setting('ACTION_LOG_RETENTION_DELAY', 3600)
+        if now < self._next_retention:
+            return
+        if self._retention_thread is not None and self._retention_thread.is_alive():
+            return
+        self._next_retention = now + _setting('ACTION_LOG_RETENTION_INTERVAL', 24 * 3600)
+        self._retention_thread = threading.Thread(
+            target=self._run_retention, name='action-log-retention', daemon=True
+        )
+        self._retention_thread.start()
+
+    @staticmethod
+    def _run_retention():
+        from .retention import run_scheduled_retention
+
+        close_old_connections()
+        try:
+            run_scheduled_retention()
+        finally:
+            close_old_connections()
+
+    def _drain(self):
+        """Retire de la file tous les enregistrements en attente"""
+        records = []
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                return records
+            if record is not _STOP:
+                records.append(record)
+
+    def flush(self):
+        """Écrit immédiatement, dans le thread appelant, tout ce qui est en attente"""
+        self.write(self._drain())
+
+    def shutdown(self, timeout=5.0):
+        """Arrête le thread après l'écriture des enregistrements en attente"""
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                thread.join(timeout)
+            except queue.Full:
+                pass
+        # Ce qui reste (thread bloqué ou jamais démarré) est écrit directement
+        records = self._drain()
+        if not records:
+            return
+        try:
+            self._insert(records)
+        except Exception as e:
+            # À la sortie de l'interpréteur la base peut être fermée ou détruite
+            # (base de test) : compter les pertes sans trace d'erreur
+            with self._lock:
+                self.failed += len(records)
+            logger.warning("Journal des actions : %d action(s) non écrite(s) à l'arrêt (%s)", len(records), e)
+
+    # --- Écriture en base --------------------------------------------------
+
+    def _write_in_background(self, records):
+        # Le thread possède sa propre connexion : la recycler comme une requête
+        close_old_connections()
+        try:
+            self.write(records)
+        finally:
+            close_old_connections()
+
+    def write(self, records):
+        """
+        Insère un lot d'enregistrements avec bulk_create
+
+        Les erreurs sont journalisées et comptées, jamais propagées.
+        """
+        if not records:
+            return
+        try:
+            self._insert(records)
+        except Exception:
+            with self._lock:
+                self.failed += len(records)
+            logger.exception("Échec de l'écriture de %d action(s) du journal", len(records))
+
+    def _insert(self, records):
+        from .models import ActionLog, ActionLogSummary
+
+        organisations = self._organisations(records)
+        logs = [self._build(ActionLog, record, organisations) for record in records]
+        with transaction.atomic():
+            ActionLog.objects.bulk_create(logs, batch_size=self.batch_size)
+            ActionLogSummary.add_counts(ActionLogSummary.counts_for(logs))
+        with self._lock:
+            self.written += len(logs)
+
+    @staticmethod
+    def _organisations(records):
+        """Organisations des utilisateurs (hors superusers) en une requête"""
+        from accounts.models import UserProfile
+
+        user_ids = {
+            record.get('user_id') for record in records
+            if record.get('resolve_organisation') and record.get('user_id')
+        }
+        if not user_ids:
+            return {}
+        return dict(
+            UserProfile.objects.filter(user_id__in=user_ids, user__is_superuser=False)
+            .values_list('user_id', 'organisation_id')
+        )
+
+    @staticmethod
+    def _build(model, record, organisations):
+        fields = dict(record)
+        describe = fields.pop('describe', None)
+        if fields.pop('resolve_organisation', False):
+            fields['organisation_id'] = organisations.get(fields.get('user_id'))
+        if describe is not None:
+            try:
+                fields['description'] = describe()
+            except Exception:
+                # Garder la description de repli fournie à l'enregistrement
+                pass
+        # timestamp (auto_now_add) correspond à l'écriture, au plus
+        # ACTION_LOG_FLUSH_INTERVAL secondes après l'action
+        return model(**fields)
+
+
+writer = ActionLogWriter()
+atexit.register(writer.shutdown)
+
+
+def is_async_enabled():
+    """Écriture différée active (désactivable avec ACTION_LOG_ASYNC = False)"""
+    return _setting('ACTION_LOG_ASYNC', True)
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking.models import ActionLogSummary
+from tracking.retention import FORMATS, archive_action_logs
+
+
+class Command(BaseCommand):
+    help = 'Archive dans MEDIA_ROOT/action_logs les actions plus anciennes que la durée de rétention, puis les supprime'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help=f"Âge minimal (en jours) des actions archivées. Défaut : ACTION_LOG_RETENTION_DAYS ({getattr(settings, 'ACTION_LOG_RETENTION_DAYS', 180)}).",
+        )
+        parser.add_argument(
+            '--format',
+            dest='fmt',
+            choices=FORMATS,
+            default=getattr(settings, 'ACTION_LOG_ARCHIVE_FORMAT', 'jsonl'),
+            help='Format des fichiers : jsonl (gzip) ou parquet (nécessite pyarrow).',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Nombre de lignes par lot.')
+        parser.add_argument('--dry-run', action='store_true', help='Afficher ce qui serait archivé sans rien modifier.')
+        parser.add_argument(
+            '--rebuild-summaries',
+            action='store_true',
+            help='Recalculer les résumés mensuels des mois encore présents dans le journal.',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild_summaries']:
+            count = ActionLogSummary.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'{count} résumés mensuels recalculés.'))
+
+        try:
+            report = archive_action_logs(
+                days=options['days'],
+                fmt=options['fmt'],
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+            )
+        except ImportError:
+            raise CommandError("Le format parquet nécessite pyarrow (pip install pyarrow).")
+
+        for month, count in sorted(report['months'].items()):
+            self.stdout.write(f"  {month:%m/%Y} : {count} action(s)")
+        for path in report['files']:
+            self.stdout.write(f"  -> {path}")
+
+        verbe = 'à archiver' if options['dry_run'] else 'archivées'
+        self.stdout.write(self.style.SUCCESS(
+            f"Terminé! {report['archived']} action(s) antérieures au {report['cutoff']:%d/%m/%Y} {verbe}."
+        ))
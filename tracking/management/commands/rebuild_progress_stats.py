@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from tracking.models import ProgressStats
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les statistiques de progression (ProgressStats) depuis les suivis d\'enseignement'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--annee',
+            dest='annee',
+            default=None,
+            help='Année académique à reconstruire (ex: 2024-2025). Toutes les années par défaut.',
+        )
+
+    def handle(self, *args, **options):
+        annee = options.get('annee')
+        created = ProgressStats.rebuild(academic_year=annee)
+        portee = f"l'année {annee}" if annee else 'toutes les années'
+        self.stdout.write(self.style.SUCCESS(
+            f'Terminé! {created} lignes de statistiques reconstruites pour {portee}.'
+        ))
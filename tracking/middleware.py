@@ -2,9 +2,45 @@ from django.utils.deprecation import MiddlewareMixin
 from .models import ActionLog
 
 
+def _describe_attribution(libelle, teacher_id, course_code):
+    """Description détaillée d'une attribution, calculée à l'écriture du log"""
+    def describe():
+        from teachers.models import Teacher
+        from courses.models import Course
+        teacher = Teacher.objects.get(pk=teacher_id)
+        course = Course.objects.get(pk=course_code)
+        return f"{libelle} d'attribution: {course.code_ue} - {teacher.nom_complet}"
+    return describe
+
+
+def _describe_planning(libelle, course_code, salle_id, jour):
+    """Description détaillée d'une entrée de planning, calculée à l'écriture du log"""
+    def describe():
+        from courses.models import Course
+        from reglage.models import Salle
+        course = Course.objects.get(pk=course_code)
+        salle = Salle.objects.get(pk=salle_id)
+        return f"{libelle} planning: {course.code_ue} - {salle.code} ({jour})"
+    return describe
+
+
+def _describe_progress(libelle, teacher_id, course_id, hours_done):
+    """Description détaillée d'un suivi, calculée à l'écriture du log"""
+    def describe():
+        from teachers.models import Teacher
+        from courses.models import Course
+        teacher = Teacher.objects.get(pk=teacher_id)
+        course = Course.objects.get(pk=course_id)
+        return f"{libelle} suivi: {course.code_ue} - {teacher.nom_complet} ({hours_done}h)"
+    return describe
+
+
 class ActionLoggingMiddleware(MiddlewareMixin):
     """
     Middleware pour enregistrer automatiquement les actions importantes
+
+    Les logs sont écrits en arrière-plan (voir tracking.audit) : les lectures
+    nécessaires aux descriptions détaillées ne sont pas faites pendant la requête.
     """
     
     def process_request(self, request):
@@ -40,159 +76,70 @@ class ActionLoggingMiddleware(MiddlewareMixin):
             if len(path_parts) >= 2:
                 app_name = path_parts[0]
                 action_name = path_parts[1] if len(path_parts) > 1 else ''
+                is_creation = 'create' in request.path or 'new' in request.path
+                post_data = request.POST
                 
                 # Créations et modifications d'attributions
                 if app_name == 'attribution' and 'attribution' in action_name:
-                    # Récupérer les données du formulaire pour une description détaillée
-                    post_data = request.POST
+                    teacher_id = post_data.get('matricule', '')
+                    course_code = post_data.get('code_ue', '')
+                    libelle = "Création" if is_creation else "Modification"
+                    description = f"{libelle} d'attribution"
+                    describe = None
+                    if teacher_id and course_code:
+                        description = f"{libelle} d'attribution (ID: {course_code} - {teacher_id})"
+                        describe = _describe_attribution(libelle, teacher_id, course_code)
                     
-                    if 'create' in request.path or 'new' in request.path:
-                        # Description détaillée pour la création
-                        teacher_id = post_data.get('matricule', '')
-                        course_code = post_data.get('code_ue', '')
-                        description = f"Création d'attribution"
-                        if teacher_id and course_code:
-                            try:
-                                from teachers.models import Teacher
-                                from courses.models import Course
-                                teacher = Teacher.objects.get(pk=teacher_id)
-                                course = Course.objects.get(pk=course_code)
-                                description = f"Création d'attribution: {course.code_ue} - {teacher.nom_complet}"
-                            except:
-                                description = f"Création d'attribution (ID: {course_code} - {teacher_id})"
-                        
-                        ActionLog.log_action(
-                            user=request.user,
-                            action_type='attribution_create',
-                            description=description,
-                            model_name='Attribution',
-                            request=request
-                        )
-                    else:
-                        # Description détaillée pour la modification
-                        teacher_id = post_data.get('matricule', '')
-                        course_code = post_data.get('code_ue', '')
-                        description = f"Modification d'attribution"
-                        if teacher_id and course_code:
-                            try:
-                                from teachers.models import Teacher
-                                from courses.models import Course
-                                teacher = Teacher.objects.get(pk=teacher_id)
-                                course = Course.objects.get(pk=course_code)
-                                description = f"Modification d'attribution: {course.code_ue} - {teacher.nom_complet}"
-                            except:
-                                description = f"Modification d'attribution (ID: {course_code} - {teacher_id})"
-                        
-                        ActionLog.log_action(
-                            user=request.user,
-                            action_type='attribution_update',
-                            description=description,
-                            model_name='Attribution',
-                            request=request
-                        )
+                    ActionLog.log_action(
+                        user=request.user,
+                        action_type='attribution_create' if is_creation else 'attribution_update',
+                        description=description,
+                        model_name='Attribution',
+                        request=request,
+                        describe=describe
+                    )
                 
                 # Créations et modifications de planning
                 elif app_name == 'attribution' and 'planning' in action_name:
-                    post_data = request.POST
+                    course_code = post_data.get('code_ue', '')
+                    salle_id = post_data.get('salle', '')
+                    jour = post_data.get('jour', '')
+                    libelle = "Création" if is_creation else "Modification"
+                    description = f"{libelle} d'entrée de planning"
+                    describe = None
+                    if course_code and salle_id and jour:
+                        description = f"{libelle} planning (ID: {course_code} - {salle_id} - {jour})"
+                        describe = _describe_planning(libelle, course_code, salle_id, jour)
                     
-                    if 'create' in request.path or 'new' in request.path:
-                        # Description détaillée pour la création de planning
-                        course_code = post_data.get('code_ue', '')
-                        salle_id = post_data.get('salle', '')
-                        jour = post_data.get('jour', '')
-                        description = f"Création d'entrée de planning"
-                        if course_code and salle_id and jour:
-                            try:
-                                from courses.models import Course
-                                from attribution.models import Salle
-                                course = Course.objects.get(pk=course_code)
-                                salle = Salle.objects.get(pk=salle_id)
-                                description = f"Création planning: {course.code_ue} - {salle.nom_salle} ({jour})"
-                            except:
-                                description = f"Création planning (ID: {course_code} - {salle_id} - {jour})"
-                        
-                        ActionLog.log_action(
-                            user=request.user,
-                            action_type='schedule_create',
-                            description=description,
-                            model_name='ScheduleEntry',
-                            request=request
-                        )
-                    else:
-                        # Description détaillée pour la modification de planning
-                        course_code = post_data.get('code_ue', '')
-                        salle_id = post_data.get('salle', '')
-                        jour = post_data.get('jour', '')
-                        description = f"Modification d'entrée de planning"
-                        if course_code and salle_id and jour:
-                            try:
-                                from courses.models import Course
-                                from attribution.models import Salle
-                                course = Course.objects.get(pk=course_code)
-                                salle = Salle.objects.get(pk=salle_id)
-                                description = f"Modification planning: {course.code_ue} - {salle.nom_salle} ({jour})"
-                            except:
-                                description = f"Modification planning (ID: {course_code} - {salle_id} - {jour})"
-                        
-                        ActionLog.log_action(
-                            user=request.user,
-                            action_type='schedule_update',
-                            description=description,
-                            model_name='ScheduleEntry',
-                            request=request
-                        )
+                    ActionLog.log_action(
+                        user=request.user,
+                        action_type='schedule_create' if is_creation else 'schedule_update',
+                        description=description,
+                        model_name='ScheduleEntry',
+                        request=request,
+                        describe=describe
+                    )
                 
                 # Suivi des enseignements
                 elif app_name == 'tracking' and 'progress' in action_name:
-                    post_data = request.POST
+                    teacher_id = post_data.get('teacher', '')
+                    course_id = post_data.get('course', '')
+                    hours_done = post_data.get('hours_done', '0')
+                    libelle = "Création" if is_creation else "Modification"
+                    description = f"{libelle} d'un suivi d'enseignement"
+                    describe = None
+                    if teacher_id and course_id:
+                        description = f"{libelle} suivi (ID: {course_id} - {teacher_id} - {hours_done}h)"
+                        describe = _describe_progress(libelle, teacher_id, course_id, hours_done)
                     
-                    if 'create' in request.path or 'new' in request.path:
-                        # Description détaillée pour la création de suivi
-                        teacher_id = post_data.get('teacher', '')
-                        course_id = post_data.get('course', '')
-                        week_id = post_data.get('week', '')
-                        hours_done = post_data.get('hours_done', '0')
-                        description = f"Création d'un suivi d'enseignement"
-                        if teacher_id and course_id:
-                            try:
-                                from teachers.models import Teacher
-                                from courses.models import Course
-                                teacher = Teacher.objects.get(pk=teacher_id)
-                                course = Course.objects.get(pk=course_id)
-                                description = f"Création suivi: {course.code_ue} - {teacher.nom_complet} ({hours_done}h)"
-                            except:
-                                description = f"Création suivi (ID: {course_id} - {teacher_id} - {hours_done}h)"
-                        
-                        ActionLog.log_action(
-                            user=request.user,
-                            action_type='progress_create',
-                            description=description,
-                            model_name='TeachingProgress',
-                            request=request
-                        )
-                    else:
-                        # Description détaillée pour la modification de suivi
-                        teacher_id = post_data.get('teacher', '')
-                        course_id = post_data.get('course', '')
-                        hours_done = post_data.get('hours_done', '0')
-                        description = f"Modification d'un suivi d'enseignement"
-                        if teacher_id and course_id:
-                            try:
-                                from teachers.models import Teacher
-                                from courses.models import Course
-                                teacher = Teacher.objects.get(pk=teacher_id)
-                                course = Course.objects.get(pk=course_id)
-                                description = f"Modification suivi: {course.code_ue} - {teacher.nom_complet} ({hours_done}h)"
-                            except:
-                                description = f"Modification suivi (ID: {course_id} - {teacher_id} - {hours_done}h)"
-                        
-                        ActionLog.log_action(
-                            user=request.user,
-                            action_type='progress_update',
-                            description=description,
-                            model_name='TeachingProgress',
-                            request=request
-                        )
+                    ActionLog.log_action(
+                        user=request.user,
+                        action_type='progress_create' if is_creation else 'progress_update',
+                        description=description,
+                        model_name='TeachingProgress',
+                        request=request,
+                        describe=describe
+                    )
         
         return None
     
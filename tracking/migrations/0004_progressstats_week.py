@@ -0,0 +1,45 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def rebuild_progress_stats(apps, schema_editor):
+    """Recalcule les statistiques par (UE, enseignant, année, semaine)"""
+    ProgressStats = apps.get_model('tracking', 'ProgressStats')
+    TeachingProgress = apps.get_model('tracking', 'TeachingProgress')
+
+    rows = TeachingProgress.objects.values(
+        'course_id', 'teacher_id', 'week_id', 'week__annee_academique'
+    ).annotate(total=models.Sum('hours_done')).order_by()
+
+    ProgressStats.objects.all().delete()
+    ProgressStats.objects.bulk_create([
+        ProgressStats(
+            course_id=row['course_id'],
+            teacher_id=row['teacher_id'],
+            week_id=row['week_id'],
+            academic_year=row['week__annee_academique'] or '',
+            total_hours_done=row['total'] or 0,
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reglage', '0011_create_default_creneaux'),
+        ('tracking', '0003_merge_20260104_1727'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='progressstats',
+            name='week',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='progress_stats', to='reglage.semainecours', verbose_name='Semaine'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='progressstats',
+            unique_together={('course', 'teacher', 'academic_year', 'week')},
+        ),
+        migrations.RunPython(rebuild_progress_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_summaries(apps, schema_editor):
+    """Résumés mensuels des logs déjà présents"""
+    from django.db.models import Count
+    from django.db.models.functions import TruncMonth
+
+    ActionLog = apps.get_model('tracking', 'ActionLog')
+    ActionLogSummary = apps.get_model('tracking', 'ActionLogSummary')
+
+    rows = ActionLog.objects.annotate(
+        month=TruncMonth('timestamp')
+    ).values('month', 'action_type', 'organisation_id', 'username').annotate(
+        total=Count('id')
+    ).order_by()
+
+    ActionLogSummary.objects.bulk_create([
+        ActionLogSummary(
+            month=row['month'].date() if hasattr(row['month'], 'date') else row['month'],
+            action_type=row['action_type'],
+            organisation_id=row['organisation_id'],
+            username=row['username'],
+            count=row['total'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_organisation_userprofile_organisation'),
+        ('tracking', '0004_progressstats_week'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionLogSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(db_index=True, verbose_name='Mois')),
+                ('action_type', models.CharField(max_length=30, verbose_name="Type d'action")),
+                ('username', models.CharField(max_length=150, verbose_name="Nom d'utilisateur")),
+                ('count', models.PositiveIntegerField(default=0, verbose_name="Nombre d'actions")),
+                ('organisation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.organisation', verbose_name='Organisation')),
+            ],
+            options={
+                'verbose_name': 'Résumé mensuel des actions',
+                'verbose_name_plural': 'Résumés mensuels des actions',
+                'ordering': ['-month', 'action_type'],
+                'unique_together': {('month', 'action_type', 'organisation', 'username')},
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
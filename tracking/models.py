@@ -1,4 +1,8 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.urls import reverse
 from django.core.validators import MinValueValidator
@@ -55,59 +59,149 @@ class TeachingProgress(models.Model):
     def __str__(self):
         return f"{self.course.code_ue} - {self.teacher.nom_complet} - {self.week.designation}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mémoriser l'état chargé pour calculer le delta des statistiques
+        instance._stats_snapshot = instance._stats_state()
+        return instance
+    
+    def _stats_state(self):
+        """Clé (UE, enseignant, semaine) et heures utilisées par ProgressStats"""
+        return (
+            self.__dict__.get('course_id'),
+            self.__dict__.get('teacher_id'),
+            self.__dict__.get('week_id'),
+            Decimal(str(self.__dict__.get('hours_done') or 0)),
+        )
+    
     def save(self, *args, **kwargs):
-        # Vérifie si c'est un nouvel enregistrement
-        is_new = self.pk is None
+        update_stats = kwargs.pop('update_stats', True)
         
         super().save(*args, **kwargs)
         
         # Mettre à jour les statistiques de progression
-        if is_new or kwargs.get('update_stats', True):
+        if update_stats:
             self.update_progress_stats()
     
     def update_progress_stats(self):
-        """Mettre à jour les statistiques de progression pour ce cours"""
-        try:
-            # Récupérer ou créer les statistiques de progression
-            stats, created = ProgressStats.objects.get_or_create(
-                course=self.course,
-                teacher=self.teacher,
-                academic_year=self.week.academic_year
-            )
-            
-            # Calculer le total des heures effectuées
-            total_hours = TeachingProgress.objects.filter(
-                course=self.course,
-                teacher=self.teacher,
-                week__academic_year=self.week.academic_year
-            ).aggregate(models.Sum('hours_done'))['hours_done__sum'] or 0
-            
-            # Mettre à jour les statistiques
-            stats.total_hours_done = total_hours
-            stats.last_update = timezone.now()
-            stats.save()
-            
-        except Exception as e:
-            # Gérer les erreurs silencieusement mais les logger
-            # En production, il faudrait utiliser un logger
-            print(f"Erreur lors de la mise à jour des statistiques: {e}")
+        """
+        Répercute l'enregistrement sur ProgressStats par incrément (F())
+        
+        Seule la différence avec l'état précédent est appliquée : aucune
+        somme n'est recalculée sur l'ensemble des suivis.
+        """
+        previous = getattr(self, '_stats_snapshot', None)
+        current = self._stats_state()
+        if previous == current:
+            return
+        
+        if previous is not None and previous[:3] != current[:3]:
+            # UE, enseignant ou semaine modifiés : déplacer les heures
+            ProgressStats.apply_delta(*previous[:3], -previous[3])
+            ProgressStats.apply_delta(*current[:3], current[3])
+        else:
+            old_hours = previous[3] if previous is not None else Decimal('0')
+            ProgressStats.apply_delta(*current[:3], current[3] - old_hours)
+        
+        self._stats_snapshot = current
 
 class ProgressStats(models.Model):
     """Modèle pour les statistiques de progression des enseignements"""
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='progress_stats', verbose_name="UE")
     teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE, related_name='progress_stats', verbose_name="Enseignant")
     academic_year = models.CharField(max_length=20, verbose_name="Année académique")
+    week = models.ForeignKey(SemaineCours, on_delete=models.CASCADE, related_name='progress_stats', verbose_name="Semaine", null=True, blank=True)
     total_hours_done = models.DecimalField(max_digits=6, decimal_places=2, default=0, verbose_name="Total heures effectuées")
     last_update = models.DateTimeField(auto_now=True, verbose_name="Dernière mise à jour")
     
     class Meta:
         verbose_name = "Statistiques de progression"
         verbose_name_plural = "Statistiques de progression"
-        unique_together = ['course', 'teacher', 'academic_year']
+        unique_together = ['course', 'teacher', 'academic_year', 'week']
         
     def __str__(self):
         return f"{self.course.code_ue} - {self.teacher.nom_complet} - {self.academic_year}"
     
+    @classmethod
+    def apply_delta(cls, course_id, teacher_id, week_id, delta):
+        """
+        Ajoute delta heures à la ligne (UE, enseignant, année, semaine)
+        
+        La ligne est mise à jour avec F() (sans lecture préalable) et créée
+        au premier enregistrement positif.
+        
+        Args:
+            course_id: int - ID de l'UE
+            teacher_id: int - ID de l'enseignant
+            week_id: int - ID de la SemaineCours
+            delta: Decimal - heures à ajouter (négatif pour retirer)
+        """
+        if not delta or not (course_id and teacher_id and week_id):
+            return
+        
+        academic_years = list(
+            SemaineCours.objects.filter(pk=week_id).values_list('annee_academique', flat=True)
+        )
+        if not academic_years:
+            return
+        key = {
+            'course_id': course_id,
+            'teacher_id': teacher_id,
+            'week_id': week_id,
+            'academic_year': academic_years[0] or '',
+        }
+        
+        def increment():
+            return cls.objects.filter(**key).update(
+                total_hours_done=F('total_hours_done') + delta,
+                last_update=timezone.now(),
+            )
+        
+        if increment() or delta < 0:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(total_hours_done=delta, **key)
+        except IntegrityError:
+            # Ligne créée entre-temps par une autre requête
+            increment()
+    
+    @classmethod
+    def rebuild(cls, academic_year=None):
+        """
+        Reconstruit les statistiques depuis TeachingProgress en un GROUP BY
+        
+        Args:
+            academic_year: str - limiter la reconstruction à une année (optionnel)
+        
+        Returns:
+            int: nombre de lignes créées
+        """
+        progress = TeachingProgress.objects.all()
+        stats = cls.objects.all()
+        if academic_year:
+            progress = progress.filter(week__annee_academique=academic_year)
+            stats = stats.filter(academic_year=academic_year)
+        
+        rows = progress.values(
+            'course_id', 'teacher_id', 'week_id', 'week__annee_academique'
+        ).annotate(total=models.Sum('hours_done')).order_by()
+        
+        with transaction.atomic():
+            stats.delete()
+            created = cls.objects.bulk_create([
+                cls(
+                    course_id=row['course_id'],
+                    teacher_id=row['teacher_id'],
+                    week_id=row['week_id'],
+                    academic_year=row['week__annee_academique'] or '',
+                    total_hours_done=row['total'] or 0,
+                )
+                for row in rows
+            ], batch_size=1000)
+        return len(created)
+    
     @property
     def total_hours_allocated(self):
         """Retourne le nombre total d'heures allouées pour ce cours et cet enseignant"""
@@ -179,11 +273,22 @@ class ActionLog(models.Model):
         return f"{self.username} - {self.get_action_type_display()} - {self.timestamp.strftime('%d/%m/%Y %H:%M')}"
     
     @classmethod
-    def log_action(cls, user, action_type, description, model_name=None, object_id=None, object_repr=None, request=None):
-        """Méthode helper pour créer un log d'action"""
+    def log_action(cls, user, action_type, description, model_name=None, object_id=None, object_repr=None, request=None, describe=None):
+        """
+        Méthode helper pour créer un log d'action
+        
+        L'enregistrement est mis en file et écrit par lots en arrière-plan
+        (voir tracking.audit) ; avec ACTION_LOG_ASYNC = False il est écrit
+        immédiatement.
+        
+        Args:
+            describe: callable optionnel calculant une description détaillée
+                au moment de l'écriture ; description sert de repli
+        """
+        from .audit import writer, is_async_enabled
+        
         ip_address = None
         user_agent = None
-        organisation = None
         
         if request:
             # Récupérer l'IP
@@ -195,21 +300,154 @@ class ActionLog(models.Model):
             
             # Récupérer le user agent
             user_agent = request.META.get('HTTP_USER_AGENT', '')[:500]  # Limiter la taille
-            
-            # Récupérer l'organisation de l'utilisateur
-            if user and user.is_authenticated:
-                from accounts.organisation_utils import get_user_organisation
-                organisation = get_user_organisation(user)
-        
-        return cls.objects.create(
-            user=user if user and user.is_authenticated else None,
-            username=user.username if user and user.is_authenticated else 'Anonyme',
-            organisation=organisation,
-            action_type=action_type,
-            model_name=model_name,
-            object_id=str(object_id) if object_id else None,
-            object_repr=str(object_repr) if object_repr else None,
-            description=description,
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
+        
+        authenticated = bool(user and user.is_authenticated)
+        record = {
+            'user_id': user.pk if authenticated else None,
+            'username': user.username if authenticated else 'Anonyme',
+            # L'organisation de l'utilisateur est recherchée à l'écriture
+            'resolve_organisation': bool(request) and authenticated,
+            'action_type': action_type,
+            'model_name': model_name,
+            'object_id': str(object_id) if object_id else None,
+            'object_repr': str(object_repr) if object_repr else None,
+            'description': description,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'describe': describe,
+        }
+        
+        if is_async_enabled():
+            writer.enqueue(record)
+        else:
+            writer.write([record])
+        return None
+
+
+class ActionLogSummary(models.Model):
+    """
+    Nombre mensuel d'actions par type, organisation et utilisateur
+    
+    Tenu à jour à l'écriture des logs : les statistiques de l'historique
+    restent exactes après l'archivage des lignes anciennes d'ActionLog.
+    """
+    month = models.DateField(verbose_name="Mois", db_index=True)
+    action_type = models.CharField(max_length=30, verbose_name="Type d'action")
+    organisation = models.ForeignKey('accounts.Organisation', on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Organisation")
+    username = models.CharField(max_length=150, verbose_name="Nom d'utilisateur")
+    count = models.PositiveIntegerField(default=0, verbose_name="Nombre d'actions")
+    
+    class Meta:
+        verbose_name = "Résumé mensuel des actions"
+        verbose_name_plural = "Résumés mensuels des actions"
+        ordering = ['-month', 'action_type']
+        unique_together = ['month', 'action_type', 'organisation', 'username']
+    
+    def __str__(self):
+        return f"{self.month.strftime('%m/%Y')} - {self.action_type} - {self.username} : {self.count}"
+    
+    @staticmethod
+    def month_of(timestamp):
+        """Premier jour du mois (heure locale) d'un horodatage"""
+        if timezone.is_aware(timestamp):
+            timestamp = timezone.localtime(timestamp)
+        return timestamp.date().replace(day=1)
+    
+    @classmethod
+    def counts_for(cls, logs):
+        """
+        Compte des logs par clé de résumé
+        
+        Args:
+            logs: itérable d'ActionLog ou de dict (timestamp, action_type,
+                organisation_id, username)
+        
+        Returns:
+            Counter: {(mois, type, organisation_id, username): nombre}
+        """
+        from collections import Counter
+        
+        counts = Counter()
+        for log in logs:
+            get = log.get if isinstance(log, dict) else lambda name: getattr(log, name)
+            counts[(
+                cls.month_of(get('timestamp')),
+                get('action_type'),
+                get('organisation_id'),
+                get('username'),
+            )] += 1
+        return counts
+    
+    @classmethod
+    def add_counts(cls, counts):
+        """
+        Applique des incréments (ou décréments) aux résumés mensuels
+        
+        Args:
+            counts: dict {(mois, type, organisation_id, username): delta}
+        """
+        to_create = []
+        with transaction.atomic():
+            for (month, action_type, organisation_id, username), delta in counts.items():
+                if not delta:
+                    continue
+                updated = cls.objects.filter(
+                    month=month,
+                    action_type=action_type,
+                    organisation_id=organisation_id,
+                    username=username,
+                ).update(count=Greatest(F('count') + delta, 0))
+                if not updated and delta > 0:
+                    to_create.append(cls(
+                        month=month,
+                        action_type=action_type,
+                        organisation_id=organisation_id,
+                        username=username,
+                        count=delta,
+                    ))
+            if to_create:
+                cls.objects.bulk_create(to_create)
+    
+    @classmethod
+    def rebuild(cls):
+        """
+        Recalcule les résumés des mois encore présents dans ActionLog
+        
+        Le compte d'un mois est la somme des lignes encore en base et des
+        lignes déjà archivées de ce mois (relues dans les archives) : le mois
+        coupé par la date limite de rétention reste exact. Les mois
+        entièrement archivés gardent leurs résumés.
+        """
+        from collections import Counter
+        from django.db.models import Count
+        from django.db.models.functions import TruncMonth
+        from .retention import archived_counts
+        
+        rows = ActionLog.objects.annotate(
+            month=TruncMonth('timestamp')
+        ).values('month', 'action_type', 'organisation_id', 'username').annotate(
+            total=Count('id')
+        ).order_by()
+        
+        def as_date(value):
+            return value.date() if hasattr(value, 'date') else value
+        
+        counts = Counter()
+        for row in rows:
+            counts[(as_date(row['month']), row['action_type'], row['organisation_id'], row['username'])] += row['total']
+        months = {key[0] for key in counts}
+        counts.update(archived_counts(months))
+        
+        with transaction.atomic():
+            cls.objects.filter(month__in=months).delete()
+            cls.objects.bulk_create([
+                cls(
+                    month=month,
+                    action_type=action_type,
+                    organisation_id=organisation_id,
+                    username=username,
+                    count=count,
+                )
+                for (month, action_type, organisation_id, username), count in counts.items()
+            ], batch_size=1000)
+        return len(counts)
@@ -0,0 +1,179 @@
+"""
+Budget de requêtes SQL par vue
+
+QueryBudgetMiddleware mesure, pour chaque requête HTTP profilée, le nombre
+de requêtes SQL, leur durée totale, les requêtes répétées (même SQL avec
+d'autres paramètres : signature d'un N+1) et la durée totale de la réponse.
+Les mesures sont agrégées par nom d'URL dans une mémoire glissante propre au
+processus, consultée par un superutilisateur (rapport et export JSON).
+
+Le profilage est actif pour toutes les requêtes si QUERY_BUDGET_ENABLED est
+vrai, ou pour une seule requête d'un superutilisateur qui envoie l'en-tête
+QUERY_BUDGET_HEADER (X-Query-Budget par défaut) ; la réponse porte alors
+les en-têtes X-Query-Count, X-Query-Time-Ms et X-Query-Duplicates.
+"""
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class QueryRecorder:
+    """Enveloppe d'exécution SQL (connection.execute_wrapper) qui compte et chronomètre"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        """Requêtes dont le SQL a déjà été exécuté pendant la requête HTTP"""
+        return self.count - len(self.statements)
+
+    def most_repeated(self):
+        """(sql, nombre) du SQL le plus répété, ou None"""
+        if not self.statements:
+            return None
+        sql, count = self.statements.most_common(1)[0]
+        return (sql, count) if count > 1 else None
+
+
+class QueryBudgetStore:
+    """
+    Mesures récentes par nom d'URL
+
+    Chaque vue garde au plus `window` mesures ; les vues les moins
+    récemment vues sont oubliées au-delà de `max_views`.
+    """
+
+    def __init__(self, window=200, max_views=500):
+        self.window = window
+        self.max_views = max_views
+        self._samples = {}
+        self._repeated = {}
+        self._lock = threading.Lock()
+
+    def record(self, view_name, queries, sql_ms, duplicates, wall_ms, repeated=None):
+        with self._lock:
+            samples = self._samples.pop(view_name, None) or deque(maxlen=self.window)
+            samples.append((time.time(), queries, sql_ms, duplicates, wall_ms))
+            # Réinsertion : le dict reste trié du moins récent au plus récent
+            self._samples[view_name] = samples
+            if repeated:
+                self._repeated[view_name] = repeated
+            while len(self._samples) > self.max_views:
+                oldest = next(iter(self._samples))
+                del self._samples[oldest]
+                self._repeated.pop(oldest, None)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._repeated.clear()
+
+    def summary(self):
+        """
+        Agrégats par vue, les plus coûteuses en requêtes d'abord
+
+        Returns:
+            list: dicts view, requests, avg/max/p95 queries, avg SQL time,
+            avg/max duplicates, avg/max wall time, last_seen et repeated_sql
+        """
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+            repeated = dict(self._repeated)
+
+        rows = []
+        for name, samples in snapshot.items():
+            n = len(samples)
+            queries = sorted(s[1] for s in samples)
+            rows.append({
+                'view': name,
+                'requests': n,
+                'avg_queries': round(sum(queries) / n, 1),
+                'max_queries': queries[-1],
+                'p95_queries': queries[min(n - 1, int(n * 0.95))],
+                'avg_sql_ms': round(sum(s[2] for s in samples) / n, 1),
+                'avg_duplicates': round(sum(s[3] for s in samples) / n, 1),
+                'max_duplicates': max(s[3] for s in samples),
+                'avg_wall_ms': round(sum(s[4] for s in samples) / n, 1),
+                'max_wall_ms': round(max(s[4] for s in samples), 1),
+                'last_seen': max(s[0] for s in samples),
+                'repeated_sql': repeated.get(name),
+            })
+        rows.sort(key=lambda row: (row['avg_queries'], row['avg_sql_ms']), reverse=True)
+        return rows
+
+
+store = QueryBudgetStore(
+    window=_setting('QUERY_BUDGET_WINDOW', 200),
+    max_views=_setting('QUERY_BUDGET_MAX_VIEWS', 500),
+)
+
+
+def view_name_of(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is not None and match.view_name:
+        return match.view_name
+    return 'non résolue'
+
+
+class QueryBudgetMiddleware:
+    """
+    Profilage des requêtes SQL par vue (voir l'en-tête du module)
+
+    À placer après AuthenticationMiddleware pour que l'en-tête de profilage
+    soit réservé aux superutilisateurs.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = 'HTTP_' + _setting('QUERY_BUDGET_HEADER', 'X-Query-Budget').upper().replace('-', '_')
+
+    def _requested(self, request):
+        if request.META.get(self.header) is None:
+            return False
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_superuser)
+
+    def __call__(self, request):
+        on_demand = self._requested(request)
+        if not (on_demand or _setting('QUERY_BUDGET_ENABLED', False)):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - start) * 1000
+        sql_ms = recorder.duration * 1000
+
+        repeated = recorder.most_repeated()
+        store.record(
+            view_name_of(request), recorder.count, sql_ms, recorder.duplicates, wall_ms,
+            repeated={'sql': repeated[0][:1000], 'count': repeated[1]} if repeated else None,
+        )
+        if on_demand:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Time-Ms'] = f"{sql_ms:.1f}"
+            response['X-Query-Duplicates'] = str(recorder.duplicates)
+        return response
@@ -0,0 +1,223 @@
+"""
+Rétention du journal des actions : archivage mensuel des lignes anciennes
+
+Les lignes d'ActionLog plus anciennes que ACTION_LOG_RETENTION_DAYS sont
+écrites dans des fichiers mensuels compressés sous MEDIA_ROOT/action_logs
+puis supprimées de la base. Les compteurs d'ActionLogSummary ne changent
+pas : ils couvrent déjà les lignes archivées.
+"""
+import glob
+import gzip
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = 'action_logs'
+ARCHIVE_FIELDS = [
+    'id', 'timestamp', 'user_id', 'username', 'organisation_id', 'action_type',
+    'model_name', 'object_id', 'object_repr', 'description', 'ip_address', 'user_agent',
+]
+FORMATS = ('jsonl', 'parquet')
+
+# Un verrou plus ancien est considéré comme abandonné
+LOCK_TIMEOUT = 3600
+
+
+def archive_root():
+    return os.path.join(settings.MEDIA_ROOT, ARCHIVE_DIR)
+
+
+def archive_path(month, fmt='jsonl', part=None):
+    """
+    Chemin du fichier d'archive d'un mois
+
+    Les archives JSONL sont compressées (gzip) et complétées à chaque
+    passage ; les archives Parquet sont écrites par morceaux numérotés.
+    """
+    folder = os.path.join(archive_root(), f"{month.year:04d}")
+    if fmt == 'parquet':
+        return os.path.join(folder, f"action_log_{month:%Y-%m}_{part}.parquet")
+    return os.path.join(folder, f"action_log_{month:%Y-%m}.jsonl.gz")
+
+
+def _serialize(row):
+    record = {field: row.get(field) for field in ARCHIVE_FIELDS}
+    record['timestamp'] = row['timestamp'].isoformat() if row.get('timestamp') else None
+    return record
+
+
+def _parse(record):
+    """Enregistrement d'archive -> dict accepté par ActionLogSummary.counts_for"""
+    organisation_id = record.get('organisation_id')
+    if organisation_id is not None and organisation_id == organisation_id:  # NaN (parquet) : pas d'organisation
+        organisation_id = int(organisation_id)
+    else:
+        organisation_id = None
+    return {
+        'timestamp': datetime.fromisoformat(record['timestamp']),
+        'action_type': record['action_type'],
+        'organisation_id': organisation_id,
+        'username': record['username'],
+    }
+
+
+def archived_counts(months):
+    """
+    Nombre de lignes archivées par clé de résumé, pour les mois donnés
+
+    Relit les archives JSONL (gzip) et Parquet de chaque mois.
+
+    Args:
+        months: itérable de dates (premier jour du mois)
+
+    Returns:
+        Counter: {(mois, type, organisation_id, username): nombre}
+    """
+    from .models import ActionLogSummary
+
+    counts = Counter()
+    for month in months:
+        path = archive_path(month)
+        if os.path.exists(path):
+            with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                counts.update(ActionLogSummary.counts_for(
+                    _parse(json.loads(line)) for line in archive if line.strip()
+                ))
+        for path in sorted(glob.glob(archive_path(month, 'parquet', '*'))):
+            import pandas as pd
+            records = pd.read_parquet(path, columns=['timestamp', 'action_type', 'organisation_id', 'username'])
+            counts.update(ActionLogSummary.counts_for(_parse(record) for record in records.to_dict('records')))
+    return counts
+
+
+def _write_month(month, records, fmt, part):
+    path = archive_path(month, fmt, part)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == 'parquet':
+        import pandas as pd
+        pd.DataFrame(records, columns=ARCHIVE_FIELDS).to_parquet(path, index=False)
+    else:
+        # Mode ajout : chaque passage ajoute un membre gzip au fichier du mois
+        with gzip.open(path, 'at', encoding='utf-8') as archive:
+            for record in records:
+                archive.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return path
+
+
+def archive_action_logs(days=None, fmt='jsonl', chunk_size=5000, dry_run=False):
+    """
+    Archive puis supprime les logs plus anciens que `days` jours
+
+    Args:
+        days: int - âge minimal des lignes archivées (ACTION_LOG_RETENTION_DAYS par défaut)
+        fmt: str - 'jsonl' (gzip) ou 'parquet' (nécessite pyarrow)
+        chunk_size: int - lignes lues, écrites et supprimées par lot
+        dry_run: bool - compter sans rien écrire ni supprimer
+
+    Returns:
+        dict: {'cutoff', 'archived', 'months': {mois: nombre}, 'files': [...]}
+    """
+    from .models import ActionLog, ActionLogSummary
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Format d'archive inconnu : {fmt}")
+    if fmt == 'parquet':
+        # Vérifier la présence du moteur avant de toucher aux données
+        import pyarrow  # noqa: F401
+
+    days = days if days is not None else getattr(settings, 'ACTION_LOG_RETENTION_DAYS', 180)
+    cutoff = timezone.now() - timedelta(days=days)
+    queryset = ActionLog.objects.filter(timestamp__lt=cutoff)
+    report = {'cutoff': cutoff, 'archived': 0, 'months': {}, 'files': []}
+
+    if dry_run:
+        for month, count in ActionLogSummary.counts_for(
+            queryset.values('timestamp', 'action_type', 'organisation_id', 'username').iterator()
+        ).items():
+            report['months'][month[0]] = report['months'].get(month[0], 0) + count
+            report['archived'] += count
+        return report
+
+    run_stamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    part = 0
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id).order_by('id').values(*ARCHIVE_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        part += 1
+
+        by_month = {}
+        for row in rows:
+            month = ActionLogSummary.month_of(row['timestamp'])
+            by_month.setdefault(month, []).append(_serialize(row))
+
+        # Écrire les fichiers avant de supprimer : une ligne n'est jamais perdue
+        for month, records in by_month.items():
+            path = _write_month(month, records, fmt, f"{run_stamp}_{part:04d}")
+            if path not in report['files']:
+                report['files'].append(path)
+            report['months'][month] = report['months'].get(month, 0) + len(records)
+
+        with transaction.atomic():
+            ActionLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        report['archived'] += len(rows)
+
+    return report
+
+
+def _acquire_lock():
+    """Verrou fichier partagé par les processus du serveur"""
+    os.makedirs(archive_root(), exist_ok=True)
+    path = os.path.join(archive_root(), '.retention.lock')
+    try:
+        if time.time() - os.path.getmtime(path) > LOCK_TIMEOUT:
+            os.remove(path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return None
+    return path
+
+
+def run_scheduled_retention():
+    """
+    Passage automatique, lancé dans un thread dédié par le writer du journal
+
+    Sans effet si ACTION_LOG_AUTO_ARCHIVE est désactivé ou si un autre
+    processus archive déjà.
+    """
+    if not getattr(settings, 'ACTION_LOG_AUTO_ARCHIVE', False):
+        return None
+    lock = _acquire_lock()
+    if lock is None:
+        return None
+    try:
+        report = archive_action_logs(fmt=getattr(settings, 'ACTION_LOG_ARCHIVE_FORMAT', 'jsonl'))
+        if report['archived']:
+            logger.info("Journal des actions : %d ligne(s) archivée(s) avant le %s",
+                        report['archived'], report['cutoff'].date())
+        return report
+    except Exception:
+        logger.exception("Échec de l'archivage automatique du journal des actions")
+        return None
+    finally:
+        try:
+            os.remove(lock)
+        except OSError:
+            pass
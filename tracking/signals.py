@@ -1,7 +1,7 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in, user_logged_out
-from .models import TeachingProgress, AcademicWeek, ActionLog
+from .models import TeachingProgress, AcademicWeek, ActionLog, ProgressStats
 from attribution.models import Attribution, ScheduleEntry
 from django.db.models.signals import pre_delete
 
@@ -52,6 +52,12 @@ def log_teaching_progress_delete(sender, instance, **kwargs):
     )
 
 
+@receiver(post_delete, sender=TeachingProgress)
+def update_progress_stats_on_delete(sender, instance, **kwargs):
+    """Retirer les heures du suivi supprimé des statistiques de progression"""
+    ProgressStats.apply_delta(instance.course_id, instance.teacher_id, instance.week_id, -instance.hours_done)
+
+
 @receiver(post_save, sender=Attribution)
 def log_attribution_save(sender, instance, created, **kwargs):
     """Enregistrer la création ou modification d'une attribution"""
@@ -174,3 +180,19 @@ def log_user_logout(sender, request, user, **kwargs):
             model_name='User',
             request=request
         )
+
+
+def _connect_statistics_invalidation():
+    """Invalider le cache des statistiques d'accueil quand les données sources changent"""
+    from accounts.models import UserProfile
+    from courses.models import Course
+    from reglage.models import Section, Departement, Mention, Classe
+    from teachers.models import Teacher
+    from .statistics import invalidate_statistics
+    
+    for model in (Course, Teacher, TeachingProgress, UserProfile, Section, Departement, Mention, Classe):
+        post_save.connect(invalidate_statistics, sender=model, dispatch_uid=f'home_stats_save_{model.__name__}')
+        post_delete.connect(invalidate_statistics, sender=model, dispatch_uid=f'home_stats_delete_{model.__name__}')
+
+
+_connect_statistics_invalidation()
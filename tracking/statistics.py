@@ -0,0 +1,227 @@
+"""
+Statistiques du tableau de bord d'accueil, calculées par section et mises en cache
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum, Case, When, F, FloatField, ExpressionWrapper, DecimalField
+
+
+SEMESTRES_IMPAIRS = ['S1', 'S3', 'S5', 'S7', 'S9', 'S11']
+SEMESTRES_PAIRS = ['S2', 'S4', 'S6', 'S8', 'S10', 'S12']
+
+CACHE_KEY = 'tracking:home_statistics'
+CACHE_TIMEOUT = getattr(settings, 'HOME_STATISTICS_CACHE_TIMEOUT', 300)
+
+COUNT_FIELDS = [
+    'departements_count', 'mentions_count', 'classes_count',
+    'teachers_count', 'courses_count', 'users_count',
+]
+HOURS_FIELDS = [
+    'heures_allouees_impair', 'heures_realisees_impair',
+    'heures_allouees_pair', 'heures_realisees_pair',
+]
+
+
+def _empty_stats():
+    stats = {field: 0 for field in COUNT_FIELDS}
+    stats.update({field: 0 for field in HOURS_FIELDS})
+    return stats
+
+
+def _taux(realisees, allouees):
+    if not allouees:
+        return 0
+    return round((float(realisees) / float(allouees)) * 100, 1)
+
+
+def _finalize(stats):
+    stats['taux_impair'] = _taux(stats['heures_realisees_impair'], stats['heures_allouees_impair'])
+    stats['taux_pair'] = _taux(stats['heures_realisees_pair'], stats['heures_allouees_pair'])
+    return stats
+
+
+def _hours_by_parity(value_expression, semestre_field, output_field):
+    """Sommes conditionnelles des heures pour les semestres impairs et pairs"""
+    return {
+        'impair': Sum(Case(When(**{f'{semestre_field}__in': SEMESTRES_IMPAIRS}, then=value_expression),
+                           default=None, output_field=output_field)),
+        'pair': Sum(Case(When(**{f'{semestre_field}__in': SEMESTRES_PAIRS}, then=value_expression),
+                         default=None, output_field=output_field)),
+    }
+
+
+def compute_section_statistics():
+    """
+    Calcule les statistiques de toutes les sections en quelques GROUP BY
+
+    Returns:
+        dict: {code de section: statistiques} ; la clé None regroupe les
+        enregistrements sans section (utile pour les totaux globaux)
+    """
+    from accounts.models import UserProfile
+    from courses.models import Course
+    from reglage.models import Departement, Mention, Classe
+    from teachers.models import Teacher
+    from .models import TeachingProgress
+
+    sections = defaultdict(_empty_stats)
+
+    def count_by(queryset, field, target):
+        for row in queryset.values(field).annotate(total=Count('pk')).order_by():
+            sections[row[field]][target] = row['total']
+
+    count_by(Departement.objects, 'section_id', 'departements_count')
+    count_by(Mention.objects, 'departement__section_id', 'mentions_count')
+    count_by(Classe.objects, 'mention__departement__section_id', 'classes_count')
+    count_by(Teacher.objects, 'section', 'teachers_count')
+    count_by(UserProfile.objects, 'organisation__code', 'users_count')
+
+    volume = ExpressionWrapper(F('cmi') + F('td_tp'), output_field=FloatField())
+    course_rows = Course.objects.values('section').annotate(
+        total=Count('pk'),
+        **{f'allouees_{k}': v for k, v in _hours_by_parity(volume, 'semestre', FloatField()).items()}
+    ).order_by()
+    for row in course_rows:
+        stats = sections[row['section']]
+        stats['courses_count'] = row['total']
+        stats['heures_allouees_impair'] = row['allouees_impair'] or 0
+        stats['heures_allouees_pair'] = row['allouees_pair'] or 0
+
+    progress_rows = TeachingProgress.objects.values('course__section').annotate(
+        **{f'realisees_{k}': v for k, v in _hours_by_parity(
+            F('hours_done'), 'course__semestre', DecimalField(max_digits=10, decimal_places=2)
+        ).items()}
+    ).order_by()
+    for row in progress_rows:
+        stats = sections[row['course__section']]
+        stats['heures_realisees_impair'] = row['realisees_impair'] or 0
+        stats['heures_realisees_pair'] = row['realisees_pair'] or 0
+
+    return {code: _finalize(stats) for code, stats in sections.items()}
+
+
+def get_section_statistics():
+    """Retourne les statistiques par section depuis le cache (calculées si absentes)"""
+    statistics = cache.get(CACHE_KEY)
+    if statistics is None:
+        statistics = compute_section_statistics()
+        cache.set(CACHE_KEY, statistics, CACHE_TIMEOUT)
+    return statistics
+
+
+def get_statistics_for_section(code):
+    """Statistiques d'une section (zéros si la section n'a aucune donnée)"""
+    return get_section_statistics().get(code) or _finalize(_empty_stats())
+
+
+def get_global_statistics():
+    """Totaux toutes sections confondues"""
+    totals = _empty_stats()
+    for stats in get_section_statistics().values():
+        for field in COUNT_FIELDS + HOURS_FIELDS:
+            totals[field] += stats[field]
+    return _finalize(totals)
+
+
+def invalidate_statistics(**kwargs):
+    """Récepteur de signal : invalide le cache des statistiques"""
+    cache.delete(CACHE_KEY)
+
+
+def progress_stats_queryset(academic_year=None, section=None, semestres=None):
+    """
+    Lignes ProgressStats (agrégat matérialisé des suivis) filtrées
+
+    Args:
+        academic_year: str - année académique (toutes si absent)
+        section: str - code de section des enseignants (optionnel)
+        semestres: liste de codes de semestre des UE (optionnel)
+    """
+    from .models import ProgressStats
+
+    queryset = ProgressStats.objects.all()
+    if academic_year:
+        queryset = queryset.filter(academic_year=academic_year)
+    if section:
+        queryset = queryset.filter(teacher__section=section)
+    if semestres:
+        queryset = queryset.filter(course__semestre__in=semestres)
+    return queryset
+
+
+def teacher_charge_progress(academic_year, section=None, semestres=None, charge_type=None):
+    """
+    Progression des enseignants par type de charge en deux requêtes
+
+    Les heures réalisées par (enseignant, UE) viennent de ProgressStats,
+    les volumes alloués des attributions ; la jointure se fait en mémoire.
+
+    Args:
+        academic_year: str - année académique
+        section: str - code de section des enseignants (optionnel)
+        semestres: liste de semestres limitant les heures réalisées (optionnel)
+        charge_type: str - type de charge à retenir (tous si absent)
+
+    Returns:
+        list: lignes triées par enseignant puis type de charge
+    """
+    from attribution.models import Attribution
+
+    stats = progress_stats_queryset(academic_year, section, semestres)
+    hours_done_by_course = {
+        (row['teacher__matricule'], row['course_id']): row['total']
+        for row in stats.values('teacher__matricule', 'course_id').annotate(
+            total=Sum('total_hours_done')
+        ).order_by()
+    }
+
+    # Attributions (enseignant, type de charge, UE) des enseignants ayant un suivi
+    attributions = Attribution.objects.filter(
+        matricule__matricule__in=stats.values('teacher__matricule'),
+        type_charge__isnull=False,
+    ).exclude(type_charge='')
+    if section:
+        attributions = attributions.filter(matricule__section=section)
+    if charge_type:
+        attributions = attributions.filter(type_charge=charge_type)
+
+    charges = {}
+    for row in attributions.values(
+        'matricule__matricule', 'matricule__nom_complet', 'type_charge',
+        'code_ue_id', 'code_ue__cmi', 'code_ue__td_tp'
+    ).order_by():
+        key = (row['matricule__matricule'], row['type_charge'])
+        charge = charges.setdefault(key, {
+            'teacher__nom_complet': row['matricule__nom_complet'],
+            'courses': {},
+        })
+        if row['code_ue_id'] is not None:
+            charge['courses'][row['code_ue_id']] = float(row['code_ue__cmi'] or 0) + float(row['code_ue__td_tp'] or 0)
+
+    teacher_progress = []
+    for (teacher_matricule, type_charge), charge in charges.items():
+        hours_done = sum(
+            (hours_done_by_course.get((teacher_matricule, course_id)) or 0
+             for course_id in charge['courses']),
+            0
+        )
+        hours_allocated = sum(charge['courses'].values(), 0)
+
+        progression_percentage = 0
+        if hours_allocated > 0:
+            progression_percentage = (float(hours_done) * 100.0) / float(hours_allocated)
+
+        teacher_progress.append({
+            'teacher__nom_complet': charge['teacher__nom_complet'],
+            'teacher__matricule': teacher_matricule,
+            'type_charge': type_charge.capitalize(),
+            'total_hours_done': hours_done,
+            'total_hours_allocated': hours_allocated,
+            'progression_percentage': progression_percentage,
+            'hours_display': f"{hours_done}/{hours_allocated}"
+        })
+
+    teacher_progress.sort(key=lambda x: (x['teacher__nom_complet'], x['type_charge']))
+    return teacher_progress
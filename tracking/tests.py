@@ -1,3 +1,297 @@
-from django.test import TestCase
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from attribution.models import Attribution
+from courses.models import Course
+from reglage.models import SemaineCours
+from reglage.registry import reference_data
+from teachers.models import Teacher
+from .audit import ActionLogWriter
+from .models import ActionLog, ActionLogSummary, TeachingProgress, ProgressStats
+from .query_budget import QueryBudgetMiddleware, QueryBudgetStore, store
+from .retention import archive_action_logs, archive_path
+from .tracing import get_tracer, tracing
+from .views import DashboardView
+
+
+def current_academic_year():
+    """Même calcul que DashboardView"""
+    now = timezone.now()
+    return f"{now.year-1}-{now.year}" if now.month < 9 else f"{now.year}-{now.year+1}"
+
+
+class DashboardQueryCountTests(TestCase):
+    """Le tableau de bord doit exécuter un nombre constant de requêtes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.academic_year = current_academic_year()
+        lundi = date(2024, 1, 1)
+        cls.week = SemaineCours.objects.create(
+            numero_semaine=1,
+            date_debut=lundi,
+            date_fin=lundi + timedelta(days=5),
+            designation='Semaine 1',
+            annee_academique=cls.academic_year,
+        )
+
+    def add_teachers(self, start, count):
+        for i in range(start, start + count):
+            teacher = Teacher.objects.create(
+                matricule=f'MAT{i:04d}',
+                nom_complet=f'Enseignant {i}',
+                fonction='ENS',
+                grade='PA',
+                categorie='A',
+                departement='Informatique',
+            )
+            for type_charge in ('Reguliere', 'Supplementaire'):
+                course = Course.objects.create(
+                    code_ue=f'UE{i:04d}{type_charge[0]}',
+                    intitule_ue=f'UE {i}',
+                    credit=3,
+                    cmi=30,
+                    td_tp=15,
+                    classe='L1INFO',
+                    semestre='S1',
+                    departement='Informatique',
+                )
+                Attribution.objects.create(
+                    matricule=teacher,
+                    code_ue=course,
+                    annee_academique=self.academic_year,
+                    type_charge=type_charge,
+                )
+                TeachingProgress.objects.create(
+                    course=course,
+                    teacher=teacher,
+                    week=self.week,
+                    hours_done=10,
+                )
+
+    def count_dashboard_queries(self):
+        request = RequestFactory().get('/tracking/')
+        request.user = self.user
+        view = DashboardView()
+        view.setup(request)
+        # Registre des tables de référence chargé une fois par processus : hors mesure
+        reference_data()
+        with CaptureQueriesContext(connection) as queries:
+            context = view.get_context_data()
+        return len(queries.captured_queries), context
+
+    def test_query_count_does_not_depend_on_teacher_count(self):
+        self.add_teachers(0, 2)
+        small_count, context = self.count_dashboard_queries()
+        self.assertEqual(len(context['teacher_progress']), 4)
+
+        self.add_teachers(2, 10)
+        large_count, context = self.count_dashboard_queries()
+        self.assertEqual(len(context['teacher_progress']), 24)
+        self.assertEqual(small_count, large_count)
+
+    def test_teacher_progress_totals(self):
+        self.add_teachers(0, 1)
+        _, context = self.count_dashboard_queries()
+        for row in context['teacher_progress']:
+            self.assertEqual(float(row['total_hours_done']), 10.0)
+            self.assertEqual(row['total_hours_allocated'], 45.0)
+
+
+class ProgressStatsDeltaTests(TestCase):
+    """ProgressStats suit les suivis par incréments"""
+
+    @classmethod
+    def setUpTestData(cls):
+        lundi = date(2024, 1, 1)
+        cls.week = SemaineCours.objects.create(
+            numero_semaine=1,
+            date_debut=lundi,
+            date_fin=lundi + timedelta(days=5),
+            designation='Semaine 1',
+            annee_academique='2023-2024',
+        )
+        cls.teacher = Teacher.objects.create(
+            matricule='MAT0001',
+            nom_complet='Enseignant',
+            fonction='ENS',
+            grade='PA',
+            categorie='A',
+            departement='Informatique',
+        )
+        cls.course = Course.objects.create(
+            code_ue='UE0001',
+            intitule_ue='UE',
+            credit=3,
+            cmi=30,
+            td_tp=15,
+            classe='L1INFO',
+            semestre='S1',
+            departement='Informatique',
+        )
+
+    def total(self):
+        stats = ProgressStats.objects.get(course=self.course, teacher=self.teacher, week=self.week)
+        self.assertEqual(stats.academic_year, '2023-2024')
+        return float(stats.total_hours_done)
+
+    def test_save_update_delete(self):
+        progress = TeachingProgress.objects.create(
+            course=self.course, teacher=self.teacher, week=self.week, hours_done=4
+        )
+        self.assertEqual(self.total(), 4.0)
+
+        progress = TeachingProgress.objects.get(pk=progress.pk)
+        progress.hours_done = 6
+        progress.save()
+        self.assertEqual(self.total(), 6.0)
+
+        progress.delete()
+        self.assertEqual(self.total(), 0.0)
+
+    def test_rebuild_matches_incremental(self):
+        TeachingProgress.objects.create(
+            course=self.course, teacher=self.teacher, week=self.week, hours_done=3
+        )
+        ProgressStats.objects.update(total_hours_done=0)
+        self.assertEqual(ProgressStats.rebuild('2023-2024'), 1)
+        self.assertEqual(self.total(), 3.0)
+
+
+class ActionLogRetentionTests(TestCase):
+    """Archivage des actions anciennes et résumés mensuels"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def log(self, username, timestamp, action_type='create'):
+        """Action écrite à `timestamp` et comptée dans le résumé de son mois, comme par le writer"""
+        log = ActionLog.objects.create(
+            username=username, action_type=action_type, description=f'{action_type} par {username}',
+        )
+        ActionLog.objects.filter(pk=log.pk).update(timestamp=timestamp)
+        log.refresh_from_db()
+        ActionLogSummary.add_counts(ActionLogSummary.counts_for([log]))
+        return log
+
+    def days_ago(self, days):
+        return timezone.now() - timedelta(days=days)
+
+    def summary_counts(self):
+        return {
+            (row.month, row.action_type, row.username): row.count
+            for row in ActionLogSummary.objects.all()
+        }
+
+    def test_old_logs_are_written_to_the_monthly_archive_then_deleted(self):
+        old = self.log('ancien', self.days_ago(400))
+        recent = self.log('recent', self.days_ago(10))
+
+        dry = archive_action_logs(days=180, dry_run=True)
+        self.assertEqual(dry['archived'], 1)
+        self.assertEqual(ActionLog.objects.count(), 2)
+
+        report = archive_action_logs(days=180)
+        self.assertEqual(report['archived'], 1)
+        self.assertEqual(list(ActionLog.objects.values_list('id', flat=True)), [recent.pk])
+
+        month = ActionLogSummary.month_of(old.timestamp)
+        self.assertEqual(report['files'], [archive_path(month)])
+        with gzip.open(report['files'][0], 'rt', encoding='utf-8') as archive:
+            records = [json.loads(line) for line in archive]
+        self.assertEqual([record['id'] for record in records], [old.pk])
+        self.assertEqual(records[0]['username'], 'ancien')
+
+    def test_rebuild_adds_archived_rows_of_the_boundary_month(self):
+        now = timezone.now()
+        month_start = timezone.localtime(self.days_ago(400)).replace(day=1, hour=12, minute=0, second=0, microsecond=0)
+        early = self.log('ancien', month_start + timedelta(days=2))
+        self.log('ancien', month_start + timedelta(days=20))
+        self.log('recent', self.days_ago(10), action_type='update')
+        counts = self.summary_counts()
+        self.assertEqual(counts[(ActionLogSummary.month_of(early.timestamp), 'create', 'ancien')], 2)
+
+        # Date limite au milieu du mois : une ligne archivée, l'autre reste en base
+        days = (now - (month_start + timedelta(days=10))).days
+        self.assertEqual(archive_action_logs(days=days)['archived'], 1)
+        self.assertEqual(self.summary_counts(), counts)
+
+        ActionLogSummary.objects.update(count=99)
+        self.assertEqual(ActionLogSummary.rebuild(), 2)
+        self.assertEqual(self.summary_counts(), counts)
+
+    def test_automatic_archiving_is_opt_in(self):
+        writer = ActionLogWriter()
+        writer._maybe_run_retention()
+        self.assertIsNone(writer._retention_thread)
+        self.assertIsNone(writer._next_retention)
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        store.clear()
+        self.addCleanup(store.clear)
+
+    def test_repeated_sql_is_counted_per_view(self):
+        def view(request):
+            from django.http import HttpResponse
+            from django.urls import ResolverMatch
+            request.resolver_match = ResolverMatch(view, (), {}, url_name='liste', namespaces=['test'])
+            for pk in (1, 2, 3):
+                User.objects.filter(pk=pk).exists()
+            return HttpResponse('ok')
+
+        with override_settings(QUERY_BUDGET_ENABLED=True):
+            QueryBudgetMiddleware(view)(RequestFactory().get('/'))
+
+        row = store.summary()[0]
+        self.assertEqual(row['view'], 'test:liste')
+        self.assertEqual(row['max_queries'], 3)
+        self.assertEqual(row['max_duplicates'], 2)
+        self.assertEqual(row['repeated_sql']['count'], 3)
+
+    def test_store_keeps_a_rolling_window(self):
+        budget = QueryBudgetStore(window=2, max_views=1)
+        for queries in (10, 20, 30):
+            budget.record('a', queries, 1.0, 0, 5.0)
+        self.assertEqual(budget.summary()[0]['avg_queries'], 25)
+        budget.record('b', 1, 1.0, 0, 5.0)
+        self.assertEqual([row['view'] for row in budget.summary()], ['b'])
+
+
+class TracingTests(TestCase):
+    def test_lazy_fields_are_only_evaluated_inside_a_trace(self):
+        trace = get_tracer('tests')
+        calls = []
+
+        def total():
+            calls.append(1)
+            return 42
+
+        trace.event('hors_trace', total=total)
+        self.assertEqual(calls, [])
+        self.assertFalse(trace.enabled)
+
+        with self.assertLogs('trace.tests', level='DEBUG') as logs:
+            with tracing('abc123'):
+                self.assertTrue(trace.enabled)
+                trace.event('dans_trace', total=total)
+                with trace.span('bloc'):
+                    pass
+        self.assertEqual(calls, [1])
+        self.assertIn('[abc123] dans_trace total=42', logs.output[0])
+        self.assertIn('bloc duration_ms=', logs.output[1])
@@ -0,0 +1,139 @@
+"""
+Traces de diagnostic par requête
+
+Remplace les print() de débogage des vues : un événement de trace n'est
+émis que pour une requête tracée, et ses valeurs peuvent être des fonctions
+(lambda) évaluées uniquement dans ce cas. Hors trace, un appel coûte une
+lecture de ContextVar ; les requêtes SQL qui ne servent qu'au diagnostic
+(comptages, échantillons) ne sont donc jamais exécutées en production.
+
+Une requête est tracée si TRACE_ALL_REQUESTS est vrai, ou si un
+superutilisateur envoie l'en-tête TRACE_HEADER (X-Trace par défaut). Les
+événements vont au logger 'trace.<module>' (voir LOGGING) avec
+l'identifiant de trace renvoyé dans l'en-tête X-Trace-Id.
+
+Usage :
+    trace = get_tracer(__name__)
+    trace.event('liste_charges.filtres', annee=annee, total=lambda: qs.count())
+    with trace.span('schedule_pdf.rendu'):
+        doc.build(elements)
+"""
+import contextvars
+import logging
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+
+
+_trace_id = contextvars.ContextVar('trace_id', default=None)
+_NULL_SPAN = nullcontext()
+
+
+def current_trace_id():
+    """Identifiant de la trace en cours, ou None hors trace"""
+    return _trace_id.get()
+
+
+def _resolve(value):
+    return value() if callable(value) else value
+
+
+class Tracer:
+    """Émetteur d'événements de trace pour un module"""
+
+    __slots__ = ('logger',)
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(f'trace.{name}')
+
+    @property
+    def enabled(self):
+        """Vrai pendant une requête tracée (à tester avant un bloc de diagnostic)"""
+        return _trace_id.get() is not None
+
+    def event(self, name, message=None, **fields):
+        """
+        Émet un événement si la requête est tracée
+
+        Args:
+            name: str - nom de l'événement (ex: 'schedule_pdf.filtre_semaine')
+            message: texte ou fonction retournant le texte
+            **fields: valeurs ou fonctions retournant les valeurs
+        """
+        trace_id = _trace_id.get()
+        if trace_id is None:
+            return
+        try:
+            values = {key: _resolve(value) for key, value in fields.items()}
+            text = _resolve(message)
+        except Exception as e:
+            # Une trace ne doit jamais faire échouer la requête
+            values, text = {}, f"valeur de trace indisponible : {e!r}"
+        details = ' '.join(f"{key}={value!r}" for key, value in values.items())
+        self.logger.debug(
+            "[%s] %s %s%s", trace_id, name, details, f" - {text}" if text else '',
+            extra={'trace_id': trace_id, 'trace_event': name, 'trace_fields': values},
+        )
+
+    def span(self, name, **fields):
+        """Mesure la durée d'un bloc (événement émis à la sortie avec duration_ms)"""
+        if _trace_id.get() is None:
+            return _NULL_SPAN
+        return self._span(name, fields)
+
+    @contextmanager
+    def _span(self, name, fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.event(name, duration_ms=round((time.perf_counter() - start) * 1000, 1), **fields)
+
+
+def get_tracer(name):
+    return Tracer(name)
+
+
+@contextmanager
+def tracing(trace_id=None):
+    """Active la trace pour le bloc (requête, commande de gestion, test)"""
+    token = _trace_id.set(trace_id or uuid.uuid4().hex[:12])
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+_request_tracer = get_tracer('request')
+
+
+class TracingMiddleware:
+    """
+    Active la trace pour la requête (voir l'en-tête du module)
+
+    À placer après AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = 'HTTP_' + getattr(settings, 'TRACE_HEADER', 'X-Trace').upper().replace('-', '_')
+
+    def _requested(self, request):
+        if getattr(settings, 'TRACE_ALL_REQUESTS', False):
+            return True
+        if request.META.get(self.header) is None:
+            return False
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_superuser)
+
+    def __call__(self, request):
+        if not self._requested(request):
+            return self.get_response(request)
+        with tracing() as trace_id:
+            with _request_tracer.span('request', method=request.method, path=request.path):
+                response = self.get_response(request)
+            _request_tracer.event('response', status=response.status_code)
+        response['X-Trace-Id'] = trace_id
+        return response
@@ -38,6 +38,10 @@ urlpatterns = [
     # Historique des actions (admin seulement)
     path('action-history/', views.action_history_view, name='action_history'),
     
+    # Budget de requêtes SQL par vue (admin seulement)
+    path('query-budget/', views.query_budget_view, name='query_budget'),
+    path('query-budget/export/', views.query_budget_export, name='query_budget_export'),
+    
     # Test des actions
     path('test-actions/', views_test.test_actions, name='test_actions'),
 ]
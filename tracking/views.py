@@ -14,12 +14,14 @@ from xhtml2pdf import pisa
 import io
 import re
 
-from .models import TeachingProgress, AcademicWeek, ProgressStats, ActionLog
+from .models import TeachingProgress, AcademicWeek, ProgressStats, ActionLog, ActionLogSummary
 from .forms import TeachingProgressForm, AcademicWeekForm, ProgressFilterForm
+from .statistics import progress_stats_queryset, teacher_charge_progress
 from courses.models import Course
 from teachers.models import Teacher
 from attribution.models import Attribution
-from reglage.models import AnneeAcademique, SemaineCours
+from reglage.models import SemaineCours
+from reglage.registry import reference_data
 from django.contrib.auth.decorators import user_passes_test
 from django.core.paginator import Paginator
 from datetime import datetime, timedelta
@@ -32,9 +34,9 @@ def home(request):
     Affiche un aperçu des informations importantes
     Filtré par organisation si l'utilisateur appartient à une organisation
     """
-    from accounts.models import Organisation, UserProfile
+    from accounts.models import Organisation
     from accounts.organisation_utils import get_user_organisation
-    from reglage.models import Section, Departement, Mention, Classe
+    from .statistics import get_statistics_for_section, get_global_statistics
     
     # Récupérer l'organisation de l'utilisateur connecté
     user_organisation = get_user_organisation(request.user)
@@ -42,192 +44,59 @@ def home(request):
     
     context = {
         'current_year': timezone.now().year,
-        'active_year': AnneeAcademique.objects.filter(est_en_cours=True).first(),
-        'current_week': SemaineCours.objects.filter(est_en_cours=True).first(),
+        'active_year': reference_data().annee_courante,
+        'current_week': reference_data().semaine_courante,
         'is_org_user': is_org_user,
         'user_organisation': user_organisation,
     }
     
     if is_org_user and user_organisation:
-        # Statistiques spécifiques à l'organisation
-        
-        # Nombre de départements de l'organisation
-        org_departements = Departement.objects.filter(section__CodeSection=user_organisation.code)
-        context['org_departements_count'] = org_departements.count()
-        
-        # Nombre de mentions de l'organisation (via départements)
-        org_mentions = Mention.objects.filter(departement__section__CodeSection=user_organisation.code)
-        context['org_mentions_count'] = org_mentions.count()
-        
-        # Nombre de classes de l'organisation (via mentions -> départements)
-        org_classes = Classe.objects.filter(mention__departement__section__CodeSection=user_organisation.code)
-        context['org_classes_count'] = org_classes.count()
-        
-        # Nombre d'enseignants de l'organisation
-        org_teachers = Teacher.objects.filter(section=user_organisation.code)
-        context['org_teachers_count'] = org_teachers.count()
-        
-        # Nombre de cours de l'organisation
-        org_courses = Course.objects.filter(section=user_organisation.code)
-        context['org_courses_count'] = org_courses.count()
-        
-        # Nombre d'utilisateurs de l'organisation
-        org_users = UserProfile.objects.filter(organisation=user_organisation)
-        context['org_users_count'] = org_users.count()
-        
-        # Heures par semestre IMPAIR (S1, S3, S5, S7, S9, S11)
-        # Heures allouées (CMI + TD/TP) pour les semestres impairs
-        courses_impair = Course.objects.filter(
-            section=user_organisation.code,
-            semestre__in=['S1', 'S3', 'S5', 'S7', 'S9', 'S11']
-        )
-        heures_allouees_impair = courses_impair.aggregate(
-            total=Sum(
-                ExpressionWrapper(
-                    F('cmi') + F('td_tp'),
-                    output_field=FloatField()
-                )
-            )
-        )['total'] or 0
-        
-        # Heures réalisées pour les semestres impairs
-        heures_realisees_impair = TeachingProgress.objects.filter(
-            course__section=user_organisation.code,
-            course__semestre__in=['S1', 'S3', 'S5', 'S7', 'S9', 'S11']
-        ).aggregate(total=Sum('hours_done'))['total'] or 0
-        
-        # Taux de réalisation semestres impairs
-        taux_realisation_impair = 0
-        if heures_allouees_impair > 0:
-            taux_realisation_impair = round((float(heures_realisees_impair) / float(heures_allouees_impair)) * 100, 1)
-        
-        context['heures_allouees_impair'] = heures_allouees_impair
-        context['heures_realisees_impair'] = heures_realisees_impair
-        context['taux_realisation_impair'] = taux_realisation_impair
-        
-        # Heures par semestre PAIR (S2, S4, S6, S8, S10, S12)
-        courses_pair = Course.objects.filter(
-            section=user_organisation.code,
-            semestre__in=['S2', 'S4', 'S6', 'S8', 'S10', 'S12']
-        )
-        heures_allouees_pair = courses_pair.aggregate(
-            total=Sum(
-                ExpressionWrapper(
-                    F('cmi') + F('td_tp'),
-                    output_field=FloatField()
-                )
-            )
-        )['total'] or 0
-        
-        # Heures réalisées pour les semestres pairs
-        heures_realisees_pair = TeachingProgress.objects.filter(
-            course__section=user_organisation.code,
-            course__semestre__in=['S2', 'S4', 'S6', 'S8', 'S10', 'S12']
-        ).aggregate(total=Sum('hours_done'))['total'] or 0
-        
-        # Taux de réalisation semestres pairs
-        taux_realisation_pair = 0
-        if heures_allouees_pair > 0:
-            taux_realisation_pair = round((float(heures_realisees_pair) / float(heures_allouees_pair)) * 100, 1)
-        
-        context['heures_allouees_pair'] = heures_allouees_pair
-        context['heures_realisees_pair'] = heures_realisees_pair
-        context['taux_realisation_pair'] = taux_realisation_pair
+        # Statistiques spécifiques à l'organisation (calculées par section et mises en cache)
+        org_stats = get_statistics_for_section(user_organisation.code)
+        for field in ('departements_count', 'mentions_count', 'classes_count',
+                      'teachers_count', 'courses_count', 'users_count'):
+            context[f'org_{field}'] = org_stats[field]
+        
+        # Heures par semestre IMPAIR (S1, S3, ...) et PAIR (S2, S4, ...)
+        context['heures_allouees_impair'] = org_stats['heures_allouees_impair']
+        context['heures_realisees_impair'] = org_stats['heures_realisees_impair']
+        context['taux_realisation_impair'] = org_stats['taux_impair']
+        context['heures_allouees_pair'] = org_stats['heures_allouees_pair']
+        context['heures_realisees_pair'] = org_stats['heures_realisees_pair']
+        context['taux_realisation_pair'] = org_stats['taux_pair']
     else:
         # Admin global / Superuser : statistiques globales puis par organisation
         
         # ==================== STATISTIQUES GLOBALES ====================
-        # Totaux globaux
-        context['global_departements_count'] = Departement.objects.count()
-        context['global_mentions_count'] = Mention.objects.count()
-        context['global_classes_count'] = Classe.objects.count()
-        context['global_teachers_count'] = Teacher.objects.count()
-        context['global_courses_count'] = Course.objects.count()
-        context['global_users_count'] = UserProfile.objects.count()
-        
-        # Heures globales - Semestres Impairs
-        global_courses_impair = Course.objects.filter(semestre__in=['S1', 'S3', 'S5', 'S7', 'S9', 'S11'])
-        global_heures_allouees_impair = global_courses_impair.aggregate(
-            total=Sum(ExpressionWrapper(F('cmi') + F('td_tp'), output_field=FloatField()))
-        )['total'] or 0
-        global_heures_realisees_impair = TeachingProgress.objects.filter(
-            course__semestre__in=['S1', 'S3', 'S5', 'S7', 'S9', 'S11']
-        ).aggregate(total=Sum('hours_done'))['total'] or 0
-        global_taux_impair = round((float(global_heures_realisees_impair) / float(global_heures_allouees_impair)) * 100, 1) if global_heures_allouees_impair > 0 else 0
-        
-        context['global_heures_allouees_impair'] = global_heures_allouees_impair
-        context['global_heures_realisees_impair'] = global_heures_realisees_impair
-        context['global_taux_impair'] = global_taux_impair
-        
-        # Heures globales - Semestres Pairs
-        global_courses_pair = Course.objects.filter(semestre__in=['S2', 'S4', 'S6', 'S8', 'S10', 'S12'])
-        global_heures_allouees_pair = global_courses_pair.aggregate(
-            total=Sum(ExpressionWrapper(F('cmi') + F('td_tp'), output_field=FloatField()))
-        )['total'] or 0
-        global_heures_realisees_pair = TeachingProgress.objects.filter(
-            course__semestre__in=['S2', 'S4', 'S6', 'S8', 'S10', 'S12']
-        ).aggregate(total=Sum('hours_done'))['total'] or 0
-        global_taux_pair = round((float(global_heures_realisees_pair) / float(global_heures_allouees_pair)) * 100, 1) if global_heures_allouees_pair > 0 else 0
-        
-        context['global_heures_allouees_pair'] = global_heures_allouees_pair
-        context['global_heures_realisees_pair'] = global_heures_realisees_pair
-        context['global_taux_pair'] = global_taux_pair
+        global_stats = get_global_statistics()
+        for field in ('departements_count', 'mentions_count', 'classes_count',
+                      'teachers_count', 'courses_count', 'users_count'):
+            context[f'global_{field}'] = global_stats[field]
+        
+        context['global_heures_allouees_impair'] = global_stats['heures_allouees_impair']
+        context['global_heures_realisees_impair'] = global_stats['heures_realisees_impair']
+        context['global_taux_impair'] = global_stats['taux_impair']
+        context['global_heures_allouees_pair'] = global_stats['heures_allouees_pair']
+        context['global_heures_realisees_pair'] = global_stats['heures_realisees_pair']
+        context['global_taux_pair'] = global_stats['taux_pair']
         
         # ==================== STATISTIQUES PAR ORGANISATION ====================
-        organisations = Organisation.objects.filter(est_active=True).order_by('nom')
-        organisations_stats = []
-        
-        for org in organisations:
-            org_stats = {
-                'organisation': org,
-                'departements_count': Departement.objects.filter(section__CodeSection=org.code).count(),
-                'mentions_count': Mention.objects.filter(departement__section__CodeSection=org.code).count(),
-                'classes_count': Classe.objects.filter(mention__departement__section__CodeSection=org.code).count(),
-                'teachers_count': Teacher.objects.filter(section=org.code).count(),
-                'courses_count': Course.objects.filter(section=org.code).count(),
-                'users_count': UserProfile.objects.filter(organisation=org).count(),
-            }
-            
-            # Heures semestres impairs pour cette organisation
-            org_courses_impair = Course.objects.filter(section=org.code, semestre__in=['S1', 'S3', 'S5', 'S7', 'S9', 'S11'])
-            org_heures_allouees_impair = org_courses_impair.aggregate(
-                total=Sum(ExpressionWrapper(F('cmi') + F('td_tp'), output_field=FloatField()))
-            )['total'] or 0
-            org_heures_realisees_impair = TeachingProgress.objects.filter(
-                course__section=org.code, course__semestre__in=['S1', 'S3', 'S5', 'S7', 'S9', 'S11']
-            ).aggregate(total=Sum('hours_done'))['total'] or 0
-            org_taux_impair = round((float(org_heures_realisees_impair) / float(org_heures_allouees_impair)) * 100, 1) if org_heures_allouees_impair > 0 else 0
-            
-            org_stats['heures_allouees_impair'] = org_heures_allouees_impair
-            org_stats['heures_realisees_impair'] = org_heures_realisees_impair
-            org_stats['taux_impair'] = org_taux_impair
-            
-            # Heures semestres pairs pour cette organisation
-            org_courses_pair = Course.objects.filter(section=org.code, semestre__in=['S2', 'S4', 'S6', 'S8', 'S10', 'S12'])
-            org_heures_allouees_pair = org_courses_pair.aggregate(
-                total=Sum(ExpressionWrapper(F('cmi') + F('td_tp'), output_field=FloatField()))
-            )['total'] or 0
-            org_heures_realisees_pair = TeachingProgress.objects.filter(
-                course__section=org.code, course__semestre__in=['S2', 'S4', 'S6', 'S8', 'S10', 'S12']
-            ).aggregate(total=Sum('hours_done'))['total'] or 0
-            org_taux_pair = round((float(org_heures_realisees_pair) / float(org_heures_allouees_pair)) * 100, 1) if org_heures_allouees_pair > 0 else 0
-            
-            org_stats['heures_allouees_pair'] = org_heures_allouees_pair
-            org_stats['heures_realisees_pair'] = org_heures_realisees_pair
-            org_stats['taux_pair'] = org_taux_pair
-            
-            organisations_stats.append(org_stats)
+        organisations = list(Organisation.objects.filter(est_active=True).order_by('nom'))
+        organisations_stats = [
+            dict(get_statistics_for_section(org.code), organisation=org)
+            for org in organisations
+        ]
         
         context['organisations'] = organisations
         context['organisations_stats'] = organisations_stats
-        context['total_organisations'] = organisations.count()
+        context['total_organisations'] = len(organisations)
     
     # Statistiques rapides (si l'utilisateur a les permissions)
     if request.user.has_perm('attribution.view_scheduleentry'):
         from attribution.models import ScheduleEntry
         if is_org_user and user_organisation:
             context['total_cours'] = ScheduleEntry.objects.filter(
-                course__section=user_organisation.code
+                attribution__code_ue__section=user_organisation.code
             ).count()
         else:
             context['total_cours'] = ScheduleEntry.objects.count()
@@ -254,16 +123,12 @@ class DashboardView(TemplateView):
         academic_year = f"{current_year-1}-{current_year}" if timezone.now().month < 9 else f"{current_year}-{current_year+1}"
         
         # Filtrer par organisation si l'utilisateur appartient à une organisation
-        teaching_progress_queryset = TeachingProgress.objects.all()
+        section_code = user_organisation.code if user_organisation else None
         attribution_queryset = Attribution.objects.select_related('code_ue').filter(code_ue__isnull=False)
         course_queryset = Course.objects.all()
         teacher_queryset = Teacher.objects.all()
         
         if user_organisation:
-            # Filtrer par enseignants de l'organisation
-            teaching_progress_queryset = teaching_progress_queryset.filter(
-                teacher__section=user_organisation.code
-            )
             attribution_queryset = attribution_queryset.filter(
                 matricule__section=user_organisation.code
             )
@@ -274,8 +139,10 @@ class DashboardView(TemplateView):
                 section=user_organisation.code
             )
         
-        # Heures effectuées (total de tous les enregistrements)
-        total_hours_done = teaching_progress_queryset.aggregate(total=Sum('hours_done'))['total'] or 0
+        # Heures effectuées (total de tous les enregistrements, depuis l'agrégat matérialisé)
+        total_hours_done = progress_stats_queryset(section=section_code).aggregate(
+            total=Sum('total_hours_done')
+        )['total'] or 0
         
         # Heures allouées (basé sur les charges des enseignants)
         total_hours_allocated = attribution_queryset.aggregate(
@@ -302,10 +169,8 @@ class DashboardView(TemplateView):
             'total_teachers': teacher_queryset.count(),
         }
         
-        # Progression des cours depuis TeachingProgress avec jointure Course
-        course_progress = teaching_progress_queryset.filter(
-            week__annee_academique=academic_year
-        ).select_related('course').values(
+        # Progression des cours depuis ProgressStats avec jointure Course
+        course_progress = progress_stats_queryset(academic_year, section_code).values(
             'course__code_ue',
             'course__intitule_ue', 
             'course__classe',
@@ -314,7 +179,7 @@ class DashboardView(TemplateView):
             'course__td_tp',
             'course__id'
         ).annotate(
-            total_hours_done=Sum('hours_done'),
+            total_hours_done=Sum('total_hours_done'),
             total_volume=ExpressionWrapper(
                 F('course__cmi') + F('course__td_tp'),
                 output_field=FloatField()
@@ -336,87 +201,10 @@ class DashboardView(TemplateView):
         
         context['courses_by_semester'] = courses_by_semester
         
-        
         # Progression des enseignants par type de charge
-        teacher_progress = []
-        
-        # Récupérer les combinaisons uniques enseignant-type_charge filtrées par organisation
-        teaching_progress_teachers = TeachingProgress.objects.filter(
-            week__annee_academique=academic_year
-        )
+        context['teacher_progress'] = teacher_charge_progress(academic_year, section=section_code)
         
-        if user_organisation:
-            teaching_progress_teachers = teaching_progress_teachers.filter(
-                teacher__section=user_organisation.code
-            )
-        
-        teacher_charge_combinations = Attribution.objects.filter(
-            matricule__matricule__in=teaching_progress_teachers.values_list('teacher__matricule', flat=True).distinct()
-        )
-        
-        if user_organisation:
-            teacher_charge_combinations = teacher_charge_combinations.filter(
-                matricule__section=user_organisation.code
-            )
-        
-        teacher_charge_combinations = teacher_charge_combinations.values(
-            'matricule__matricule', 'matricule__nom_complet', 'type_charge'
-        ).distinct()
-        
-        for combination in teacher_charge_combinations:
-            teacher_matricule = combination['matricule__matricule']
-            teacher_name = combination['matricule__nom_complet']
-            charge_type = combination['type_charge']
-            
-            if not charge_type:
-                continue
-                
-            # Filtrer les cours selon le type de charge
-            courses_for_charge = Attribution.objects.filter(
-                matricule__matricule=teacher_matricule,
-                type_charge=charge_type
-            ).values_list('code_ue__id', flat=True)
-            
-            # Calculer les heures réalisées pour ce type de charge spécifique
-            hours_done_for_charge = TeachingProgress.objects.filter(
-                teacher__matricule=teacher_matricule,
-                week__annee_academique=academic_year,
-                course__id__in=courses_for_charge
-            ).aggregate(total=Sum('hours_done'))['total'] or 0
-            
-            # Calculer les heures allouées pour ce type de charge spécifique
-            hours_allocated_for_charge = Course.objects.filter(
-                id__in=courses_for_charge
-            ).aggregate(
-                total=Sum(
-                    ExpressionWrapper(
-                        F('cmi') + F('td_tp'),
-                        output_field=FloatField()
-                    )
-                )
-            )['total'] or 0
-            
-            # Calculer le pourcentage de progression
-            progression_percentage = 0
-            if hours_allocated_for_charge > 0:
-                progression_percentage = (float(hours_done_for_charge) * 100.0) / float(hours_allocated_for_charge)
-            
-            teacher_progress.append({
-                'teacher__nom_complet': teacher_name,
-                'teacher__matricule': teacher_matricule,
-                'type_charge': charge_type.capitalize(),
-                'total_hours_done': hours_done_for_charge,
-                'total_hours_allocated': hours_allocated_for_charge,
-                'progression_percentage': progression_percentage,
-                'hours_display': f"{hours_done_for_charge}/{hours_allocated_for_charge}"
-            })
-        
-        # Trier par nom d'enseignant puis par type de charge
-        teacher_progress.sort(key=lambda x: (x['teacher__nom_complet'], x['type_charge']))
-        
-        context['teacher_progress'] = teacher_progress
-        
-        # Progression des classes
+        # Progression des classes : volumes alloués par (classe, semestre)
         class_progress_queryset = Course.objects.all()
         
         if user_organisation:
@@ -424,7 +212,7 @@ class DashboardView(TemplateView):
                 section=user_organisation.code
             )
         
-        class_progress = class_progress_queryset.values(
+        class_progress = list(class_progress_queryset.values(
             'classe', 'semestre'
         ).annotate(
             nombre_ue=Count('id'),
@@ -434,25 +222,23 @@ class DashboardView(TemplateView):
                     output_field=FloatField()
                 )
             ),
-            total_hours_done=Sum(
-                Case(
-                    When(
-                        progress_records__week__annee_academique=academic_year,
-                        then='progress_records__hours_done'
-                    ),
-                    default=Value(0),
-                    output_field=FloatField()
-                )
-            ),
-            progression_percentage=Case(
-                When(
-                    total_hours_allocated__gt=0,
-                    then=(F('total_hours_done') * 100.0) / F('total_hours_allocated')
-                ),
-                default=Value(0),
-                output_field=FloatField()
-            )
-        ).order_by('classe', 'semestre')
+        ).order_by('classe', 'semestre'))
+        
+        # Heures effectuées par (classe, semestre) depuis ProgressStats
+        class_stats = progress_stats_queryset(academic_year)
+        if user_organisation:
+            class_stats = class_stats.filter(course__section=user_organisation.code)
+        hours_done_by_class = {
+            (row['course__classe'], row['course__semestre']): row['total']
+            for row in class_stats.values('course__classe', 'course__semestre').annotate(
+                total=Sum('total_hours_done')
+            ).order_by()
+        }
+        
+        for row in class_progress:
+            row['total_hours_done'] = float(hours_done_by_class.get((row['classe'], row['semestre'])) or 0)
+            allocated = row['total_hours_allocated'] or 0
+            row['progression_percentage'] = (row['total_hours_done'] * 100.0 / allocated) if allocated > 0 else 0
         
         context['class_progress'] = class_progress
         context['stats'] = stats
@@ -780,18 +566,18 @@ class TeacherProgressView(DetailView):
         context['academic_year'] = academic_year
         
         # Progression hebdomadaire
-        weekly_progress = TeachingProgress.objects.filter(
-            teacher=teacher,
-            week__annee_academique=academic_year
-        ).order_by('week__numero_semaine').values('week__numero_semaine').annotate(
-            total_hours=Sum('hours_done')
+        weekly_progress = stats.order_by('week__numero_semaine').values('week__numero_semaine').annotate(
+            total_hours=Sum('total_hours_done')
         )
         
         context['weekly_progress'] = list(weekly_progress)
         
-        # Calculer les totaux
-        total_allocated = sum(stat.total_hours_allocated for stat in stats)
-        total_done = sum(stat.total_hours_done for stat in stats)
+        # Calculer les totaux (une ligne par semaine : volume compté une fois par UE)
+        total_done = stats.aggregate(total=Sum('total_hours_done'))['total'] or 0
+        total_allocated = sum(
+            (course.cmi or 0) + (course.td_tp or 0)
+            for course in Course.objects.filter(progress_stats__in=stats).distinct()
+        )
         
         context['total_allocated'] = total_allocated
         context['total_done'] = total_done
@@ -857,24 +643,14 @@ class CourseProgressView(DetailView):
         context['academic_year'] = academic_year
         
         # Progression hebdomadaire
-        weekly_progress_queryset = TeachingProgress.objects.filter(
-            course=course,
-            week__annee_academique=academic_year
-        )
-        
-        if user_organisation:
-            weekly_progress_queryset = weekly_progress_queryset.filter(
-                teacher__section=user_organisation.code
-            )
-        
-        weekly_progress = weekly_progress_queryset.order_by('week__numero_semaine').values('week__numero_semaine').annotate(
-            total_hours=Sum('hours_done')
+        weekly_progress = stats_queryset.order_by('week__numero_semaine').values('week__numero_semaine').annotate(
+            total_hours=Sum('total_hours_done')
         )
         
         context['weekly_progress'] = list(weekly_progress)
         
         # Calculer les totaux
-        total_done = sum(stat.total_hours_done for stat in stats)
+        total_done = stats_queryset.aggregate(total=Sum('total_hours_done'))['total'] or 0
         # Calculer le volume horaire total en additionnant cmi et td_tp
         total_allocated = course.cmi + course.td_tp
         
@@ -910,10 +686,10 @@ def progress_chart_data(request):
     
     if chart_type == 'weekly':
         # Progression hebdomadaire globale
-        weekly_data = TeachingProgress.objects.filter(
-            week__annee_academique=academic_year
+        weekly_data = ProgressStats.objects.filter(
+            academic_year=academic_year
         ).values('week__numero_semaine').annotate(
-            hours=Sum('hours_done')
+            hours=Sum('total_hours_done')
         ).order_by('week__numero_semaine')
         
         weeks = [item['week__numero_semaine'] for item in weekly_data]
@@ -1029,8 +805,8 @@ def dashboard_pdf_view(request):
     current_year = timezone.now().year
     academic_year = f"{current_year-1}-{current_year}" if timezone.now().month < 9 else f"{current_year}-{current_year+1}"
     
-    # Heures effectuées (total de tous les enregistrements)
-    total_hours_done = TeachingProgress.objects.aggregate(total=Sum('hours_done'))['total'] or 0
+    # Heures effectuées (total de tous les enregistrements, depuis l'agrégat matérialisé)
+    total_hours_done = ProgressStats.objects.aggregate(total=Sum('total_hours_done'))['total'] or 0
     
     # Heures allouées (basé sur les charges des enseignants)
     total_hours_allocated = Attribution.objects.select_related('code_ue').filter(
@@ -1119,23 +895,19 @@ def dashboard_pdf_view(request):
         dept_mapping[dept.CodeDept] = dept.DesignationDept
     
     # Construire un dictionnaire des progressions par cours (cumul de toutes les semaines)
-    progress_filter = {'week__annee_academique': academic_year}
-    # Ne pas filtrer par semaine spécifique pour avoir le cumul
-    # if semaine_date_debut:
-    #     progress_filter['week__date_debut'] = semaine_date_debut
+    semestres_filtre = None
     if type_semestre == 'impair':
-        progress_filter['course__semestre__in'] = ['S1', 'S3', 'S5', 'S7']
+        semestres_filtre = ['S1', 'S3', 'S5', 'S7']
     elif type_semestre == 'pair':
-        progress_filter['course__semestre__in'] = ['S2', 'S4', 'S6', 'S8']
+        semestres_filtre = ['S2', 'S4', 'S6', 'S8']
+    section_filtre = user_org.code if user_org else None
     
     progress_by_course = {}
-    progress_queryset = TeachingProgress.objects.filter(**progress_filter)
-    if user_org:
-        progress_queryset = progress_queryset.filter(teacher__section=user_org.code)
-    
-    progress_data = progress_queryset.values('course_id').annotate(
-        total_hours=Sum('hours_done')
-    )
+    progress_data = progress_stats_queryset(academic_year, section_filtre, semestres_filtre).values(
+        'course_id'
+    ).annotate(
+        total_hours=Sum('total_hours_done')
+    ).order_by()
     
     for prog in progress_data:
         progress_by_course[prog['course_id']] = prog['total_hours'] or 0
@@ -1245,97 +1017,14 @@ def dashboard_pdf_view(request):
         courses_by_department[department]['total_hours'] += float(course.get('total_hours_done', 0) or 0)
         courses_by_department[department]['course_count'] += 1
     
-    # Progression des enseignants
-    teacher_progress = []
-    
-    # Filtrer les enseignants avec le filtre de type semestre (cumul de toutes les semaines)
-    teacher_progress_filter = {'week__annee_academique': academic_year}
-    # Ne pas filtrer par semaine spécifique pour avoir le cumul
-    # if semaine_date_debut:
-    #     teacher_progress_filter['week__date_debut'] = semaine_date_debut
-    if type_semestre == 'impair':
-        teacher_progress_filter['course__semestre__in'] = ['S1', 'S3', 'S5', 'S7']
-    elif type_semestre == 'pair':
-        teacher_progress_filter['course__semestre__in'] = ['S2', 'S4', 'S6', 'S8']
-    
-    # Filtrer par organisation si spécifiée
-    teaching_progress_teachers = TeachingProgress.objects.filter(**teacher_progress_filter)
-    if user_org:
-        teaching_progress_teachers = teaching_progress_teachers.filter(teacher__section=user_org.code)
-    
-    teacher_charge_combinations = Attribution.objects.filter(
-        matricule__matricule__in=teaching_progress_teachers.values_list('teacher__matricule', flat=True).distinct()
+    # Progression des enseignants (cumul de toutes les semaines)
+    teacher_progress = teacher_charge_progress(
+        academic_year,
+        section=section_filtre,
+        semestres=semestres_filtre,
+        charge_type=None if charge_type_filter == 'all' else charge_type_filter,
     )
     
-    if user_org:
-        teacher_charge_combinations = teacher_charge_combinations.filter(matricule__section=user_org.code)
-    
-    teacher_charge_combinations = teacher_charge_combinations.values(
-        'matricule__matricule', 'matricule__nom_complet', 'type_charge'
-    ).distinct()
-    
-    for combination in teacher_charge_combinations:
-        teacher_matricule = combination['matricule__matricule']
-        teacher_name = combination['matricule__nom_complet']
-        charge_type = combination['type_charge']
-        
-        if not charge_type:
-            continue
-        
-        # Appliquer le filtre de type de charge
-        if charge_type_filter != 'all' and charge_type != charge_type_filter:
-            continue
-            
-        courses_for_charge = Attribution.objects.filter(
-            matricule__matricule=teacher_matricule,
-            type_charge=charge_type
-        ).values_list('code_ue__id', flat=True)
-        
-        # Appliquer le filtre par type semestre aux heures effectuées (cumul de toutes les semaines)
-        teacher_hours_filter = {
-            'teacher__matricule': teacher_matricule,
-            'week__annee_academique': academic_year,
-            'course__id__in': courses_for_charge
-        }
-        # Ne pas filtrer par semaine spécifique pour avoir le cumul
-        # if semaine_date_debut:
-        #     teacher_hours_filter['week__date_debut'] = semaine_date_debut
-        if type_semestre == 'impair':
-            teacher_hours_filter['course__semestre__in'] = ['S1', 'S3', 'S5', 'S7']
-        elif type_semestre == 'pair':
-            teacher_hours_filter['course__semestre__in'] = ['S2', 'S4', 'S6', 'S8']
-        
-        hours_done_for_charge = TeachingProgress.objects.filter(
-            **teacher_hours_filter
-        ).aggregate(total=Sum('hours_done'))['total'] or 0
-        
-        hours_allocated_for_charge = Course.objects.filter(
-            id__in=courses_for_charge
-        ).aggregate(
-            total=Sum(
-                ExpressionWrapper(
-                    F('cmi') + F('td_tp'),
-                    output_field=FloatField()
-                )
-            )
-        )['total'] or 0
-        
-        progression_percentage = 0
-        if hours_allocated_for_charge > 0:
-            progression_percentage = (float(hours_done_for_charge) * 100.0) / float(hours_allocated_for_charge)
-        
-        teacher_progress.append({
-            'teacher__nom_complet': teacher_name,
-            'teacher__matricule': teacher_matricule,
-            'type_charge': charge_type.capitalize(),
-            'total_hours_done': hours_done_for_charge,
-            'total_hours_allocated': hours_allocated_for_charge,
-            'progression_percentage': progression_percentage,
-            'hours_display': f"{hours_done_for_charge}/{hours_allocated_for_charge}"
-        })
-    
-    teacher_progress.sort(key=lambda x: (x['teacher__nom_complet'], x['type_charge']))
-    
     # Chemin absolu pour les images dans le PDF
     from django.conf import settings
     import os
@@ -1438,11 +1127,30 @@ def action_history_view(request):
     if request.method == 'POST' and 'delete_selected' in request.POST:
         selected_ids = request.POST.getlist('selected_actions')
         if selected_ids:
-            deleted_count = ActionLog.objects.filter(id__in=selected_ids).delete()[0]
+            selected = ActionLog.objects.filter(id__in=selected_ids)
+            counts = ActionLogSummary.counts_for(
+                selected.values('timestamp', 'action_type', 'organisation_id', 'username')
+            )
+            deleted_count = selected.delete()[0]
+            ActionLogSummary.add_counts({key: -count for key, count in counts.items()})
             return redirect('tracking:action_history')
     
-    # Statistiques des types d'action - créer une liste complète avec tous les types
-    actions_by_type_dict = {action['action_type']: action['count'] for action in logs.values('action_type').annotate(count=Count('id'))}
+    # Statistiques des types d'action : lues dans les résumés mensuels (qui
+    # couvrent aussi les actions archivées) quand les filtres le permettent
+    if model_name or date_from or date_to or search:
+        actions_by_type = logs.values('action_type').annotate(count=Count('id')).order_by('-count')
+    else:
+        summaries = ActionLogSummary.objects.all()
+        if action_type:
+            summaries = summaries.filter(action_type=action_type)
+        if username:
+            summaries = summaries.filter(username__icontains=username)
+        if organisation_id:
+            summaries = summaries.filter(organisation_id=organisation_id)
+        actions_by_type = summaries.values('action_type').annotate(count=Sum('count')).order_by('-count')
+    
+    actions_by_type = list(actions_by_type)
+    actions_by_type_dict = {action['action_type']: action['count'] for action in actions_by_type}
     
     # Créer une liste complète avec tous les types d'action, triée par nombre d'actions
     all_actions_by_type = []
@@ -1458,7 +1166,7 @@ def action_history_view(request):
     all_actions_by_type.sort(key=lambda x: x['count'], reverse=True)
     
     stats = {
-        'actions_by_type': logs.values('action_type').annotate(count=Count('id')).order_by('-count'),
+        'actions_by_type': actions_by_type,
         'all_actions_by_type': all_actions_by_type,
     }
     
@@ -1518,3 +1226,37 @@ def action_history_view(request):
     }
     
     return render(request, 'tracking/action_history.html', context)
+
+
+@user_passes_test(lambda u: u.is_superuser, login_url='/admin/login/')
+def query_budget_view(request):
+    """Rapport du nombre de requêtes SQL par vue (réservé aux administrateurs)"""
+    from django.conf import settings
+    from .query_budget import store
+
+    if request.method == 'POST' and 'reset' in request.POST:
+        store.clear()
+        messages.success(request, "Mesures de requêtes réinitialisées.")
+        return redirect('tracking:query_budget')
+
+    rows = store.summary()
+    for row in rows:
+        row['last_seen'] = datetime.fromtimestamp(row['last_seen'])
+    return render(request, 'tracking/query_budget.html', {
+        'rows': rows,
+        'enabled': getattr(settings, 'QUERY_BUDGET_ENABLED', False),
+        'header': getattr(settings, 'QUERY_BUDGET_HEADER', 'X-Query-Budget'),
+    })
+
+
+@user_passes_test(lambda u: u.is_superuser, login_url='/admin/login/')
+def query_budget_export(request):
+    """Export JSON des mesures de requêtes SQL par vue"""
+    import os
+    from .query_budget import store
+
+    return JsonResponse({
+        'generated_at': timezone.now().isoformat(),
+        'pid': os.getpid(),
+        'views': store.summary(),
+    })